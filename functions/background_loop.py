@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Process-lifetime asyncio event loop for synchronous entry points
+
+The Firebase handlers are synchronous. Running a coroutine from them with
+asyncio.run() creates and closes an event loop per request, and with it the
+loop's httpx.AsyncClient (get_async_client keeps one per loop) and its
+pooled connections; it also fails outright when the caller is already
+inside a running loop. run_coroutine() instead submits the coroutine to a
+single loop that runs on a daemon thread for the life of the process, so
+the loop, the AsyncClient and its keep-alive connections are reused by
+every request and by concurrent handler threads.
+"""
+
+import asyncio
+import atexit
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Coroutine, Optional
+
+from http_client import close_async_client
+
+logger = logging.getLogger(__name__)
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+def _run_loop(loop: asyncio.AbstractEventLoop, ready: threading.Event) -> None:
+    asyncio.set_event_loop(loop)
+    loop.call_soon(ready.set)
+    loop.run_forever()
+
+def _loop_running() -> bool:
+    return _loop is not None and not _loop.is_closed() and _thread is not None and _thread.is_alive()
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """Return the background event loop, starting its thread on first use"""
+    global _loop, _thread
+    if not _loop_running():
+        with _lock:
+            if not _loop_running():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+                thread = threading.Thread(target=_run_loop, args=(loop, ready), name="background-event-loop", daemon=True)
+                thread.start()
+                ready.wait()
+                _loop, _thread = loop, thread
+                logger.info("🔁 Started background event loop")
+    return _loop
+
+def submit_coroutine(coro: Coroutine) -> Future:
+    """Schedule coro on the background loop and return a concurrent.futures.Future for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, get_background_loop())
+
+def run_coroutine(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """
+    Run a coroutine on the background loop and wait for its result
+
+    Args:
+        coro: The coroutine to run
+        timeout: Seconds to wait before cancelling it (None: no limit)
+
+    Returns:
+        Any: The coroutine's result (its exception is re-raised)
+
+    Raises:
+        RuntimeError: If called from a coroutine on the background loop itself, which would deadlock
+    """
+    loop = get_background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_coroutine() cannot block the background loop; await the coroutine instead")
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result(timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        raise
+
+def shutdown_background_loop(timeout: float = 5.0) -> None:
+    """Close the loop's AsyncClient, then stop and close the loop (it restarts on next use)"""
+    global _loop, _thread
+    with _lock:
+        loop, thread = _loop, _thread
+        _loop, _thread = None, None
+    if loop is None or loop.is_closed():
+        return
+    if thread is not None and thread.is_alive():
+        try:
+            asyncio.run_coroutine_threadsafe(close_async_client(), loop).result(timeout)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not close the background AsyncClient: {str(e)}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+    if not loop.is_running():
+        loop.close()
+
+atexit.register(shutdown_background_loop)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark for typo-tolerant ingredient lookups
+
+Names are built from a per-language vocabulary, so words repeat across
+ingredients the way "chicken", "dried" or "sauce" do in the real corpus.
+Queries are corpus names with 0-2 random edits. The run fails (exit code 1)
+when p99 latency exceeds the budget.
+
+Usage:
+    python benchmark_fuzzy_matcher.py [--size 5000] [--vocabulary 3000] [--queries 5000] [--p99-budget-ms 5]
+"""
+
+import argparse
+import random
+import sys
+import time
+from config import FUZZY_MATCH_CONFIG
+from fuzzy_matcher import FuzzyIngredientMatcher
+from benchmark_ingredient_index import ALPHABETS
+
+def synthetic_documents(rng: random.Random, size: int, vocabulary_size: int):
+    vocabularies = {
+        language: ["".join(rng.choice(alphabet) for _ in range(rng.randint(3, 10))) for _ in range(vocabulary_size)]
+        for language, alphabet in ALPHABETS.items()
+    }
+
+    def random_name(language: str) -> str:
+        # Low word indexes are picked far more often, like common words in real names
+        words = vocabularies[language]
+        return " ".join(words[int(len(words) * rng.random() ** 2)] for _ in range(rng.randint(1, 3)))
+
+    for document_id in range(size):
+        names = {}
+        for language in ALPHABETS:
+            names[language] = {
+                "name": {"singular": random_name(language), "plural": random_name(language)},
+                "synonyms": [random_name(language) for _ in range(rng.randint(0, 2))]
+            }
+        yield {"_id": document_id, "name": names["english"]["name"]["singular"], "names": names}
+
+def misspell(rng: random.Random, word: str, alphabet: str, edits: int) -> str:
+    for _ in range(edits):
+        position = rng.randrange(len(word))
+        operation = rng.choice(("insert", "delete", "substitute", "transpose"))
+        if operation == "insert":
+            word = word[:position] + rng.choice(alphabet) + word[position:]
+        elif operation == "delete" and len(word) > 3:
+            word = word[:position] + word[position + 1:]
+        elif operation == "transpose" and position < len(word) - 1:
+            word = word[:position] + word[position + 1] + word[position] + word[position + 2:]
+        else:
+            word = word[:position] + rng.choice(alphabet) + word[position + 1:]
+    return word
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FuzzyIngredientMatcher lookups")
+    parser.add_argument("--size", type=int, default=5000, help="Number of ingredient documents")
+    parser.add_argument("--vocabulary", type=int, default=3000, help="Distinct words per language")
+    parser.add_argument("--queries", type=int, default=5000, help="Number of lookups to time")
+    parser.add_argument("--p99-budget-ms", type=float, default=5.0, help="Fail when p99 latency exceeds this")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    documents = list(synthetic_documents(rng, args.size, args.vocabulary))
+    matcher = FuzzyIngredientMatcher()
+
+    print(f"🚀 Building fuzzy matcher from {args.size:,} documents...")
+    start = time.perf_counter()
+    matcher.build(documents)
+    print(f"   Built in {time.perf_counter() - start:.1f}s ({matcher.key_count:,} distinct words)")
+
+    queries = []
+    for _ in range(args.queries):
+        document = rng.choice(documents)
+        language = rng.choice(list(ALPHABETS))
+        name = document["names"][language]["name"]["singular"]
+        queries.append((misspell(rng, name, ALPHABETS[language], rng.randint(0, 2)), document["name"]))
+
+    timings = []
+    found = 0
+    for query, expected in queries:
+        start = time.perf_counter()
+        results = matcher.search(query, limit=5, min_score=FUZZY_MATCH_CONFIG['MIN_SCORE'])
+        timings.append((time.perf_counter() - start) * 1000)
+        if any(result["name"] == expected for result in results):
+            found += 1
+
+    timings.sort()
+    p99 = timings[int(len(timings) * 0.99)]
+    print(f"📊 {args.queries:,} fuzzy lookups: {found / args.queries:.1%} found the source ingredient in the top 5")
+    print(f"   p50: {timings[len(timings) // 2]:.3f} ms")
+    print(f"   p99: {p99:.3f} ms (budget {args.p99_budget_ms} ms)")
+    print(f"   max: {timings[-1]:.3f} ms")
+    if p99 > args.p99_budget_ms:
+        print("❌ p99 latency over budget")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the pooled HTTP clients against per-request connections
+
+Runs a local HTTP/1.1 stub standing in for OpenRouter. Connections to it are
+plain TCP, so TLS handshake savings against the real API come on top of the
+numbers printed here.
+
+Usage:
+    python benchmark_http_client.py [--requests 300] [--concurrency 8]
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import requests
+
+import http_client
+from http_client import get_async_client, get_session
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"choices": [{"message": {"content": "{}"}}]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def _report(label: str, timings: list, elapsed: float) -> None:
+    timings.sort()
+    print(f"   {label}: {len(timings) / elapsed:,.0f} req/s, "
+          f"p50 {timings[len(timings) // 2]:.2f} ms, p99 {timings[int(len(timings) * 0.99)]:.2f} ms")
+
+def _timed(call) -> float:
+    start = time.perf_counter()
+    call()
+    return (time.perf_counter() - start) * 1000
+
+def bench_sync(url: str, count: int, payload: dict) -> None:
+    print("🔁 requests (sync)")
+    start = time.perf_counter()
+    timings = [_timed(lambda: requests.post(url, json=payload, timeout=30)) for _ in range(count)]
+    _report("requests.post per call", timings, time.perf_counter() - start)
+
+    session = get_session()
+    start = time.perf_counter()
+    timings = [_timed(lambda: session.post(url, json=payload, timeout=30)) for _ in range(count)]
+    _report("pooled session       ", timings, time.perf_counter() - start)
+
+async def bench_async(url: str, count: int, concurrency: int, payload: dict) -> None:
+    print(f"⚡ httpx (async, concurrency {concurrency})")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def per_call():
+        async with semaphore:
+            start = time.perf_counter()
+            async with httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=10.0)) as client:
+                await client.post(url, json=payload)
+            return (time.perf_counter() - start) * 1000
+
+    async def shared():
+        async with semaphore:
+            start = time.perf_counter()
+            await get_async_client().post(url, json=payload)
+            return (time.perf_counter() - start) * 1000
+
+    for label, call in (("AsyncClient per call ", per_call), ("shared AsyncClient   ", shared)):
+        start = time.perf_counter()
+        timings = await asyncio.gather(*(call() for _ in range(count)))
+        _report(label, list(timings), time.perf_counter() - start)
+    await http_client.close_async_client()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pooled HTTP clients")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent async requests")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/v1/chat/completions"
+    payload = {"model": "stub", "messages": [{"role": "user", "content": "x" * 2048}]}
+
+    print(f"🚀 Benchmarking {args.requests} requests against {url}")
+    bench_sync(url, args.requests, payload)
+    asyncio.run(bench_async(url, args.requests, args.concurrency, payload))
+    http_client.close_session()
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Benchmark for near-duplicate lookups in the perceptual hash index
+
+Usage:
+    python benchmark_image_hash.py [--size 1000000] [--queries 2000] [--distance 6]
+"""
+
+import argparse
+import random
+import time
+from image_hash import MultiIndexHashIndex
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MultiIndexHashIndex lookups")
+    parser.add_argument("--size", type=int, default=1_000_000, help="Number of stored hashes")
+    parser.add_argument("--queries", type=int, default=2000, help="Number of lookups to time")
+    parser.add_argument("--distance", type=int, default=6, help="Max Hamming distance")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    index = MultiIndexHashIndex()
+
+    print(f"🚀 Building index with {args.size:,} hashes...")
+    start = time.perf_counter()
+    stored = [rng.getrandbits(64) for _ in range(args.size)]
+    for value in stored:
+        index.add(value)
+    print(f"   Built in {time.perf_counter() - start:.1f}s")
+
+    # Half the queries are near-duplicates of stored hashes, half are fresh images
+    queries = []
+    for i in range(args.queries):
+        if i % 2 == 0:
+            value = rng.choice(stored)
+            for position in rng.sample(range(64), rng.randint(0, args.distance)):
+                value ^= 1 << position
+        else:
+            value = rng.getrandbits(64)
+        queries.append(value)
+
+    timings = []
+    found = 0
+    for value in queries:
+        start = time.perf_counter()
+        if index.search(value, args.distance):
+            found += 1
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    print(f"📊 {args.queries:,} lookups at distance <= {args.distance}: {found:,} matched")
+    print(f"   p50: {timings[len(timings) // 2]:.3f} ms")
+    print(f"   p99: {timings[int(len(timings) * 0.99)]:.3f} ms")
+    print(f"   max: {timings[-1]:.3f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark peak memory of building the v2 vision request body
+
+Compares the previous path (decode, re-encode to base64, build a data: URL,
+serialize the whole payload through json=) with the bytes-first path
+(decode once, stream base64 into the body). The client's base64 string is
+allocated before measuring, as it is by the request parser.
+
+Usage:
+    python benchmark_image_payload.py [--size-mb 4]
+"""
+
+import argparse
+import base64
+import json
+import os
+import time
+import tracemalloc
+
+from image_payload import ImagePayload, StreamingJSONBody, IMAGE_URL_PLACEHOLDER
+
+def _payload(url: str) -> dict:
+    return {
+        "model": "benchmark",
+        "messages": [{"role": "user", "content": [
+            {"type": "text", "text": "Analyze this meal"},
+            {"type": "image_url", "image_url": {"url": url}}
+        ]}],
+        "max_tokens": 1000
+    }
+
+def legacy_body(image_base64: str) -> int:
+    image_bytes = base64.b64decode(image_base64)
+    image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+    payload = _payload(f"data:image/jpeg;base64,{image_base64}")
+    body = json.dumps(payload).encode("utf-8")  # what requests does for json=
+    return len(body)
+
+def streamed_body(image_base64: str) -> int:
+    image = ImagePayload.from_base64(image_base64)
+    body = StreamingJSONBody(_payload(IMAGE_URL_PLACEHOLDER), image)
+    sent = 0
+    for chunk in body:  # what the connection does while sending
+        sent += len(chunk)
+    return sent
+
+def measure(label: str, build, image_base64: str) -> None:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    sent = build(image_base64)
+    elapsed = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"   {label:14} peak {peak / 1024 / 1024:6.2f} MB, {elapsed:6.1f} ms, body {sent / 1024 / 1024:.2f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark v2 request body memory")
+    parser.add_argument("--size-mb", type=float, default=4, help="Decoded image size")
+    args = parser.parse_args()
+
+    image_base64 = base64.b64encode(b"\xff\xd8\xff" + os.urandom(int(args.size_mb * 1024 * 1024))).decode("ascii")
+    print(f"🚀 Building request bodies for a {args.size_mb} MB image ({len(image_base64) / 1024 / 1024:.2f} MB base64)")
+    measure("json= + f-string", legacy_body, image_base64)
+    measure("streamed", streamed_body, image_base64)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark for image preprocessing before vision model requests
+
+Builds a corpus of synthetic phone-style photos (noisy, textured, common
+camera resolutions, some with EXIF rotation and alpha) and compares the
+single-pass pipeline with the previous quality/scale re-encode loop.
+
+Usage:
+    python benchmark_image_pipeline.py [--max-size-kb 400] [--runs 3]
+"""
+
+import argparse
+import io
+import random
+import time
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from image_pipeline import prepare_image_for_api
+
+CORPUS = [
+    ("12MP landscape", (4032, 3024), "JPEG", None),
+    ("12MP portrait, EXIF rotated", (4032, 3024), "JPEG", 6),
+    ("48MP landscape", (8064, 6048), "JPEG", None),
+    ("FullHD screenshot", (1920, 1080), "JPEG", None),
+    ("8MP PNG with alpha", (3264, 2448), "PNG", None),
+    ("already small", (1024, 768), "JPEG", None),
+]
+
+def _synthetic_photo(size, seed: int) -> Image.Image:
+    """Textured plate-like scene with sensor noise, so JPEG sizes resemble real photos"""
+    rng = random.Random(seed)
+    base = Image.effect_noise((size[0] // 4, size[1] // 4), 60).convert("RGB").resize(size, Image.Resampling.BICUBIC)
+    draw = ImageDraw.Draw(base)
+    for _ in range(40):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        radius = rng.randrange(size[0] // 40, size[0] // 6)
+        colour = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=colour)
+    base = base.filter(ImageFilter.GaussianBlur(2))
+    grain = Image.effect_noise(size, 18).convert("RGB")
+    return Image.blend(base, grain, 0.15)
+
+def build_corpus():
+    corpus = []
+    for seed, (label, size, image_format, orientation) in enumerate(CORPUS):
+        image = _synthetic_photo(size, seed)
+        output = io.BytesIO()
+        if image_format == "PNG":
+            image.putalpha(255)
+            image.save(output, format="PNG", compress_level=1)
+        else:
+            exif = Image.Exif()
+            if orientation:
+                exif[0x0112] = orientation
+            image.save(output, format="JPEG", quality=92, exif=exif.tobytes())
+        corpus.append((label, output.getvalue()))
+    return corpus
+
+def legacy_compress(image_bytes, max_size_kb=400, quality=85):
+    """The re-encode loop compress_image_for_api used before the pipeline"""
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGB')
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=quality, optimize=True)
+    compressed_bytes = output.getvalue()
+    while len(compressed_bytes) > max_size_kb * 1024 and quality > 10:
+        output = io.BytesIO()
+        quality -= 10
+        image.save(output, format='JPEG', quality=quality, optimize=True)
+        compressed_bytes = output.getvalue()
+    if len(compressed_bytes) > max_size_kb * 1024:
+        width, height = image.size
+        scale_factor = 0.8
+        while len(compressed_bytes) > max_size_kb * 1024 and scale_factor > 0.3:
+            resized_image = image.resize((int(width * scale_factor), int(height * scale_factor)), Image.Resampling.LANCZOS)
+            output = io.BytesIO()
+            resized_image.save(output, format='JPEG', quality=quality, optimize=True)
+            compressed_bytes = output.getvalue()
+            scale_factor -= 0.1
+    return compressed_bytes
+
+def _time(call, runs):
+    timings = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = call()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image preprocessing")
+    parser.add_argument("--max-size-kb", type=int, default=400, help="Byte budget per image")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per image (best is reported)")
+    args = parser.parse_args()
+
+    print("🚀 Building benchmark corpus...")
+    corpus = build_corpus()
+    totals = {"legacy": 0.0, "pipeline": 0.0}
+
+    print(f"📊 Budget {args.max_size_kb} KB, best of {args.runs} runs")
+    print(f"   {'image':30} {'in KB':>8} | {'legacy ms':>9} {'out KB':>7} | {'pipeline ms':>11} {'out KB':>7} {'size':>10} {'q':>3} {'enc':>3}")
+    for label, image_bytes in corpus:
+        legacy_ms, legacy_out = _time(lambda: legacy_compress(image_bytes, args.max_size_kb), args.runs)
+        pipeline_ms, (pipeline_out, stats) = _time(lambda: prepare_image_for_api(image_bytes, args.max_size_kb), args.runs)
+        totals["legacy"] += legacy_ms
+        totals["pipeline"] += pipeline_ms
+        size = f"{stats['output_size'][0]}x{stats['output_size'][1]}"
+        print(f"   {label:30} {len(image_bytes) / 1024:8.0f} | {legacy_ms:9.0f} {len(legacy_out) / 1024:7.0f} | "
+              f"{pipeline_ms:11.0f} {len(pipeline_out) / 1024:7.0f} {size:>10} {stats['quality']:>3} {stats['encodes']:>3}")
+
+    count = len(corpus)
+    print(f"✅ Mean ms/image: legacy {totals['legacy'] / count:.0f}, pipeline {totals['pipeline'] / count:.0f} "
+          f"({totals['legacy'] / max(totals['pipeline'], 1e-9):.1f}x faster)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark for autocomplete lookups in the in-memory ingredient name index
+
+Usage:
+    python benchmark_ingredient_index.py [--size 50000] [--queries 5000]
+"""
+
+import argparse
+import random
+import time
+from ingredient_index import IngredientNameIndex
+
+ALPHABETS = {
+    "english": "abcdefghijklmnopqrstuvwxyz",
+    "hebrew": "אבגדהוזחטיכלמנסעפצקרשת",
+    "russian": "абвгдежзийклмнопрстуфхцчшщыэюя",
+    "spanish": "abcdefghijklmnñopqrstuvwxyzáéí"
+}
+
+def random_name(rng: random.Random, alphabet: str) -> str:
+    return " ".join(
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(3, 10)))
+        for _ in range(rng.randint(1, 3))
+    )
+
+def synthetic_documents(rng: random.Random, size: int):
+    for document_id in range(size):
+        names = {}
+        for language, alphabet in ALPHABETS.items():
+            names[language] = {
+                "name": {"singular": random_name(rng, alphabet), "plural": random_name(rng, alphabet)},
+                "synonyms": [random_name(rng, alphabet) for _ in range(rng.randint(0, 2))]
+            }
+        yield {"_id": document_id, "name": names["english"]["name"]["singular"], "names": names}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark IngredientNameIndex autocomplete")
+    parser.add_argument("--size", type=int, default=50_000, help="Number of ingredient documents")
+    parser.add_argument("--queries", type=int, default=5000, help="Number of lookups to time")
+    parser.add_argument("--updates", type=int, default=1000, help="Number of incremental upserts to time")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    documents = list(synthetic_documents(rng, args.size))
+    index = IngredientNameIndex()
+
+    print(f"🚀 Building index from {args.size:,} documents...")
+    start = time.perf_counter()
+    index.build(documents)
+    print(f"   Built in {time.perf_counter() - start:.1f}s ({index.key_count:,} keys)")
+
+    # Prefixes of 1-6 characters taken from real names in random languages
+    queries = []
+    for _ in range(args.queries):
+        document = rng.choice(documents)
+        language = rng.choice(list(ALPHABETS))
+        name = document["names"][language]["name"]["singular"]
+        queries.append(name[:rng.randint(1, min(6, len(name)))])
+
+    timings = []
+    found = 0
+    for query in queries:
+        start = time.perf_counter()
+        if index.autocomplete(query):
+            found += 1
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    print(f"📊 {args.queries:,} autocomplete lookups: {found:,} with results")
+    print(f"   p50: {timings[len(timings) // 2]:.3f} ms")
+    print(f"   p99: {timings[int(len(timings) * 0.99)]:.3f} ms")
+    print(f"   max: {timings[-1]:.3f} ms")
+
+    updates = list(synthetic_documents(rng, args.updates))
+    start = time.perf_counter()
+    for document in updates:
+        document["_id"] = rng.randrange(args.size)
+        index.upsert_document(document)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"📊 {args.updates:,} incremental upserts: {elapsed / args.updates:.3f} ms each")
+
+if __name__ == "__main__":
+    main()
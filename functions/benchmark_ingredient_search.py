@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark $regex ingredient search against the search_tokens index
+
+Fills a scratch database with synthetic multilingual ingredient documents,
+adds search fields and indexes, then times the legacy unanchored $regex
+queries against the indexed ones and prints the winning plan stage.
+Requires a reachable MongoDB (the same MONGO_* settings as mongodb_config,
+or --uri).
+
+Usage:
+    python benchmark_ingredient_search.py [--documents 500000] [--queries 200] [--uri mongodb://...]
+"""
+
+import argparse
+import random
+import time
+
+from search_index import SEARCH_INDEXES, build_search_fields
+
+WORDS = {
+    "en": ["chicken", "breast", "tomato", "cherry", "green", "apple", "smoked", "salmon", "greek", "yogurt",
+           "whole", "wheat", "bread", "olive", "oil", "brown", "rice", "sweet", "potato", "red", "onion"],
+    "es": ["pollo", "pechuga", "tomate", "cereza", "verde", "manzana", "ahumado", "salmón", "griego", "yogur",
+           "integral", "trigo", "pan", "aceite", "oliva", "arroz", "dulce", "patata", "roja", "cebolla"],
+    "he": ["עוף", "חזה", "עגבנייה", "שרי", "ירוק", "תפוח", "מעושן", "סלמון", "יווני", "יוגורט",
+           "מלא", "חיטה", "לחם", "שמן", "זית", "אורז", "מתוק", "תפוחי", "אדמה", "בצל"],
+    "ru": ["курица", "грудка", "помидор", "черри", "зелёный", "яблоко", "копчёный", "лосось", "греческий", "йогурт",
+           "цельный", "пшеница", "хлеб", "оливковое", "масло", "рис", "сладкий", "картофель", "красный", "лук"]
+}
+
+def _document(rng: random.Random, index: int) -> dict:
+    positions = [rng.randrange(len(WORDS["en"]) - 1) for _ in range(rng.randint(1, 3))]
+    names = {}
+    for language, words in WORDS.items():
+        text = " ".join(words[p % len(words)] for p in positions) + f" {index}"
+        names[language] = {"name": {"singular": text, "plural": text + ("s" if language == "en" else "")}}
+    document = {"name": names["en"]["name"]["singular"], "names": names, "category": rng.choice(["Protein", "Vegetable", "Grain", "Dairy"])}
+    document.update(build_search_fields(document, "name"))
+    return document
+
+def _time_queries(collection, filters, limit=10):
+    timings = []
+    for query_filter in filters:
+        start = time.perf_counter()
+        list(collection.find(query_filter, {"_id": 0, "name": 1}).limit(limit))
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+
+def _plan_stage(collection, query_filter) -> str:
+    plan = collection.find(query_filter).limit(10).explain()["queryPlanner"]["winningPlan"]
+    stages = []
+    while plan:
+        stages.append(plan.get("stage", "?"))
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " <- ".join(stages)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark indexed ingredient search")
+    parser.add_argument("--documents", type=int, default=500_000, help="Synthetic documents to insert")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per mode")
+    parser.add_argument("--uri", help="MongoDB URI (defaults to mongodb_config settings)")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database afterwards")
+    args = parser.parse_args()
+
+    from pymongo import MongoClient
+    if args.uri:
+        client = MongoClient(args.uri)
+    else:
+        import mongodb_config
+        client = mongodb_config.client
+        if client is None:
+            raise SystemExit("❌ MongoDB is not reachable; pass --uri")
+    database = client["kali_search_benchmark"]
+    collection = database["ingredient_names"]
+    collection.drop()
+
+    rng = random.Random(7)
+    print(f"🚀 Inserting {args.documents:,} synthetic ingredient documents...")
+    start = time.perf_counter()
+    for offset in range(0, args.documents, 10_000):
+        collection.insert_many([_document(rng, i) for i in range(offset, min(offset + 10_000, args.documents))], ordered=False)
+    for keys, name in SEARCH_INDEXES:
+        collection.create_index(keys, name=name)
+    print(f"   Loaded and indexed in {time.perf_counter() - start:.1f}s")
+
+    samples = []
+    for _ in range(args.queries):
+        language = rng.choice(list(WORDS))
+        word = rng.choice(WORDS[language])
+        samples.append((language, word[:rng.randint(3, len(word))]))
+
+    from mongodb_config import _indexed_name_query
+    modes = {
+        "partial $regex": [{"name": {"$regex": q, "$options": "i"}} for _, q in samples],
+        "multilingual $regex": [{f"names.{lang}.name.singular": {"$regex": q, "$options": "i"}} for lang, q in samples],
+        "indexed": [_indexed_name_query(q, lang) for lang, q in samples]
+    }
+    print(f"📊 {args.queries} queries per mode (limit 10)")
+    for label, filters in modes.items():
+        p50, p99 = _time_queries(collection, filters)
+        print(f"   {label:20} p50 {p50:8.2f} ms  p99 {p99:8.2f} ms  plan: {_plan_stage(collection, filters[0])}")
+
+    if not args.keep:
+        client.drop_database("kali_search_benchmark")
+
+if __name__ == "__main__":
+    main()
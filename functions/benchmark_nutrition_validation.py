@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark for nutrition validation: the batch validator against the one-row
+validator, and the per-item cost of each single-item path
+
+Usage:
+    python benchmark_nutrition_validation.py [--size 200000] [--items 20000]
+"""
+
+import argparse
+import random
+import time
+import utils
+from nutrition_validation import PER_100G_FIELDS, check_nutrition_rules, validate_nutrition_batch
+
+CATEGORIES = ["Fruits", "Vegetables", "Meat", "Dairy", "Grains", "Nut", "Alcoholic", "Red Wine", "Beer", "Other"]
+
+def synthetic_rows(rng: random.Random, size: int):
+    for _ in range(size):
+        proteins, carbs, fats = (round(rng.uniform(0, 40), 1) for _ in range(3))
+        calories = round(proteins * 4 + carbs * 4 + fats * 9 + rng.uniform(-80, 80), 1)
+        yield {
+            "category": rng.choice(CATEGORIES),
+            "proteins": f"{proteins}g",
+            "carbohydrates": f"{carbs}g",
+            "fats": f"{fats}g",
+            "calories": f"{calories}kcal",
+            "proteins_per_100g": f"{proteins}g",
+            "carbohydrates_per_100g": f"{carbs}g",
+            "fats_per_100g": f"{fats}g",
+            "calories_per_100g": f"{calories}kcal"
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark validate_nutrition_batch")
+    parser.add_argument("--size", type=int, default=200_000, help="Number of ingredients")
+    parser.add_argument("--items", type=int, default=20_000, help="Ingredients for the per-item timings")
+    args = parser.parse_args()
+
+    rows = list(synthetic_rows(random.Random(42), args.size))
+
+    print(f"🚀 Validating {args.size:,} ingredients...")
+    start = time.perf_counter()
+    result = validate_nutrition_batch(rows)
+    batch_seconds = time.perf_counter() - start
+    invalid = len(result.invalid_rows())
+
+    # Row by row, without the per-failure MongoDB insert
+    utils.save_validation_error = lambda **kwargs: None
+    start = time.perf_counter()
+    row_invalid = sum(not utils.validate_nutritional_values(row, row["category"], "benchmark")[0] for row in rows)
+    row_seconds = time.perf_counter() - start
+
+    print(f"📊 Batch: {batch_seconds:.2f}s ({args.size / batch_seconds:,.0f} rows/s), {invalid:,} invalid")
+    print(f"   Row by row: {row_seconds:.2f}s ({args.size / row_seconds:,.0f} rows/s), {row_invalid:,} invalid")
+    print(f"   Speedup: {row_seconds / batch_seconds:.1f}x")
+
+    from mongodb_config import validate_nutrition_data
+
+    items = rows[:args.items]
+    parsed = [{key: float(row[key].rstrip("gkcal")) for key in PER_100G_FIELDS} for row in items]
+    single_item_paths = [
+        ("check_nutrition_rules (parsed values)", lambda row, values: check_nutrition_rules(values, row["category"])),
+        ("validate_nutritional_values", lambda row, values: utils.validate_nutritional_values(row, row["category"], "benchmark")),
+        ("validate_nutrition_data", lambda row, values: validate_nutrition_data("benchmark", row))
+    ]
+    print(f"📊 Per-item cost over {len(items):,} ingredients:")
+    for label, validate in single_item_paths:
+        start = time.perf_counter()
+        for row, values in zip(items, parsed):
+            validate(row, values)
+        print(f"   {label}: {(time.perf_counter() - start) / len(items) * 1e6:.2f} µs")
+
+if __name__ == "__main__":
+    main()
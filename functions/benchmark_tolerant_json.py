@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark for tolerant JSON parsing against the old repair cascade
+
+The corpus holds meal analyses written the ways the models return them:
+plain JSON, fenced, introduced by prose, Python-style single quotes,
+trailing commas and outputs cut off by the token limit.
+
+Usage:
+    python benchmark_tolerant_json.py [--documents 2000] [--repeat 5]
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+from tolerant_json import parse_tolerant_json
+
+INGREDIENTS = ["Chicken Breast", "Brown Rice", "Broccoli", "Olive Oil", "Tomato", "Feta Cheese",
+               "Avocado", "Salmon", "Quinoa", "Shepherd's Pie", "Greek Yogurt", "Almonds"]
+VARIANTS = ("plain", "fenced", "prose", "single_quotes", "trailing_commas", "truncated")
+
+def cascade_parse(text: str):
+    """
+    The parsing this module replaced: json.loads, then fence stripping, brace
+    slicing and regex single-quote rewrites, each followed by a full re-parse
+    """
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    text_to_parse = text.strip()
+    if text_to_parse.startswith("```json") and text_to_parse.endswith("```"):
+        text_to_parse = text_to_parse[len("```json"):-len("```")].strip()
+    elif text_to_parse.startswith("```") and text_to_parse.endswith("```"):
+        text_to_parse = text_to_parse[len("```"):-len("```")].strip()
+    start, end = text_to_parse.find("{"), text_to_parse.rfind("}")
+    if start != -1 and end > start:
+        text_to_parse = text_to_parse[start:end + 1]
+    try:
+        return json.loads(text_to_parse)
+    except json.JSONDecodeError:
+        pass
+    if "'" in text_to_parse:
+        if '"' not in text_to_parse:
+            text_to_parse = text_to_parse.replace("'", '"')
+        else:
+            text_to_parse = re.sub(r"'([^']*)'(\s*:)", r'"\1"\2', text_to_parse)
+            text_to_parse = re.sub(r":\s*'([^']*)'", r': "\1"', text_to_parse)
+    return json.loads(text_to_parse)
+
+def make_analysis(rng: random.Random) -> dict:
+    ingredients = rng.sample(INGREDIENTS, rng.randint(2, 6))
+    detailed = [{
+        "name": name,
+        "grams": rng.randint(10, 300),
+        "calories": round(rng.uniform(5, 500), 1),
+        "proteins": round(rng.uniform(0, 40), 1),
+        "carbs": round(rng.uniform(0, 60), 1),
+        "fats": round(rng.uniform(0, 30), 1)
+    } for name in ingredients]
+    return {
+        "mealName": " & ".join(ingredients[:2]),
+        "estimatedCalories": round(sum(item["calories"] for item in detailed)),
+        "macros": {"proteins": f"{rng.randint(5, 80)}g", "carbohydrates": f"{rng.randint(5, 120)}g", "fats": f"{rng.randint(2, 60)}g"},
+        "ingredients": ingredients,
+        "detailedIngredients": detailed,
+        "healthiness": rng.choice(["healthy", "medium", "unhealthy"]),
+        "health_assessment": "A balanced plate with lean protein and vegetables. " * rng.randint(1, 4),
+        "source": "https://fdc.nal.usda.gov/"
+    }
+
+def render(analysis: dict, variant: str, rng: random.Random) -> str:
+    """Write an analysis the way a model might"""
+    text = json.dumps(analysis, indent=2)
+    if variant == "fenced":
+        return f"```json\n{text}\n```"
+    if variant == "prose":
+        return f"Here is the nutritional analysis of the meal:\n\n{text}\n\nLet me know if you need anything else."
+    if variant == "single_quotes":
+        return repr(analysis)
+    if variant == "trailing_commas":
+        return re.sub(r"(\S)(\n\s*[}\]])", r"\1,\2", text)
+    if variant == "truncated":
+        return text[:rng.randint(len(text) // 2, len(text) - 2)]
+    return text
+
+def build_corpus(documents: int, seed: int = 42):
+    """List of (variant, original analysis, text)"""
+    rng = random.Random(seed)
+    corpus = []
+    for index in range(documents):
+        variant = VARIANTS[index % len(VARIANTS)]
+        analysis = make_analysis(rng)
+        corpus.append((variant, analysis, render(analysis, variant, rng)))
+    return corpus
+
+def _run(parse, texts, repeat):
+    outcomes = {}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            try:
+                value = parse(text)
+            except Exception:
+                value = None
+            outcomes[text] = value
+    return outcomes, (time.perf_counter() - start) / (len(texts) * repeat)
+
+def _recovered(variant: str, value, analysis: dict) -> bool:
+    if variant == "truncated":
+        # A truncated output counts as recovered when its mealName survives
+        return isinstance(value, dict) and value.get("mealName") == analysis["mealName"]
+    return value == analysis
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parse_tolerant_json against the old repair cascade")
+    parser.add_argument("--documents", type=int, default=2000, help="Corpus size")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the corpus")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.documents)
+    total_bytes = sum(len(text) for _, _, text in corpus)
+    print(f"🚀 Parsing {len(corpus):,} model outputs ({total_bytes / 1024:.0f} KB) x {args.repeat}...")
+    print("📊 Per variant: µs per output and analyses recovered (tolerant parser | repair cascade)")
+    totals = [0.0, 0.0]
+    for variant in VARIANTS:
+        rows = [(analysis, text) for name, analysis, text in corpus if name == variant]
+        texts = [text for _, text in rows]
+        results = []
+        for index, parse in enumerate((lambda text: parse_tolerant_json(text).value, cascade_parse)):
+            outcomes, seconds = _run(parse, texts, args.repeat)
+            totals[index] += seconds * len(texts)
+            recovered = sum(_recovered(variant, outcomes[text], analysis) for analysis, text in rows)
+            results.append(f"{seconds * 1e6:7.1f}µs {recovered:5d}/{len(rows)}")
+        print(f"   {variant:16s} {results[0]}  |  {results[1]}")
+    print(f"📊 Mean: {totals[0] / len(corpus) * 1e6:.1f}µs tolerant parser, {totals[1] / len(corpus) * 1e6:.1f}µs repair cascade")
+
+if __name__ == "__main__":
+    main()
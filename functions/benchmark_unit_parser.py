@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark for unit-string parsing against the old .replace() chains
+
+Values mix repeated literals ("0g", "100g") with unique ones, like model
+output does.
+
+Usage:
+    python benchmark_unit_parser.py [--values 3000000] [--distinct 50000]
+"""
+
+import argparse
+import random
+import time
+from unit_parser import _parse_text, _text_to_grams, _text_to_kcal, to_grams, to_kcal
+
+UNITS = ["g", "g", "g", "kcal", "kcal", "ml", "kg", "mg", " g", " kcal"]
+
+def replace_chain(value: str) -> float:
+    return float(value.replace("g", "").replace("kcal", "").replace("ml", ""))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark to_grams / to_kcal")
+    parser.add_argument("--values", type=int, default=3_000_000, help="Number of values to parse")
+    parser.add_argument("--distinct", type=int, default=50_000, help="Distinct literal strings")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    distinct = [f"{round(rng.uniform(0, 500), rng.choice((0, 1, 2)))}{rng.choice(UNITS)}" for _ in range(args.distinct)]
+    # Low indexes are picked far more often, like "0g" in real data
+    values = [distinct[int(len(distinct) * rng.random() ** 3)] for _ in range(args.values)]
+    energy = [value for value in values if value.endswith("kcal")]
+    masses = [value for value in values if not value.endswith("kcal")]
+
+    print(f"🚀 Parsing {args.values:,} values ({args.distinct:,} distinct)...")
+    for cached in (_parse_text, _text_to_grams, _text_to_kcal):
+        cached.cache_clear()
+    start = time.perf_counter()
+    parsed = [to_kcal(value) for value in energy] + [to_grams(value) for value in masses]
+    parser_seconds = time.perf_counter() - start
+    hits = sum(cached.cache_info().hits for cached in (_text_to_grams, _text_to_kcal))
+    misses = sum(cached.cache_info().misses for cached in (_text_to_grams, _text_to_kcal))
+
+    start = time.perf_counter()
+    failures = 0
+    for value in values:
+        try:
+            replace_chain(value)
+        except ValueError:
+            failures += 1
+    chain_seconds = time.perf_counter() - start
+
+    print(f"📊 unit_parser: {parser_seconds:.2f}s ({args.values / parser_seconds / 1e6:.2f}M values/s), "
+          f"{sum(value is None for value in parsed):,} unparsed, cache hit rate {hits / (hits + misses):.1%}")
+    print(f"   replace chain: {chain_seconds:.2f}s ({args.values / chain_seconds / 1e6:.2f}M values/s), "
+          f"{failures:,} failed (kg/mg values)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+In-process caches for expensive model calls
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from config import ANALYSIS_CACHE_CONFIG, RECIPE_CACHE_CONFIG
+from image_hash import compute_image_hash, near_duplicate_index
+from text_normalization import normalize_text
+
+logger = logging.getLogger(__name__)
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire ttl_seconds after being stored"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the cached value for key, or default if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Store value under key, evicting the least recently used entries when full"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+def make_analysis_cache_key(image_bytes: bytes, prompt: str, model: Optional[str]) -> str:
+    """
+    Build a content-addressed cache key for an image analysis
+
+    The key covers the decoded image bytes, the prompt text and the model, so a
+    prompt or model change never serves a stale analysis.
+    """
+    digest = hashlib.sha256()
+    digest.update(hashlib.sha256(image_bytes).digest())
+    digest.update(hashlib.sha256((prompt or "").encode("utf-8")).digest())
+    digest.update(str(model).encode("utf-8"))
+    return digest.hexdigest()
+
+class AnalysisResultCache:
+    """
+    Two-tier cache for meal image analysis results
+
+    The first tier is an in-process TTLCache. The optional second tier is a
+    MongoDB collection shared by all function instances; hits there are
+    promoted into the in-process tier.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 86400, mongo_collection=None):
+        self.memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.ttl_seconds = ttl_seconds
+        self.mongo_collection = mongo_collection
+        self.mongo_hits = 0
+        self.mongo_errors = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return a copy of the cached analysis for key, or None on a miss"""
+        result = self.memory.get(key)
+        if result is not None:
+            return copy.deepcopy(result)
+
+        if self.mongo_collection is None:
+            return None
+        try:
+            document = self.mongo_collection.find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.utcnow()}},
+                {"result_json": 1}
+            )
+        except Exception as e:
+            with self._lock:
+                self.mongo_errors += 1
+            logger.error(f"❌ Analysis cache lookup failed: {str(e)}")
+            return None
+        if not document:
+            return None
+
+        result = json.loads(document["result_json"])
+        with self._lock:
+            self.mongo_hits += 1
+        self.memory.set(key, result)
+        return copy.deepcopy(result)
+
+    def set(self, key: str, result: dict) -> None:
+        """Store a successful analysis in every configured tier"""
+        self.memory.set(key, copy.deepcopy(result))
+        if self.mongo_collection is None:
+            return
+        try:
+            now = datetime.utcnow()
+            self.mongo_collection.replace_one(
+                {"_id": key},
+                {
+                    "_id": key,
+                    "result_json": json.dumps(result),
+                    "created_at": now,
+                    "expires_at": now + timedelta(seconds=self.ttl_seconds)
+                },
+                upsert=True
+            )
+        except Exception as e:
+            with self._lock:
+                self.mongo_errors += 1
+            logger.error(f"❌ Failed to store analysis in cache collection: {str(e)}")
+
+    def ensure_indexes(self) -> None:
+        """Create the TTL index that lets MongoDB expire cached analyses"""
+        if self.mongo_collection is not None:
+            self.mongo_collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters across both tiers"""
+        memory_stats = self.memory.stats()
+        hits = memory_stats["hits"] + self.mongo_hits
+        misses = memory_stats["misses"] - self.mongo_hits
+        lookups = hits + misses
+        return {
+            "memory_hits": memory_stats["hits"],
+            "mongo_hits": self.mongo_hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": memory_stats["entries"],
+            "evictions": memory_stats["evictions"],
+            "mongo_enabled": self.mongo_collection is not None,
+            "mongo_errors": self.mongo_errors
+        }
+
+def _build_analysis_cache() -> AnalysisResultCache:
+    mongo_collection = None
+    if ANALYSIS_CACHE_CONFIG['MONGO_ENABLED']:
+        try:
+            from mongodb_config import analysis_cache_collection
+            mongo_collection = analysis_cache_collection
+        except Exception as e:
+            logger.warning(f"Analysis cache Mongo tier unavailable: {str(e)}")
+    cache = AnalysisResultCache(
+        max_entries=ANALYSIS_CACHE_CONFIG['MAX_ENTRIES'],
+        ttl_seconds=ANALYSIS_CACHE_CONFIG['TTL_SECONDS'],
+        mongo_collection=mongo_collection
+    )
+    try:
+        cache.ensure_indexes()
+    except Exception as e:
+        logger.warning(f"Could not create analysis cache TTL index: {str(e)}")
+    return cache
+
+# Shared cache used by the meal image endpoints
+analysis_cache = _build_analysis_cache()
+
+class AnalysisCacheLookup:
+    """Outcome of looking an image up in the analysis cache"""
+
+    def __init__(self, cache_key: str, image_hash: Optional[int], result: Optional[dict], source: Optional[str]):
+        self.cache_key = cache_key
+        self.image_hash = image_hash
+        self.result = result
+        self.source = source
+
+def lookup_cached_analysis(image_bytes: bytes, prompt: str, model: Optional[str]) -> AnalysisCacheLookup:
+    """
+    Look an image up by exact content first, then by perceptual near-duplicate
+
+    The returned lookup carries the keys needed by store_cached_analysis when
+    the caller ends up running the analysis itself.
+    """
+    cache_key = make_analysis_cache_key(image_bytes, prompt, model)
+    result = analysis_cache.get(cache_key)
+    if result is not None:
+        return AnalysisCacheLookup(cache_key, None, result, "exact")
+
+    image_hash = compute_image_hash(image_bytes)
+    similar_key = near_duplicate_index.find(image_hash, prompt, model)
+    if similar_key:
+        result = analysis_cache.get(similar_key)
+        if result is not None:
+            return AnalysisCacheLookup(cache_key, image_hash, result, "near_duplicate")
+    return AnalysisCacheLookup(cache_key, image_hash, None, None)
+
+def store_cached_analysis(lookup: AnalysisCacheLookup, prompt: str, model: Optional[str], result: dict) -> None:
+    """Cache a successful analysis and register the image's perceptual hash"""
+    analysis_cache.set(lookup.cache_key, result)
+    near_duplicate_index.add(lookup.image_hash, prompt, model, lookup.cache_key)
+
+def _bucket(value: Optional[float], width: float) -> Optional[float]:
+    """Round a macro target to the nearest multiple of width (None stays None)"""
+    if value is None or width <= 0:
+        return value
+    return round(value / width) * width
+
+def make_recipe_cache_key(ingredient_names: Iterable[str], macro_ranges: Dict[str, Tuple[Optional[float], Optional[float]]],
+                          diet_type: Optional[str], difficulty: Optional[str], lang: Optional[str]) -> str:
+    """
+    Build the cache key of a recipe request from its canonical constraints
+
+    Ingredient names are normalized, deduplicated and sorted; each (min, max)
+    macro target is rounded to RECIPE_CACHE_CONFIG's calorie or macro bucket.
+    Requests that differ only in ingredient order, case or a few kcal share a key.
+
+    Args:
+        ingredient_names: Names of the available ingredients
+        macro_ranges: (min, max) per field, e.g. {"calories": (None, 500), "proteins": (30.0, 40.0)}
+        diet_type, difficulty, lang: The remaining request constraints
+
+    Returns:
+        str: A SHA-256 hex digest
+    """
+    ranges = {}
+    for field in sorted(macro_ranges):
+        width = RECIPE_CACHE_CONFIG['CALORIE_BUCKET'] if field == "calories" else RECIPE_CACHE_CONFIG['MACRO_BUCKET']
+        ranges[field] = [_bucket(bound, width) for bound in macro_ranges[field]]
+    canonical = {
+        "ingredients": sorted({normalize_text(name) for name in ingredient_names} - {""}),
+        "ranges": ranges,
+        "diet_type": normalize_text(diet_type or ""),
+        "difficulty": normalize_text(difficulty or ""),
+        "lang": normalize_text(lang or "en")
+    }
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode("utf-8")).hexdigest()
+
+class RecipeResultCache:
+    """
+    TTL/LRU cache of generated recipe sets with token accounting
+
+    Each entry remembers how many tokens its generation used, so every hit
+    adds to tokens_saved.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 21600):
+        self.memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.tokens_saved = 0
+        self.tokens_generated = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return a copy of the cached recipe set for key, or None on a miss"""
+        entry = self.memory.get(key)
+        if entry is None:
+            return None
+        with self._lock:
+            self.tokens_saved += entry["tokens"]
+        return copy.deepcopy(entry["result"])
+
+    def set(self, key: str, result: dict, tokens: int = 0, generated: bool = True) -> None:
+        """
+        Store a generated recipe set and the tokens its generation used
+
+        Args:
+            key: Canonical request key
+            result: The recipe set
+            tokens: Tokens the generation used (credited to tokens_saved on every hit)
+            generated: False when the tokens are already in tokens_generated (a coalesced request)
+        """
+        self.memory.set(key, {"result": copy.deepcopy(result), "tokens": tokens})
+        if generated:
+            with self._lock:
+                self.tokens_generated += tokens
+
+    def clear(self) -> None:
+        self.memory.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and token savings for monitoring"""
+        stats = self.memory.stats()
+        stats["tokens_saved"] = self.tokens_saved
+        stats["tokens_generated"] = self.tokens_generated
+        return stats
+
+# Shared cache used by /get_recipe
+recipe_cache = RecipeResultCache(
+    max_entries=RECIPE_CACHE_CONFIG['MAX_ENTRIES'],
+    ttl_seconds=RECIPE_CACHE_CONFIG['TTL_SECONDS']
+)
@@ -9,6 +9,116 @@ API_KEYS = {
     'OPEN_ROUTER': os.environ.get('OPEN_ROUTER_API_KEY', '')  # Must be set in environment variables
 }
 
+# Meal image analysis result cache
+ANALYSIS_CACHE_CONFIG = {
+    'MAX_ENTRIES': int(os.environ.get('ANALYSIS_CACHE_MAX_ENTRIES', '512')),
+    'TTL_SECONDS': int(os.environ.get('ANALYSIS_CACHE_TTL_SECONDS', '86400')),
+    'MONGO_ENABLED': os.environ.get('ANALYSIS_CACHE_MONGO_ENABLED', 'false').lower() == 'true',
+    # Max Hamming distance (of 64 bits) for reusing a near-duplicate image's analysis; -1 disables
+    'NEAR_DUPLICATE_MAX_DISTANCE': int(os.environ.get('ANALYSIS_CACHE_NEAR_DUPLICATE_MAX_DISTANCE', '6')),
+    'NEAR_DUPLICATE_MAX_ENTRIES': int(os.environ.get('ANALYSIS_CACHE_NEAR_DUPLICATE_MAX_ENTRIES', '1000000'))
+}
+
+# Shared HTTP connection pools for OpenRouter calls
+HTTP_CLIENT_CONFIG = {
+    'POOL_CONNECTIONS': int(os.environ.get('HTTP_POOL_CONNECTIONS', '4')),
+    'POOL_MAXSIZE': int(os.environ.get('HTTP_POOL_MAXSIZE', '16')),
+    'MAX_CONNECTIONS': int(os.environ.get('HTTP_MAX_CONNECTIONS', '32')),
+    'MAX_KEEPALIVE_CONNECTIONS': int(os.environ.get('HTTP_MAX_KEEPALIVE_CONNECTIONS', '16')),
+    'KEEPALIVE_EXPIRY': float(os.environ.get('HTTP_KEEPALIVE_EXPIRY_SECONDS', '60')),
+    'HTTP2': os.environ.get('HTTP_ENABLE_HTTP2', 'true').lower() == 'true'
+}
+
+# Write-behind persistence of analysis results (ingredients, validation errors, meal analyses)
+WRITE_BEHIND_CONFIG = {
+    'ENABLED': os.environ.get('WRITE_BEHIND_ENABLED', 'true').lower() == 'true',
+    'MAX_QUEUE_SIZE': int(os.environ.get('WRITE_BEHIND_MAX_QUEUE_SIZE', '1000')),
+    'MAX_BATCH_DOCUMENTS': int(os.environ.get('WRITE_BEHIND_MAX_BATCH_DOCUMENTS', '500')),
+    'FLUSH_INTERVAL_SECONDS': float(os.environ.get('WRITE_BEHIND_FLUSH_INTERVAL_SECONDS', '1.0')),
+    'ENQUEUE_TIMEOUT_SECONDS': float(os.environ.get('WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS', '0.5')),
+    'SHUTDOWN_TIMEOUT_SECONDS': float(os.environ.get('WRITE_BEHIND_SHUTDOWN_TIMEOUT_SECONDS', '10')),
+    'SPILL_PATH': os.environ.get('WRITE_BEHIND_SPILL_PATH', '/tmp/kali_write_behind_spill.jsonl'),
+    'SPILL_MAX_BYTES': int(os.environ.get('WRITE_BEHIND_SPILL_MAX_BYTES', str(50 * 1024 * 1024)))
+}
+
+# In-memory multilingual ingredient name index used for autocomplete
+INGREDIENT_INDEX_CONFIG = {
+    'ENABLED': os.environ.get('INGREDIENT_INDEX_ENABLED', 'true').lower() == 'true',
+    'LANGUAGES': tuple(code.strip() for code in os.environ.get('INGREDIENT_INDEX_LANGUAGES', 'en,he,ru,es').split(',') if code.strip()),
+    # Follow the collection's change stream; falls back to full rebuilds every REFRESH_INTERVAL_SECONDS
+    'AUTO_REFRESH': os.environ.get('INGREDIENT_INDEX_AUTO_REFRESH', 'true').lower() == 'true',
+    'REFRESH_INTERVAL_SECONDS': float(os.environ.get('INGREDIENT_INDEX_REFRESH_INTERVAL_SECONDS', '300')),
+    'MAX_RESULTS': int(os.environ.get('INGREDIENT_INDEX_MAX_RESULTS', '10'))
+}
+
+# Typo-tolerant ingredient matching used by find_ingredient(search_type="fuzzy")
+FUZZY_MATCH_CONFIG = {
+    'ENABLED': os.environ.get('FUZZY_MATCH_ENABLED', 'true').lower() == 'true',
+    'MAX_EDIT_DISTANCE': int(os.environ.get('FUZZY_MATCH_MAX_EDIT_DISTANCE', '2')),
+    'MIN_SCORE': float(os.environ.get('FUZZY_MATCH_MIN_SCORE', '0.6')),
+    'MAX_RESULTS': int(os.environ.get('FUZZY_MATCH_MAX_RESULTS', '10'))
+}
+
+# Mapping of model-produced ingredient names to normalized_ingredients_v5 entries
+INGREDIENT_RESOLVER_CONFIG = {
+    'ENABLED': os.environ.get('INGREDIENT_RESOLVER_ENABLED', 'true').lower() == 'true',
+    'CACHE_SIZE': int(os.environ.get('INGREDIENT_RESOLVER_CACHE_SIZE', '4096')),
+    'FUZZY_MIN_SCORE': float(os.environ.get('INGREDIENT_RESOLVER_FUZZY_MIN_SCORE', '0.85')),
+    'REFRESH_INTERVAL_SECONDS': float(os.environ.get('INGREDIENT_RESOLVER_REFRESH_INTERVAL_SECONDS', '900'))
+}
+
+# Two-stage refrigerator/invoice analysis: detect items with the vision model, fill macros from ingredients_nutrition_v5
+TWO_STAGE_NUTRITION_CONFIG = {
+    # Default mode; a request can still choose with "mode": "two_stage" or "single_stage"
+    'ENABLED': os.environ.get('TWO_STAGE_NUTRITION_ENABLED', 'false').lower() == 'true',
+    'REFRESH_INTERVAL_SECONDS': float(os.environ.get('TWO_STAGE_NUTRITION_REFRESH_INTERVAL_SECONDS', '900')),
+    # Text model used to enrich items missing from the table (empty: the vision model)
+    'ENRICHMENT_MODEL': os.environ.get('TWO_STAGE_NUTRITION_ENRICHMENT_MODEL', ''),
+    'ENRICHMENT_MAX_TOKENS': int(os.environ.get('TWO_STAGE_NUTRITION_ENRICHMENT_MAX_TOKENS', '2000'))
+}
+
+# Recipe sets served again for requests with the same canonical constraints
+RECIPE_CACHE_CONFIG = {
+    'ENABLED': os.environ.get('RECIPE_CACHE_ENABLED', 'true').lower() == 'true',
+    'MAX_ENTRIES': int(os.environ.get('RECIPE_CACHE_MAX_ENTRIES', '1024')),
+    'TTL_SECONDS': int(os.environ.get('RECIPE_CACHE_TTL_SECONDS', '21600')),
+    # Macro targets are rounded to these steps, so 480 and 510 kcal share an entry
+    'CALORIE_BUCKET': float(os.environ.get('RECIPE_CACHE_CALORIE_BUCKET', '50')),
+    'MACRO_BUCKET': float(os.environ.get('RECIPE_CACHE_MACRO_BUCKET', '5'))
+}
+
+# Retrieval-first /get_recipe: answer from the stored gpt_recipes corpus, generate only the shortfall
+RECIPE_RETRIEVAL_CONFIG = {
+    'ENABLED': os.environ.get('RECIPE_RETRIEVAL_ENABLED', 'false').lower() == 'true',
+    'TARGET_RECIPES': int(os.environ.get('RECIPE_RETRIEVAL_TARGET_RECIPES', '5')),
+    # Share of a stored recipe's base ingredients the user must have
+    'MIN_COVERAGE': float(os.environ.get('RECIPE_RETRIEVAL_MIN_COVERAGE', '0.6')),
+    # Relative widening of the requested macro ranges (0.1 = 10%)
+    'RANGE_TOLERANCE': float(os.environ.get('RECIPE_RETRIEVAL_RANGE_TOLERANCE', '0.1')),
+    'REFRESH_INTERVAL_SECONDS': int(os.environ.get('RECIPE_RETRIEVAL_REFRESH_INTERVAL_SECONDS', '900'))
+}
+
+# Streamed vision completions for meal analysis (parsed incrementally, finished at the closing brace)
+STREAMING_ANALYSIS_CONFIG = {
+    # Also stream upstream for clients that want a plain JSON response; SSE clients always stream
+    'ENABLED': os.environ.get('STREAMING_ANALYSIS_ENABLED', 'true').lower() == 'true'
+}
+
+# Typed output schemas: response_format constraints and validation of model answers
+STRUCTURED_OUTPUT_CONFIG = {
+    'ENABLED': os.environ.get('STRUCTURED_OUTPUT_ENABLED', 'true').lower() == 'true',
+    # Model prefixes that accept an OpenRouter "json_schema" response_format; others are only validated
+    'MODELS': tuple(prefix.strip() for prefix in os.environ.get('STRUCTURED_OUTPUT_MODELS', 'openai/,google/').split(',') if prefix.strip())
+}
+
+# Single-flight: concurrent identical analyses / recipe generations share one model call
+SINGLE_FLIGHT_CONFIG = {
+    'ENABLED': os.environ.get('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+}
+
+# Largest image accepted by the upload endpoints
+MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+
 # Email Configuration
 EMAIL_CONFIG = {
     'SENDER': os.environ.get('EMAIL_SENDER', 'noreply@theholylabs.com'),
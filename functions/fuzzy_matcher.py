@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Typo-tolerant ingredient name matching
+
+A symmetric-delete (SymSpell) index over the words of every name and
+synonym in ingredient_names_v5. Each word is stored under all variants of its
+first PREFIX_LENGTH characters with up to MAX_EDIT_DISTANCE characters
+deleted; a query word generates the same deletes, so every word within the
+edit distance is found with a handful of dictionary lookups instead of a scan
+of the corpus. Candidates are verified with the optimal string alignment
+distance, and names are ranked by how well they match all the query's words.
+
+Names are normalized per script (Hebrew final letters, geresh/apostrophes)
+and Hebrew and Russian names are also indexed in Latin transliteration, so
+"kuritsa" finds "курица" and both resolve to the canonical "chicken".
+"""
+
+import logging
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from config import FUZZY_MATCH_CONFIG, INGREDIENT_INDEX_CONFIG
+from ingredient_index import (DEFAULT_LANGUAGES, INDEX_PROJECTION, canonical_document_name, document_names,
+                              get_index_refresher, language_code)
+from text_normalization import normalize_text
+
+logger = logging.getLogger(__name__)
+
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
+# Score multiplier for names with words the query did not match
+WORD_MATCH_WEIGHT = 0.85
+
+_APOSTROPHES = re.compile(r"['\"`׳״’]")
+_HEBREW_FINALS = str.maketrans("ךםןףץ", "כמנפצ")
+
+# Lossy on purpose: close enough for edit distance to bridge the remaining gap
+_TRANSLITERATION = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ж": "zh", "з": "z", "и": "i",
+    "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t",
+    "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "",
+    "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+    "א": "a", "ב": "b", "ג": "g", "ד": "d", "ה": "h", "ו": "o", "ז": "z", "ח": "h", "ט": "t",
+    "י": "i", "כ": "k", "ל": "l", "מ": "m", "נ": "n", "ס": "s", "ע": "a", "פ": "p", "צ": "ts",
+    "ק": "k", "ר": "r", "ש": "sh", "ת": "t"
+})
+
+def fuzzy_key(text: str) -> str:
+    """
+    Normalize a name for edit-distance comparison
+
+    On top of normalize_text (case, diacritics, Russian ё), apostrophes and
+    Hebrew geresh are dropped rather than split on, and Hebrew final letters
+    are folded to their regular forms.
+    """
+    if not text:
+        return ""
+    return normalize_text(_APOSTROPHES.sub("", str(text))).translate(_HEBREW_FINALS)
+
+def transliterate(key: str) -> str:
+    """Latin spelling of a fuzzy_key; unchanged for text that is already Latin"""
+    return key.translate(_TRANSLITERATION)
+
+def allowed_distance(length: int, max_distance: int = MAX_EDIT_DISTANCE) -> int:
+    """Edits tolerated for a query of this length; short words would match almost anything"""
+    if length < 3:
+        return 0
+    if length < 6:
+        return min(1, max_distance)
+    return max_distance
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Optimal string alignment distance, or max_distance + 1 once it is exceeded
+    """
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        char_a = a[i - 1]
+        for j in range(1, len(b) + 1):
+            cost = 0 if char_a == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous_previous is not None and j > 1 and char_a == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous_previous[j - 2] + 1)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
+
+def _deletes(word: str, max_distance: int) -> Set[str]:
+    """The word and every string reachable from it by up to max_distance deletions"""
+    results = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for variant in frontier:
+            if len(variant) <= 1:
+                continue
+            for position in range(len(variant)):
+                next_frontier.add(variant[:position] + variant[position + 1:])
+        next_frontier -= results
+        results |= next_frontier
+        frontier = next_frontier
+    return results
+
+class SymSpellIndex:
+    """
+    Symmetric-delete index from words to the ids of the names containing them
+
+    Most deletes belong to a single word, so the delete map stores a plain
+    string until a second word shares it and only then a list.
+    """
+
+    def __init__(self, max_distance: int = MAX_EDIT_DISTANCE, prefix_length: int = PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.postings: Dict[str, Set[int]] = {}
+        self._deletes: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.postings)
+
+    def _term_deletes(self, term: str) -> Set[str]:
+        # Queries of length Q search allowed_distance(Q) edits and only reach terms of length >= Q - max_distance,
+        # so a term never needs deeper deletes than a query max_distance characters longer would use
+        return _deletes(term[:self.prefix_length], allowed_distance(len(term) + self.max_distance, self.max_distance))
+
+    def add(self, term: str, name_id: int):
+        postings = self.postings.get(term)
+        if postings is None:
+            postings = self.postings[term] = set()
+            deletes = self._deletes
+            for variant in self._term_deletes(term):
+                terms = deletes.get(variant)
+                if terms is None:
+                    deletes[variant] = term
+                elif type(terms) is str:
+                    deletes[variant] = [terms, term]
+                else:
+                    terms.append(term)
+        postings.add(name_id)
+
+    def remove(self, term: str, name_id: int):
+        postings = self.postings.get(term)
+        if postings is None:
+            return
+        postings.discard(name_id)
+        if postings:
+            return
+        del self.postings[term]
+        for variant in self._term_deletes(term):
+            terms = self._deletes.get(variant)
+            if terms is None:
+                continue
+            if type(terms) is str:
+                if terms == term:
+                    del self._deletes[variant]
+            elif term in terms:
+                terms.remove(term)
+                if len(terms) == 1:
+                    self._deletes[variant] = terms[0]
+
+    def lookup(self, query: str, max_distance: int) -> List[Tuple[str, int]]:
+        """Indexed terms within max_distance edits of the query, as (term, distance)"""
+        max_distance = min(max_distance, self.max_distance)
+        if max_distance <= 0:
+            return [(query, 0)] if query in self.postings else []
+        query_length = len(query)
+        matches = []
+        checked = set()
+        for variant in _deletes(query[:self.prefix_length], max_distance):
+            terms = self._deletes.get(variant)
+            if terms is None:
+                continue
+            for term in (terms,) if type(terms) is str else terms:
+                if term in checked:
+                    continue
+                checked.add(term)
+                if abs(len(term) - query_length) > max_distance:
+                    continue
+                distance = edit_distance(query, term, max_distance)
+                if distance <= max_distance:
+                    matches.append((term, distance))
+        return matches
+
+def _document_names(document: dict, languages: Iterable[str]) -> Dict[str, str]:
+    """Distinct fuzzy keys of a names document (plus Latin transliterations) -> language code"""
+    keys = {}
+    for language, values in document_names(document, languages).items():
+        for value in values:
+            key = fuzzy_key(value)
+            if key:
+                keys.setdefault(key, language)
+                keys.setdefault(transliterate(key), language)
+    return keys
+
+class FuzzyIngredientMatcher:
+    """
+    Typo-tolerant lookup of canonical ingredient names
+
+    Words are matched individually against the SymSpell index and names are
+    scored by how well all of the query's words match theirs, so "chiken
+    brest" finds "chicken breast" and a single word finds every name that
+    contains it (ranked below names made of just that word).
+
+    Exposes the same build/upsert_document/remove_document interface as
+    IngredientNameIndex, so it can be kept current by the same refresher.
+    """
+
+    def __init__(self, languages: Iterable[str] = DEFAULT_LANGUAGES, max_distance: int = MAX_EDIT_DISTANCE,
+                 prefix_length: int = PREFIX_LENGTH):
+        self.languages = tuple(languages)
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self._lock = threading.Lock()
+        self._reset(SymSpellIndex(max_distance, prefix_length), {}, {}, 0)
+
+    def _reset(self, index: SymSpellIndex, names: dict, names_by_document: dict, next_name_id: int):
+        self._index = index
+        # name id -> (canonical name, language code, fuzzy key, word count, document id)
+        self._names: Dict[int, Tuple[str, str, str, int, Any]] = names
+        self._names_by_document: Dict[Any, List[int]] = names_by_document
+        self._next_name_id = next_name_id
+
+    def __len__(self) -> int:
+        return len(self._names_by_document)
+
+    @property
+    def key_count(self) -> int:
+        return len(self._index)
+
+    def _add_document(self, document: dict) -> bool:
+        canonical = canonical_document_name(document)
+        if canonical is None:
+            return False
+        document_id = document.get("_id", canonical)
+        name_ids = []
+        for key, language in _document_names(document, self.languages).items():
+            name_id = self._next_name_id
+            self._next_name_id += 1
+            words = key.split()
+            self._names[name_id] = (canonical, language, key, len(words), document_id)
+            for word in words:
+                self._index.add(word, name_id)
+            name_ids.append(name_id)
+        self._names_by_document[document_id] = name_ids
+        return True
+
+    def build(self, documents: Iterable[dict]) -> int:
+        """
+        Replace the matcher contents with the given names documents
+
+        Returns:
+            int: Number of documents indexed
+        """
+        fresh = FuzzyIngredientMatcher(self.languages, self.max_distance, self.prefix_length)
+        for document in documents:
+            fresh._add_document(document)
+        with self._lock:
+            self._reset(fresh._index, fresh._names, fresh._names_by_document, fresh._next_name_id)
+        return len(fresh._names_by_document)
+
+    def upsert_document(self, document: dict) -> bool:
+        """Index a new or changed names document, replacing its previous names"""
+        with self._lock:
+            self._remove_locked(document.get("_id", canonical_document_name(document)))
+            return self._add_document(document)
+
+    def remove_document(self, document_id) -> bool:
+        """Drop every name belonging to a document; returns False if it was not indexed"""
+        with self._lock:
+            return self._remove_locked(document_id)
+
+    def _remove_locked(self, document_id) -> bool:
+        name_ids = self._names_by_document.pop(document_id, None)
+        if name_ids is None:
+            return False
+        for name_id in name_ids:
+            key = self._names.pop(name_id)[2]
+            for word in key.split():
+                self._index.remove(word, name_id)
+        return True
+
+    def _score_names(self, words: List[str], code: Optional[str], max_distance: Optional[int]) -> Dict[int, List[Tuple[float, int]]]:
+        """Best (similarity, distance) of each query word against each candidate name"""
+        scores = {}
+        for position, word in enumerate(words):
+            distance_limit = allowed_distance(len(word), self.max_distance) if max_distance is None else max_distance
+            for term, distance in self._index.lookup(word, distance_limit):
+                similarity = 1.0 - distance / max(len(word), len(term))
+                for name_id in self._index.postings[term]:
+                    if code and self._names[name_id][1] != code:
+                        continue
+                    matched = scores.get(name_id)
+                    if matched is None:
+                        matched = scores[name_id] = [(0.0, 0)] * len(words)
+                    if similarity > matched[position][0]:
+                        matched[position] = (similarity, distance)
+        return scores
+
+    def search(self, query: str, language: Optional[str] = None, limit: int = 10,
+               max_distance: Optional[int] = None, min_score: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        Rank canonical ingredients by how closely one of their names matches the query
+
+        Args:
+            query: Possibly misspelled or transliterated name
+            language: Only match names in this language; all languages when None
+            limit: Maximum number of distinct ingredients returned
+            max_distance: Edit distance to tolerate per word (defaults by word length)
+            min_score: Drop candidates scoring below this
+
+        Returns:
+            List of {"name", "id", "match", "distance", "score", "language", "complete"}, best first;
+            "id" is the names document's _id (its canonical name when it has none) and
+            "complete" is False when the matched name has words the query did not match
+        """
+        key = fuzzy_key(query)
+        if not key or limit <= 0:
+            return []
+        code = language_code(language)
+
+        best = {}
+        with self._lock:
+            # A Hebrew/Cyrillic query is retried in Latin letters only when its own script finds nothing
+            for variant in dict.fromkeys((key, transliterate(key))):
+                if best:
+                    break
+                words = variant.split()
+                for name_id, matched in self._score_names(words, code, max_distance).items():
+                    total = 0.0
+                    hits = 0
+                    distance = 0
+                    for similarity, edits in matched:
+                        if similarity:
+                            total += similarity
+                            hits += 1
+                            distance += edits
+                    score = total / len(words)
+                    name = self._names[name_id]
+                    if name[3] > hits:
+                        # The name has words the query did not mention
+                        score *= WORD_MATCH_WEIGHT
+                    if score < min_score:
+                        continue
+                    current = best.get(name[0])
+                    if current is None or score > current[0]:
+                        best[name[0]] = (score, distance, name_id, name[3] <= hits)
+
+            ranked = sorted(best.items(), key=lambda item: (-item[1][0], item[1][1], item[0]))[:limit]
+            return [
+                {"name": canonical, "id": self._names[name_id][4], "match": self._names[name_id][2], "distance": distance,
+                 "score": round(score, 3), "language": self._names[name_id][1], "complete": complete}
+                for canonical, (score, distance, name_id, complete) in ranked
+            ]
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+def get_fuzzy_matcher() -> Optional[FuzzyIngredientMatcher]:
+    """
+    Return the process-wide fuzzy matcher, building it on first use
+
+    It shares the ingredient name index's refresher (and change stream) when
+    that index is enabled. Returns None when disabled or MongoDB is not available.
+    """
+    global _matcher
+    if _matcher is not None or not FUZZY_MATCH_CONFIG['ENABLED']:
+        return _matcher
+    with _matcher_lock:
+        if _matcher is None:
+            matcher = FuzzyIngredientMatcher(INGREDIENT_INDEX_CONFIG['LANGUAGES'], FUZZY_MATCH_CONFIG['MAX_EDIT_DISTANCE'])
+            try:
+                refresher = get_index_refresher()
+                if refresher is not None:
+                    refresher.attach(matcher)
+                else:
+                    from mongodb_config import ingredient_names_collection
+
+                    if ingredient_names_collection is None:
+                        logger.warning("MongoDB ingredient_names collection not available")
+                        return None
+                    matcher.build(ingredient_names_collection.find({}, INDEX_PROJECTION))
+            except Exception as e:
+                logger.error(f"❌ Failed to build fuzzy ingredient matcher: {str(e)}")
+                return None
+            _matcher = matcher
+    return _matcher
+
+def fuzzy_ingredient_matches(query: str, language: Optional[str] = None, limit: int = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    Ranked fuzzy matches from the shared matcher
+
+    Returns:
+        List of matches (possibly empty), or None when the matcher is unavailable
+    """
+    matcher = get_fuzzy_matcher()
+    if matcher is None:
+        return None
+    return matcher.search(query, language, limit or FUZZY_MATCH_CONFIG['MAX_RESULTS'], min_score=FUZZY_MATCH_CONFIG['MIN_SCORE'])
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Shared, keep-alive HTTP clients for OpenRouter calls
+
+Every analysis used to open a new TCP + TLS connection to openrouter.ai.
+These process-wide clients keep connections pooled across requests.
+"""
+
+import asyncio
+import logging
+import threading
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import HTTP_CLIENT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401 - httpx needs it for HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_session = None
+_session_lock = threading.Lock()
+
+# One AsyncClient per event loop: httpx connections cannot be shared across loops
+_async_clients = weakref.WeakKeyDictionary()
+_async_clients_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """Return the process-wide requests.Session with a tuned connection pool"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_CLIENT_CONFIG['POOL_CONNECTIONS'],
+                    pool_maxsize=HTTP_CLIENT_CONFIG['POOL_MAXSIZE'],
+                    max_retries=0
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+                logger.info(f"🔌 Created pooled HTTP session (pool_maxsize={HTTP_CLIENT_CONFIG['POOL_MAXSIZE']})")
+    return _session
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Return the long-lived httpx.AsyncClient for the running event loop
+
+    HTTP/2 is used when the h2 package is installed and HTTP_ENABLE_HTTP2 is set,
+    so concurrent requests share one multiplexed connection.
+    """
+    loop = asyncio.get_running_loop()
+    with _async_clients_lock:
+        client = _async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE and HTTP_CLIENT_CONFIG['HTTP2'],
+                limits=httpx.Limits(
+                    max_connections=HTTP_CLIENT_CONFIG['MAX_CONNECTIONS'],
+                    max_keepalive_connections=HTTP_CLIENT_CONFIG['MAX_KEEPALIVE_CONNECTIONS'],
+                    keepalive_expiry=HTTP_CLIENT_CONFIG['KEEPALIVE_EXPIRY']
+                ),
+                timeout=httpx.Timeout(30.0, connect=10.0)
+            )
+            _async_clients[loop] = client
+    return client
+
+def close_session() -> None:
+    """Close the pooled requests.Session (it is recreated on next use)"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+async def close_async_client() -> None:
+    """Close the AsyncClient bound to the running event loop"""
+    loop = asyncio.get_running_loop()
+    with _async_clients_lock:
+        client = _async_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
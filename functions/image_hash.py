@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Perceptual image hashing and a Hamming-distance index for near-duplicate uploads
+"""
+
+import hashlib
+import io
+import logging
+import threading
+from collections import deque
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from config import ANALYSIS_CACHE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+
+def compute_image_hash(image_bytes: bytes, hash_size: int = 8) -> Optional[int]:
+    """
+    Compute a 64-bit difference hash (dHash) of an image
+
+    The image is decoded at reduced scale, oriented from its EXIF data and
+    shrunk to a (hash_size + 1) x hash_size grayscale grid; every bit records
+    whether a pixel is brighter than its right-hand neighbour. Re-encoded or
+    slightly resized copies of a photo land within a few bits of each other.
+
+    Returns:
+        int or None: The hash, or None if the bytes could not be decoded
+    """
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image.draft('L', ((hash_size + 1) * 8, hash_size * 8))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+        pixels = image.tobytes()
+    except Exception as e:
+        logger.warning(f"Could not compute perceptual hash: {str(e)}")
+        return None
+
+    value = 0
+    row_width = hash_size + 1
+    for row in range(hash_size):
+        offset = row * row_width
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+class MultiIndexHashIndex:
+    """
+    Multi-index hashing over 64-bit hashes
+
+    Each hash is split into `chunks` substrings, each stored in its own hash
+    table. Two hashes within distance d must agree to within d // chunks bits
+    on at least one substring (pigeonhole), so a query only probes the buckets
+    of its own substrings and their near variants, then verifies the full
+    distance on that small candidate set. Three ~21-bit substrings keep the
+    buckets nearly empty even with millions of stored hashes.
+    """
+
+    def __init__(self, chunks: int = 3, bits: int = HASH_BITS):
+        self.chunks = chunks
+        widths = [bits // chunks + (1 if i < bits % chunks else 0) for i in range(chunks)]
+        self._layout = []
+        shift = 0
+        for width in widths:
+            self._layout.append((shift, (1 << width) - 1, width))
+            shift += width
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(chunks)]
+        self._hashes: Dict[int, int] = {}
+        self._next_id = 0
+        self._variant_masks: Dict[Tuple[int, int], List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _split(self, hash_value: int) -> List[int]:
+        return [(hash_value >> shift) & mask for shift, mask, _ in self._layout]
+
+    def _masks_within(self, width: int, radius: int) -> List[int]:
+        masks = self._variant_masks.get((width, radius))
+        if masks is None:
+            masks = [0]
+            for flipped in range(1, radius + 1):
+                for positions in combinations(range(width), flipped):
+                    mask = 0
+                    for position in positions:
+                        mask |= 1 << position
+                    masks.append(mask)
+            self._variant_masks[(width, radius)] = masks
+        return masks
+
+    def add(self, hash_value: int) -> int:
+        """Insert a hash and return its entry id"""
+        entry_id = self._next_id
+        self._next_id += 1
+        self._hashes[entry_id] = hash_value
+        for table, chunk in zip(self._tables, self._split(hash_value)):
+            table.setdefault(chunk, []).append(entry_id)
+        return entry_id
+
+    def remove(self, entry_id: int) -> None:
+        hash_value = self._hashes.pop(entry_id, None)
+        if hash_value is None:
+            return
+        for table, chunk in zip(self._tables, self._split(hash_value)):
+            bucket = table.get(chunk)
+            if bucket:
+                bucket.remove(entry_id)
+                if not bucket:
+                    del table[chunk]
+
+    def search(self, hash_value: int, max_distance: int) -> List[Tuple[int, int]]:
+        """Return (distance, entry_id) pairs within max_distance, closest first"""
+        radius = max_distance // self.chunks
+        seen = set()
+        matches = []
+        hashes = self._hashes
+        for table, chunk, (_, _, width) in zip(self._tables, self._split(hash_value), self._layout):
+            for mask in self._masks_within(width, radius):
+                bucket = table.get(chunk ^ mask)
+                if not bucket:
+                    continue
+                for entry_id in bucket:
+                    if entry_id in seen:
+                        continue
+                    seen.add(entry_id)
+                    distance = (hashes[entry_id] ^ hash_value).bit_count()
+                    if distance <= max_distance:
+                        matches.append((distance, entry_id))
+        matches.sort()
+        return matches
+
+class NearDuplicateIndex:
+    """
+    Maps perceptual hashes of analyzed images to their analysis cache keys
+
+    Entries are scoped by prompt and model so a near-duplicate image only
+    reuses an analysis produced by the same request type. The oldest entries
+    are dropped once max_entries is reached.
+    """
+
+    def __init__(self, max_distance: int = 6, max_entries: int = 1_000_000, chunks: int = 3):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self._index = MultiIndexHashIndex(chunks=chunks)
+        self._entries: Dict[int, Tuple[str, str]] = {}
+        self._order = deque()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _scope(prompt: str, model: Optional[str]) -> str:
+        return hashlib.sha256(f"{model}\n{prompt or ''}".encode("utf-8")).hexdigest()
+
+    def find(self, image_hash: Optional[int], prompt: str, model: Optional[str]) -> Optional[str]:
+        """Return the cache key of the closest stored image within max_distance"""
+        if image_hash is None or self.max_distance < 0:
+            return None
+        scope = self._scope(prompt, model)
+        with self._lock:
+            for _, entry_id in self._index.search(image_hash, self.max_distance):
+                entry_scope, cache_key = self._entries[entry_id]
+                if entry_scope == scope:
+                    self.hits += 1
+                    return cache_key
+            self.misses += 1
+        return None
+
+    def add(self, image_hash: Optional[int], prompt: str, model: Optional[str], cache_key: str) -> None:
+        if image_hash is None or self.max_distance < 0:
+            return
+        scope = self._scope(prompt, model)
+        with self._lock:
+            entry_id = self._index.add(image_hash)
+            self._entries[entry_id] = (scope, cache_key)
+            self._order.append(entry_id)
+            while len(self._order) > self.max_entries:
+                oldest = self._order.popleft()
+                self._index.remove(oldest)
+                self._entries.pop(oldest, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "max_distance": self.max_distance
+        }
+
+# Shared index used by the meal image endpoints (a negative distance disables it)
+near_duplicate_index = NearDuplicateIndex(
+    max_distance=ANALYSIS_CACHE_CONFIG['NEAR_DUPLICATE_MAX_DISTANCE'],
+    max_entries=ANALYSIS_CACHE_CONFIG['NEAR_DUPLICATE_MAX_ENTRIES']
+)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Bytes-first image handling for vision requests
+
+Uploaded images arrive as base64 text, are decoded exactly once into an
+ImagePayload and stay binary until the outgoing request body is written.
+StreamingJSONBody base64-encodes the image chunk by chunk while the body is
+sent, so no full-size data URL or serialized JSON string is ever built.
+"""
+
+import binascii
+import json
+from typing import Iterator, Optional, Tuple, Union
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Input bytes per base64 chunk; a multiple of 3 so chunks concatenate without padding
+STREAM_CHUNK_SIZE = 3 * 16 * 1024
+
+# Put this where the image data URL belongs in a payload passed to StreamingJSONBody
+IMAGE_URL_PLACEHOLDER = "__image_payload_data_url__"
+
+def sniff_image_mime_type(data: Union[bytes, memoryview], default: str = "image/jpeg") -> str:
+    """Return the MIME type implied by the image's magic bytes"""
+    header = bytes(data[:12])
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    return default
+
+class ImagePayload:
+    """An image held once as bytes, exposed to readers as a zero-copy memoryview"""
+
+    __slots__ = ("data", "mime_type")
+
+    def __init__(self, data: bytes, mime_type: Optional[str] = None):
+        self.data = data
+        self.mime_type = mime_type or sniff_image_mime_type(data)
+
+    @classmethod
+    def from_base64(cls, image_base64: Union[str, bytes]) -> "ImagePayload":
+        """
+        Decode client-supplied base64 (optionally a data: URL) into an ImagePayload
+
+        Raises:
+            ValueError: If the input is not valid base64
+        """
+        if isinstance(image_base64, str) and image_base64.startswith("data:"):
+            image_base64 = image_base64.partition(",")[2]
+        try:
+            # a2b_base64 reads ASCII str directly, avoiding an encoded copy of the input
+            return cls(binascii.a2b_base64(image_base64))
+        except (binascii.Error, ValueError) as e:
+            raise ValueError(f"Invalid base64 image data: {str(e)}")
+
+    @property
+    def view(self) -> memoryview:
+        return memoryview(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def base64_length(self) -> int:
+        return 4 * ((len(self.data) + 2) // 3)
+
+    def iter_base64(self, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield the base64 encoding in chunks without materializing the whole string"""
+        view = self.view
+        for offset in range(0, len(view), chunk_size):
+            yield binascii.b2a_base64(view[offset:offset + chunk_size], newline=False)
+
+class StreamingJSONBody:
+    """
+    A JSON request body whose image data URL is base64-encoded while it is sent
+
+    The payload is serialized once with a placeholder in place of the image
+    URL; iterating yields the text around it and streams the image between.
+    Defining __len__ lets requests send a Content-Length header instead of
+    chunked encoding, and each iteration starts over so retries work.
+    """
+
+    def __init__(self, payload: dict, image: ImagePayload):
+        serialized = json.dumps(payload)
+        prefix, marker, suffix = serialized.partition(json.dumps(IMAGE_URL_PLACEHOLDER))
+        if not marker:
+            raise ValueError("Payload does not reference the image placeholder")
+        self.image = image
+        self._prefix = (prefix + f'"data:{image.mime_type};base64,').encode("utf-8")
+        self._suffix = ('"' + suffix).encode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self._prefix) + self.image.base64_length + len(self._suffix)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._prefix
+        yield from self.image.iter_base64()
+        yield self._suffix
+
+class ImageUploadError(Exception):
+    """An upload that cannot be analyzed, with the HTTP status to report"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+def read_image_upload(req, max_size: int) -> Tuple[ImagePayload, str]:
+    """
+    Read an image sent as multipart/form-data or as a raw image body
+
+    The declared Content-Length is checked before any of the body is read,
+    and at most max_size + 1 bytes are ever read from the stream.
+
+    Args:
+        req: The incoming Flask/Werkzeug request
+        max_size: Largest accepted image in bytes
+
+    Returns:
+        tuple: (ImagePayload, image name)
+
+    Raises:
+        ImageUploadError: If the upload is too large, empty or of an unsupported type
+    """
+    if req.content_length is not None and req.content_length > max_size:
+        raise ImageUploadError(f"Image exceeds the maximum size of {max_size // (1024 * 1024)}MB", 413)
+
+    image_name = req.args.get('image_name') or req.headers.get('X-Image-Name')
+    if req.mimetype == 'multipart/form-data':
+        try:
+            # Let the form parser reject oversized bodies sent without a Content-Length
+            req.max_content_length = max_size
+        except AttributeError:
+            pass
+        try:
+            files = req.files
+        except RequestEntityTooLarge:
+            raise ImageUploadError(f"Image exceeds the maximum size of {max_size // (1024 * 1024)}MB", 413)
+        upload = files.get('image') or next(iter(files.values()), None)
+        if upload is None:
+            raise ImageUploadError("No image file found in multipart form (expected field 'image')")
+        data = upload.stream.read(max_size + 1)
+        image_name = req.form.get('image_name') or image_name or upload.filename
+    elif req.mimetype.startswith('image/') or req.mimetype == 'application/octet-stream':
+        data = req.stream.read(max_size + 1)
+    else:
+        raise ImageUploadError(f"Unsupported content type '{req.mimetype}'; send multipart/form-data or an image/* body", 415)
+
+    if len(data) > max_size:
+        raise ImageUploadError(f"Image exceeds the maximum size of {max_size // (1024 * 1024)}MB", 413)
+    if not data:
+        raise ImageUploadError("Empty image upload")
+    return ImagePayload(data), image_name or 'unknown.jpg'
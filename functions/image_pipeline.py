@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Single-pass image preprocessing for vision model requests
+
+Large phone photos are decoded at reduced scale, oriented once and resized
+straight to a size predicted to fit the byte budget, so most images need only
+one or two JPEG encodes instead of re-encoding the full-resolution image at
+every quality and scale step.
+"""
+
+import io
+import math
+import threading
+from typing import Optional, Tuple
+
+from PIL import Image
+
+MIN_QUALITY = 10
+MIN_SCALE = 0.3
+# Initial guess for JPEG bytes per pixel of a photo at quality ~85; refined as images are processed
+DEFAULT_BYTES_PER_PIXEL = 0.2
+EXIF_ORIENTATION_TAG = 0x0112
+
+_ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90
+}
+
+class _BytesPerPixelEstimate:
+    """Running average of observed JPEG bytes per pixel at the target quality"""
+
+    def __init__(self, initial: float = DEFAULT_BYTES_PER_PIXEL, weight: float = 0.2):
+        self.value = initial
+        self.weight = weight
+        self._lock = threading.Lock()
+
+    def update(self, encoded_size: int, pixels: int) -> None:
+        if pixels <= 0:
+            return
+        with self._lock:
+            self.value = (1 - self.weight) * self.value + self.weight * (encoded_size / pixels)
+
+_bytes_per_pixel = _BytesPerPixelEstimate()
+
+def _encode_jpeg(image: Image.Image, quality: int) -> bytes:
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=quality, optimize=True)
+    return output.getvalue()
+
+def _fit_size(size: Tuple[int, int], max_pixels: float) -> Tuple[int, int]:
+    """Scale (width, height) down to at most max_pixels"""
+    width, height = size
+    scale = min(1.0, math.sqrt(max_pixels / float(width * height)))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+def _search_quality(image: Image.Image, max_bytes: int, low: int, high: int) -> Tuple[Optional[bytes], int, int]:
+    """
+    Binary-search the highest JPEG quality in [low, high] that fits max_bytes
+
+    Returns:
+        tuple: (encoded bytes or None if even `low` is too large, chosen quality, encodes performed)
+    """
+    best, best_quality = None, low
+    encodes = 0
+    while low <= high:
+        middle = (low + high) // 2
+        encoded = _encode_jpeg(image, middle)
+        encodes += 1
+        if len(encoded) <= max_bytes:
+            best, best_quality = encoded, middle
+            low = middle + 1
+        else:
+            high = middle - 1
+    return best, best_quality, encodes
+
+def prepare_image_for_api(image_bytes: bytes, max_size_kb: int = 400, quality: int = 85) -> Tuple[bytes, dict]:
+    """
+    Decode, orient, resize and JPEG-encode an image to fit within max_size_kb
+
+    Args:
+        image_bytes: Raw uploaded image bytes (any format PIL can read)
+        max_size_kb: Byte budget for the encoded JPEG
+        quality: Preferred JPEG quality; only lowered when the predicted size misses
+
+    Returns:
+        tuple: (JPEG bytes, stats dict with sizes, quality and encode count)
+    """
+    max_bytes = max_size_kb * 1024
+    image = Image.open(io.BytesIO(image_bytes))
+    original_size = image.size
+    orientation = image.getexif().get(EXIF_ORIENTATION_TAG, 1)
+
+    # Predict how many pixels fit the budget and let the JPEG decoder downscale for free
+    min_pixels = original_size[0] * original_size[1] * MIN_SCALE * MIN_SCALE
+    target_size = _fit_size(original_size, max(max_bytes / _bytes_per_pixel.value, min_pixels))
+    if image.format == 'JPEG':
+        image.draft('RGB', target_size)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if image.size[0] * image.size[1] > target_size[0] * target_size[1]:
+        image = image.resize(target_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    # Fix the orientation once, on the already reduced image
+    transpose = _ORIENTATION_TRANSPOSE.get(orientation)
+    if transpose is not None:
+        image = image.transpose(transpose)
+
+    encoded = _encode_jpeg(image, quality)
+    encodes = 1
+    _bytes_per_pixel.update(len(encoded), image.size[0] * image.size[1])
+    chosen_quality = quality
+
+    while len(encoded) > max_bytes:
+        at_min_size = image.size[0] * image.size[1] <= min_pixels + 1
+        if at_min_size or len(encoded) <= max_bytes * 1.5:
+            # Close miss (or nothing left to shrink): search quality on the small image
+            low = MIN_QUALITY if at_min_size else max(MIN_QUALITY, quality - 25)
+            fitted, fitted_quality, searched = _search_quality(image, max_bytes, low, quality - 1)
+            encodes += searched
+            if fitted is not None:
+                encoded, chosen_quality = fitted, fitted_quality
+                break
+            if at_min_size:
+                encoded, chosen_quality = _encode_jpeg(image, MIN_QUALITY), MIN_QUALITY
+                encodes += 1
+                break
+        # Shrink in proportion to the overshoot, keeping the preferred quality
+        new_size = _fit_size(image.size, image.size[0] * image.size[1] * (max_bytes / len(encoded)) * 0.9)
+        if new_size[0] * new_size[1] < min_pixels:
+            new_size = _fit_size(image.size, min_pixels)
+        image = image.resize(new_size, Image.Resampling.LANCZOS)
+        encoded = _encode_jpeg(image, quality)
+        encodes += 1
+
+    stats = {
+        "original_size": original_size,
+        "output_size": image.size,
+        "bytes_in": len(image_bytes),
+        "bytes_out": len(encoded),
+        "quality": chosen_quality,
+        "encodes": encodes
+    }
+    return encoded, stats
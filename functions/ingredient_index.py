@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+In-memory multilingual ingredient name index for autocomplete
+
+Built once from ingredient_names_v5, the index holds every English, Hebrew,
+Russian and Spanish name and synonym as normalized keys in one sorted array
+per language. A prefix lookup is two bisects and a short scan, and every key
+points back at the canonical (English) ingredient name, so a user typing
+"עו" or "кур" gets "chicken" without any translation round trip.
+
+Documents are indexed whole: upsert_document/remove_document replace one
+ingredient's keys in place, and a change-stream watcher (or a periodic full
+rebuild where change streams are unavailable) keeps the index current.
+"""
+
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import INGREDIENT_INDEX_CONFIG
+from search_index import _language_names
+from text_normalization import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# names.<key> spellings seen in the collection -> language code used by the index
+LANGUAGE_ALIASES = {
+    "en": "en", "english": "en",
+    "he": "he", "hebrew": "he", "iw": "he",
+    "ru": "ru", "russian": "ru",
+    "es": "es", "spanish": "es"
+}
+
+DEFAULT_LANGUAGES = ("en", "he", "ru", "es")
+
+# Only these fields are needed to index a document
+INDEX_PROJECTION = {"name": 1, "names": 1}
+
+def language_code(language: Optional[str]) -> Optional[str]:
+    if not language:
+        return None
+    return LANGUAGE_ALIASES.get(language.lower())
+
+def document_names(document: dict, languages: Iterable[str] = DEFAULT_LANGUAGES) -> Dict[str, List[str]]:
+    """
+    Collect a names document's names and synonyms per language code
+
+    The top-level name counts as English; names.<language> may use a code
+    ("he") or a full language name ("hebrew").
+    """
+    texts = {}
+    canonical = document.get("name")
+    if isinstance(canonical, str):
+        texts.setdefault("en", []).append(canonical)
+    names = document.get("names")
+    for language, values in _language_names(names).items():
+        code = language_code(language)
+        if code:
+            texts.setdefault(code, []).extend(values)
+    if isinstance(names, dict):
+        for language, entry in names.items():
+            code = language_code(language)
+            synonyms = entry.get("synonyms") if isinstance(entry, dict) else None
+            if code and isinstance(synonyms, list):
+                texts.setdefault(code, []).extend(s for s in synonyms if isinstance(s, str))
+    return {code: values for code, values in texts.items() if code in languages}
+
+def _document_keys(document: dict, languages: Iterable[str]) -> List[Tuple[str, str]]:
+    """
+    Return the (language, key) pairs a names document is found under
+
+    Each name contributes its full normalized form plus the suffix starting at
+    every later word, so "breast" finds "chicken breast".
+    """
+    keys = set()
+    for code, values in document_names(document, languages).items():
+        for value in values:
+            words = normalize_text(value).split()
+            for start in range(len(words)):
+                keys.add((code, " ".join(words[start:])))
+    return sorted(keys)
+
+def canonical_document_name(document: dict) -> Optional[str]:
+    """English display name for a document: top-level name, else names.en singular"""
+    name = document.get("name")
+    if isinstance(name, str) and name.strip():
+        return name.strip()
+    for language, values in _language_names(document.get("names")).items():
+        if language_code(language) == "en" and values:
+            return values[0]
+    return None
+
+class _LanguageKeys:
+    """Sorted normalized keys with a parallel array of canonical slots"""
+
+    __slots__ = ("keys", "slots")
+
+    def __init__(self, pairs: Optional[List[Tuple[str, int]]] = None):
+        pairs = sorted(pairs or [])
+        self.keys = [key for key, _ in pairs]
+        self.slots = array("l", (slot for _, slot in pairs))
+
+    def insert(self, key: str, slot: int):
+        position = bisect_left(self.keys, key)
+        while position < len(self.keys) and self.keys[position] == key and self.slots[position] < slot:
+            position += 1
+        self.keys.insert(position, key)
+        self.slots.insert(position, slot)
+
+    def remove(self, key: str, slot: int):
+        position = bisect_left(self.keys, key)
+        while position < len(self.keys) and self.keys[position] == key:
+            if self.slots[position] == slot:
+                del self.keys[position]
+                del self.slots[position]
+                return
+            position += 1
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        start = bisect_left(self.keys, prefix)
+        # U+10FFFF sorts after any character normalize_text can produce
+        return start, bisect_left(self.keys, prefix + "\U0010ffff", start)
+
+class IngredientNameIndex:
+    """
+    Prefix index over multilingual ingredient names and synonyms
+
+    Reads and incremental updates share one lock; a full rebuild prepares the
+    new arrays without it and swaps them in at the end.
+    """
+
+    def __init__(self, languages: Iterable[str] = DEFAULT_LANGUAGES):
+        self.languages = tuple(languages)
+        self._lock = threading.Lock()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._by_language = {code: _LanguageKeys() for code in self.languages}
+        self._canonical: List[Optional[str]] = []
+        self._slot_by_name: Dict[str, int] = {}
+        self._slot_refs: List[int] = []
+        self._keys_by_document: Dict[Any, Tuple[int, List[Tuple[str, str]]]] = {}
+        self.built_at = None
+
+    def __len__(self) -> int:
+        return len(self._keys_by_document)
+
+    @property
+    def key_count(self) -> int:
+        return sum(len(entry.keys) for entry in self._by_language.values())
+
+    def _acquire_slot(self, canonical: str) -> int:
+        slot = self._slot_by_name.get(canonical)
+        if slot is None:
+            slot = len(self._canonical)
+            self._canonical.append(canonical)
+            self._slot_refs.append(0)
+            self._slot_by_name[canonical] = slot
+        self._slot_refs[slot] += 1
+        return slot
+
+    def _release_slot(self, slot: int):
+        self._slot_refs[slot] -= 1
+        if self._slot_refs[slot] == 0:
+            # Slots are never reused, so the arrays stay valid; only the name lookup goes
+            self._slot_by_name.pop(self._canonical[slot], None)
+            self._canonical[slot] = None
+
+    def build(self, documents: Iterable[dict]) -> int:
+        """
+        Replace the index contents with the given names documents
+
+        Returns:
+            int: Number of documents indexed
+        """
+        fresh = IngredientNameIndex(self.languages)
+        pairs = {code: [] for code in self.languages}
+        for document in documents:
+            canonical = canonical_document_name(document)
+            if canonical is None:
+                continue
+            document_id = document.get("_id", canonical)
+            if document_id in fresh._keys_by_document:
+                continue
+            slot = fresh._acquire_slot(canonical)
+            keys = _document_keys(document, self.languages)
+            fresh._keys_by_document[document_id] = (slot, keys)
+            for code, key in keys:
+                pairs[code].append((key, slot))
+        fresh._by_language = {code: _LanguageKeys(pairs[code]) for code in self.languages}
+
+        with self._lock:
+            self._by_language = fresh._by_language
+            self._canonical = fresh._canonical
+            self._slot_by_name = fresh._slot_by_name
+            self._slot_refs = fresh._slot_refs
+            self._keys_by_document = fresh._keys_by_document
+            self.built_at = time.time()
+        return len(fresh._keys_by_document)
+
+    def upsert_document(self, document: dict) -> bool:
+        """Index a new or changed names document, replacing its previous keys"""
+        canonical = canonical_document_name(document)
+        if canonical is None:
+            return False
+        document_id = document.get("_id", canonical)
+        keys = _document_keys(document, self.languages)
+        with self._lock:
+            self._remove_locked(document_id)
+            slot = self._acquire_slot(canonical)
+            self._keys_by_document[document_id] = (slot, keys)
+            for code, key in keys:
+                self._by_language[code].insert(key, slot)
+        return True
+
+    def remove_document(self, document_id) -> bool:
+        """Drop every key belonging to a document; returns False if it was not indexed"""
+        with self._lock:
+            return self._remove_locked(document_id)
+
+    def _remove_locked(self, document_id) -> bool:
+        previous = self._keys_by_document.pop(document_id, None)
+        if previous is None:
+            return False
+        slot, keys = previous
+        for code, key in keys:
+            self._by_language[code].remove(key, slot)
+        self._release_slot(slot)
+        return True
+
+    def autocomplete(self, query: str, language: Optional[str] = None, limit: int = 10) -> List[Dict[str, str]]:
+        """
+        Canonical ingredients whose name or synonym starts with the query
+
+        Args:
+            query: Text typed so far, in any supported language
+            language: Search only this language ("he", "hebrew", ...); all languages when None
+            limit: Maximum number of distinct ingredients returned
+
+        Returns:
+            List of {"name": canonical English name, "match": matched key, "language": code},
+            shortest matches first
+        """
+        prefix = normalize_text(query)
+        if not prefix or limit <= 0:
+            return []
+        code = language_code(language)
+        languages = (code,) if code in self._by_language else self.languages
+
+        with self._lock:
+            candidates = []
+            for index_language in languages:
+                entry = self._by_language[index_language]
+                start, end = entry.prefix_range(prefix)
+                # Rank a bounded window per language so huge prefix ranges ("c") stay cheap
+                for position in range(start, min(end, start + limit * 8)):
+                    candidates.append((len(entry.keys[position]), entry.keys[position], index_language, entry.slots[position]))
+            candidates.sort()
+
+            results = []
+            seen = set()
+            for _, key, index_language, slot in candidates:
+                if slot in seen:
+                    continue
+                seen.add(slot)
+                results.append({"name": self._canonical[slot], "match": key, "language": index_language})
+                if len(results) >= limit:
+                    break
+        return results
+
+    def canonical_name(self, name: str, language: Optional[str] = None) -> Optional[str]:
+        """Map a name or synonym in any indexed language to its canonical English name"""
+        key = normalize_text(name)
+        code = language_code(language)
+        languages = (code,) if code in self._by_language else self.languages
+        with self._lock:
+            for index_language in languages:
+                entry = self._by_language[index_language]
+                position = bisect_left(entry.keys, key)
+                if position < len(entry.keys) and entry.keys[position] == key:
+                    return self._canonical[entry.slots[position]]
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self),
+            "keys": {code: len(entry.keys) for code, entry in self._by_language.items()},
+            "built_at": self.built_at
+        }
+
+class IngredientIndexRefresher:
+    """
+    Keeps in-memory ingredient indexes in sync with a MongoDB collection
+
+    Any index with build/upsert_document/remove_document can be attached, so
+    several indexes over the same collection share one change stream. Uses a change stream when the deployment supports one (replica sets and
+    Atlas), applying each insert/update/delete incrementally. Standalone
+    servers reject change streams, so the refresher falls back to rebuilding
+    the whole index every refresh_interval seconds.
+    """
+
+    def __init__(self, index: IngredientNameIndex, collection, refresh_interval: float = 300):
+        self.indexes = [index]
+        self.collection = collection
+        self.refresh_interval = refresh_interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def attach(self, index) -> int:
+        """Build another index from the collection and keep it updated from now on"""
+        count = index.build(self.collection.find({}, INDEX_PROJECTION))
+        self.indexes.append(index)
+        logger.info(f"✅ {type(index).__name__} built: {count} ingredients, {index.key_count} keys")
+        return count
+
+    def rebuild(self) -> int:
+        documents = list(self.collection.find({}, INDEX_PROJECTION))
+        count = 0
+        for index in list(self.indexes):
+            count = index.build(documents)
+            logger.info(f"✅ {type(index).__name__} built: {count} ingredients, {index.key_count} keys")
+        return count
+
+    def apply_change(self, change: dict):
+        """Apply one change-stream event to the index"""
+        operation = change.get("operationType")
+        document_id = (change.get("documentKey") or {}).get("_id")
+        if operation in ("insert", "update", "replace"):
+            document = change.get("fullDocument")
+            for index in list(self.indexes):
+                if document is not None:
+                    index.upsert_document(document)
+                elif document_id is not None:
+                    # The document was deleted before the update could be looked up
+                    index.remove_document(document_id)
+        elif operation == "delete" and document_id is not None:
+            for index in list(self.indexes):
+                index.remove_document(document_id)
+        elif operation in ("drop", "rename", "dropDatabase", "invalidate"):
+            self.rebuild()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ingredient-index-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._watch()
+            except Exception as e:
+                logger.warning(f"⚠️ Ingredient index change stream unavailable, polling instead: {str(e)}")
+                if self._stop.wait(self.refresh_interval):
+                    return
+                try:
+                    self.rebuild()
+                except Exception as rebuild_error:
+                    logger.error(f"❌ Ingredient index rebuild failed: {str(rebuild_error)}")
+
+    def _watch(self):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete", "drop", "rename", "dropDatabase", "invalidate"]}}}]
+        with self.collection.watch(pipeline, full_document="updateLookup", max_await_time_ms=1000) as stream:
+            # Catch up on anything written between the initial build and opening the stream
+            self.rebuild()
+            while not self._stop.is_set() and stream.alive:
+                change = stream.try_next()
+                if change is not None:
+                    self.apply_change(change)
+
+_index = None
+_refresher = None
+_index_lock = threading.Lock()
+
+def get_ingredient_index() -> Optional[IngredientNameIndex]:
+    """
+    Return the process-wide ingredient name index, building it on first use
+
+    Returns None when the index is disabled or MongoDB is not available.
+    """
+    global _index, _refresher
+    if _index is not None or not INGREDIENT_INDEX_CONFIG['ENABLED']:
+        return _index
+    with _index_lock:
+        if _index is None:
+            from mongodb_config import ingredient_names_collection
+
+            if ingredient_names_collection is None:
+                logger.warning("MongoDB ingredient_names collection not available")
+                return None
+            index = IngredientNameIndex(INGREDIENT_INDEX_CONFIG['LANGUAGES'])
+            refresher = IngredientIndexRefresher(index, ingredient_names_collection, INGREDIENT_INDEX_CONFIG['REFRESH_INTERVAL_SECONDS'])
+            try:
+                refresher.rebuild()
+            except Exception as e:
+                logger.error(f"❌ Failed to build ingredient name index: {str(e)}")
+                return None
+            if INGREDIENT_INDEX_CONFIG['AUTO_REFRESH']:
+                refresher.start()
+            _index, _refresher = index, refresher
+    return _index
+
+def autocomplete_ingredients(query: str, language: Optional[str] = None, limit: int = None) -> List[Dict[str, str]]:
+    """Autocomplete against the shared index; empty when the index is unavailable"""
+    index = get_ingredient_index()
+    if index is None:
+        return []
+    return index.autocomplete(query, language, limit or INGREDIENT_INDEX_CONFIG['MAX_RESULTS'])
+
+def get_index_refresher() -> Optional[IngredientIndexRefresher]:
+    """The refresher behind the shared index, for attaching further indexes over ingredient_names"""
+    get_ingredient_index()
+    return _refresher
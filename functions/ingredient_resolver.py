@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Resolve model-produced ingredient names to canonical base ingredients
+
+Analyses name ingredients like "Apple (Granny Smith)" or "Tomatoes, diced".
+The resolver strips the qualifiers and looks the base name up in the
+normalized_ingredients_v5 catalog: exact name first, then normalized
+(case, accents, plurals), then fuzzy, where every word of the catalog name
+must be matched. Resolutions, including misses, are
+memoized in an LRU, so repeat names cost one dictionary lookup.
+"""
+
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from caching import TTLCache
+from config import INGREDIENT_RESOLVER_CONFIG
+from fuzzy_matcher import FuzzyIngredientMatcher
+from text_normalization import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# "(Granny Smith)", "[raw]" and everything after the first comma ("Tomatoes, diced")
+_QUALIFIERS = re.compile(r"\([^)]*\)|\[[^\]]*\]|,.*$")
+_MISS = object()
+
+class ResolvedIngredient(NamedTuple):
+    id: str
+    name: str
+    category: Optional[str]
+    method: str
+    score: float
+
+def base_name(raw_name: str) -> str:
+    """Strip varieties and preparation notes: "Apple (Granny Smith)" -> "Apple" """
+    stripped = _QUALIFIERS.sub(" ", raw_name or "").strip()
+    return stripped or (raw_name or "").strip()
+
+def singular_forms(key: str) -> List[str]:
+    """The normalized key plus plausible English singulars of its last word"""
+    forms = [key]
+    head, _, last = key.rpartition(" ")
+    prefix = f"{head} " if head else ""
+    if len(last) > 3 and last.endswith("ies"):
+        forms.append(prefix + last[:-3] + "y")
+    if len(last) > 3 and last.endswith(("oes", "ches", "shes", "xes", "ses")):
+        forms.append(prefix + last[:-2])
+    if len(last) > 2 and last.endswith("s") and not last.endswith(("ss", "us", "is")):
+        forms.append(prefix + last[:-1])
+    return forms
+
+def _catalog_names(document: dict) -> List[str]:
+    names = document.get("base_ingredient_name")
+    if isinstance(names, str):
+        return [names]
+    if isinstance(names, list):
+        return [name for name in names if isinstance(name, str)]
+    return []
+
+class IngredientResolver:
+    """
+    Maps raw ingredient names to catalog entries with a memoizing LRU in front
+
+    The catalog is reloaded from load_catalog every refresh_interval seconds
+    (lazily, on the next resolve); a reload clears the memoized resolutions.
+    """
+
+    def __init__(self, load_catalog=None, cache_size: int = 4096, fuzzy_min_score: float = 0.85,
+                 refresh_interval: float = 900):
+        self.load_catalog = load_catalog
+        self.fuzzy_min_score = fuzzy_min_score
+        self.refresh_interval = refresh_interval
+        self.cache = TTLCache(max_entries=cache_size, ttl_seconds=refresh_interval)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._by_exact: Dict[str, Tuple[str, str, Optional[str]]] = {}
+        self._by_key: Dict[str, Tuple[str, str, Optional[str]]] = {}
+        self._fuzzy = FuzzyIngredientMatcher(languages=("en",))
+        self._loaded_at = None
+        # Normalized names of unknown ingredients already queued for storage by this instance
+        self._persisted = TTLCache(max_entries=cache_size, ttl_seconds=refresh_interval)
+
+    def load(self, documents: Iterable[dict]) -> int:
+        """
+        Replace the catalog with normalized ingredient documents
+
+        Returns:
+            int: Number of catalog entries
+        """
+        by_exact = {}
+        by_key = {}
+        fuzzy_documents = []
+        for document in documents:
+            names = _catalog_names(document)
+            if not names:
+                continue
+            entry = (str(document.get("_id", names[0])), names[0], document.get("category"))
+            for name in names:
+                by_exact.setdefault(name.strip(), entry)
+                by_key.setdefault(normalize_text(name), entry)
+                fuzzy_documents.append({"_id": (entry[0], name), "name": entry[1], "names": {"en": {"name": name}}})
+        fuzzy = FuzzyIngredientMatcher(languages=("en",))
+        fuzzy.build(fuzzy_documents)
+        with self._lock:
+            self._by_exact = by_exact
+            self._by_key = by_key
+            self._fuzzy = fuzzy
+            self._loaded_at = time.monotonic()
+        self.cache.clear()
+        self._persisted.clear()
+        return len(by_key)
+
+    def _is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_interval
+
+    def _refresh_if_stale(self):
+        if self.load_catalog is None or not self._is_stale():
+            return
+        # One thread reloads; the others wait and then see the fresh catalog
+        with self._refresh_lock:
+            if not self._is_stale():
+                return
+            try:
+                count = self.load(self.load_catalog())
+                logger.info(f"✅ Ingredient catalog loaded: {count} names")
+            except Exception as e:
+                # Keep serving the previous catalog; retry after another interval
+                self._loaded_at = time.monotonic()
+                logger.error(f"❌ Failed to load ingredient catalog: {str(e)}")
+
+    def resolve(self, raw_name: str) -> Optional[ResolvedIngredient]:
+        """
+        Resolve a raw ingredient name to its catalog entry
+
+        Returns:
+            ResolvedIngredient, or None when the ingredient is not in the catalog
+        """
+        if not raw_name:
+            return None
+        self._refresh_if_stale()
+        cached = self.cache.get(raw_name, _MISS)
+        if cached is not _MISS:
+            return cached
+        resolved = self._resolve(raw_name)
+        self.cache.set(raw_name, resolved)
+        return resolved
+
+    def _resolve(self, raw_name: str) -> Optional[ResolvedIngredient]:
+        with self._lock:
+            by_exact, by_key, fuzzy = self._by_exact, self._by_key, self._fuzzy
+        entry = by_exact.get(raw_name.strip())
+        if entry is not None:
+            return ResolvedIngredient(*entry, "exact", 1.0)
+
+        base = base_name(raw_name)
+        for key in singular_forms(normalize_text(base)):
+            entry = by_key.get(key)
+            if entry is not None:
+                return ResolvedIngredient(*entry, "normalized", 1.0)
+
+        # A catalog name is only a match when every one of its words is matched:
+        # "Chicken" must not resolve to "chicken stock"
+        for match in fuzzy.search(base, limit=5, min_score=self.fuzzy_min_score):
+            if not match["complete"]:
+                continue
+            entry = by_key.get(normalize_text(match["name"]))
+            if entry is not None:
+                return ResolvedIngredient(*entry, "fuzzy", match["score"])
+        return None
+
+    def should_persist(self, raw_name: str) -> bool:
+        """
+        True the first time an unknown ingredient is seen until the next catalog refresh
+
+        Repeated analyses of the same new ingredient are stored once per instance.
+        """
+        key = normalize_text(base_name(raw_name))
+        if self._persisted.get(key) is not None:
+            return False
+        self._persisted.set(key, True)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"catalog_names": len(self._by_key), "cache": self.cache.stats()}
+
+def _load_normalized_ingredients() -> Iterable[dict]:
+    from mongodb_config import normalized_ingredients_collection
+
+    if normalized_ingredients_collection is None:
+        raise RuntimeError("normalized_ingredients collection not available")
+    return normalized_ingredients_collection.find({}, {"base_ingredient_name": 1, "category": 1})
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+def get_ingredient_resolver() -> Optional[IngredientResolver]:
+    """Return the process-wide resolver over normalized_ingredients_v5, or None when disabled"""
+    global _resolver
+    if _resolver is not None or not INGREDIENT_RESOLVER_CONFIG['ENABLED']:
+        return _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = IngredientResolver(
+                _load_normalized_ingredients,
+                cache_size=INGREDIENT_RESOLVER_CONFIG['CACHE_SIZE'],
+                fuzzy_min_score=INGREDIENT_RESOLVER_CONFIG['FUZZY_MIN_SCORE'],
+                refresh_interval=INGREDIENT_RESOLVER_CONFIG['REFRESH_INTERVAL_SECONDS']
+            )
+    return _resolver
+
+def resolve_ingredient(raw_name: str) -> Optional[ResolvedIngredient]:
+    """Resolve with the shared resolver; None when disabled or the ingredient is unknown"""
+    resolver = get_ingredient_resolver()
+    return resolver.resolve(raw_name) if resolver is not None else None
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Incremental JSON parsing of streamed model output
+
+The model's answer arrives as a sequence of text deltas. IncrementalJSONParser
+consumes them as they come and builds the result object in place, so the
+answer is complete the moment its closing brace arrives and each top-level
+field (e.g. "mealName") can be reported as soon as its value is finished.
+
+Text before the first "{" (prose, a ```json fence) and after the closing
+brace is ignored. Single-quoted strings, Python literals (True/None) and
+trailing commas are accepted, since the prompts show single-quoted examples.
+"""
+
+import json
+from typing import Any, Iterable, Iterator, List, Optional, Tuple, Union
+
+_STRUCTURAL = "{}[],:"
+_WHITESPACE = " \t\r\n"
+_BARE_END = set(_STRUCTURAL + _WHITESPACE + "\"'")
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+
+def _decode_string(token: str) -> str:
+    if token[0] == '"':
+        return json.loads(token)
+    # 'single quoted': unescape \' and escape bare double quotes for json.loads
+    body = token[1:-1].replace("\\'", "'").replace('"', '\\"').replace('\\\\"', '\\"')
+    return json.loads(f'"{body}"')
+
+def _decode_bare(token: str) -> Any:
+    if token in _LITERALS:
+        return _LITERALS[token]
+    try:
+        return int(token)
+    except ValueError:
+        pass
+    try:
+        return float(token)
+    except ValueError:
+        # Unquoted words such as 30g are kept as strings
+        return token
+
+class IncrementalJSONParser:
+    """
+    Push parser for one JSON object delivered in chunks
+
+    feed() returns the top-level fields completed by the chunk as
+    (key, value) pairs; done / result tell whether the root object has been
+    closed. close() returns whatever was built if the stream ended early.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._started = False
+        # Open containers as [container, pending key]
+        self._stack: List[list] = []
+        self._expect_key = False
+        self.result: Optional[dict] = None
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume the next piece of text; returns the top-level fields it completed"""
+        if self.done or not chunk:
+            return []
+        buffer = self._buffer + chunk
+        position = 0
+        if not self._started:
+            position = buffer.find("{")
+            if position == -1:
+                # Keep nothing: the object has not started yet
+                self._buffer = ""
+                return []
+            self._started = True
+        fields: List[Tuple[str, Any]] = []
+        length = len(buffer)
+        while position < length and not self.done:
+            char = buffer[position]
+            if char in _WHITESPACE:
+                position += 1
+            elif char in _STRUCTURAL:
+                self._structural(char, fields)
+                position += 1
+            elif char == '"' or char == "'":
+                end = self._string_end(buffer, position, char)
+                if end == -1:
+                    break
+                self._token(_decode_string(buffer[position:end + 1]), fields)
+                position = end + 1
+            else:
+                end = position
+                while end < length and buffer[end] not in _BARE_END:
+                    end += 1
+                if end == length:
+                    # The word may continue in the next chunk
+                    break
+                self._token(_decode_bare(buffer[position:end]), fields)
+                position = end
+        self._buffer = "" if self.done else buffer[position:]
+        return fields
+
+    @staticmethod
+    def _string_end(buffer: str, start: int, quote: str) -> int:
+        position = start + 1
+        while True:
+            position = buffer.find(quote, position)
+            if position == -1:
+                return -1
+            backslashes = 0
+            while buffer[position - 1 - backslashes] == "\\":
+                backslashes += 1
+            if backslashes % 2 == 0:
+                return position
+            position += 1
+
+    def _structural(self, char: str, fields: List[Tuple[str, Any]]) -> None:
+        if char == "{" or char == "[":
+            container = {} if char == "{" else []
+            if self._stack:
+                self._attach(container)
+            else:
+                self.result = container
+            self._stack.append([container, None])
+            self._expect_key = char == "{"
+        elif char == "}" or char == "]":
+            if not self._stack:
+                return
+            container, _ = self._stack.pop()
+            if not self._stack:
+                self.done = True
+                return
+            self._completed(container, fields)
+        elif char == ",":
+            self._expect_key = bool(self._stack) and isinstance(self._stack[-1][0], dict)
+        # ":" only separates a key from its value
+
+    def _token(self, value: Any, fields: List[Tuple[str, Any]]) -> None:
+        if not self._stack:
+            return
+        top = self._stack[-1]
+        if isinstance(top[0], dict) and self._expect_key:
+            top[1] = value if isinstance(value, str) else str(value)
+            self._expect_key = False
+            return
+        self._attach(value)
+        self._completed(value, fields)
+
+    def _attach(self, value: Any) -> None:
+        top = self._stack[-1]
+        if isinstance(top[0], dict):
+            if top[1] is not None:
+                top[0][top[1]] = value
+        else:
+            top[0].append(value)
+
+    def _completed(self, value: Any, fields: List[Tuple[str, Any]]) -> None:
+        """A value finished; report it when it belongs directly to the root object"""
+        if len(self._stack) == 1 and isinstance(self._stack[0][0], dict):
+            key = self._stack[0][1]
+            if key is not None:
+                fields.append((key, value))
+            self._stack[0][1] = None
+
+    def close(self) -> Optional[dict]:
+        """The root object, or the part of it received before the stream ended"""
+        return self.result if isinstance(self.result, dict) else None
+
+def iter_sse_data(lines: Iterable[Union[bytes, str]]) -> Iterator[Any]:
+    """
+    Decode the JSON payloads of a server-sent event stream
+
+    Args:
+        lines: The stream's lines (e.g. requests' Response.iter_lines())
+
+    Yields:
+        The parsed "data:" payload of each event, up to a "[DONE]" marker
+    """
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        # Blank separators and ": keep-alive" comments carry no data
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        if data:
+            yield json.loads(data)
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -12,17 +12,30 @@ import string
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import smtplib
-from config import EMAIL_CONFIG, EMAIL_TEMPLATES
+from config import EMAIL_CONFIG, EMAIL_TEMPLATES, MAX_FILE_SIZE, INGREDIENT_INDEX_CONFIG, STREAMING_ANALYSIS_CONFIG
+from caching import analysis_cache, lookup_cached_analysis, store_cached_analysis
+from image_payload import ImagePayload, ImageUploadError, read_image_upload
+from image_pipeline import prepare_image_for_api
+from ingredient_index import autocomplete_ingredients
+from json_stream import sse_event
+from output_schemas import SIMPLE_MEAL_ANALYSIS, parse_structured_output
+from single_flight import vision_flight
 
 # Initialize Firebase app
 app = initialize_app()
 
+# Images larger than this are compressed before being sent for analysis
+COMPRESS_ABOVE_BYTES = 400 * 1024
+
 # Import our custom helper module
 try:
-    from openai_helper import analyze_image_with_vision
+    from openai_helper import analysis_key, analyze_image_with_vision, stream_image_analysis, VISION_MODEL
 except ImportError:
+    VISION_MODEL = None
+    stream_image_analysis = None
+
     # Fallback implementation if import fails
-    def analyze_image_with_vision(image_url=None, prompt=None, image_base64=None):
+    def analyze_image_with_vision(image_url=None, prompt=None, image_base64=None, image_payload=None, output_schema=None):
         return {
             "mealName": "Analysis temporarily unavailable",
             "estimatedCalories": 400,
@@ -158,47 +171,135 @@ def send_verification_email(to_email: str, verification_code: str) -> bool:
         print(f"❌ Full error details: {repr(e)}")
         return False
 
-# OpenAI function for analyzing meal images
-@https_fn.on_request()
-def analyze_meal_image_v2(req: https_fn.Request) -> https_fn.Response:
-    """Analyze meal image using OpenAI Vision API"""
-    try:
-        # Get data from request
-        data = req.get_json()
-        image_url = data.get('image_url')
-        image_base64 = data.get('image_base64')
-        image_name = data.get('image_name', 'unknown.jpg')
-        function_info = data.get('function_info', {})
-        
-        print(f"Received analysis request for image: {image_name}")
+def _parse_analysis_output(raw_analysis_output):
+    """
+    Turn the vision model's output into the analysis object, checked against SIMPLE_MEAL_ANALYSIS
+    
+    Args:
+        raw_analysis_output (str or dict): Model text (possibly fenced, single-quoted or truncated), a streamed
+            analysis or an error dict
         
-        if image_url:
-            print(f"Image URL length: {len(image_url)}")
-        if image_base64:
-            print(f"Image base64 length: {len(image_base64)}")
+    Returns:
+        dict or list: The parsed analysis, with a default healthiness when the model left it out
         
-        # Validate that we have either URL or base64
-        if not image_url and not image_base64:
-            return https_fn.Response(
-                json.dumps({'error': 'Either image_url or image_base64 must be provided'}),
-                status=400,
-                headers={'Content-Type': 'application/json'}
-            )
-            
-        # Validate URL format if provided
-        if image_url and not image_url.startswith(('http://', 'https://')):
-            return https_fn.Response(
-                json.dumps({'error': 'Invalid image URL format. Must start with http:// or https://'}),
-                status=400,
-                headers={'Content-Type': 'application/json'}
-            )
+    Raises:
+        Exception: If the output cannot be parsed as JSON
+    """
+    if isinstance(raw_analysis_output, dict) and "error" in raw_analysis_output:
+        return raw_analysis_output
+    if not isinstance(raw_analysis_output, (str, dict, list)):
+        error_message = f"Unexpected data type from image analysis service: {type(raw_analysis_output)}. Output snippet: {str(raw_analysis_output)[:200]}"
+        print(error_message)
+        raise Exception(error_message)
 
-        if image_url:
-            print(f"Processing image URL: {image_url[:50]}...")
+    # Strict parse first; one tolerant pass handles fences, prose, single quotes, trailing commas and truncation
+    try:
+        parsed = parse_structured_output(raw_analysis_output, SIMPLE_MEAL_ANALYSIS, VISION_MODEL)
+    except json.JSONDecodeError as e:
+        error_message = f"Vision API output is not a recognized JSON object. Error: {str(e)}. Original snippet: {raw_analysis_output[:200]}"
+        print(error_message)
+        raise Exception(error_message) from e
+    if parsed.repairs:
+        print(f"🔧 Repaired vision API JSON: {', '.join(parsed.repairs)}")
+
+    parsed_json = parsed.value
+    if isinstance(parsed_json, dict):
+        print(f"🔍 Parsed JSON keys: {list(parsed_json.keys())}")
+        if 'healthiness' not in parsed_json:
+            # Add default healthiness if missing
+            parsed_json['healthiness'] = 'N/A'
+            print("🔧 Added default healthiness: N/A")
+    return parsed_json
+
+def _finish_streamed_analysis(kind, payload):
+    """Map the final stream_image_analysis event to what analyze_image_with_vision returns"""
+    if kind == "result":
+        if 'healthiness' not in payload:
+            payload['healthiness'] = 'N/A'
+            print("🔧 Added default healthiness: N/A")
+        return payload
+    if kind == "text":
+        # The output never closed its object; _parse_analysis_output repairs it
+        return payload
+    return {"error": payload}
+
+def _collect_streamed_analysis(image_url, prompt, image_base64, image_payload):
+    """
+    Run a streamed analysis and return its output as soon as the JSON object is complete
+    
+    Identical analyses already in flight (streamed or not) are joined instead of starting another model call.
+    """
+    key = analysis_key(image_url, prompt, image_base64, image_payload, SIMPLE_MEAL_ANALYSIS)
+    return vision_flight.do(key, _run_streamed_analysis, image_url, prompt, image_base64, image_payload)
+
+def _run_streamed_analysis(image_url, prompt, image_base64, image_payload):
+    final_event = ("error", "Streamed analysis produced no result")
+    for event in stream_image_analysis(image_url=image_url, prompt=prompt, image_base64=image_base64,
+                                       image_payload=image_payload, output_schema=SIMPLE_MEAL_ANALYSIS):
+        if event[0] != "field":
+            final_event = event
+    return _finish_streamed_analysis(*final_event)
+
+def _stream_meal_analysis(image_url, prompt, image_base64, image_payload, cache_lookup):
+    """
+    Server-sent events for one analysis
+    
+    A duplicate of an analysis already in flight does not call the model; it waits for the
+    leader's output and sends only the final event.
+    
+    Yields:
+        str: A "field" event ({"key", "value"}) per top-level field as soon as it is complete, then
+            a "result" event with the full analysis, or an "error" event
+    """
+    try:
+        flight_key = analysis_key(image_url, prompt, image_base64, image_payload, SIMPLE_MEAL_ANALYSIS)
+        future, leader = vision_flight.join(flight_key)
+        if leader:
+            final_event = ("error", "Streamed analysis produced no result")
+            try:
+                for event in stream_image_analysis(image_url=image_url, prompt=prompt, image_base64=image_base64,
+                                                   image_payload=image_payload, output_schema=SIMPLE_MEAL_ANALYSIS):
+                    if event[0] == "field":
+                        key, value = event[1]
+                        yield sse_event("field", {"key": key, "value": value})
+                    else:
+                        final_event = event
+                raw_output = _finish_streamed_analysis(*final_event)
+            except BaseException as stream_error:
+                # Also reached when the client disconnects (GeneratorExit); waiters must not hang
+                error = stream_error if isinstance(stream_error, Exception) else RuntimeError("Streamed analysis was interrupted")
+                vision_flight.finish(flight_key, future, error=error)
+                raise
+            vision_flight.finish(flight_key, future, raw_output)
         else:
-            print(f"Processing base64 image data ({len(image_base64)} characters)")
+            print("🔗 Joined an identical analysis already in flight")
+            raw_output = vision_flight.wait(future)
+        final_result = _parse_analysis_output(raw_output)
+        if isinstance(final_result, dict) and "error" in final_result:
+            yield sse_event("error", {"error": "Failed to analyze image with OpenAI Vision API", "message": final_result["error"]})
+            return
+        if cache_lookup and isinstance(final_result, dict):
+            store_cached_analysis(cache_lookup, prompt, VISION_MODEL, final_result)
+        yield sse_event("result", final_result)
+    except Exception as vision_error:
+        print(f"OpenAI Vision API streaming error: {str(vision_error)}")
+        yield sse_event("error", {"error": "Failed to analyze image with OpenAI Vision API", "message": str(vision_error)})
+
+def _analyze_meal_image(image_url, image_base64, image_payload, image_name, stream_events=False) -> https_fn.Response:
+    """
+    Run the meal analysis shared by the JSON and upload endpoints
+    
+    Args:
+        image_url (str, optional): URL of the image to analyze
+        image_base64 (str, optional): Base64 data that could not be decoded, sent as-is
+        image_payload (ImagePayload, optional): Decoded image bytes
+        image_name (str): Name used in logs
+        stream_events (bool): Answer with server-sent events, sending fields as they are generated
         
-        prompt = """
+    Returns:
+        https_fn.Response: The analysis JSON (or an event stream), or error info with a fallback analysis
+    """
+    prompt = """
 Analyze this meal image and provide detailed nutritional information in JSON format. Include:
 1. Meal identification (in English only)
 2. Accurate calorie estimation
@@ -249,161 +350,154 @@ Important:
 - Be as accurate as possible with ingredient weights and nutrition values.
 """
 
+    # Serve repeat uploads of the same image from the analysis cache
+    cache_lookup = None
+    if image_payload is not None and VISION_MODEL:
         try:
+            cache_lookup = lookup_cached_analysis(image_payload.data, prompt, VISION_MODEL)
+        except Exception as key_error:
+            print(f"⚠️ Analysis cache lookup failed: {str(key_error)}")
+    if cache_lookup and cache_lookup.result is not None:
+        print(f"✅ Analysis cache hit ({cache_lookup.source}) for {image_name}: {analysis_cache.stats()}")
+        if stream_events:
+            return https_fn.Response(
+                sse_event("result", cache_lookup.result),
+                status=200,
+                headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache', 'X-Analysis-Cache': 'HIT'}
+            )
+        return https_fn.Response(
+            json.dumps(cache_lookup.result),
+            status=200,
+            headers={'Content-Type': 'application/json', 'X-Analysis-Cache': 'HIT'}
+        )
+
+    # Large photos are downscaled before upload; the cache stays keyed on the original bytes
+    if image_payload is not None and len(image_payload) > COMPRESS_ABOVE_BYTES:
+        try:
+            compressed_bytes, stats = prepare_image_for_api(image_payload.data, max_size_kb=COMPRESS_ABOVE_BYTES // 1024)
+            print(f"📏 Image compressed from {len(image_payload)} to {len(compressed_bytes)} bytes ({stats['encodes']} encodes)")
+            image_payload = ImagePayload(compressed_bytes)
+        except Exception as compress_error:
+            print(f"⚠️ Image compression failed, sending original: {str(compress_error)}")
+
+    if stream_events and stream_image_analysis is not None:
+        print(f"📡 Streaming analysis events for {image_name}")
+        return https_fn.Response(
+            _stream_meal_analysis(image_url, prompt, image_base64, image_payload, cache_lookup),
+            status=200,
+            headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache', 'X-Analysis-Cache': 'MISS'}
+        )
+
+    try:
+        if stream_image_analysis is not None and STREAMING_ANALYSIS_CONFIG['ENABLED']:
+            # The streamed answer is returned as soon as its closing brace arrives
+            raw_analysis_output = _collect_streamed_analysis(image_url, prompt, image_base64, image_payload)
+        else:
             # Using the custom analyze_image_with_vision function from openai_helper
             raw_analysis_output = analyze_image_with_vision(
                 image_url=image_url, 
                 prompt=prompt, 
-                image_base64=image_base64
+                image_base64=image_base64,
+                image_payload=image_payload,
+                output_schema=SIMPLE_MEAL_ANALYSIS
             )
-            
-            # Debug: Log what OpenAI actually returned
-            print(f"🔍 Raw OpenAI output type: {type(raw_analysis_output)}")
-            if isinstance(raw_analysis_output, str):
-                print(f"🔍 Raw OpenAI output (first 500 chars): {raw_analysis_output[:500]}")
-            else:
-                print(f"🔍 Raw OpenAI output: {raw_analysis_output}")
-            
-            final_json_payload_str: str
-
-            if isinstance(raw_analysis_output, str):
-                text_to_parse = raw_analysis_output.strip()
-
-                # Try to remove markdown fences
-                if text_to_parse.startswith("```json") and text_to_parse.endswith("```"):
-                    # Slice from after "```json" (length 7) to before "```" (length 3 from end)
-                    text_to_parse = text_to_parse[len("```json"):-len("```")].strip()
-                elif text_to_parse.startswith("```") and text_to_parse.endswith("```"):
-                    # Slice from after "```" (length 3) to before "```" (length 3 from end)
-                    text_to_parse = text_to_parse[len("```"):-len("```")].strip()
-
-                # After attempting to strip markdown, find the JSON object
-                json_start_index = text_to_parse.find('{')
-                json_end_index = text_to_parse.rfind('}')
-
-                if json_start_index != -1 and json_end_index != -1 and json_end_index > json_start_index:
-                    json_str_candidate = text_to_parse[json_start_index : json_end_index + 1]
-                    
-                    # Fix common JSON issues: replace single quotes with double quotes
-                    # This is a common issue with AI-generated JSON
-                    print(f"🔧 Original JSON candidate (first 200 chars): {json_str_candidate[:200]}")
-                    
-                    # Replace single quotes with double quotes for property names and string values
-                    # But be careful not to replace quotes inside strings
-                    fixed_json_str = json_str_candidate
-                    
-                    # More robust approach: handle mixed quotes and escape sequences
-                    if "'" in fixed_json_str:
-                        # If there are no double quotes at all, simple replacement is safe
-                        if '"' not in fixed_json_str:
-                            fixed_json_str = fixed_json_str.replace("'", '"')
-                            print(f"🔧 Fixed JSON by replacing all single quotes with double quotes")
-                        else:
-                            # If there are mixed quotes, use regex for more careful replacement
-                            import re
-                            # Replace single quotes around property names: 'propertyName':
-                            fixed_json_str = re.sub(r"'([^']*)'(\s*:)", r'"\1"\2', fixed_json_str)
-                            # Replace single quotes around string values: : 'value'
-                            fixed_json_str = re.sub(r":\s*'([^']*)'", r': "\1"', fixed_json_str)
-                            print(f"🔧 Fixed JSON using regex for mixed quote replacement")
-                    
-                    print(f"🔧 Fixed JSON candidate (first 200 chars): {fixed_json_str[:200]}")
-                    
-                    try:
-                        parsed_json = json.loads(fixed_json_str)
-                        
-                        # Debug: Check if healthiness is in the parsed JSON
-                        print(f"🔍 Parsed JSON keys: {list(parsed_json.keys())}")
-                        if 'healthiness' in parsed_json:
-                            print(f"✅ Found healthiness in parsed JSON: {parsed_json['healthiness']}")
-                        else:
-                            print("❌ No healthiness field found in parsed JSON")
-                            print(f"🔍 Full parsed JSON: {parsed_json}")
-                            # Add default healthiness if missing
-                            parsed_json['healthiness'] = 'N/A'
-                            print("🔧 Added default healthiness: N/A")
-                        
-                        final_json_payload_str = json.dumps(parsed_json) # Re-serialize for clean output
-                    except json.JSONDecodeError as e:
-                        error_message = f"Could not parse extracted JSON (from braces) from vision API output. Error: {str(e)}. Original snippet: {json_str_candidate[:200]}. Fixed snippet: {fixed_json_str[:200]}"
-                        print(error_message)
-                        raise Exception(error_message) from e
-                else:
-                    # If no '{...}' found, try to parse the text_to_parse directly
-                    print(f"🔧 No braces found, trying direct parse of: {text_to_parse[:200]}")
-                    
-                    # Apply the same quote fixing logic
-                    fixed_text = text_to_parse
-                    if "'" in fixed_text:
-                        # If there are no double quotes at all, simple replacement is safe
-                        if '"' not in fixed_text:
-                            fixed_text = fixed_text.replace("'", '"')
-                            print(f"🔧 Fixed direct parse text by replacing all single quotes")
-                        else:
-                            # If there are mixed quotes, use regex for more careful replacement
-                            import re
-                            # Replace single quotes around property names: 'propertyName':
-                            fixed_text = re.sub(r"'([^']*)'(\s*:)", r'"\1"\2', fixed_text)
-                            # Replace single quotes around string values: : 'value'
-                            fixed_text = re.sub(r":\s*'([^']*)'", r': "\1"', fixed_text)
-                            print(f"🔧 Fixed direct parse text using regex")
-                    
-                    try:
-                        parsed_json = json.loads(fixed_text)
-                        
-                        # Debug: Check if healthiness is in the parsed JSON
-                        print(f"🔍 Direct parse JSON keys: {list(parsed_json.keys())}")
-                        if 'healthiness' in parsed_json:
-                            print(f"✅ Found healthiness in direct parsed JSON: {parsed_json['healthiness']}")
-                        else:
-                            print("❌ No healthiness field found in direct parsed JSON")
-                            print(f"🔍 Full direct parsed JSON: {parsed_json}")
-                            # Add default healthiness if missing
-                            parsed_json['healthiness'] = 'N/A'
-                            print("🔧 Added default healthiness: N/A")
-                        
-                        final_json_payload_str = json.dumps(parsed_json) 
-                    except json.JSONDecodeError as e:
-                        error_message = f"Vision API output is not a recognized JSON object (no braces found) and not a simple JSON string after stripping. Error: {str(e)}. Original snippet: {text_to_parse[:200]}. Fixed snippet: {fixed_text[:200]}"
-                        print(error_message)
-                        raise Exception(error_message) from e
-            elif isinstance(raw_analysis_output, (dict, list)):
-                final_json_payload_str = json.dumps(raw_analysis_output)
-            else:
-                error_message = f"Unexpected data type from image analysis service: {type(raw_analysis_output)}. Output snippet: {str(raw_analysis_output)[:200]}"
-                print(error_message)
-                raise Exception(error_message)
+        
+        # Debug: Log what OpenAI actually returned
+        print(f"🔍 Raw OpenAI output type: {type(raw_analysis_output)}")
+        if isinstance(raw_analysis_output, str):
+            print(f"🔍 Raw OpenAI output (first 500 chars): {raw_analysis_output[:500]}")
+        else:
+            print(f"🔍 Raw OpenAI output: {raw_analysis_output}")
+        
+        final_result = _parse_analysis_output(raw_analysis_output)
+        final_json_payload_str = json.dumps(final_result)
+
+        if cache_lookup and isinstance(final_result, dict) and "error" not in final_result:
+            store_cached_analysis(cache_lookup, prompt, VISION_MODEL, final_result)
+
+        # Return the cleaned and validated analysis result
+        return https_fn.Response(
+            final_json_payload_str,
+            status=200,
+            headers={'Content-Type': 'application/json', 'X-Analysis-Cache': 'MISS'}
+        )
+    except Exception as vision_error:
+        print(f"OpenAI Vision API error: {str(vision_error)}")
+        # Return a more helpful error message
+        error_response = {
+            "error": "Failed to analyze image with OpenAI Vision API",
+            "message": str(vision_error),
+            "fallback_analysis": {
+                "meal_name": "Unknown meal (analysis failed)",
+                "estimated_calories": 0,
+                "macronutrients": {
+                    "proteins": "0g",
+                    "carbohydrates": "0g",
+                    "fats": "0g"
+                },
+                "ingredients": ["could not analyze image"],
+                "health_assessment": "Analysis failed. Please try again later.",
+                "source": "https://fdc.nal.usda.gov/"
+            }
+        }
+        return https_fn.Response(
+            json.dumps(error_response),
+            status=200,  # Return 200 with error info instead of 500
+            headers={'Content-Type': 'application/json'}
+        )
 
-            # Return the cleaned and validated analysis result
+# OpenAI function for analyzing meal images
+@https_fn.on_request()
+def analyze_meal_image_v2(req: https_fn.Request) -> https_fn.Response:
+    """Analyze meal image using OpenAI Vision API"""
+    try:
+        # Get data from request
+        data = req.get_json()
+        image_url = data.get('image_url')
+        image_base64 = data.get('image_base64')
+        image_name = data.get('image_name', 'unknown.jpg')
+        function_info = data.get('function_info', {})
+        # SSE clients get partial fields (mealName first) while the analysis is generated
+        stream_events = data.get('stream') is True or 'text/event-stream' in req.headers.get('Accept', '')
+        
+        print(f"Received analysis request for image: {image_name}")
+        
+        if image_url:
+            print(f"Image URL length: {len(image_url)}")
+        if image_base64:
+            print(f"Image base64 length: {len(image_base64)}")
+        
+        # Validate that we have either URL or base64
+        if not image_url and not image_base64:
             return https_fn.Response(
-                final_json_payload_str,
-                status=200,
+                json.dumps({'error': 'Either image_url or image_base64 must be provided'}),
+                status=400,
                 headers={'Content-Type': 'application/json'}
             )
-        except Exception as vision_error:
-            print(f"OpenAI Vision API error: {str(vision_error)}")
-            # Return a more helpful error message
-            error_response = {
-                "error": "Failed to analyze image with OpenAI Vision API",
-                "message": str(vision_error),
-                "fallback_analysis": {
-                    "meal_name": "Unknown meal (analysis failed)",
-                    "estimated_calories": 0,
-                    "macronutrients": {
-                        "proteins": "0g",
-                        "carbohydrates": "0g",
-                        "fats": "0g"
-                    },
-                    "ingredients": ["could not analyze image"],
-                    "health_assessment": "Analysis failed. Please try again later.",
-                    "source": "https://fdc.nal.usda.gov/"
-                }
-            }
+            
+        # Validate URL format if provided
+        if image_url and not image_url.startswith(('http://', 'https://')):
             return https_fn.Response(
-                json.dumps(error_response),
-                status=200,  # Return 200 with error info instead of 500
+                json.dumps({'error': 'Invalid image URL format. Must start with http:// or https://'}),
+                status=400,
                 headers={'Content-Type': 'application/json'}
             )
+
+        if image_url:
+            print(f"Processing image URL: {image_url[:50]}...")
+        else:
+            print(f"Processing base64 image data ({len(image_base64)} characters)")
+        
+        # Decode the upload once; it stays binary until it is streamed to the model
+        image_payload = None
+        if image_base64:
+            try:
+                image_payload = ImagePayload.from_base64(image_base64)
+                image_base64 = None
+            except ValueError as decode_error:
+                print(f"⚠️ Could not decode base64 image, sending it as-is: {str(decode_error)}")
+
+        return _analyze_meal_image(image_url, image_base64, image_payload, image_name, stream_events)
         
     except Exception as e:
         print(f"Error in analyze_meal_image: {str(e)}")
@@ -428,6 +522,68 @@ Important:
             headers={'Content-Type': 'application/json'}
         )
 
+@https_fn.on_request()
+def analyze_meal_image_upload(req: https_fn.Request) -> https_fn.Response:
+    """Analyze a meal image uploaded as multipart/form-data or a raw image/* body"""
+    try:
+        if req.method != 'POST':
+            return https_fn.Response(
+                json.dumps({'error': 'Only POST method is allowed'}),
+                status=405,
+                headers={'Content-Type': 'application/json'}
+            )
+
+        # Rejects oversized uploads from Content-Length before reading the body
+        try:
+            image_payload, image_name = read_image_upload(req, MAX_FILE_SIZE)
+        except ImageUploadError as upload_error:
+            print(f"❌ Rejected image upload: {str(upload_error)}")
+            return https_fn.Response(
+                json.dumps({'error': str(upload_error)}),
+                status=upload_error.status,
+                headers={'Content-Type': 'application/json'}
+            )
+
+        print(f"Received image upload for analysis: {image_name} ({len(image_payload)} bytes, {image_payload.mime_type})")
+        stream_events = req.args.get('stream') == 'true' or 'text/event-stream' in req.headers.get('Accept', '')
+        return _analyze_meal_image(None, None, image_payload, image_name, stream_events)
+
+    except Exception as e:
+        print(f"Error in analyze_meal_image_upload: {str(e)}")
+        return https_fn.Response(
+            json.dumps({
+                "error": "General error occurred",
+                "message": str(e)
+            }),
+            status=500,
+            headers={'Content-Type': 'application/json'}
+        )
+
+@https_fn.on_request()
+def autocomplete_ingredient(req: https_fn.Request) -> https_fn.Response:
+    """Autocomplete ingredient names typed in English, Hebrew, Russian or Spanish"""
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Content-Type': 'application/json'
+    }
+    if req.method == 'OPTIONS':
+        return https_fn.Response('', status=204, headers={**headers, 'Access-Control-Allow-Methods': 'GET', 'Access-Control-Max-Age': '3600'})
+
+    query = req.args.get('q', '')
+    language = req.args.get('lang')
+    try:
+        limit = int(req.args.get('limit', INGREDIENT_INDEX_CONFIG['MAX_RESULTS']))
+    except ValueError:
+        return https_fn.Response(json.dumps({'error': 'limit must be an integer'}), status=400, headers=headers)
+
+    # Served from the in-memory name index; matches map back to the canonical English name
+    results = autocomplete_ingredients(query, language, min(max(limit, 1), 50))
+    return https_fn.Response(
+        json.dumps({'query': query, 'results': results}, ensure_ascii=False),
+        status=200,
+        headers=headers
+    )
+
 @https_fn.on_request()
 def global_auth(req: https_fn.Request) -> https_fn.Response:
     """Handle email verification code generation and sending"""
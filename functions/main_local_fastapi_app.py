@@ -26,7 +26,7 @@
 #     analyze_invoice_service,
 #     get_recipe_service
 # )
-# from .utils import process_ingredient_nutrition_data
+# from .utils import process_ingredient_nutrition_data, get_recipe_logic_async
 #
 # app = FastAPI()
 #
@@ -92,10 +92,11 @@
 # @app.get("/get_recipe")
 # async def get_recipe(request: Request):
 #     params = dict(request.query_params)
-#     service_result = get_recipe_service(params)
-#     if 'error' in service_result:
-#         raise HTTPException(status_code=500, detail=service_result['error'])
-#     return JSONResponse(content=service_result['result'])
+#     # Awaited on the server's loop: get_recipe_logic() would block it on the background loop
+#     result = await get_recipe_logic_async(params)
+#     if 'error' in result:
+#         raise HTTPException(status_code=500, detail=result['error'])
+#     return JSONResponse(content=result)
 #
 # # For local run: uvicorn functions.fastapi_app:app --reload
 #
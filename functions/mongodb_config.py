@@ -4,10 +4,24 @@ MongoDB configuration and helper functions for the Kali Mobile Firebase Function
 """
 
 import os
+import re
 import logging
 from datetime import datetime
+from itertools import islice
 from typing import Dict, List, Tuple, Optional, Any
 
+try:
+    from pymongo.errors import BulkWriteError
+except ImportError:
+    class BulkWriteError(Exception):
+        details = None
+
+from text_normalization import ANY_LANGUAGE, long_query_words, normalize_text, query_tokens
+from fuzzy_matcher import fuzzy_ingredient_matches
+from search_index import matches_full_words
+from nutrition_validation import FIELDS as NUTRITION_FIELDS, PER_100G_FIELDS, check_nutrition_rules
+from unit_parser import parse_nutrient
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -86,6 +100,8 @@ try:
     NORMALIZED_INGREDIENTS_COLLECTION = os.environ.get("MONGODB_NORMALIZED_INGREDIENTS_COLLECTION", "normalized_ingredients_v5")
     INGREDIENTS_NUTRITION_COLLECTION = os.environ.get("MONGODB_INGREDIENTS_NUTRITION_COLLECTION", "ingredients_nutrition_v5")
     INGREDIENT_CATEGORIES_COLLECTION = os.environ.get("MONGODB_INGREDIENT_CATEGORIES_COLLECTION", "ingredient_categories_v5")
+    ANALYSIS_CACHE_COLLECTION = os.environ.get("MONGODB_ANALYSIS_CACHE_COLLECTION", "analysis_cache")
+    GPT_RECIPES_COLLECTION = os.environ.get("MONGODB_GPT_RECIPES_COLLECTION", "gpt_recipes")
     
     # Define collections
     ingredients_collection = db[INGREDIENTS_COLLECTION]
@@ -95,6 +111,8 @@ try:
     normalized_ingredients_collection = db[NORMALIZED_INGREDIENTS_COLLECTION]
     ingredients_nutrition_collection = db[INGREDIENTS_NUTRITION_COLLECTION]
     ingredient_categories_collection = db[INGREDIENT_CATEGORIES_COLLECTION]
+    analysis_cache_collection = db[ANALYSIS_CACHE_COLLECTION]
+    gpt_recipes_collection = db[GPT_RECIPES_COLLECTION]
     
     logger.info(f"📁 Collections configured: {INGREDIENTS_COLLECTION}, {VALIDATION_ERRORS_COLLECTION}, {MEAL_ANALYSIS_COLLECTION}")
     
@@ -109,6 +127,61 @@ except Exception as e:
     normalized_ingredients_collection = None
     ingredients_nutrition_collection = None
     ingredient_categories_collection = None
+    analysis_cache_collection = None
+    gpt_recipes_collection = None
+
+# Use the normalized search_key/search_tokens fields (see search_index.py) instead of $regex scans
+INDEXED_SEARCH_ENABLED = os.environ.get("MONGODB_INDEXED_SEARCH", "false").lower() == "true"
+
+def _indexed_name_query(query: str, language: str = None) -> dict:
+    """
+    Build an index-backed filter matching every query word as a word prefix
+
+    Matches the language-neutral tokens and, if given, the tokens of one
+    names.<language> entry. Queries without a word long enough to be
+    tokenized fall back to an anchored prefix match on search_key.
+    """
+    any_tokens = query_tokens(query, ANY_LANGUAGE)
+    if not any_tokens:
+        return {"search_key": {"$regex": f"^{re.escape(normalize_text(query))}"}}
+    clauses = [{"search_tokens": {"$all": any_tokens}}]
+    if language and language != ANY_LANGUAGE:
+        clauses.append({"search_tokens": {"$all": query_tokens(query, language)}})
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+def _documents_for_matches(collection, matches: List[Dict]) -> List[Dict]:
+    """Fetch the documents for fuzzy matches by _id in one query, keeping the match ranking and scores"""
+    if not matches:
+        return []
+    by_id = {}
+    for document in collection.find({"_id": {"$in": [match["id"] for match in matches]}}, {"search_tokens": 0}):
+        by_id[document.pop("_id")] = document
+    results = []
+    for match in matches:
+        document = by_id.get(match["id"])
+        if document is not None:
+            results.append({**document, "score": match["score"], "match": match["match"], "distance": match["distance"]})
+    return results
+
+def _validation_error_document(ingredient_name: str, error_details: dict, original_data: dict = None) -> dict:
+    return {
+        "ingredient_name": ingredient_name,
+        "error_details": error_details,
+        "original_data": original_data,
+        "timestamp": datetime.utcnow(),
+        "status": "pending_review"
+    }
+
+def _ingredient_document(ingredient_data: dict) -> dict:
+    # Add timestamp
+    ingredient_data["created_at"] = datetime.utcnow()
+    ingredient_data["updated_at"] = datetime.utcnow()
+    return ingredient_data
+
+def _meal_analysis_document(analysis_data: dict) -> dict:
+    # Add timestamp
+    analysis_data["created_at"] = datetime.utcnow()
+    return analysis_data
 
 def save_validation_error(ingredient_name: str, error_details: dict, original_data: dict = None) -> bool:
     """
@@ -127,13 +200,7 @@ def save_validation_error(ingredient_name: str, error_details: dict, original_da
             logger.warning("MongoDB validation_errors collection not available")
             return False
             
-        error_document = {
-            "ingredient_name": ingredient_name,
-            "error_details": error_details,
-            "original_data": original_data,
-            "timestamp": datetime.utcnow(),
-            "status": "pending_review"
-        }
+        error_document = _validation_error_document(ingredient_name, error_details, original_data)
         
         result = validation_errors_collection.insert_one(error_document)
         logger.info(f"✅ Validation error saved for {ingredient_name} with ID: {result.inserted_id}")
@@ -158,11 +225,7 @@ def save_ingredient_to_mongo(ingredient_data: dict) -> bool:
             logger.warning("MongoDB ingredients collection not available")
             return False
             
-        # Add timestamp
-        ingredient_data["created_at"] = datetime.utcnow()
-        ingredient_data["updated_at"] = datetime.utcnow()
-        
-        result = ingredients_collection.insert_one(ingredient_data)
+        result = ingredients_collection.insert_one(_ingredient_document(ingredient_data))
         logger.info(f"✅ Ingredient saved to MongoDB with ID: {result.inserted_id}")
         return True
         
@@ -185,10 +248,7 @@ def save_meal_analysis_to_mongo(analysis_data: dict) -> bool:
             logger.warning("MongoDB meal_analysis collection not available")
             return False
             
-        # Add timestamp
-        analysis_data["created_at"] = datetime.utcnow()
-        
-        result = meal_analysis_collection.insert_one(analysis_data)
+        result = meal_analysis_collection.insert_one(_meal_analysis_document(analysis_data))
         logger.info(f"✅ Meal analysis saved to MongoDB with ID: {result.inserted_id}")
         return True
         
@@ -196,6 +256,117 @@ def save_meal_analysis_to_mongo(analysis_data: dict) -> bool:
         logger.error(f"❌ Failed to save meal analysis to MongoDB: {str(e)}")
         return False
 
+class AnalysisWriteBatch:
+    """
+    Accumulates ingredient, validation error and meal analysis documents
+    
+    flush() writes each collection with a single unordered insert_many, so a
+    scan with dozens of ingredients costs one round trip per collection and
+    one bad document does not stop the rest. Used as a context manager, the
+    batch is flushed on exit.
+    """
+    
+    def __init__(self, ingredients=None, validation_errors=None, meal_analysis=None):
+        self._collections = {
+            "ingredients": ingredients if ingredients is not None else ingredients_collection,
+            "validation_errors": validation_errors if validation_errors is not None else validation_errors_collection,
+            "meal_analysis": meal_analysis if meal_analysis is not None else meal_analysis_collection
+        }
+        self._pending: Dict[str, List[Tuple[str, dict]]] = {name: [] for name in self._collections}
+    
+    def add_ingredient(self, ingredient_data: dict) -> None:
+        self._pending["ingredients"].append((ingredient_data.get("name", ""), _ingredient_document(ingredient_data)))
+    
+    def add_validation_error(self, ingredient_name: str, error_details: dict, original_data: dict = None) -> None:
+        self._pending["validation_errors"].append(
+            (ingredient_name, _validation_error_document(ingredient_name, error_details, original_data))
+        )
+    
+    def add_meal_analysis(self, analysis_data: dict) -> None:
+        self._pending["meal_analysis"].append((analysis_data.get("analysis_type", ""), _meal_analysis_document(analysis_data)))
+    
+    def add_document(self, collection_name: str, label: str, document: dict) -> None:
+        """Queue an already built document, e.g. one replayed from the write-behind spill file"""
+        self._pending[collection_name].append((label, document))
+    
+    def take_entries(self) -> List[Tuple[str, str, dict]]:
+        """Remove and return all pending (collection name, label, document) entries"""
+        entries = [(name, label, document) for name, pending in self._pending.items() for label, document in pending]
+        self._pending = {name: [] for name in self._collections}
+        return entries
+    
+    def merge(self, other: "AnalysisWriteBatch") -> None:
+        """Move all pending documents of another batch into this one"""
+        for name, label, document in other.take_entries():
+            self.add_document(name, label, document)
+    
+    def __len__(self) -> int:
+        return sum(len(documents) for documents in self._pending.values())
+    
+    def flush(self, include_documents: bool = False) -> Dict[str, Any]:
+        """
+        Write all pending documents and clear the batch
+        
+        Args:
+            include_documents: Add the failed "document" and whether the failure is
+                "retryable" (the server was not reached) to each failure entry
+        
+        Returns:
+            dict: {"inserted": {collection: count}, "failed": [{"collection", "index", "label", "error"}]}
+        """
+        inserted: Dict[str, int] = {}
+        failed: List[Dict[str, Any]] = []
+        for name, entries in self._pending.items():
+            if not entries:
+                continue
+            self._pending[name] = []
+            labels = [label for label, _ in entries]
+            documents = [document for _, document in entries]
+            collection = self._collections[name]
+            
+            def _failure(index: int, error: str, retryable: bool) -> dict:
+                entry = {
+                    "collection": name,
+                    "index": index,
+                    "label": labels[index] if index is not None and index < len(labels) else None,
+                    "error": error
+                }
+                if include_documents:
+                    entry["document"] = documents[index] if index is not None and index < len(documents) else None
+                    entry["retryable"] = retryable
+                return entry
+            
+            if collection is None:
+                logger.warning(f"MongoDB {name} collection not available")
+                failed.extend(_failure(i, "collection not available", True) for i in range(len(documents)))
+                inserted[name] = 0
+                continue
+            
+            try:
+                result = collection.insert_many(documents, ordered=False)
+                inserted[name] = len(result.inserted_ids)
+            except BulkWriteError as e:
+                details = e.details or {}
+                inserted[name] = details.get("nInserted", 0)
+                for write_error in details.get("writeErrors", []):
+                    failed.append(_failure(write_error.get("index"), write_error.get("errmsg", "unknown write error"), False))
+            except Exception as e:
+                inserted[name] = 0
+                failed.extend(_failure(i, str(e), True) for i in range(len(documents)))
+        
+        for failure in failed:
+            logger.error(f"❌ Failed to save {failure['collection']} document '{failure['label']}': {failure['error']}")
+        if inserted:
+            logger.info(f"✅ Batch saved to MongoDB: {inserted} ({len(failed)} failed)")
+        return {"inserted": inserted, "failed": failed}
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        return False
+
 def validate_nutrition_data(ingredient_name: str, nutrition_data: dict) -> Tuple[bool, dict]:
     """
     Validate nutrition data for an ingredient
@@ -211,48 +382,33 @@ def validate_nutrition_data(ingredient_name: str, nutrition_data: dict) -> Tuple
     
     try:
         # Check required fields
-        required_fields = ["proteins", "carbohydrates", "fats", "calories"]
-        for field in required_fields:
+        for field in NUTRITION_FIELDS:
             if field not in nutrition_data:
                 errors.append(f"Missing required field: {field}")
             elif not nutrition_data[field]:
                 errors.append(f"Empty value for required field: {field}")
         
-        # Validate numeric values
-        numeric_fields = ["proteins", "carbohydrates", "fats", "calories"]
-        for field in numeric_fields:
+        # Parse numeric values
+        values = {}
+        for field in NUTRITION_FIELDS:
             if field in nutrition_data and nutrition_data[field]:
-                try:
-                    value = float(str(nutrition_data[field]).replace("g", "").replace("kcal", ""))
-                    if value < 0:
-                        errors.append(f"Negative value for {field}: {value}")
-                    if value > 10000:  # Reasonable upper limit
-                        errors.append(f"Unrealistically high value for {field}: {value}")
-                except ValueError:
+                value = parse_nutrient(field, nutrition_data[field])
+                if value is None:
                     errors.append(f"Invalid numeric value for {field}: {nutrition_data[field]}")
+                else:
+                    values[field] = value
         
-        # Special validation for alcoholic beverages
-        if "category" in nutrition_data and "alcoholic" in nutrition_data["category"].lower():
-            if "calories" in nutrition_data:
-                try:
-                    calories = float(str(nutrition_data["calories"]).replace("kcal", ""))
-                    if calories < 50:  # Alcoholic beverages typically have higher calories
-                        errors.append(f"Alcoholic beverage has unusually low calories: {calories}")
-                except ValueError:
-                    pass
-        
-        # Validate per 100g values if present
-        per_100g_fields = ["proteins_per_100g", "carbohydrates_per_100g", "fats_per_100g", "calories_per_100g"]
-        for field in per_100g_fields:
+        # Parse per 100g values if present
+        for field in PER_100G_FIELDS:
             if field in nutrition_data and nutrition_data[field] is not None:
-                try:
-                    value = float(nutrition_data[field])
-                    if value < 0:
-                        errors.append(f"Negative value for {field}: {value}")
-                    if value > 1000:  # Reasonable upper limit for per 100g
-                        errors.append(f"Unrealistically high value for {field}: {value}")
-                except ValueError:
+                value = parse_nutrient(field, nutrition_data[field])
+                if value is None:
                     errors.append(f"Invalid numeric value for {field}: {nutrition_data[field]}")
+                else:
+                    values[field] = value
+        
+        # Range, alcoholic-beverage, macro total and calorie rules from the shared rule table
+        errors.extend(message for _, message in check_nutrition_rules(values, nutrition_data.get("category")))
         
         is_valid = len(errors) == 0
         error_details = {
@@ -277,7 +433,7 @@ def find_ingredient(query: str, search_type: str = "partial", limit: int = 10, l
     
     Args:
         query: Search query
-        search_type: Type of search (exact, partial, fuzzy, multilingual)
+        search_type: Type of search (exact, partial, fuzzy, multilingual, indexed)
         limit: Maximum number of results
         language: Language for multilingual search
         
@@ -304,11 +460,16 @@ def find_ingredient(query: str, search_type: str = "partial", limit: int = 10, l
             ).limit(limit))
             
         elif search_type == "fuzzy":
-            # Fuzzy search using text index
-            results = list(ingredient_names_collection.find(
-                {"$text": {"$search": query}},
-                {"_id": 0, "score": {"$meta": "textScore"}}
-            ).sort([("score", {"$meta": "textScore"})]).limit(limit))
+            # Typo-tolerant match in any language from the in-memory matcher, ranked by score
+            matches = fuzzy_ingredient_matches(query, limit=limit)
+            if matches is not None:
+                results = _documents_for_matches(ingredient_names_collection, matches)
+            else:
+                # Fuzzy search using text index
+                results = list(ingredient_names_collection.find(
+                    {"$text": {"$search": query}},
+                    {"_id": 0, "score": {"$meta": "textScore"}}
+                ).sort([("score", {"$meta": "textScore"})]).limit(limit))
             
         elif search_type == "multilingual":
             # Multilingual search
@@ -317,6 +478,22 @@ def find_ingredient(query: str, search_type: str = "partial", limit: int = 10, l
                 {"_id": 0}
             ).limit(limit))
             
+        elif search_type == "indexed":
+            # Word-prefix search on the name and names.<language>, served by the search_tokens index
+            cursor = ingredient_names_collection.find(
+                _indexed_name_query(query, language),
+                {"_id": 0, "search_tokens": 0}
+            )
+            long_words = long_query_words(query)
+            if long_words:
+                # Tokens stop at MAX_PREFIX_LENGTH characters, so check the longer query words in full
+                results = list(islice(
+                    (document for document in cursor if matches_full_words(document, "name", long_words, language)),
+                    limit
+                ))
+            else:
+                results = list(cursor.limit(limit))
+            
         else:
             logger.warning(f"Unknown search type: {search_type}")
             return []
@@ -327,13 +504,14 @@ def find_ingredient(query: str, search_type: str = "partial", limit: int = 10, l
         logger.error(f"❌ Error finding ingredients: {str(e)}")
         return []
 
-def find_ingredient_by_category(category: str, limit: int = 10) -> List[Dict]:
+def find_ingredient_by_category(category: str, limit: int = 10, indexed: bool = None) -> List[Dict]:
     """
     Find ingredients by category
     
     Args:
         category: Category to search for
         limit: Maximum number of results
+        indexed: Use the search index fields (defaults to MONGODB_INDEXED_SEARCH)
         
     Returns:
         List of ingredients in the category
@@ -343,10 +521,16 @@ def find_ingredient_by_category(category: str, limit: int = 10) -> List[Dict]:
             logger.warning("MongoDB ingredient_categories collection not available")
             return []
         
-        results = list(ingredient_categories_collection.find(
-            {"category": {"$regex": category, "$options": "i"}},
-            {"_id": 0}
-        ).limit(limit))
+        if indexed if indexed is not None else INDEXED_SEARCH_ENABLED:
+            results = list(ingredient_categories_collection.find(
+                _indexed_name_query(category),
+                {"_id": 0, "search_tokens": 0}
+            ).limit(limit))
+        else:
+            results = list(ingredient_categories_collection.find(
+                {"category": {"$regex": category, "$options": "i"}},
+                {"_id": 0}
+            ).limit(limit))
         
         return results
         
@@ -354,12 +538,13 @@ def find_ingredient_by_category(category: str, limit: int = 10) -> List[Dict]:
         logger.error(f"❌ Error finding ingredients by category: {str(e)}")
         return []
 
-def find_ingredient_nutrition(ingredient_name: str) -> Optional[Dict]:
+def find_ingredient_nutrition(ingredient_name: str, indexed: bool = None) -> Optional[Dict]:
     """
     Find nutrition information for an ingredient
     
     Args:
         ingredient_name: Name of the ingredient
+        indexed: Use the search index fields (defaults to MONGODB_INDEXED_SEARCH)
         
     Returns:
         Nutrition data or None if not found
@@ -369,10 +554,17 @@ def find_ingredient_nutrition(ingredient_name: str) -> Optional[Dict]:
             logger.warning("MongoDB ingredients_nutrition collection not available")
             return None
         
-        result = ingredients_nutrition_collection.find_one(
-            {"name": {"$regex": ingredient_name, "$options": "i"}},
-            {"_id": 0}
-        )
+        if indexed if indexed is not None else INDEXED_SEARCH_ENABLED:
+            # Prefer the exact normalized name, then any name containing all the words as prefixes
+            projection = {"_id": 0, "search_tokens": 0}
+            result = ingredients_nutrition_collection.find_one({"search_key": normalize_text(ingredient_name)}, projection)
+            if result is None:
+                result = ingredients_nutrition_collection.find_one(_indexed_name_query(ingredient_name), projection)
+        else:
+            result = ingredients_nutrition_collection.find_one(
+                {"name": {"$regex": ingredient_name, "$options": "i"}},
+                {"_id": 0}
+            )
         
         return result
         
@@ -380,13 +572,14 @@ def find_ingredient_nutrition(ingredient_name: str) -> Optional[Dict]:
         logger.error(f"❌ Error finding ingredient nutrition: {str(e)}")
         return None
 
-def find_similar_ingredients(ingredient_name: str, limit: int = 5) -> List[Dict]:
+def find_similar_ingredients(ingredient_name: str, limit: int = 5, indexed: bool = None) -> List[Dict]:
     """
     Find similar ingredients
     
     Args:
         ingredient_name: Name of the ingredient
         limit: Maximum number of results
+        indexed: Use the search index fields (defaults to MONGODB_INDEXED_SEARCH)
         
     Returns:
         List of similar ingredients
@@ -396,19 +589,46 @@ def find_similar_ingredients(ingredient_name: str, limit: int = 5) -> List[Dict]
             logger.warning("MongoDB normalized_ingredients collection not available")
             return []
         
+        use_index = indexed if indexed is not None else INDEXED_SEARCH_ENABLED
+        
         # Find the base ingredient first
-        base_ingredient = normalized_ingredients_collection.find_one(
-            {"base_ingredient_name": {"$regex": ingredient_name, "$options": "i"}},
-            {"_id": 0}
-        )
+        if use_index:
+            base_ingredient = normalized_ingredients_collection.find_one(
+                _indexed_name_query(ingredient_name),
+                {"_id": 0, "search_tokens": 0}
+            )
+        else:
+            base_ingredient = normalized_ingredients_collection.find_one(
+                {"base_ingredient_name": {"$regex": ingredient_name, "$options": "i"}},
+                {"_id": 0}
+            )
+        
+        match = None
+        if base_ingredient is None:
+            # Misspelled or transliterated names: try the best fuzzy candidates in rank order
+            for match in fuzzy_ingredient_matches(ingredient_name, limit=3) or []:
+                # search_key also finds stored names that differ in case or surrounding whitespace
+                base_ingredient = normalized_ingredients_collection.find_one(
+                    {"search_key": normalize_text(match["name"])} if use_index else {"base_ingredient_name": match["name"]},
+                    {"_id": 0, "search_tokens": 0}
+                )
+                if base_ingredient:
+                    break
         
         if base_ingredient:
-            # Find similar ingredients in the same category
+            # Find similar ingredients in the same category (category + search_key index)
             category = base_ingredient.get("category", "")
+            base_name = base_ingredient.get("base_ingredient_name", match["name"]) if match else ingredient_name
+            projection = {"_id": 0, "search_tokens": 0} if use_index else {"_id": 0}
             results = list(normalized_ingredients_collection.find(
-                {"category": category, "base_ingredient_name": {"$ne": ingredient_name}},
-                {"_id": 0}
+                {"category": category, "base_ingredient_name": {"$ne": base_name}},
+                projection
             ).limit(limit))
+            if match:
+                # Tell the caller which ingredient the query was resolved to, and how confidently
+                for result in results:
+                    result["matched_ingredient"] = match["name"]
+                    result["match_score"] = match["score"]
             
             return results
         else:
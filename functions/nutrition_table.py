@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+In-memory nutrition table for the two-stage refrigerator/invoice analysis
+
+In two-stage mode the vision model only lists the detected items and their
+weights. Per-100g macros for items already curated in
+ingredients_nutrition_v5 come from this table: one float matrix row per
+canonical ingredient, so filling a whole image is a single
+per_100g[rows] * weights / 100 multiplication. Only the items the table does
+not know are sent back to the model for enrichment.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from config import TWO_STAGE_NUTRITION_CONFIG
+from ingredient_resolver import base_name, resolve_ingredient, singular_forms
+from text_normalization import normalize_text
+from unit_parser import parse_nutrient, to_grams
+
+logger = logging.getLogger(__name__)
+
+MACRO_FIELDS = ("proteins", "carbohydrates", "fats", "calories")
+MACRO_UNITS = {"proteins": "g", "carbohydrates": "g", "fats": "g", "calories": "kcal"}
+# Value of nutrition_source on entries filled from the table (they are not stored again)
+TABLE_SOURCE = "ingredients_nutrition_v5"
+
+def _document_keys(document: dict) -> List[str]:
+    names = [document.get("name")]
+    base = document.get("base_ingredient_name")
+    names.extend(base if isinstance(base, list) else [base])
+    return [key for key in dict.fromkeys(normalize_text(name) for name in names if isinstance(name, str)) if key]
+
+class NutritionTable:
+    """Per-100g macros of known ingredients as a (rows x 4) float matrix"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.per_100g = np.zeros((0, len(MACRO_FIELDS)), dtype=np.float64)
+        self.metadata: List[Dict[str, Any]] = []
+        self._row_by_key: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.metadata)
+
+    def load(self, documents: Iterable[dict]) -> int:
+        """
+        Replace the table with ingredients_nutrition documents
+
+        Documents without all four per-100g values are skipped.
+
+        Returns:
+            int: Number of rows loaded
+        """
+        rows = []
+        metadata = []
+        row_by_key = {}
+        for document in documents:
+            values = [parse_nutrient(field, document.get(f"{field}_per_100g")) for field in MACRO_FIELDS]
+            keys = _document_keys(document)
+            if not keys or any(value is None for value in values):
+                continue
+            row = len(rows)
+            rows.append(values)
+            metadata.append({
+                "name": document.get("name") or keys[0],
+                "category": document.get("category", "Other"),
+                "possible_measurement": document.get("possible_measurement", {}),
+                "names": document.get("names", {}),
+                "data_source": document.get("data_source", TABLE_SOURCE)
+            })
+            for key in keys:
+                row_by_key.setdefault(key, row)
+        per_100g = np.array(rows, dtype=np.float64).reshape(len(rows), len(MACRO_FIELDS))
+        with self._lock:
+            self.per_100g = per_100g
+            self.metadata = metadata
+            self._row_by_key = row_by_key
+        return len(rows)
+
+    def row_for(self, raw_name: str, resolve: Optional[Callable] = resolve_ingredient) -> int:
+        """
+        Table row for a detected item name, or -1 when unknown
+
+        Tries the name, its base name without varieties and their singulars,
+        then the canonical name from the ingredient resolver.
+        """
+        return self._row_for(raw_name, resolve, self._row_by_key)
+
+    @staticmethod
+    def _row_for(raw_name: str, resolve: Optional[Callable], row_by_key: Dict[str, int]) -> int:
+        for name in dict.fromkeys((raw_name, base_name(raw_name))):
+            for key in singular_forms(normalize_text(name)):
+                row = row_by_key.get(key)
+                if row is not None:
+                    return row
+        resolved = resolve(raw_name) if resolve is not None else None
+        if resolved is not None:
+            row = row_by_key.get(normalize_text(resolved.name))
+            if row is not None:
+                return row
+        return -1
+
+    def fill(self, items: List[dict], resolve: Optional[Callable] = resolve_ingredient) -> Tuple[Dict[str, dict], List[dict]]:
+        """
+        Compute macros for detected items from the table
+
+        Args:
+            items: Detected items, each {"name": ..., "weight": "450g", ...}
+            resolve: Raw name -> ResolvedIngredient, used when the name is not in the table
+
+        Returns:
+            tuple: (macronutrients_by_ingredient entries for known items, items the table does not know)
+        """
+        with self._lock:
+            per_100g, metadata, row_by_key = self.per_100g, self.metadata, self._row_by_key
+        named = [item for item in items if isinstance(item, dict) and item.get("name")]
+        rows = np.fromiter(
+            (self._row_for(item["name"], resolve, row_by_key) for item in named), dtype=np.int64, count=len(named)
+        )
+        weights = np.fromiter(
+            (to_grams(item.get("weight")) or np.nan for item in named), dtype=np.float64, count=len(named)
+        )
+        known = (rows >= 0) & np.isfinite(weights) & (weights > 0)
+        totals = np.round(per_100g[rows[known]] * (weights[known] / 100.0)[:, None], 2)
+
+        entries = {}
+        known_items = [item for item, ok in zip(named, known) if ok]
+        for item, row, weight, values in zip(known_items, rows[known], weights[known], totals):
+            meta = metadata[row]
+            entry = {
+                "category": meta["category"],
+                "possible_measurement": meta["possible_measurement"],
+                "base_ingredient_name": [meta["name"]],
+                "names": meta["names"],
+                "data_source": meta["data_source"],
+                "weight": f"{weight:g}g",
+                "nutrition_source": TABLE_SOURCE
+            }
+            for field, value, value_per_100g in zip(MACRO_FIELDS, values, per_100g[row]):
+                entry[field] = f"{value:g}{MACRO_UNITS[field]}"
+                entry[f"{field}_per_100g"] = float(value_per_100g)
+            entries[item["name"]] = entry
+        unknown = [item for item, ok in zip(named, known) if not ok]
+        return entries, unknown
+
+def complete_detection_result(result: dict, enrich: Optional[Callable[[List[dict]], dict]] = None,
+                              table: Optional["NutritionTable"] = None) -> dict:
+    """
+    Turn a detection-only result into the usual macronutrients_by_ingredient shape
+
+    Args:
+        result: Model output with an "items" list of {"name", "weight"}
+        enrich: Called with the items the table does not know; returns their
+            macronutrients_by_ingredient entries (e.g. from a text-only model call)
+        table: Nutrition table to use (defaults to the shared one)
+
+    Returns:
+        dict: The result with macronutrients_by_ingredient, plus unresolved_items when some stay unknown
+    """
+    items = result.get("items") or []
+    table = table if table is not None else get_nutrition_table()
+    if table is not None:
+        entries, unknown = table.fill(items)
+    else:
+        entries, unknown = {}, [item for item in items if isinstance(item, dict) and item.get("name")]
+
+    if unknown and enrich is not None:
+        enriched = enrich(unknown) or {}
+        for item in unknown:
+            entry = enriched.get(item["name"])
+            if isinstance(entry, dict):
+                entry.setdefault("nutrition_source", "model")
+                entries[item["name"]] = entry
+        unknown = [item for item in unknown if item["name"] not in entries]
+
+    result["macronutrients_by_ingredient"] = entries
+    result.setdefault("total_items", len(items))
+    if unknown:
+        result["unresolved_items"] = unknown
+    logger.info(f"📊 Two-stage nutrition: {len(items) - len(unknown)} of {len(items)} items filled")
+    return result
+
+def _load_nutrition_documents() -> Iterable[dict]:
+    from mongodb_config import ingredients_nutrition_collection
+
+    if ingredients_nutrition_collection is None:
+        raise RuntimeError("ingredients_nutrition collection not available")
+    fields = ["name", "base_ingredient_name", "category", "possible_measurement", "names", "data_source"]
+    projection = {field: 1 for field in fields + [f"{macro}_per_100g" for macro in MACRO_FIELDS]}
+    return ingredients_nutrition_collection.find({}, projection)
+
+_table = None
+_table_loaded_at = None
+_table_lock = threading.Lock()
+
+def get_nutrition_table() -> Optional[NutritionTable]:
+    """
+    Return the shared nutrition table, reloading it every REFRESH_INTERVAL_SECONDS
+
+    Returns None when MongoDB is not available and no table has been loaded yet.
+    """
+    global _table, _table_loaded_at
+    interval = TWO_STAGE_NUTRITION_CONFIG['REFRESH_INTERVAL_SECONDS']
+    if _table_loaded_at is not None and time.monotonic() - _table_loaded_at < interval:
+        return _table
+    with _table_lock:
+        if _table_loaded_at is None or time.monotonic() - _table_loaded_at >= interval:
+            _table_loaded_at = time.monotonic()
+            try:
+                table = NutritionTable()
+                count = table.load(_load_nutrition_documents())
+                _table = table
+                logger.info(f"✅ Nutrition table loaded: {count} ingredients")
+            except Exception as e:
+                logger.error(f"❌ Failed to load nutrition table: {str(e)}")
+    return _table
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Nutrition validation rules shared by the single-item and batch validators
+
+The limits live in one declarative table, RULE_TABLE, keyed by category
+profile ("regular", "alcoholic"); categories such as Alcoholic or Liquor map
+to a profile through CATEGORY_PROFILES / CATEGORY_PROFILE_TERMS. At import
+every profile is compiled into CompiledRule objects holding both a scalar
+predicate (used per ingredient by validate_nutrition_data and
+validate_nutritional_values) and an array mask (used by the columnar batch
+validator).
+
+The batch validator parses every unit string into float columns,
+evaluates the masks and returns a bitmask of error codes per row.
+Persisting the failures is a separate step that queues them all on one
+AnalysisWriteBatch (a single insert_many).
+"""
+
+import logging
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from unit_parser import to_grams, to_kcal
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("proteins", "carbohydrates", "fats", "calories")
+PER_100G_FIELDS = tuple(f"{field}_per_100g" for field in FIELDS)
+UNITS = {"proteins": "g", "carbohydrates": "g", "fats": "g", "calories": "kcal"}
+LABELS = {"proteins": "protein", "carbohydrates": "carbohydrate", "fats": "fat", "calories": "calorie"}
+
+_TOTAL_RANGES = {field: (0.0, 10000.0) for field in FIELDS}
+
+# Per profile: (min, max) of each nutrition field (per-ingredient totals and
+# per-100g values), the per-100g macro total cap and the allowed gap between
+# stated calories and 4/4/9 kcal per g of protein/carbs/fat (None: not checked)
+RULE_TABLE = {
+    "regular": {
+        "label": "Food",
+        "ranges": {
+            **_TOTAL_RANGES,
+            "proteins_per_100g": (0.0, 100.0),
+            "carbohydrates_per_100g": (0.0, 100.0),
+            "fats_per_100g": (0.0, 100.0),
+            "calories_per_100g": (0.0, 900.0)
+        },
+        "max_macro_total_per_100g": 100.0,
+        "atwater_tolerance_per_100g": 50.0
+    },
+    "alcoholic": {
+        "label": "Alcoholic beverage",
+        "ranges": {
+            **_TOTAL_RANGES,
+            # Alcoholic beverages typically have higher calories
+            "calories": (50.0, 10000.0),
+            "proteins_per_100g": (0.0, 5.0),
+            "carbohydrates_per_100g": (0.0, 30.0),
+            "fats_per_100g": (0.0, 5.0),
+            "calories_per_100g": (0.0, 350.0)
+        },
+        # Ethanol carries 7 kcal/g, so the whole-food consistency checks do not apply
+        "max_macro_total_per_100g": None,
+        "atwater_tolerance_per_100g": None
+    }
+}
+DEFAULT_PROFILE = "regular"
+CATEGORY_PROFILES = {
+    "Alcoholic": "alcoholic",
+    "Alcohol": "alcoholic",
+    "Liquor": "alcoholic",
+    "Fortified Wine": "alcoholic",
+    "Liqueur": "alcoholic"
+}
+# Substrings of the lower-cased category, checked when there is no exact match
+CATEGORY_PROFILE_TERMS = (
+    ("alcoholic", "alcoholic"),
+    ("wine", "alcoholic"),
+    ("beer", "alcoholic"),
+    ("spirit", "alcoholic"),
+    ("liquor", "alcoholic")
+)
+
+class CompiledRule(NamedTuple):
+    code: str
+    fields: Tuple[str, ...]
+    violated: Callable[[Dict[str, float]], bool]
+    mask: Callable[[Dict[str, np.ndarray]], np.ndarray]
+    message: Callable[[Dict[str, float]], str]
+
+def _range_rule(key: str, low: float, high: float, profile: dict) -> CompiledRule:
+    field = key[:-len("_per_100g")] if key.endswith("_per_100g") else key
+    unit = UNITS[field]
+    qualifier = "" if profile is RULE_TABLE[DEFAULT_PROFILE] else f" for {profile['label'].lower()}"
+
+    def violated(values):
+        value = values[key]
+        return value < low or value > high
+
+    def mask(columns):
+        values = columns[key]
+        return (values < low) | (values > high)
+
+    def message(values):
+        value = values[key]
+        if key.endswith("_per_100g"):
+            return (f"Invalid {LABELS[field]} value{qualifier}: {value:g}{unit} "
+                    f"(should be between {low:g}-{high:g}{unit})")
+        if value > high:
+            return f"Unrealistically high value for {key}: {value:g}"
+        if low > 0:
+            return f"{profile['label']} has unusually low {key}: {value:g}"
+        return f"Negative value for {key}: {value:g}"
+
+    return CompiledRule(f"{key}_out_of_range", (key,), violated, mask, message)
+
+def _macro_total_rule(limit: float) -> CompiledRule:
+    proteins, carbs, fats = PER_100G_FIELDS[:3]
+
+    def violated(values):
+        return values[proteins] + values[carbs] + values[fats] > limit
+
+    def mask(columns):
+        return columns[proteins] + columns[carbs] + columns[fats] > limit
+
+    def message(values):
+        total = values[proteins] + values[carbs] + values[fats]
+        return f"Total macronutrients ({total:g}g) exceed {limit:g}g"
+
+    return CompiledRule("macro_total_exceeds_100g", (proteins, carbs, fats), violated, mask, message)
+
+def _atwater_rule(tolerance: float) -> CompiledRule:
+    proteins, carbs, fats, calories = PER_100G_FIELDS
+
+    def violated(values):
+        return abs(values[proteins] * 4 + values[carbs] * 4 + values[fats] * 9 - values[calories]) > tolerance
+
+    def mask(columns):
+        return np.abs(columns[proteins] * 4 + columns[carbs] * 4 + columns[fats] * 9 - columns[calories]) > tolerance
+
+    def message(values):
+        calculated = values[proteins] * 4 + values[carbs] * 4 + values[fats] * 9
+        return f"Calorie calculation mismatch: calculated {calculated:g}kcal vs provided {values[calories]:g}kcal"
+
+    return CompiledRule("calorie_mismatch", PER_100G_FIELDS, violated, mask, message)
+
+def compile_rules(table: Dict[str, dict]) -> Dict[str, Tuple[CompiledRule, ...]]:
+    """
+    Compile a rule table into per-profile rules
+
+    Range rules come first (totals, then per-100g values), followed by the
+    macro total and Atwater checks, so the first violation is the one the
+    validators have always reported first.
+    """
+    compiled = {}
+    for name, profile in table.items():
+        rules = [_range_rule(key, low, high, profile) for key, (low, high) in profile["ranges"].items()]
+        if profile.get("max_macro_total_per_100g") is not None:
+            rules.append(_macro_total_rule(profile["max_macro_total_per_100g"]))
+        if profile.get("atwater_tolerance_per_100g") is not None:
+            rules.append(_atwater_rule(profile["atwater_tolerance_per_100g"]))
+        compiled[name] = tuple(rules)
+    return compiled
+
+COMPILED_RULES = compile_rules(RULE_TABLE)
+
+# Error code -> bit in the per-row mask of the batch validator
+ERROR_CODES = [f"invalid_{key}" for key in FIELDS + PER_100G_FIELDS] + list(dict.fromkeys(
+    rule.code for rules in COMPILED_RULES.values() for rule in rules
+))
+ERROR_BITS = {code: np.uint32(1 << bit) for bit, code in enumerate(ERROR_CODES)}
+
+@lru_cache(maxsize=1024)
+def _profile_for(category: str) -> str:
+    profile = CATEGORY_PROFILES.get(category)
+    if profile is not None:
+        return profile
+    lowered = category.lower()
+    for term, profile in CATEGORY_PROFILE_TERMS:
+        if term in lowered:
+            return profile
+    return DEFAULT_PROFILE
+
+def category_profile(category: Any) -> str:
+    """Rule profile name for an ingredient category"""
+    return _profile_for(str(category)) if category else DEFAULT_PROFILE
+
+@lru_cache(maxsize=256)
+def _applicable_rules(profile: str, keys: Tuple[str, ...]) -> Tuple[CompiledRule, ...]:
+    present = set(keys)
+    return tuple(rule for rule in COMPILED_RULES[profile] if present.issuperset(rule.fields))
+
+def check_nutrition_rules(values: Dict[str, float], category: Any = None,
+                          first_only: bool = False) -> List[Tuple[str, str]]:
+    """
+    Evaluate the compiled rules of the category's profile on one ingredient
+
+    Args:
+        values: Parsed numbers keyed by field ("proteins", "calories_per_100g", ...);
+            rules on missing fields are skipped
+        category: Ingredient category
+        first_only: Stop at the first violation
+
+    Returns:
+        list: (error code, message) of every violated rule
+    """
+    violations = []
+    for rule in _applicable_rules(category_profile(category), tuple(values)):
+        if rule.violated(values):
+            violations.append((rule.code, rule.message(values)))
+            if first_only:
+                break
+    return violations
+
+def parse_quantities(values: Iterable[Any], field: str = "proteins") -> np.ndarray:
+    """
+    Parse "5.2g" / "500mg" / "120 kcal" / 5.2 values into a float column (NaN when unparseable)
+
+    Values are converted to the field's base unit (kcal for calories, grams
+    otherwise); repeated strings are served from the unit parser's LRU.
+    """
+    to_base = to_kcal if field.startswith("calories") else to_grams
+    values = list(values)
+    return np.fromiter(
+        (np.nan if number is None else number for number in map(to_base, values)), dtype=np.float64, count=len(values)
+    )
+
+class BatchValidationResult(NamedTuple):
+    codes: np.ndarray
+    values: Dict[str, np.ndarray]
+    profiles: np.ndarray
+
+    @property
+    def valid(self) -> np.ndarray:
+        return self.codes == 0
+
+    def invalid_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.codes)
+
+    def errors(self, row: int) -> List[str]:
+        """Error codes of one row"""
+        mask = self.codes[row]
+        return [code for code, bit in ERROR_BITS.items() if mask & bit]
+
+    def messages(self, row: int) -> List[str]:
+        """Readable messages for one row, worded like the single-item validators"""
+        values = {key: float(column[row]) for key, column in self.values.items()}
+        messages = [f"Invalid numeric value for {key}" for key, value in values.items() if np.isnan(value)]
+        codes = set(self.errors(row))
+        messages.extend(rule.message(values) for rule in COMPILED_RULES[self.profiles[row]] if rule.code in codes)
+        return messages
+
+def validate_nutrition_columns(columns: Dict[str, np.ndarray], categories: Sequence[Any]) -> BatchValidationResult:
+    """
+    Validate float columns against the compiled rules
+
+    Args:
+        columns: {"proteins_per_100g": array, ...}, NaN for unparseable; rules
+            on fields without a column are skipped
+        categories: Ingredient category per row
+
+    Returns:
+        BatchValidationResult with a uint32 error bitmask per row (0 = valid)
+    """
+    rows = len(categories)
+    profiles = np.fromiter((category_profile(category) for category in categories), dtype=object, count=rows)
+    codes = np.zeros(rows, dtype=np.uint32)
+    for key, values in columns.items():
+        codes[np.isnan(values)] |= ERROR_BITS[f"invalid_{key}"]
+    for name, rules in COMPILED_RULES.items():
+        in_profile = profiles == name
+        if not in_profile.any():
+            continue
+        for rule in rules:
+            if all(key in columns for key in rule.fields):
+                codes[in_profile & rule.mask(columns)] |= ERROR_BITS[rule.code]
+    return BatchValidationResult(codes, dict(columns), profiles)
+
+def validate_nutrition_batch(rows: Sequence[Dict[str, Any]], categories: Optional[Sequence[Any]] = None,
+                             fields: Sequence[str] = PER_100G_FIELDS) -> BatchValidationResult:
+    """
+    Validate the nutrition values of many ingredients at once
+
+    Args:
+        rows: Nutrition dicts with proteins_per_100g, ..., calories_per_100g (numbers or "5.2g" strings)
+        categories: Category per row (defaults to each row's "category")
+        fields: Fields to parse and check (add FIELDS to check the totals too)
+
+    Returns:
+        BatchValidationResult with per-row error codes
+    """
+    columns = {key: parse_quantities((row.get(key) for row in rows), key) for key in fields}
+    if categories is None:
+        categories = [row.get("category") for row in rows]
+    return validate_nutrition_columns(columns, categories)
+
+def queue_validation_errors(result: BatchValidationResult, rows: Sequence[Dict[str, Any]],
+                            names: Sequence[str], batch=None):
+    """
+    Queue one validation_errors document per invalid row on a write batch
+
+    Args:
+        result: Output of validate_nutrition_batch for rows
+        rows: The validated nutrition dicts (stored as original_data)
+        names: Ingredient name per row
+        batch: AnalysisWriteBatch to add to (a new one when None)
+
+    Returns:
+        The batch; hand it to persist_analysis_batch or flush() it
+    """
+    if batch is None:
+        from mongodb_config import AnalysisWriteBatch
+        batch = AnalysisWriteBatch()
+    timestamp = datetime.utcnow().isoformat()
+    for row in result.invalid_rows():
+        name = names[row] or "Unknown"
+        batch.add_validation_error(name, {
+            "ingredient_name": name,
+            "errors": result.messages(row),
+            "error_codes": result.errors(row),
+            "validation_timestamp": timestamp
+        }, rows[row])
+    return batch
+
+def validate_and_record(rows: Sequence[Dict[str, Any]], names: Sequence[str]) -> BatchValidationResult:
+    """Validate a batch and persist all its failures with one bulk write"""
+    from persistence_queue import persist_analysis_batch
+
+    result = validate_nutrition_batch(rows)
+    invalid = int(np.count_nonzero(result.codes))
+    if invalid:
+        persist_analysis_batch(queue_validation_errors(result, rows, names))
+        logger.warning(f"⚠️ {invalid} of {len(rows)} ingredients failed nutrition validation")
+    return result
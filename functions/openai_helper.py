@@ -2,10 +2,18 @@ import os
 import json
 import requests
 from config import API_KEYS
+from http_client import get_session
+from image_payload import IMAGE_URL_PLACEHOLDER, StreamingJSONBody
+from json_stream import IncrementalJSONParser, iter_sse_data
+from output_schemas import output_stats, parse_structured_output, response_format_for
+from single_flight import analysis_flight, content_key, vision_flight
 
 # Get API key from config
 api_key = API_KEYS['OPEN_ROUTER']
 
+# OpenRouter's model for vision
+VISION_MODEL = "anthropic/claude-3-opus-20240229"
+
 if api_key and len(api_key) > 10:
     print("🔑 OpenRouter API key loaded successfully")
 else:
@@ -13,18 +21,110 @@ else:
     print("📝 Please set OPEN_ROUTER_API_KEY in your .env file")
     print("📝 Get your key from: https://openrouter.ai/keys")
 
-def analyze_image_with_vision(image_url=None, prompt=None, image_base64=None):
+def _vision_input_error(image_url, image_base64, image_payload):
+    """Return why a vision request cannot be made with these inputs, or None"""
+    if not api_key:
+        return "OpenRouter API key not configured in environment variables"
+    if len(api_key) < 20:  # OpenRouter keys are typically much longer
+        return f"OpenRouter API key appears to be invalid (too short: {len(api_key)} characters)"
+    # Validate image input
+    if not image_url and not image_base64 and image_payload is None:
+        return "Either image_url or image_base64 must be provided"
+    if image_url and not image_url.startswith(('http://', 'https://')):
+        return f"Invalid image URL format: {image_url}"
+    return None
+
+def _build_vision_request(image_url, prompt, image_base64, image_payload, stream=False, output_schema=None):
+    """
+    Build the headers and body of a vision chat completion request
+    
+    Args:
+        output_schema (OutputSchema, optional): Expected answer format, sent as a response_format when the model supports it
+    
+    Returns:
+        tuple: (headers, keyword arguments carrying the body for session.post)
+    """
+    # OpenRouter API headers
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}",
+        "HTTP-Referer": "https://theholylabs.com",  # Replace with your domain
+        "X-Title": "Kali AI Food Analysis"  # Your app name
+    }
+    
+    # Prepare image content based on input type
+    if image_payload is not None:
+        image_content = {
+            "type": "image_url",
+            "image_url": {"url": IMAGE_URL_PLACEHOLDER}
+        }
+        print(f"🔍 Streaming image payload into request body")
+    elif image_base64:
+        image_content = {
+            "type": "image_url",
+            "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}
+        }
+        print(f"🔍 Using base64 image data")
+    else:
+        image_content = {
+            "type": "image_url",
+            "image_url": {"url": image_url}
+        }
+        print(f"🔍 Using image URL")
+
+    payload = {
+        "model": VISION_MODEL,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    image_content
+                ]
+            }
+        ],
+        "max_tokens": 1000
+    }
+    if stream:
+        payload["stream"] = True
+    response_format = response_format_for(output_schema, VISION_MODEL)
+    if response_format:
+        payload["response_format"] = response_format
+    output_stats.record_request(VISION_MODEL, structured=bool(response_format))
+    
+    print(f"🚀 Making OpenRouter API request...")
+    print(f"🚀 Model: {payload['model']}")
+    print(f"🚀 Max tokens: {payload['max_tokens']}")
+    
+    if image_payload is not None:
+        return headers, {"data": StreamingJSONBody(payload, image_payload)}
+    return headers, {"json": payload}
+
+def analysis_key(image_url, prompt, image_base64, image_payload, output_schema):
+    """Content hash of a vision request; identical concurrent requests share one model call"""
+    return content_key(VISION_MODEL, prompt, image_url, image_base64, image_payload,
+                       output_schema.name if output_schema is not None else None)
+
+def analyze_image_with_vision(image_url=None, prompt=None, image_base64=None, image_payload=None, output_schema=None):
     """
     Analyze an image using OpenRouter's Vision capabilities
     
+    Identical requests made while one is in flight wait for its answer instead of calling the model again.
+    
     Args:
         image_url (str, optional): URL of the image to analyze
         prompt (str): Instructions for the analysis
         image_base64 (str, optional): Base64 encoded image data
+        image_payload (ImagePayload, optional): Decoded image bytes, streamed into the request body
+        output_schema (OutputSchema, optional): Expected answer format
         
     Returns:
         str or dict: The analysis result from OpenRouter
     """
+    key = analysis_key(image_url, prompt, image_base64, image_payload, output_schema)
+    return vision_flight.do(key, _analyze_image_with_vision, image_url, prompt, image_base64, image_payload, output_schema)
+
+def _analyze_image_with_vision(image_url, prompt, image_base64, image_payload, output_schema):
     try:
         print(f"🔍 Starting OpenRouter Vision API call...")
         print(f"🔍 API key configured: {'Yes' if api_key and len(api_key) > 10 else 'No/Invalid'}")
@@ -34,73 +134,20 @@ def analyze_image_with_vision(image_url=None, prompt=None, image_base64=None):
             print(f"🔍 Image URL: {image_url[:100]}..." if len(image_url) > 100 else f"🔍 Image URL: {image_url}")
         if image_base64:
             print(f"🔍 Image base64: {len(image_base64)} characters")
+        if image_payload is not None:
+            print(f"🔍 Image payload: {len(image_payload)} bytes ({image_payload.mime_type})")
         
-        if not api_key:
-            error_msg = "OpenRouter API key not configured in environment variables"
-            print(f"❌ {error_msg}")
-            return {"error": error_msg}
-        
-        if len(api_key) < 20:  # OpenRouter keys are typically much longer
-            error_msg = f"OpenRouter API key appears to be invalid (too short: {len(api_key)} characters)"
-            print(f"❌ {error_msg}")
-            return {"error": error_msg}
-        
-        # Validate image input
-        if not image_url and not image_base64:
-            error_msg = "Either image_url or image_base64 must be provided"
-            print(f"❌ {error_msg}")
-            return {"error": error_msg}
-        
-        if image_url and not image_url.startswith(('http://', 'https://')):
-            error_msg = f"Invalid image URL format: {image_url}"
+        error_msg = _vision_input_error(image_url, image_base64, image_payload)
+        if error_msg:
             print(f"❌ {error_msg}")
             return {"error": error_msg}
         
-        # OpenRouter API headers
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-            "HTTP-Referer": "https://theholylabs.com",  # Replace with your domain
-            "X-Title": "Kali AI Food Analysis"  # Your app name
-        }
-        
-        # Prepare image content based on input type
-        if image_base64:
-            image_content = {
-                "type": "image_url",
-                "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}
-            }
-            print(f"🔍 Using base64 image data")
-        else:
-            image_content = {
-                "type": "image_url",
-                "image_url": {"url": image_url}
-            }
-            print(f"🔍 Using image URL")
-
-        payload = {
-            "model": "anthropic/claude-3-opus-20240229",  # OpenRouter's model for vision
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        image_content
-                    ]
-                }
-            ],
-            "max_tokens": 1000
-        }
-        
-        print(f"🚀 Making OpenRouter API request...")
-        print(f"🚀 Model: {payload['model']}")
-        print(f"🚀 Max tokens: {payload['max_tokens']}")
-        
-        response = requests.post(
+        headers, request_body = _build_vision_request(image_url, prompt, image_base64, image_payload, output_schema=output_schema)
+        response = get_session().post(
             "https://openrouter.ai/api/v1/chat/completions",
             headers=headers,
-            json=payload,
-            timeout=30  # Add timeout
+            timeout=30,  # Add timeout
+            **request_body
         )
         
         print(f"📥 OpenRouter API response status: {response.status_code}")
@@ -154,4 +201,198 @@ def analyze_image_with_vision(image_url=None, prompt=None, image_base64=None):
         error_msg = f"Unexpected error in OpenRouter Vision API call: {str(e)}"
         print(f"❌ {error_msg}")
         print(f"❌ Error type: {type(e).__name__}")
-        return {"error": error_msg} 
\ No newline at end of file
+        return {"error": error_msg} 
+
+def analyze_image_with_openai(image_url=None, prompt=None, image_base64=None):
+    """
+    Analyze an image and return the raw model output (kept for the v1 endpoint)
+    
+    Returns:
+        str or dict: The raw analysis text, or a dict with an "error" key
+    """
+    return analyze_image_with_vision(image_url=image_url, prompt=prompt, image_base64=image_base64)
+
+def analyze_image_with_openrouter(image_url=None, image_base64=None, prompt=None, image_payload=None, output_schema=None):
+    """
+    Analyze an image using OpenRouter and parse the model output into a dict
+    
+    Args:
+        image_url (str, optional): URL of the image to analyze
+        image_base64 (str, optional): Base64 encoded image data
+        prompt (str): Instructions for the analysis
+        image_payload (ImagePayload, optional): Decoded image bytes, streamed into the request body
+        output_schema (OutputSchema, optional): Expected answer format, requested and validated
+        
+    Returns:
+        dict: The parsed analysis result, or a dict with an "error" key
+    """
+    key = analysis_key(image_url, prompt, image_base64, image_payload, output_schema)
+    return analysis_flight.do(key, _analyze_image_with_openrouter, image_url, image_base64, prompt, image_payload, output_schema)
+
+def _analyze_image_with_openrouter(image_url, image_base64, prompt, image_payload, output_schema):
+    raw_output = analyze_image_with_vision(image_url=image_url, prompt=prompt, image_base64=image_base64,
+                                           image_payload=image_payload, output_schema=output_schema)
+    return parse_model_json(raw_output, output_schema)
+
+def stream_image_analysis(image_url=None, prompt=None, image_base64=None, image_payload=None, output_schema=None):
+    """
+    Analyze an image with a streamed completion, parsing the JSON answer while tokens arrive
+    
+    The request is closed as soon as the answer's closing brace is parsed, so
+    the result does not wait for the end of the stream.
+    
+    Args:
+        image_url (str, optional): URL of the image to analyze
+        prompt (str): Instructions for the analysis
+        image_base64 (str, optional): Base64 encoded image data
+        image_payload (ImagePayload, optional): Decoded image bytes, streamed into the request body
+        output_schema (OutputSchema, optional): Expected answer format, sent as a response_format when supported
+        
+    Yields:
+        tuple: ("field", (key, value)) for each top-level field as soon as it is complete, then one of
+            ("result", dict) once the object is closed, ("text", str) with the whole output when it
+            never formed a complete object, or ("error", str)
+    """
+    error_msg = _vision_input_error(image_url, image_base64, image_payload)
+    if error_msg:
+        print(f"❌ {error_msg}")
+        yield "error", error_msg
+        return
+    
+    headers, request_body = _build_vision_request(image_url, prompt, image_base64, image_payload, stream=True,
+                                                  output_schema=output_schema)
+    try:
+        response = get_session().post(
+            "https://openrouter.ai/api/v1/chat/completions",
+            headers=headers,
+            timeout=30,
+            stream=True,
+            **request_body
+        )
+    except requests.exceptions.RequestException as e:
+        error_msg = f"OpenRouter streaming request failed: {str(e)}"
+        print(f"❌ {error_msg}")
+        yield "error", error_msg
+        return
+    
+    try:
+        print(f"📥 OpenRouter streaming response status: {response.status_code}")
+        if response.status_code != 200:
+            error_msg = f"API call failed with status {response.status_code}: {response.text[:200]}"
+            print(f"❌ {error_msg}")
+            yield "error", error_msg
+            return
+        
+        parser = IncrementalJSONParser()
+        received = []
+        for chunk in iter_sse_data(response.iter_lines()):
+            if "error" in chunk:
+                router_error = chunk["error"]
+                message = router_error.get("message", "Unknown error") if isinstance(router_error, dict) else str(router_error)
+                print(f"❌ OpenRouter stream error: {message}")
+                yield "error", f"OpenRouter API Error: {message}"
+                return
+            choices = chunk.get("choices") or [{}]
+            content = (choices[0].get("delta") or {}).get("content")
+            if not content:
+                continue
+            received.append(content)
+            for field in parser.feed(content):
+                yield "field", field
+            if parser.done:
+                print(f"✅ Streamed analysis complete after {sum(map(len, received))} characters")
+                yield "result", parser.result
+                return
+        
+        raw_output = "".join(received)
+        if not raw_output:
+            yield "error", "No content in OpenRouter response"
+            return
+        print(f"⚠️ Streamed output did not close its JSON object ({len(raw_output)} characters)")
+        yield "text", raw_output
+    except requests.exceptions.RequestException as e:
+        error_msg = f"OpenRouter stream interrupted: {str(e)}"
+        print(f"❌ {error_msg}")
+        yield "error", error_msg
+    finally:
+        # Stops reading the rest of the stream once the answer is complete
+        response.close()
+
+def parse_model_json(raw_output, output_schema=None, model=None):
+    """
+    Parse model output into a dict, repairing fenced, single-quoted or truncated JSON only when strict parsing fails
+    
+    Args:
+        raw_output (str or dict): Model text, or an error dict passed through
+        output_schema (OutputSchema, optional): Expected answer format; violations are logged and counted
+        model (str, optional): The model that answered (defaults to VISION_MODEL)
+    
+    Returns:
+        dict: The parsed object, or a dict with an "error" key
+    """
+    if isinstance(raw_output, dict):
+        return raw_output
+    
+    try:
+        parsed = parse_structured_output(str(raw_output), output_schema, model or VISION_MODEL)
+    except json.JSONDecodeError as e:
+        error_msg = f"Could not parse OpenRouter output as JSON: {str(e)}"
+        print(f"❌ {error_msg}")
+        return {"error": error_msg}
+    if parsed.repairs:
+        print(f"🔧 Repaired OpenRouter JSON: {', '.join(parsed.repairs)}")
+    
+    if not isinstance(parsed.value, dict):
+        return {"error": f"Unexpected JSON type from OpenRouter: {type(parsed.value).__name__}"}
+    return parsed.value
+
+def complete_text_with_openrouter(prompt, model=None, max_tokens=2000, output_schema=None):
+    """
+    Run a text-only prompt through OpenRouter and parse the JSON answer
+    
+    Args:
+        prompt (str): Instructions asking for a JSON object
+        model (str, optional): OpenRouter model (defaults to VISION_MODEL)
+        max_tokens (int): Output token limit
+        output_schema (OutputSchema, optional): Expected answer format, requested and validated
+        
+    Returns:
+        dict: The parsed answer, or a dict with an "error" key
+    """
+    if not api_key:
+        return {"error": "OpenRouter API key not configured"}
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}",
+        "HTTP-Referer": "https://theholylabs.com",
+        "X-Title": "Kali AI Food Analysis"
+    }
+    model = model or VISION_MODEL
+    payload = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": max_tokens
+    }
+    response_format = response_format_for(output_schema, model)
+    if response_format:
+        payload["response_format"] = response_format
+    output_stats.record_request(model, structured=bool(response_format))
+    try:
+        response = get_session().post(
+            "https://openrouter.ai/api/v1/chat/completions",
+            headers=headers,
+            json=payload,
+            timeout=30
+        )
+        if response.status_code != 200:
+            error_msg = f"OpenRouter API call failed with status {response.status_code}: {response.text[:200]}"
+            print(f"❌ {error_msg}")
+            return {"error": error_msg}
+        result = response.json()
+        if not result.get("choices"):
+            return {"error": "No content in OpenRouter response"}
+        return parse_model_json(result["choices"][0]["message"]["content"], output_schema, model)
+    except requests.exceptions.RequestException as e:
+        error_msg = f"OpenRouter text request failed: {str(e)}"
+        print(f"❌ {error_msg}")
+        return {"error": error_msg}
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Typed schemas for the JSON answers the models return
+
+Each answer format is declared once as a JSON schema: the meal analyses,
+refrigerator/invoice nutrition, two-stage item detection and recipe sets.
+Models that support structured outputs get the schema as an OpenRouter
+"json_schema" response_format, so their answers parse without repair.
+Every schema is also compiled at import into nested checking functions, so
+validating an answer walks the value once without interpreting the schema
+again.
+
+parse_structured_output() tries json.loads first and falls back to the
+tolerant repair parser only when that fails. Outcomes (strict, repaired,
+parse failure, schema violation) and request retries are counted per model
+in output_stats.
+"""
+
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from config import STRUCTURED_OUTPUT_CONFIG
+from tolerant_json import parse_tolerant_json
+
+logger = logging.getLogger(__name__)
+
+_STRING = {"type": "string"}
+# Amounts the prompts allow as numbers or unit strings ("30g", "165kcal")
+_AMOUNT = {"type": ["number", "string"]}
+_STRINGS = {"type": "array", "items": _STRING}
+_AMOUNTS_BY_NAME = {"type": "object", "additionalProperties": _AMOUNT}
+_MACROS = {
+    "type": "object",
+    "properties": {"proteins": _AMOUNT, "carbohydrates": _AMOUNT, "fats": _AMOUNT},
+    "required": ["proteins", "carbohydrates", "fats"]
+}
+_HEALTHINESS = {"type": "string", "enum": ["healthy", "medium", "unhealthy", "N/A"]}
+
+SIMPLE_MEAL_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "mealName": _STRING,
+        "estimatedCalories": _AMOUNT,
+        "macros": _MACROS,
+        "ingredients": _STRINGS,
+        "detailedIngredients": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": _STRING, "grams": _AMOUNT, "calories": _AMOUNT,
+                    "proteins": _AMOUNT, "carbs": _AMOUNT, "fats": _AMOUNT
+                },
+                "required": ["name"]
+            }
+        },
+        "healthiness": _HEALTHINESS,
+        "health_assessment": _STRING,
+        "source": _STRING
+    },
+    "required": ["mealName", "estimatedCalories", "macros", "ingredients"]
+}
+
+MEAL_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "mealName": _STRING,
+        "calories": _AMOUNT,
+        "meal_name": _STRING,
+        "cuisine_type": _STRING,
+        "macronutrients": _MACROS,
+        "macros": {"type": "object", "properties": {"proteins": _AMOUNT, "carbs": _AMOUNT, "fats": _AMOUNT}},
+        "estimated_weight": _AMOUNT,
+        "weight_estimation_details": _STRINGS,
+        "ingredients": _STRINGS,
+        "nutrients": _AMOUNTS_BY_NAME,
+        "cooking_state": _STRING,
+        "cooking_method": _STRING,
+        "category": _STRING,
+        "category_cause": _STRING,
+        "assumptions": _STRINGS,
+        "portion_size": _STRING,
+        "meal_type": _STRING,
+        "allergens": _STRINGS,
+        "dietary_tags": _STRINGS,
+        "part_identification_confidence": _AMOUNTS_BY_NAME,
+        "health_assessment": _STRING,
+        "healthiness": _HEALTHINESS,
+        "healthiness_explanation": _STRING,
+        "source": _STRING,
+        "confidence_level": _STRING,
+        "macronutrients_by_ingredient": {
+            "type": "object",
+            "additionalProperties": {
+                "type": "object",
+                "properties": {"proteins": _AMOUNT, "carbohydrates": _AMOUNT, "fats": _AMOUNT, "calories": _AMOUNT}
+            }
+        },
+        "judge": {"type": "object"}
+    },
+    "required": ["mealName", "calories", "macronutrients", "ingredients"]
+}
+
+_NUTRITION_ENTRY = {
+    "type": "object",
+    "properties": {
+        "category": _STRING,
+        "possible_measurement": _AMOUNTS_BY_NAME,
+        "base_ingredient_name": _STRINGS,
+        "names": {"type": "object"},
+        "data_source": _STRING,
+        "weight": _AMOUNT,
+        "proteins": _AMOUNT,
+        "carbohydrates": _AMOUNT,
+        "fats": _AMOUNT,
+        "calories": _AMOUNT,
+        "average_weight": _AMOUNT,
+        "proteins_per_100g": _AMOUNT,
+        "carbohydrates_per_100g": _AMOUNT,
+        "fats_per_100g": _AMOUNT,
+        "calories_per_100g": _AMOUNT
+    },
+    "required": ["proteins", "carbohydrates", "fats", "calories"]
+}
+
+INGREDIENT_NUTRITION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "macronutrients_by_ingredient": {"type": "object", "additionalProperties": _NUTRITION_ENTRY}
+    },
+    "required": ["macronutrients_by_ingredient"]
+}
+
+ITEM_DETECTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"name": _STRING, "weight": _AMOUNT, "quantity": {"type": "number"}},
+                "required": ["name"]
+            }
+        },
+        "total_items": {"type": "integer"}
+    },
+    "required": ["items"]
+}
+
+_RECIPE = {
+    "type": "object",
+    "properties": {
+        "name": _STRING,
+        "description": _STRING,
+        "ingredients": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": _STRING, "amount": _AMOUNT, "unit": _STRING, "calories": _AMOUNT,
+                    "protein": _AMOUNT, "carbohydrates": _AMOUNT, "fat": _AMOUNT, "fiber": _AMOUNT
+                },
+                "required": ["name"]
+            }
+        },
+        "base_ingredient_name": _STRINGS,
+        "instructions": _STRINGS,
+        "nutritional_info": {
+            "type": "object",
+            "properties": {
+                "calories": _AMOUNT, "protein": _AMOUNT, "carbohydrates": _AMOUNT, "fat": _AMOUNT, "fiber": _AMOUNT
+            }
+        },
+        "macronutrients": _AMOUNTS_BY_NAME,
+        "macronutrients_per_for_this_meal_100g": _AMOUNTS_BY_NAME,
+        "preparation_time": _AMOUNT,
+        "cooking_time": _AMOUNT,
+        "difficulty": _STRING,
+        "servings": _AMOUNT,
+        "cusine": _STRING,
+        "course": _STRING,
+        "dietary_tags": _STRINGS,
+        "health_rank": _AMOUNT,
+        "tasty_rank": _AMOUNT,
+        "health_recommendations": {
+            "type": "object",
+            "properties": {
+                "benefits": _STRINGS, "considerations": _STRINGS,
+                "suitable_for": _STRINGS, "not_suitable_for": _STRINGS
+            }
+        },
+        "allergens": _STRINGS,
+        "allergen_free": _STRINGS
+    },
+    "required": ["name", "ingredients", "instructions", "nutritional_info"]
+}
+
+RECIPE_SET_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "recipes": {"type": "array", "items": _RECIPE},
+        "total_recipes": _AMOUNT,
+        "recommendations": _STRINGS,
+        "available_ingredients_used": _STRINGS
+    },
+    "required": ["recipes"]
+}
+
+_PYTHON_TYPES = {
+    "object": (dict,),
+    "array": (list,),
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "null": (type(None),)
+}
+
+# validate(value, path, errors) appends "path: problem" messages to errors
+Validator = Callable[[Any, str, List[str]], None]
+
+def compile_schema(schema: Dict[str, Any]) -> Validator:
+    """
+    Compile the JSON schema subset used here (type, enum, properties, required,
+    additionalProperties, items) into a validating function
+
+    Args:
+        schema: The schema to compile
+
+    Returns:
+        Validator: validate(value, path, errors), appending one message per violation
+    """
+    type_names = schema.get("type")
+    if isinstance(type_names, str):
+        type_names = [type_names]
+    allowed: Tuple[type, ...] = tuple(t for name in type_names or () for t in _PYTHON_TYPES[name])
+    # bool is an int subclass: True only satisfies "boolean"
+    reject_bool = bool(allowed) and "boolean" not in type_names
+    expected = "|".join(type_names or ())
+    enum = frozenset(schema["enum"]) if "enum" in schema else None
+    properties = {key: compile_schema(sub_schema) for key, sub_schema in schema.get("properties", {}).items()}
+    required = tuple(schema.get("required", ()))
+    extra = schema.get("additionalProperties")
+    extra_validator = compile_schema(extra) if isinstance(extra, dict) else None
+    items_validator = compile_schema(schema["items"]) if "items" in schema else None
+
+    def validate(value: Any, path: str, errors: List[str]) -> None:
+        if allowed and (not isinstance(value, allowed) or (reject_bool and isinstance(value, bool))):
+            errors.append(f"{path}: expected {expected}, got {type(value).__name__}")
+            return
+        if enum is not None and value not in enum:
+            errors.append(f"{path}: {value!r} is not one of {sorted(enum)}")
+            return
+        if isinstance(value, dict):
+            for key in required:
+                if key not in value:
+                    errors.append(f"{path}.{key}: missing")
+            if properties or extra_validator:
+                for key, item in value.items():
+                    check = properties.get(key, extra_validator)
+                    if check is not None:
+                        check(item, f"{path}.{key}", errors)
+        elif items_validator is not None and isinstance(value, list):
+            for index, item in enumerate(value):
+                items_validator(item, f"{path}[{index}]", errors)
+
+    return validate
+
+class OutputSchema(NamedTuple):
+    """A named answer format: its JSON schema and the compiled validator"""
+    name: str
+    schema: Dict[str, Any]
+    validator: Validator
+
+    def validate(self, value: Any) -> List[str]:
+        """Return the schema violations of value (empty when it conforms)"""
+        errors: List[str] = []
+        self.validator(value, "$", errors)
+        return errors
+
+    def response_format(self) -> Dict[str, Any]:
+        """The OpenRouter response_format constraining a completion to this schema"""
+        # Not strict: the schemas leave optional fields open, which strict mode forbids
+        return {"type": "json_schema", "json_schema": {"name": self.name, "strict": False, "schema": self.schema}}
+
+def _output_schema(name: str, schema: Dict[str, Any]) -> OutputSchema:
+    return OutputSchema(name, schema, compile_schema(schema))
+
+SIMPLE_MEAL_ANALYSIS = _output_schema("simple_meal_analysis", SIMPLE_MEAL_ANALYSIS_SCHEMA)
+MEAL_ANALYSIS = _output_schema("meal_analysis", MEAL_ANALYSIS_SCHEMA)
+INGREDIENT_NUTRITION = _output_schema("ingredient_nutrition", INGREDIENT_NUTRITION_SCHEMA)
+ITEM_DETECTION = _output_schema("item_detection", ITEM_DETECTION_SCHEMA)
+RECIPE_SET = _output_schema("recipe_set", RECIPE_SET_SCHEMA)
+
+def supports_structured_output(model: Optional[str]) -> bool:
+    """Whether model accepts a json_schema response_format (STRUCTURED_OUTPUT_CONFIG['MODELS'] prefixes)"""
+    return bool(model) and STRUCTURED_OUTPUT_CONFIG['ENABLED'] and model.startswith(STRUCTURED_OUTPUT_CONFIG['MODELS'])
+
+def response_format_for(output_schema: Optional[OutputSchema], model: Optional[str], default: Optional[dict] = None) -> Optional[dict]:
+    """
+    The response_format to send for an answer in output_schema
+
+    Args:
+        output_schema: The expected answer format (None: unconstrained)
+        model: The OpenRouter model the request goes to
+        default: What to send when the model does not support structured outputs
+
+    Returns:
+        dict or None: A json_schema response_format, or default
+    """
+    if output_schema is not None and supports_structured_output(model):
+        return output_schema.response_format()
+    return default
+
+class OutputStats:
+    """Thread-safe per-model counters of requests, retries and how their answers parsed"""
+
+    OUTCOMES = ("strict", "repaired", "parse_failures", "schema_failures")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict[str, int]] = {}
+
+    def _counters(self, model: Optional[str]) -> Dict[str, int]:
+        counters = self._models.get(model or "unknown")
+        if counters is None:
+            counters = dict.fromkeys(("requests", "structured_requests", "retries", "responses") + self.OUTCOMES, 0)
+            self._models[model or "unknown"] = counters
+        return counters
+
+    def record_request(self, model: Optional[str], structured: bool = False) -> None:
+        with self._lock:
+            counters = self._counters(model)
+            counters["requests"] += 1
+            counters["structured_requests"] += structured
+
+    def record_retry(self, model: Optional[str]) -> None:
+        with self._lock:
+            self._counters(model)["retries"] += 1
+
+    def record_response(self, model: Optional[str], outcome: str, schema_valid: bool = True) -> None:
+        """Count one answer: outcome is "strict", "repaired" or "parse_failures" """
+        with self._lock:
+            counters = self._counters(model)
+            counters["responses"] += 1
+            counters[outcome] += 1
+            counters["schema_failures"] += not schema_valid
+
+    def reset(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return the counters and rates of every model for monitoring"""
+        with self._lock:
+            snapshot = {model: dict(counters) for model, counters in self._models.items()}
+        for counters in snapshot.values():
+            responses, requests = counters["responses"], counters["requests"]
+            counters["repair_rate"] = round(counters["repaired"] / responses, 4) if responses else 0.0
+            counters["parse_failure_rate"] = round(counters["parse_failures"] / responses, 4) if responses else 0.0
+            counters["schema_failure_rate"] = round(counters["schema_failures"] / responses, 4) if responses else 0.0
+            counters["retry_rate"] = round(counters["retries"] / requests, 4) if requests else 0.0
+        return snapshot
+
+output_stats = OutputStats()
+
+class StructuredOutput(NamedTuple):
+    """A parsed answer, the repairs it needed and its schema violations"""
+    value: Any
+    repairs: Tuple[str, ...]
+    errors: List[str]
+
+def parse_structured_output(raw_output: Any, output_schema: Optional[OutputSchema], model: Optional[str]) -> StructuredOutput:
+    """
+    Parse and validate a model answer, repairing it only when strict parsing fails
+
+    Args:
+        raw_output: The model text, or an already parsed value (e.g. from a streamed answer)
+        output_schema: The expected answer format (None: parse only)
+        model: The model that answered, for output_stats
+
+    Returns:
+        StructuredOutput: The value with its repairs and schema violations
+
+    Raises:
+        json.JSONDecodeError: If no JSON value can be recovered, or it nests too deeply
+    """
+    repairs: Tuple[str, ...] = ()
+    if isinstance(raw_output, (dict, list)):
+        value = raw_output
+    else:
+        try:
+            value = json.loads(raw_output)
+        except RecursionError:
+            output_stats.record_response(model, "parse_failures")
+            raise json.JSONDecodeError("JSON nested too deeply", str(raw_output), 0) from None
+        except (json.JSONDecodeError, TypeError):
+            try:
+                value, repairs = parse_tolerant_json(str(raw_output))
+            except json.JSONDecodeError:
+                output_stats.record_response(model, "parse_failures")
+                raise
+    errors = output_schema.validate(value) if output_schema is not None else []
+    output_stats.record_response(model, "repaired" if repairs else "strict", schema_valid=not errors)
+    if errors:
+        logger.warning(f"⚠️ {model} answer does not match {output_schema.name}: {'; '.join(errors[:5])}")
+    return StructuredOutput(value, repairs, errors)
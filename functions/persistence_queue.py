@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Write-behind persistence for analysis results
+
+Endpoints hand their AnalysisWriteBatch to a bounded in-process queue and
+return immediately; a background worker merges queued batches and writes
+them with one insert_many per collection. Documents that cannot reach
+MongoDB are appended to a JSON-lines spill file and replayed once writes
+succeed again. The queue is drained on interpreter shutdown.
+
+Background writes need CPU after the response is sent, so deployments
+should keep CPU allocated between requests (the default for long-lived
+servers; a setting on Cloud Functions 2nd gen / Cloud Run).
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import WRITE_BEHIND_CONFIG
+
+try:
+    from bson import json_util
+except ImportError:
+    json_util = None
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+def _default_batch_factory():
+    from mongodb_config import AnalysisWriteBatch
+    return AnalysisWriteBatch()
+
+class WriteBehindQueue:
+    """
+    Bounded queue of AnalysisWriteBatch objects drained by one worker thread
+
+    Backpressure: submit() waits up to enqueue_timeout for a free slot and
+    spills the batch to disk rather than blocking a request indefinitely or
+    dropping data.
+    """
+
+    def __init__(self, batch_factory: Callable = _default_batch_factory,
+                 max_queue_size: int = 1000, max_batch_documents: int = 500,
+                 flush_interval: float = 1.0, enqueue_timeout: float = 0.5,
+                 spill_path: Optional[str] = None, spill_max_bytes: int = 50 * 1024 * 1024,
+                 shutdown_timeout: float = 10.0):
+        self.batch_factory = batch_factory
+        self.max_batch_documents = max_batch_documents
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.spill_path = spill_path
+        self.spill_max_bytes = spill_max_bytes
+        self.shutdown_timeout = shutdown_timeout
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._closed = False
+        self._stats = {
+            "batches_enqueued": 0,
+            "documents_written": 0,
+            "documents_failed": 0,
+            "documents_spilled": 0,
+            "documents_replayed": 0,
+            "backpressure_spills": 0
+        }
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._worker.start()
+
+    def submit(self, batch) -> bool:
+        """
+        Queue a batch for background writing
+
+        Returns:
+            bool: True if queued, False if it was spilled to disk instead
+        """
+        if len(batch) == 0:
+            return True
+        if self._closed:
+            # Shutting down: write synchronously so nothing is lost
+            self._write([batch])
+            return True
+        self._ensure_worker()
+        try:
+            self._queue.put(batch, timeout=self.enqueue_timeout)
+            self._count("batches_enqueued")
+            return True
+        except queue.Full:
+            logger.warning(f"⚠️ Write-behind queue full, spilling {len(batch)} documents to disk")
+            self._count("backpressure_spills")
+            self._spill(batch.take_entries())
+            return False
+
+    def _collect(self) -> Tuple[List[Any], bool]:
+        """Wait for the first batch, then take whatever else is queued up to the document limit"""
+        batches, documents, stop = [], 0, False
+        try:
+            item = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return batches, stop
+        while True:
+            if item is _STOP:
+                stop = True
+                break
+            batches.append(item)
+            documents += len(item)
+            if documents >= self.max_batch_documents:
+                break
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+        return batches, stop
+
+    def _run(self) -> None:
+        last_replay = 0.0
+        while True:
+            batches, stop = self._collect()
+            if batches:
+                self._write(batches)
+            elif time.monotonic() - last_replay >= self.flush_interval * 30:
+                last_replay = time.monotonic()
+                self.replay_spill()
+            if stop:
+                break
+
+    def _write(self, batches: List[Any]) -> None:
+        merged = self.batch_factory()
+        for batch in batches:
+            merged.merge(batch)
+        try:
+            result = merged.flush(include_documents=True)
+        except Exception as e:
+            logger.error(f"❌ Write-behind flush failed: {str(e)}")
+            return
+        written = sum(result["inserted"].values())
+        self._count("documents_written", written)
+        retryable = [(f["collection"], f["label"], f["document"]) for f in result["failed"] if f["retryable"]]
+        self._count("documents_failed", len(result["failed"]) - len(retryable))
+        if retryable:
+            self._spill(retryable)
+        elif written:
+            # MongoDB is reachable again: push anything spilled earlier
+            self.replay_spill()
+
+    def _spill(self, entries: List[Tuple[str, str, dict]]) -> None:
+        if not entries:
+            return
+        if not self.spill_path or json_util is None:
+            logger.error(f"❌ {len(entries)} analysis documents lost: no write-behind spill file configured")
+            self._count("documents_failed", len(entries))
+            return
+        try:
+            if os.path.exists(self.spill_path) and os.path.getsize(self.spill_path) >= self.spill_max_bytes:
+                logger.error(f"❌ {len(entries)} analysis documents lost: spill file {self.spill_path} is full")
+                self._count("documents_failed", len(entries))
+                return
+            with self._spill_lock, open(self.spill_path, "a", encoding="utf-8") as spill_file:
+                for name, label, document in entries:
+                    spill_file.write(json_util.dumps({"collection": name, "label": label, "document": document}) + "\n")
+            self._count("documents_spilled", len(entries))
+            logger.warning(f"💾 Spilled {len(entries)} analysis documents to {self.spill_path}")
+        except Exception as e:
+            logger.error(f"❌ Failed to spill {len(entries)} analysis documents: {str(e)}")
+            self._count("documents_failed", len(entries))
+
+    def replay_spill(self) -> int:
+        """Re-submit spilled documents to MongoDB; returns how many were written"""
+        if not self.spill_path or json_util is None:
+            return 0
+        with self._replay_lock:
+            return self._replay_spill()
+
+    def _replay_spill(self) -> int:
+        replay_path = self.spill_path + ".replay"
+        with self._spill_lock:
+            if os.path.exists(self.spill_path) and not os.path.exists(replay_path):
+                os.replace(self.spill_path, replay_path)
+        if not os.path.exists(replay_path):
+            return 0
+
+        batch = self.batch_factory()
+        with open(replay_path, "r", encoding="utf-8") as replay_file:
+            for line in replay_file:
+                if line.strip():
+                    entry = json_util.loads(line)
+                    batch.add_document(entry["collection"], entry["label"], entry["document"])
+        result = batch.flush(include_documents=True)
+        retryable = [(f["collection"], f["label"], f["document"]) for f in result["failed"] if f["retryable"]]
+        self._count("documents_failed", len(result["failed"]) - len(retryable))
+        self._spill(retryable)
+        os.remove(replay_path)
+        written = sum(result["inserted"].values())
+        self._count("documents_replayed", written)
+        if written:
+            logger.info(f"✅ Replayed {written} spilled analysis documents")
+        return written
+
+    def shutdown(self, timeout: Optional[float] = None) -> None:
+        """Stop accepting batches, drain the queue and spill anything that could not be written in time"""
+        if self._closed:
+            return
+        self._closed = True
+        timeout = self.shutdown_timeout if timeout is None else timeout
+        worker = self._worker
+        if worker is not None and worker.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+                worker.join(timeout)
+            except queue.Full:
+                pass
+        leftovers = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftovers.extend(item.take_entries())
+        if leftovers:
+            logger.warning(f"⚠️ Write-behind shutdown timed out, spilling {len(leftovers)} documents")
+            self._spill(leftovers)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued_batches"] = self._queue.qsize()
+        return stats
+
+_write_behind_queue = None
+_write_behind_lock = threading.Lock()
+
+def get_write_behind_queue() -> WriteBehindQueue:
+    """Return the process-wide write-behind queue, flushed automatically at exit"""
+    global _write_behind_queue
+    if _write_behind_queue is None:
+        with _write_behind_lock:
+            if _write_behind_queue is None:
+                _write_behind_queue = WriteBehindQueue(
+                    max_queue_size=WRITE_BEHIND_CONFIG['MAX_QUEUE_SIZE'],
+                    max_batch_documents=WRITE_BEHIND_CONFIG['MAX_BATCH_DOCUMENTS'],
+                    flush_interval=WRITE_BEHIND_CONFIG['FLUSH_INTERVAL_SECONDS'],
+                    enqueue_timeout=WRITE_BEHIND_CONFIG['ENQUEUE_TIMEOUT_SECONDS'],
+                    spill_path=WRITE_BEHIND_CONFIG['SPILL_PATH'],
+                    spill_max_bytes=WRITE_BEHIND_CONFIG['SPILL_MAX_BYTES'],
+                    shutdown_timeout=WRITE_BEHIND_CONFIG['SHUTDOWN_TIMEOUT_SECONDS']
+                )
+                atexit.register(_write_behind_queue.shutdown)
+    return _write_behind_queue
+
+def persist_analysis_batch(batch) -> None:
+    """Write a batch in the background, or synchronously when write-behind is disabled"""
+    if WRITE_BEHIND_CONFIG['ENABLED']:
+        get_write_behind_queue().submit(batch)
+    else:
+        result = batch.flush()
+        if result["failed"]:
+            logger.warning(f"⚠️ {len(result['failed'])} analysis documents were not saved")
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Numeric macro columns and range indexes for the gpt_recipes collection
+
+save_recipe_to_mongodb stores macro totals as strings ("25g", "500kcal"),
+which no index can serve for a min/max filter. Every recipe also gets a
+float copy of each macro (`total_calories_value`, `proteins_value`, ...;
+kcal for calories, grams otherwise, null when unparseable), and compound
+indexes on those columns serve the calorie/protein/carb/fat ranges that
+/get_recipe accepts: recipe_retrieval narrows its candidates with a
+macro_range_filter query. Recipes without the columns never match a
+range, so backfill the existing corpus before enabling retrieval.
+
+Usage:
+    python recipe_macro_columns.py                  # backfill numeric columns and create indexes
+    python recipe_macro_columns.py --indexes        # only create indexes
+    python recipe_macro_columns.py --batch-size 500
+"""
+
+import argparse
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from unit_parser import parse_nutrient
+
+logger = logging.getLogger(__name__)
+
+# Bump to force a re-backfill when parsing changes
+MACRO_COLUMNS_VERSION = 1
+
+# Stored string field -> (unit_parser field, numeric column)
+MACRO_COLUMNS = {
+    "total_calories": ("calories", "total_calories_value"),
+    "total_proteins": ("proteins", "total_proteins_value"),
+    "total_carbohydrates": ("carbohydrates", "total_carbohydrates_value"),
+    "total_fats": ("fats", "total_fats_value"),
+    "calories": ("calories", "calories_value"),
+    "proteins": ("proteins", "proteins_value"),
+    "carbohydrates": ("carbohydrates", "carbohydrates_value"),
+    "fats": ("fats", "fats_value")
+}
+
+# /get_recipe range parameter -> numeric column of the recipe totals
+RANGE_COLUMNS = {
+    "calories": "total_calories_value",
+    "proteins": "total_proteins_value",
+    "carbohydrates": "total_carbohydrates_value",
+    "fats": "total_fats_value"
+}
+
+# One index led by each range field bounds its scan; calories (or proteins) as the
+# second key is then filtered from the index entries without fetching documents.
+# Difficulty is an equality filter, so it goes first in its index.
+MACRO_INDEXES = [
+    ([("total_calories_value", 1), ("total_proteins_value", 1)], "total_calories_proteins"),
+    ([("total_proteins_value", 1), ("total_calories_value", 1)], "total_proteins_calories"),
+    ([("total_carbohydrates_value", 1), ("total_calories_value", 1)], "total_carbohydrates_calories"),
+    ([("total_fats_value", 1), ("total_calories_value", 1)], "total_fats_calories"),
+    ([("difficulty", 1), ("total_calories_value", 1), ("total_proteins_value", 1)], "difficulty_calories_proteins")
+]
+
+def build_macro_columns(document: dict) -> Dict[str, Any]:
+    """Return the $set payload with the numeric macro columns for one recipe"""
+    columns = {}
+    for stored_field, (field, column) in MACRO_COLUMNS.items():
+        if stored_field in document:
+            columns[column] = parse_nutrient(field, document.get(stored_field))
+    columns["macro_columns_version"] = MACRO_COLUMNS_VERSION
+    return columns
+
+def macro_range_filter(macro_ranges: Dict[str, Tuple[Optional[float], Optional[float]]]) -> Dict[str, Any]:
+    """
+    Build a MongoDB filter on the numeric columns for /get_recipe macro ranges
+
+    Args:
+        macro_ranges: (min, max) per field of RANGE_COLUMNS; None (or a 0 minimum) leaves that bound open
+
+    Returns:
+        dict: e.g. {"total_calories_value": {"$gte": 400, "$lte": 600}}
+    """
+    query = {}
+    for field, (low, high) in macro_ranges.items():
+        bounds = {}
+        if low:
+            bounds["$gte"] = float(low)
+        if high is not None:
+            bounds["$lte"] = float(high)
+        if bounds and field in RANGE_COLUMNS:
+            query[RANGE_COLUMNS[field]] = bounds
+    return query
+
+def _log_progress(processed: int, total: int) -> None:
+    percent = 100.0 * processed / total if total else 100.0
+    logger.info(f"🔄 Macro columns: {processed}/{total} recipes ({percent:.1f}%)")
+
+def backfill_macro_columns(collection, batch_size: int = 1000,
+                           progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """
+    Add numeric macro columns to every recipe that lacks the current version
+
+    Args:
+        collection: The gpt_recipes collection
+        batch_size: Documents per cursor batch and per bulk write
+        progress: Called with (processed, total) after each bulk write (default: log it)
+
+    Returns:
+        int: Number of documents updated
+    """
+    from pymongo import UpdateOne
+
+    progress = progress or _log_progress
+    pending = {"macro_columns_version": {"$ne": MACRO_COLUMNS_VERSION}}
+    total = collection.count_documents(pending)
+    updated = 0
+    processed = 0
+    operations = []
+    cursor = collection.find(pending, {field: 1 for field in MACRO_COLUMNS}).batch_size(batch_size)
+    for document in cursor:
+        operations.append(UpdateOne({"_id": document["_id"]}, {"$set": build_macro_columns(document)}))
+        if len(operations) >= batch_size:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+            processed += len(operations)
+            operations = []
+            progress(processed, total)
+    if operations:
+        updated += collection.bulk_write(operations, ordered=False).modified_count
+        processed += len(operations)
+        progress(processed, total)
+    return updated
+
+def ensure_macro_indexes(collection) -> List[str]:
+    """Create the macro range indexes on gpt_recipes (no-op for existing ones)"""
+    return [collection.create_index(keys, name=name) for keys, name in MACRO_INDEXES]
+
+def bootstrap_macro_columns(backfill: bool = True, batch_size: int = 1000) -> Dict[str, Any]:
+    """
+    Backfill numeric macro columns and create the range indexes on gpt_recipes
+
+    Returns:
+        dict: {"updated": count, "indexes": [...]} or {"error": message}
+    """
+    from mongodb_config import gpt_recipes_collection
+
+    if gpt_recipes_collection is None:
+        return {"error": "collection not available"}
+    try:
+        updated = backfill_macro_columns(gpt_recipes_collection, batch_size) if backfill else 0
+        indexes = ensure_macro_indexes(gpt_recipes_collection)
+        logger.info(f"✅ Macro columns ready on {gpt_recipes_collection.name}: {updated} documents updated")
+        return {"updated": updated, "indexes": indexes}
+    except Exception as e:
+        logger.error(f"❌ Failed to bootstrap macro columns: {str(e)}")
+        return {"error": str(e)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill numeric macro columns on gpt_recipes and create range indexes")
+    parser.add_argument("--indexes", action="store_true", help="Only create indexes, skip the backfill")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Documents per bulk write")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print("🚀 Bootstrapping gpt_recipes macro columns...")
+    print(f"   gpt_recipes: {bootstrap_macro_columns(backfill=not args.indexes, batch_size=args.batch_size)}")
+
+if __name__ == "__main__":
+    main()
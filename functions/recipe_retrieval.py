@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Retrieval-first recipe search over the stored gpt_recipes corpus
+
+save_recipe_to_mongodb has flattened every generated recipe into
+gpt_recipes. RecipeIndex keeps the columns it searches on in memory (the
+_id, ingredient forms, macro totals, diets, difficulty and health rank of
+every recipe), so /get_recipe can answer from the corpus before calling
+the model; the full documents of the top matches are fetched by _id:
+
+- an inverted index maps each base ingredient (by its singular/plural
+  forms) to the recipes using it; a recipe's coverage is the share of its
+  distinct base ingredients the user has
+- each macro total (calories, proteins, carbohydrates, fats) is a sorted
+  float column, so a min/max filter is two binary searches
+- when MongoDB is reachable, the request's macro ranges are instead
+  answered by the gpt_recipes macro indexes (see recipe_macro_columns.py),
+  so they see the current stored values rather than the last refresh
+- diet flags / suitable diets and difficulty are posting lists
+
+The generator is only asked for the recipes the corpus cannot supply.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from config import RECIPE_RETRIEVAL_CONFIG
+from ingredient_resolver import base_name, singular_forms
+from recipe_macro_columns import RANGE_COLUMNS, macro_range_filter
+from text_normalization import normalize_text
+from unit_parser import parse_nutrient, parse_number
+
+logger = logging.getLogger(__name__)
+
+# Range-filterable totals: request field -> gpt_recipes field
+MACRO_FIELDS = {
+    "calories": "total_calories",
+    "proteins": "total_proteins",
+    "carbohydrates": "total_carbohydrates",
+    "fats": "total_fats"
+}
+# Boolean gpt_recipes flags, by normalized diet name
+DIET_FLAGS = {
+    "kosher": "kosher",
+    "halal": "halal",
+    "gluten free": "gluten_free",
+    "dairy free": "dairy_free",
+    "low carb": "low_carb",
+    "diabetic friendly": "diabetic_friendly",
+    "heart healthy": "heart_healthy"
+}
+# Fields loaded into the index; only what search() needs stays resident
+INDEX_FIELDS = [
+    "_id", "name", "base_ingredient_name", "ingredients.name", "difficulty", "health_rank", "suitable_diets"
+] + list(MACRO_FIELDS.values()) + list(RANGE_COLUMNS.values()) + list(DIET_FLAGS.values())
+# Fields fetched for the recipes returned to the client
+RECIPE_FIELDS = [
+    "name", "ingredients", "base_ingredient_name", "instructions", "allergens", "allergen_free", "prep_time",
+    "cook_time", "difficulty", "servings", "cusine", "course", "health_rank", "tasty_rank", "health_benefits",
+    "health_considerations", "suitable_diets", "unsuitable_diets", "proteins", "carbohydrates", "fats", "calories"
+] + list(MACRO_FIELDS.values()) + list(RANGE_COLUMNS.values()) + list(DIET_FLAGS.values())
+
+def macro_value(document: dict, field: str) -> Optional[float]:
+    """A recipe total in kcal/grams: the backfilled numeric column when present, else parsed from the string"""
+    value = document.get(RANGE_COLUMNS[field])
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return parse_nutrient(field, document.get(MACRO_FIELDS[field]))
+
+def ingredient_forms(name: Any) -> List[str]:
+    """Normalized singular/plural lookup forms of an ingredient name ("Tomatoes (Cherry)" -> tomatoes, tomato, ...)"""
+    if not isinstance(name, str):
+        return []
+    key = normalize_text(base_name(name))
+    return singular_forms(key) if key else []
+
+def widen_ranges(macro_ranges: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]],
+                 tolerance: float = 0.0) -> Dict[str, Tuple[Optional[float], Optional[float]]]:
+    """Widen every bound by tolerance (0.1 = 10%); open ranges (no bound, or a 0 minimum only) are dropped"""
+    widened = {}
+    for field, (low, high) in (macro_ranges or {}).items():
+        if not low and high is None:
+            continue
+        widened[field] = (low * (1 - tolerance) if low else None, high * (1 + tolerance) if high is not None else None)
+    return widened
+
+def _ingredient_groups(document: dict) -> List[set]:
+    """A recipe's distinct base ingredients as sets of lookup forms ("apple" and "apples" are one group)"""
+    names = document.get("base_ingredient_name") or []
+    if isinstance(names, str):
+        names = [names]
+    if not names:
+        names = [item.get("name") for item in document.get("ingredients") or [] if isinstance(item, dict)]
+    groups: List[set] = []
+    for name in names:
+        forms = set(ingredient_forms(name))
+        if not forms:
+            continue
+        for group in groups:
+            if group & forms:
+                group |= forms
+                break
+        else:
+            groups.append(forms)
+    return groups
+
+def _document_diets(document: dict) -> set:
+    diets = {diet for diet, field in DIET_FLAGS.items() if document.get(field) is True}
+    for diet in document.get("suitable_diets") or []:
+        if isinstance(diet, str):
+            diets.add(normalize_text(diet))
+    return diets
+
+def recipe_response(document: dict) -> Dict[str, Any]:
+    """Shape a flattened gpt_recipes document like a generated recipe in the /get_recipe answer"""
+    return {
+        "name": document.get("name"),
+        "ingredients": document.get("ingredients", []),
+        "base_ingredient_name": document.get("base_ingredient_name", []),
+        "instructions": document.get("instructions", []),
+        "nutritional_info": {
+            "calories": macro_value(document, "calories"),
+            "protein": macro_value(document, "proteins"),
+            "carbohydrates": macro_value(document, "carbohydrates"),
+            "fat": macro_value(document, "fats")
+        },
+        "macronutrients": {
+            "proteins": document.get("total_proteins"),
+            "carbohydrates": document.get("total_carbohydrates"),
+            "fats": document.get("total_fats"),
+            "calories": document.get("total_calories")
+        },
+        "macronutrients_per_for_this_meal_100g": {
+            "proteins": document.get("proteins"),
+            "carbohydrates": document.get("carbohydrates"),
+            "fats": document.get("fats"),
+            "calories": document.get("calories")
+        },
+        "preparation_time": document.get("prep_time"),
+        "cooking_time": document.get("cook_time"),
+        "difficulty": document.get("difficulty"),
+        "servings": document.get("servings"),
+        "cusine": document.get("cusine"),
+        "course": document.get("course"),
+        "health_rank": document.get("health_rank"),
+        "tasty_rank": document.get("tasty_rank"),
+        "health_recommendations": {
+            "benefits": document.get("health_benefits", []),
+            "considerations": document.get("health_considerations", []),
+            "suitable_for": document.get("suitable_diets", []),
+            "not_suitable_for": document.get("unsuitable_diets", [])
+        },
+        "allergens": document.get("allergens", []),
+        "allergen_free": document.get("allergen_free", []),
+        "recipe_id": str(document.get("_id")) if document.get("_id") is not None else None,
+        "source": "gpt_recipes"
+    }
+
+def _postings(mapping: Dict[str, List[int]]) -> Dict[str, np.ndarray]:
+    return {key: np.array(sorted(set(rows)), dtype=np.int64) for key, rows in mapping.items()}
+
+class RecipeIndex:
+    """In-memory inverted and numeric indexes over gpt_recipes documents (the documents themselves are not kept)"""
+
+    def __init__(self):
+        self.ids: List[Any] = []
+        self.names: List[str] = []
+        self._row_by_id: Dict[Any, int] = {}
+        # Ingredient groups: lookup form -> group ids; group id -> recipe row; recipe row -> group count
+        self._groups_by_form: Dict[str, np.ndarray] = {}
+        self._group_row = np.zeros(0, dtype=np.int64)
+        self._group_count = np.zeros(0, dtype=np.int64)
+        # Per macro: (row order by value, values in that order); missing values sort last as NaN
+        self._sorted_macros: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._rows_by_diet: Dict[str, np.ndarray] = {}
+        self._rows_by_difficulty: Dict[str, np.ndarray] = {}
+        self._health_rank = np.zeros(0, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def build(self, documents: Iterable[dict]) -> int:
+        """
+        Replace the index with gpt_recipes documents
+
+        Documents without ingredients are skipped.
+
+        Returns:
+            int: Number of recipes indexed
+        """
+        ids = []
+        names = []
+        macros: Dict[str, List[Optional[float]]] = {field: [] for field in MACRO_FIELDS}
+        health_rank = []
+        groups_by_form: Dict[str, List[int]] = {}
+        group_row: List[int] = []
+        group_count: List[int] = []
+        rows_by_diet: Dict[str, List[int]] = {}
+        rows_by_difficulty: Dict[str, List[int]] = {}
+        for document in documents:
+            groups = _ingredient_groups(document)
+            if not groups:
+                continue
+            row = len(ids)
+            ids.append(document.get("_id"))
+            names.append(normalize_text(document.get("name") or ""))
+            for field, values in macros.items():
+                values.append(macro_value(document, field))
+            health_rank.append(parse_number(document.get("health_rank")))
+            for forms in groups:
+                for form in forms:
+                    groups_by_form.setdefault(form, []).append(len(group_row))
+                group_row.append(row)
+            group_count.append(len(groups))
+            for diet in _document_diets(document):
+                rows_by_diet.setdefault(diet, []).append(row)
+            difficulty = normalize_text(document.get("difficulty") or "")
+            if difficulty:
+                rows_by_difficulty.setdefault(difficulty, []).append(row)
+
+        sorted_macros = {}
+        for field, values in macros.items():
+            values = np.array(values, dtype=np.float64)
+            order = np.argsort(values, kind="stable")
+            sorted_macros[field] = (order, values[order])
+
+        self.ids = ids
+        self.names = names
+        self._row_by_id = {recipe_id: row for row, recipe_id in enumerate(ids)}
+        self._groups_by_form = _postings(groups_by_form)
+        self._group_row = np.array(group_row, dtype=np.int64)
+        self._group_count = np.array(group_count, dtype=np.int64)
+        self._sorted_macros = sorted_macros
+        self._rows_by_diet = _postings(rows_by_diet)
+        self._rows_by_difficulty = _postings(rows_by_difficulty)
+        self._health_rank = np.nan_to_num(np.array(health_rank, dtype=np.float64), nan=0.0)
+        return len(ids)
+
+    def _range_mask(self, field: str, low: Optional[float], high: Optional[float]) -> np.ndarray:
+        order, values = self._sorted_macros[field]
+        start = 0 if low is None else np.searchsorted(values, low, side="left")
+        end = np.searchsorted(values, np.inf, side="right") if high is None else np.searchsorted(values, high, side="right")
+        mask = np.zeros(len(self.ids), dtype=bool)
+        mask[order[start:end]] = True
+        return mask
+
+    def _ids_mask(self, ids: Iterable[Any]) -> np.ndarray:
+        rows = [self._row_by_id[recipe_id] for recipe_id in ids if recipe_id in self._row_by_id]
+        return self._rows_mask(np.array(rows, dtype=np.int64))
+
+    def _rows_mask(self, rows: Optional[np.ndarray]) -> np.ndarray:
+        mask = np.zeros(len(self.ids), dtype=bool)
+        if rows is not None:
+            mask[rows] = True
+        return mask
+
+    def search(self, ingredient_names: Iterable[str],
+               macro_ranges: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+               diet_type: Optional[str] = None, difficulty: Optional[str] = None, limit: int = 5,
+               min_coverage: float = 0.6, tolerance: float = 0.0,
+               candidate_ids: Optional[Iterable[Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Rank stored recipes for a request
+
+        Args:
+            ingredient_names: The ingredients the user has
+            macro_ranges: (min, max) per field of MACRO_FIELDS; None bounds are open
+            diet_type: Required diet (a flag like "gluten free" or an entry of suitable_diets)
+            difficulty: Required difficulty
+            limit: Maximum number of recipes
+            min_coverage: Smallest share of a recipe's base ingredients the user must have
+            tolerance: Relative widening of every macro bound (0.1 = 10%)
+            candidate_ids: Only rank recipes with these _ids (e.g. the result of an indexed range query)
+
+        Returns:
+            list: [{"id", "coverage", "matched", "missing"}] best first
+        """
+        if not self.ids:
+            return []
+        query_forms = set()
+        for name in ingredient_names:
+            query_forms.update(ingredient_forms(name))
+        postings = [self._groups_by_form[form] for form in query_forms if form in self._groups_by_form]
+        if not postings:
+            return []
+        covered_groups = np.unique(np.concatenate(postings))
+        matched = np.bincount(self._group_row[covered_groups], minlength=len(self.ids))
+        coverage = matched / self._group_count
+        mask = (matched > 0) & (coverage >= min_coverage)
+
+        for field, (low, high) in widen_ranges(macro_ranges, tolerance).items():
+            if field in self._sorted_macros:
+                mask &= self._range_mask(field, low, high)
+        if candidate_ids is not None:
+            mask &= self._ids_mask(candidate_ids)
+        if diet_type:
+            mask &= self._rows_mask(self._rows_by_diet.get(normalize_text(diet_type)))
+        if difficulty:
+            mask &= self._rows_mask(self._rows_by_difficulty.get(normalize_text(difficulty)))
+
+        rows = np.flatnonzero(mask)
+        # Best coverage first, then more matched ingredients, then healthier
+        ranked = rows[np.lexsort((-self._health_rank[rows], -matched[rows], -coverage[rows]))]
+        results = []
+        seen_names = set()
+        for row in ranked:
+            # The corpus holds variations of the same recipe; keep one per name
+            if self.names[row] in seen_names:
+                continue
+            seen_names.add(self.names[row])
+            results.append({
+                "id": self.ids[row],
+                "coverage": round(float(coverage[row]), 4),
+                "matched": int(matched[row]),
+                "missing": int(self._group_count[row] - matched[row])
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "recipes": len(self.ids),
+            "ingredient_forms": len(self._groups_by_form),
+            "diets": len(self._rows_by_diet)
+        }
+
+def _recipes_collection():
+    from mongodb_config import gpt_recipes_collection
+    return gpt_recipes_collection
+
+def _load_recipe_documents() -> Iterable[dict]:
+    collection = _recipes_collection()
+    if collection is None:
+        raise RuntimeError("gpt_recipes collection not available")
+    return collection.find({}, {field: 1 for field in INDEX_FIELDS})
+
+def _fetch_recipe_documents(ids: List[Any]) -> List[dict]:
+    """Full gpt_recipes documents for ids, in the same order; recipes deleted since the index was loaded are skipped"""
+    collection = _recipes_collection()
+    if collection is None or not ids:
+        return []
+    by_id = {document["_id"]: document
+             for document in collection.find({"_id": {"$in": ids}}, {field: 1 for field in RECIPE_FIELDS})}
+    return [by_id[recipe_id] for recipe_id in ids if recipe_id in by_id]
+
+def _range_candidate_ids(macro_ranges: Dict[str, Tuple[Optional[float], Optional[float]]]) -> Optional[set]:
+    """
+    _ids of the recipes within the macro ranges, from a gpt_recipes query served by the macro indexes
+
+    Returns None when there is no range to apply or MongoDB cannot answer;
+    the caller then filters on the index's own columns.
+    """
+    query = macro_range_filter(macro_ranges)
+    collection = _recipes_collection() if query else None
+    if collection is None:
+        return None
+    try:
+        return {document["_id"] for document in collection.find(query, {"_id": 1})}
+    except Exception as e:
+        logger.warning(f"⚠️ Macro range query failed, filtering in memory: {str(e)}")
+        return None
+
+_index = None
+_index_loaded_at = None
+_index_lock = threading.Lock()
+
+def get_recipe_index() -> Optional[RecipeIndex]:
+    """
+    Return the shared recipe index, reloading it every REFRESH_INTERVAL_SECONDS
+
+    Returns None when MongoDB is not available and no index has been built yet.
+    While one request rebuilds a stale index, the others keep using the previous one.
+    """
+    global _index, _index_loaded_at
+    interval = RECIPE_RETRIEVAL_CONFIG['REFRESH_INTERVAL_SECONDS']
+    if _index_loaded_at is not None and time.monotonic() - _index_loaded_at < interval:
+        return _index
+    if not _index_lock.acquire(blocking=_index is None):
+        return _index
+    try:
+        if _index_loaded_at is None or time.monotonic() - _index_loaded_at >= interval:
+            _index_loaded_at = time.monotonic()
+            try:
+                index = RecipeIndex()
+                count = index.build(_load_recipe_documents())
+                _index = index
+                logger.info(f"✅ Recipe index built: {count} recipes")
+            except Exception as e:
+                logger.error(f"❌ Failed to build recipe index: {str(e)}")
+    finally:
+        _index_lock.release()
+    return _index
+
+def search_stored_recipes(ingredient_names: Iterable[str],
+                          macro_ranges: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+                          diet_type: Optional[str] = None, difficulty: Optional[str] = None,
+                          limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Find stored recipes for a /get_recipe request
+
+    Args:
+        ingredient_names: The ingredients the user has
+        macro_ranges: (min, max) per field of MACRO_FIELDS
+        diet_type: Required diet
+        difficulty: Required difficulty
+        limit: Maximum number of recipes (default TARGET_RECIPES)
+
+    Returns:
+        list: Recipes in the /get_recipe shape with their coverage; empty when the index is unavailable
+    """
+    index = get_recipe_index()
+    if index is None:
+        return []
+    ranges = widen_ranges(macro_ranges, RECIPE_RETRIEVAL_CONFIG['RANGE_TOLERANCE'])
+    candidate_ids = _range_candidate_ids(ranges)
+    matches = index.search(
+        ingredient_names, ranges if candidate_ids is None else None, diet_type, difficulty,
+        limit=limit or RECIPE_RETRIEVAL_CONFIG['TARGET_RECIPES'],
+        min_coverage=RECIPE_RETRIEVAL_CONFIG['MIN_COVERAGE'],
+        candidate_ids=candidate_ids
+    )
+    coverage = {match["id"]: match["coverage"] for match in matches}
+    recipes = []
+    for document in _fetch_recipe_documents([match["id"] for match in matches]):
+        recipe = recipe_response(document)
+        recipe["ingredient_coverage"] = coverage[document["_id"]]
+        recipes.append(recipe)
+    return recipes
+
+def merge_recipes(retrieved: List[dict], generated: List[dict]) -> List[dict]:
+    """Retrieved recipes first, then the generated ones whose name is not already among them"""
+    seen_names = {normalize_text(recipe.get("name") or "") for recipe in retrieved}
+    merged = list(retrieved)
+    for recipe in generated:
+        name = normalize_text(recipe.get("name") or "") if isinstance(recipe, dict) else ""
+        if name and name in seen_names:
+            continue
+        seen_names.add(name)
+        merged.append(recipe)
+    return merged
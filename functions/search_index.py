@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Search keys and index bootstrap for the ingredient collections
+
+Each searchable document gets a normalized `search_key` (for exact and
+anchored prefix lookups) and a multikey `search_tokens` array of
+language-tagged word prefixes covering the top-level name and every
+language under `names.*`. Compound indexes on those fields replace the
+unanchored, case-insensitive $regex scans.
+
+Usage:
+    python search_index.py            # backfill search keys and create indexes
+    python search_index.py --indexes  # only create indexes
+"""
+
+import argparse
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from text_normalization import ANY_LANGUAGE, normalize_text, search_tokens, words_have_prefixes
+
+logger = logging.getLogger(__name__)
+
+# Bump to force a re-backfill when normalization or tokenization changes
+SEARCH_FIELDS_VERSION = 1
+
+# Collection attribute in mongodb_config -> field holding its primary name
+SEARCHABLE_COLLECTIONS = {
+    "ingredient_names_collection": "name",
+    "ingredients_nutrition_collection": "name",
+    "normalized_ingredients_collection": "base_ingredient_name",
+    "ingredient_categories_collection": "category"
+}
+
+SEARCH_INDEXES = [
+    ([("search_tokens", 1), ("search_key", 1)], "search_tokens_key"),
+    ([("search_key", 1)], "search_key")
+]
+
+# Extra indexes for equality filters used next to the search fields
+EXTRA_INDEXES = {
+    "normalized_ingredients_collection": [([("category", 1), ("search_key", 1)], "category_search_key")]
+}
+
+def _language_names(names: Any) -> Dict[str, List[str]]:
+    """Collect names.<lang>.name.{singular,plural} (or plain strings) per language"""
+    by_language = {}
+    if not isinstance(names, dict):
+        return by_language
+    for language, entry in names.items():
+        values = []
+        name = entry.get("name", entry) if isinstance(entry, dict) else entry
+        if isinstance(name, dict):
+            values.extend(v for v in name.values() if isinstance(v, str))
+        elif isinstance(name, str):
+            values.append(name)
+        if values:
+            by_language[language] = values
+    return by_language
+
+def build_search_fields(document: dict, primary_field: str) -> Dict[str, Any]:
+    """Return the $set payload with search_key/search_tokens for one document"""
+    primary = document.get(primary_field) or ""
+    tokens = set(search_tokens([primary], ANY_LANGUAGE))
+    for language, values in _language_names(document.get("names")).items():
+        tokens.update(search_tokens(values, language))
+    return {
+        "search_key": normalize_text(primary),
+        "search_tokens": sorted(tokens),
+        "search_version": SEARCH_FIELDS_VERSION
+    }
+
+def matches_full_words(document: dict, primary_field: str, words: List[str], language: Optional[str] = None) -> bool:
+    """
+    Re-check query words longer than the indexed prefixes against a document found by its search_tokens
+
+    The words must all start words of the primary name, or all start words of
+    names.<language>, mirroring the two token clauses of the indexed query.
+    """
+    if words_have_prefixes(words, [document.get(primary_field) or ""]):
+        return True
+    if not language or language == ANY_LANGUAGE:
+        return False
+    return words_have_prefixes(words, _language_names(document.get("names")).get(language, []))
+
+def backfill_search_fields(collection, primary_field: str, batch_size: int = 1000) -> int:
+    """
+    Add search fields to every document that lacks the current version
+
+    Returns:
+        int: Number of documents updated
+    """
+    from pymongo import UpdateOne
+
+    updated = 0
+    operations = []
+    cursor = collection.find(
+        {"search_version": {"$ne": SEARCH_FIELDS_VERSION}},
+        {primary_field: 1, "names": 1}
+    ).batch_size(batch_size)
+    for document in cursor:
+        operations.append(UpdateOne({"_id": document["_id"]}, {"$set": build_search_fields(document, primary_field)}))
+        if len(operations) >= batch_size:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += collection.bulk_write(operations, ordered=False).modified_count
+    return updated
+
+def ensure_search_indexes(collection, extra_indexes: Optional[Iterable] = None) -> List[str]:
+    """Create the search indexes on a collection (no-op for existing ones)"""
+    created = []
+    for keys, name in list(SEARCH_INDEXES) + list(extra_indexes or []):
+        created.append(collection.create_index(keys, name=name))
+    return created
+
+def bootstrap_search_indexes(backfill: bool = True) -> Dict[str, Dict[str, Any]]:
+    """
+    Backfill search fields and create indexes on all ingredient collections
+
+    Returns:
+        dict: Per-collection {"updated": count, "indexes": [...]} or {"error": message}
+    """
+    import mongodb_config
+
+    report = {}
+    for attribute, primary_field in SEARCHABLE_COLLECTIONS.items():
+        collection = getattr(mongodb_config, attribute, None)
+        if collection is None:
+            report[attribute] = {"error": "collection not available"}
+            continue
+        try:
+            updated = backfill_search_fields(collection, primary_field) if backfill else 0
+            indexes = ensure_search_indexes(collection, EXTRA_INDEXES.get(attribute))
+            report[attribute] = {"updated": updated, "indexes": indexes}
+            logger.info(f"✅ Search fields ready on {collection.name}: {updated} documents updated")
+        except Exception as e:
+            logger.error(f"❌ Failed to bootstrap search indexes on {attribute}: {str(e)}")
+            report[attribute] = {"error": str(e)}
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill ingredient search fields and create indexes")
+    parser.add_argument("--indexes", action="store_true", help="Only create indexes, skip the backfill")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print("🚀 Bootstrapping ingredient search indexes...")
+    for attribute, result in bootstrap_search_indexes(backfill=not args.indexes).items():
+        print(f"   {attribute}: {result}")
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,82 @@
 import json
-from utils import get_simple_meal_analysis_prompt, get_analysis_prompt, get_refrigerator_prompt, get_invoice_prompt, get_recipe_logic, compress_image_for_api, MAX_IMAGES, process_ingredient_nutrition_data
-from openai_helper import analyze_image_with_openai, analyze_image_with_openrouter
+from concurrent.futures import ThreadPoolExecutor
+from utils import get_simple_meal_analysis_prompt, get_analysis_prompt, get_refrigerator_prompt, get_invoice_prompt, get_refrigerator_detection_prompt, get_invoice_detection_prompt, get_ingredient_enrichment_prompt, get_recipe_logic, compress_image_for_api, MAX_FILE_SIZE, MAX_IMAGES, MAX_CONCURRENT_IMAGE_ANALYSES, process_ingredient_nutrition_data
+from openai_helper import analyze_image_with_openai, analyze_image_with_openrouter, complete_text_with_openrouter, VISION_MODEL
+from caching import analysis_cache, lookup_cached_analysis, store_cached_analysis
+from image_payload import ImagePayload, ImageUploadError, read_image_upload
+from ingredient_index import autocomplete_ingredients
+from nutrition_table import complete_detection_result
+from output_schemas import INGREDIENT_NUTRITION, ITEM_DETECTION, MEAL_ANALYSIS
+from config import INGREDIENT_INDEX_CONFIG, TWO_STAGE_NUTRITION_CONFIG
 import base64
 import logging
 from firebase_functions.https_fn import Request, Response
 
 logger = logging.getLogger(__name__)
 
+def _two_stage_requested(request_data: dict) -> bool:
+    """Per-request "mode" ("two_stage" / "single_stage") overrides TWO_STAGE_NUTRITION_CONFIG['ENABLED']"""
+    mode = request_data.get('mode')
+    if mode in ("two_stage", "single_stage"):
+        return mode == "two_stage"
+    return TWO_STAGE_NUTRITION_CONFIG['ENABLED']
+
+def _enrich_unknown_items(items: list) -> dict:
+    """Ask the model (text only) for the nutrition of items missing from the nutrition table"""
+    result = complete_text_with_openrouter(
+        get_ingredient_enrichment_prompt(items),
+        model=TWO_STAGE_NUTRITION_CONFIG['ENRICHMENT_MODEL'] or None,
+        max_tokens=TWO_STAGE_NUTRITION_CONFIG['ENRICHMENT_MAX_TOKENS'],
+        output_schema=INGREDIENT_NUTRITION
+    )
+    if "error" in result:
+        logger.error(f"Enrichment failed for {len(items)} items: {result['error']}")
+        return {}
+    return result.get("macronutrients_by_ingredient") or {}
+
+def _analyze_single_image(index: int, image_data: dict, prompt: str, two_stage: bool = False, output_schema=None) -> tuple:
+    """Analyze one image of a multi-image request, returning (result, error_message)"""
+    try:
+        image_base64 = image_data.get('image_base64')
+        if not image_base64:
+            return None, f"Image {index+1}: No base64 data provided"
+        result = analyze_image_with_openrouter(
+            image_base64=image_base64,
+            prompt=prompt,
+            output_schema=output_schema
+        )
+        if "error" in result:
+            return None, f"Image {index+1}: {result['error']}"
+        if two_stage:
+            complete_detection_result(result, enrich=_enrich_unknown_items)
+        if "macronutrients_by_ingredient" in result:
+            process_ingredient_nutrition_data(result)
+        return result, None
+    except Exception as e:
+        error_msg = f"Error processing image {index+1}: {str(e)}"
+        logger.error(error_msg)
+        return None, error_msg
+
+def analyze_images_concurrently(images: list, prompt: str, max_workers: int = MAX_CONCURRENT_IMAGE_ANALYSES,
+                                two_stage: bool = False, output_schema=None) -> list:
+    """
+    Fan out the per-image analysis over a bounded thread pool.
+
+    Results are returned in the original image order as (result, error_message)
+    pairs, so callers aggregate exactly as they would for a sequential loop.
+    With max_workers <= 1 the images are analyzed one after another. In
+    two-stage mode the prompt only detects items and the nutrition is filled
+    from the nutrition table (unknown items are enriched by the model).
+    output_schema is the expected answer format of every image.
+    """
+    if max_workers <= 1 or len(images) <= 1:
+        return [_analyze_single_image(index, image_data, prompt, two_stage, output_schema) for index, image_data in enumerate(images)]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(images))) as executor:
+        return list(executor.map(
+            lambda args: _analyze_single_image(args[0], args[1], prompt, two_stage, output_schema),
+            enumerate(images)
+        ))
+
 def analyze_meal_image_v1_service(req: Request) -> Response:
     try:
         data = req.get_json()
@@ -122,28 +192,73 @@ def analyze_meal_image_v2_service(req: Request) -> Response:
         image_name = request_data.get('image_name', 'unknown')
         if not image_url and not image_base64:
             return Response(json.dumps({"error": "Either 'image_url' or 'image_base64' must be provided"}), status=400, headers=headers)
+        image_payload = None
         if image_base64:
             try:
-                image_bytes = base64.b64decode(image_base64)
-                original_size_kb = len(image_bytes) / 1024
-                if original_size_kb > 400:
-                    compressed_bytes = compress_image_for_api(image_bytes, max_size_kb=400)
-                    image_base64 = base64.b64encode(compressed_bytes).decode('utf-8')
+                # Decode once; the image stays binary until it is streamed to the model
+                image_payload = ImagePayload.from_base64(request_data.pop('image_base64'))
+                image_base64 = None
             except Exception as e:
                 pass
-        analysis_result = analyze_image_with_openrouter(
-            image_url=image_url,
-            image_base64=image_base64,
-            prompt=get_analysis_prompt()
-        )
-        if "error" not in analysis_result:
-            return Response(json.dumps(analysis_result), status=200, headers=headers)
-        else:
-            return Response(json.dumps(analysis_result), status=500, headers=headers)
+        return _analyze_meal_image_payload(image_url, image_base64, image_payload, image_name, headers)
     except Exception as e:
         error_msg = f"Unexpected error in analyze_meal_image_v2: {str(e)}"
         return Response(json.dumps({"error": error_msg}), status=500, headers=headers)
 
+def _analyze_meal_image_payload(image_url, image_base64, image_payload, image_name: str, headers: dict) -> Response:
+    """Cache lookup, compression and analysis shared by the JSON and upload v2 endpoints"""
+    prompt = get_analysis_prompt()
+    cache_lookup = None
+    if image_payload is not None:
+        try:
+            cache_lookup = lookup_cached_analysis(image_payload.data, prompt, VISION_MODEL)
+            if cache_lookup.result is not None:
+                logger.info(f"Analysis cache hit ({cache_lookup.source}) for {image_name}: {analysis_cache.stats()}")
+                return Response(json.dumps(cache_lookup.result), status=200, headers={**headers, 'X-Analysis-Cache': 'HIT'})
+            original_size_kb = len(image_payload) / 1024
+            if original_size_kb > 400:
+                image_payload = ImagePayload(compress_image_for_api(image_payload.data, max_size_kb=400))
+        except Exception as e:
+            pass
+    analysis_result = analyze_image_with_openrouter(
+        image_url=image_url,
+        image_base64=image_base64,
+        prompt=prompt,
+        image_payload=image_payload,
+        output_schema=MEAL_ANALYSIS
+    )
+    if "error" not in analysis_result:
+        if cache_lookup:
+            store_cached_analysis(cache_lookup, prompt, VISION_MODEL, analysis_result)
+        return Response(json.dumps(analysis_result), status=200, headers={**headers, 'X-Analysis-Cache': 'MISS'})
+    else:
+        return Response(json.dumps(analysis_result), status=500, headers=headers)
+
+def analyze_meal_image_upload_service(req: Request) -> Response:
+    if req.method == 'OPTIONS':
+        headers = {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'POST',
+            'Access-Control-Allow-Headers': 'Content-Type, X-Image-Name',
+            'Access-Control-Max-Age': '3600'
+        }
+        return Response("", status=204, headers=headers)
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Content-Type': 'application/json'
+    }
+    try:
+        if req.method != 'POST':
+            return Response(json.dumps({"error": "Only POST method is allowed"}), status=405, headers=headers)
+        try:
+            image_payload, image_name = read_image_upload(req, MAX_FILE_SIZE)
+        except ImageUploadError as e:
+            return Response(json.dumps({"error": str(e)}), status=e.status, headers=headers)
+        return _analyze_meal_image_payload(None, None, image_payload, image_name, headers)
+    except Exception as e:
+        error_msg = f"Unexpected error in analyze_meal_image_upload: {str(e)}"
+        return Response(json.dumps({"error": error_msg}), status=500, headers=headers)
+
 def analyze_refrigerator_service(req: Request) -> Response:
     if req.method == 'OPTIONS':
         headers = {
@@ -176,30 +291,23 @@ def analyze_refrigerator_service(req: Request) -> Response:
         total_items = 0
         processed_images = 0
         errors = []
-        for index, image_data in enumerate(images):
-            try:
-                image_base64 = image_data.get('image_base64')
-                if not image_base64:
-                    errors.append(f"Image {index+1}: No base64 data provided")
-                    continue
-                result = analyze_image_with_openrouter(
-                    image_base64=image_base64,
-                    prompt=get_refrigerator_prompt()
-                )
-                if "error" in result:
-                    errors.append(f"Image {index+1}: {result['error']}")
-                else:
-                    if "macronutrients_by_ingredient" in result:
-                        process_ingredient_nutrition_data(result)
-                    if "ingredients" in result:
-                        all_ingredients.extend(result["ingredients"])
-                    if "total_items" in result:
-                        total_items += result["total_items"]
-                    processed_images += 1
-            except Exception as e:
-                error_msg = f"Error processing image {index+1}: {str(e)}"
-                errors.append(error_msg)
-                logger.error(error_msg)
+        two_stage = _two_stage_requested(request_data)
+        prompt = get_refrigerator_detection_prompt() if two_stage else get_refrigerator_prompt()
+        nutrition_by_ingredient = {}
+        unresolved_items = []
+        output_schema = ITEM_DETECTION if two_stage else INGREDIENT_NUTRITION
+        for result, error in analyze_images_concurrently(images, prompt, two_stage=two_stage, output_schema=output_schema):
+            if error:
+                errors.append(error)
+                continue
+            if "ingredients" in result:
+                all_ingredients.extend(result["ingredients"])
+            if two_stage:
+                nutrition_by_ingredient.update(result.get("macronutrients_by_ingredient", {}))
+                unresolved_items.extend(result.get("unresolved_items", []))
+            if "total_items" in result:
+                total_items += result["total_items"]
+            processed_images += 1
         response_data = {
             "ingredients": all_ingredients,
             "total_items": total_items,
@@ -209,6 +317,10 @@ def analyze_refrigerator_service(req: Request) -> Response:
             "processing_errors": errors if errors else None,
             "analysis_type": "refrigerator_analysis"
         }
+        if two_stage:
+            response_data["macronutrients_by_ingredient"] = nutrition_by_ingredient
+            response_data["unresolved_items"] = unresolved_items or None
+            response_data["analysis_mode"] = "two_stage"
         return Response(json.dumps(response_data), status=200, headers=headers)
     except Exception as e:
         error_msg = f"Unexpected error in analyze_refrigerator: {str(e)}"
@@ -248,32 +360,25 @@ def analyze_invoice_service(req: Request) -> Response:
         processed_images = 0
         errors = []
         receipt_summaries = []
-        for index, image_data in enumerate(images):
-            try:
-                image_base64 = image_data.get('image_base64')
-                if not image_base64:
-                    errors.append(f"Image {index+1}: No base64 data provided")
-                    continue
-                result = analyze_image_with_openrouter(
-                    image_base64=image_base64,
-                    prompt=get_invoice_prompt()
-                )
-                if "error" in result:
-                    errors.append(f"Image {index+1}: {result['error']}")
-                else:
-                    if "macronutrients_by_ingredient" in result:
-                        process_ingredient_nutrition_data(result)
-                    if "ingredients" in result:
-                        all_ingredients.extend(result["ingredients"])
-                    if "total_items" in result:
-                        total_items += result["total_items"]
-                    if "receipt_summary" in result:
-                        receipt_summaries.append(result["receipt_summary"])
-                    processed_images += 1
-            except Exception as e:
-                error_msg = f"Error processing image {index+1}: {str(e)}"
-                errors.append(error_msg)
-                logger.error(error_msg)
+        two_stage = _two_stage_requested(request_data)
+        prompt = get_invoice_detection_prompt() if two_stage else get_invoice_prompt()
+        nutrition_by_ingredient = {}
+        unresolved_items = []
+        output_schema = ITEM_DETECTION if two_stage else INGREDIENT_NUTRITION
+        for result, error in analyze_images_concurrently(images, prompt, two_stage=two_stage, output_schema=output_schema):
+            if error:
+                errors.append(error)
+                continue
+            if "ingredients" in result:
+                all_ingredients.extend(result["ingredients"])
+            if two_stage:
+                nutrition_by_ingredient.update(result.get("macronutrients_by_ingredient", {}))
+                unresolved_items.extend(result.get("unresolved_items", []))
+            if "total_items" in result:
+                total_items += result["total_items"]
+            if "receipt_summary" in result:
+                receipt_summaries.append(result["receipt_summary"])
+            processed_images += 1
         response_data = {
             "ingredients": all_ingredients,
             "total_items": total_items,
@@ -284,6 +389,10 @@ def analyze_invoice_service(req: Request) -> Response:
             "processing_errors": errors if errors else None,
             "analysis_type": "invoice_receipt_analysis"
         }
+        if two_stage:
+            response_data["macronutrients_by_ingredient"] = nutrition_by_ingredient
+            response_data["unresolved_items"] = unresolved_items or None
+            response_data["analysis_mode"] = "two_stage"
         return Response(json.dumps(response_data), status=200, headers=headers)
     except Exception as e:
         error_msg = f"Unexpected error in analyze_invoice: {str(e)}"
@@ -295,3 +404,17 @@ def get_recipe_service(req: Request) -> Response:
     result = get_recipe_logic(params)
     return Response(json.dumps(result), mimetype="application/json")
 
+
+def autocomplete_ingredients_service(req: Request) -> Response:
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Content-Type': 'application/json'
+    }
+    query = req.args.get('q', '')
+    language = req.args.get('lang')
+    try:
+        limit = int(req.args.get('limit', INGREDIENT_INDEX_CONFIG['MAX_RESULTS']))
+    except ValueError:
+        return Response(json.dumps({"error": "limit must be an integer"}), status=400, headers=headers)
+    results = autocomplete_ingredients(query, language, min(max(limit, 1), 50))
+    return Response(json.dumps({"query": query, "results": results}, ensure_ascii=False), status=200, headers=headers)
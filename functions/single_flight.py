@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Request coalescing (single-flight) for identical concurrent model calls
+
+A client retrying on a slow network sends the same image or the same
+/get_recipe query several times within seconds. A SingleFlight runs the
+first call for a content key and makes every identical call that arrives
+while it is in flight wait for that result instead of starting its own
+model call. Nothing is kept once the call finishes; caching finished
+results is the job of caching.py.
+
+do() serves synchronous callers on handler threads; do_async() serves
+coroutines on one event loop. join()/finish() let a caller that produces
+its result incrementally (a streamed analysis) lead a call itself.
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from config import SINGLE_FLIGHT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+def content_key(*parts: Any) -> str:
+    """
+    Hash request content into a single-flight key
+
+    Strings and bytes (or objects with a `data` bytes attribute, like
+    ImagePayload) are hashed as-is; other values as canonical JSON.
+
+    Returns:
+        str: Hex sha256 digest
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        data = getattr(part, "data", part)
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            encoded = bytes(data)
+        elif isinstance(data, str):
+            encoded = data.encode("utf-8")
+        else:
+            encoded = json.dumps(data, sort_keys=True, default=str).encode("utf-8")
+        # Length prefix, so ("ab", "c") and ("a", "bc") differ
+        digest.update(len(encoded).to_bytes(8, "big"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+class SingleFlight:
+    """Share one in-flight call among concurrent callers with the same key"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._async_in_flight: Dict[str, tuple] = {}
+        self._calls = 0
+        self._executions = 0
+        self._coalesced = 0
+
+    def _join(self, key: str) -> None:
+        self._coalesced += 1
+        logger.info(f"🔗 {self.name}: joined in-flight call {key[:12]} ({self._coalesced}/{self._calls} calls coalesced)")
+
+    def join(self, key: Optional[str]) -> Tuple[Future, bool]:
+        """
+        Join the in-flight call for key, or become its leader
+
+        A leader must settle the returned future with finish(); waiters read it with wait().
+
+        Returns:
+            tuple: (future, leader)
+        """
+        if key is None or not SINGLE_FLIGHT_CONFIG['ENABLED']:
+            return Future(), True
+        with self._lock:
+            self._calls += 1
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._in_flight[key] = Future()
+                self._executions += 1
+                return future, True
+            self._join(key)
+            return future, False
+
+    def finish(self, key: Optional[str], future: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+        """Settle a led call: waiters get a copy of result (frozen now), or error raised"""
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            # The leader may go on to modify its own result
+            future.set_result(copy.deepcopy(result))
+
+    @staticmethod
+    def wait(future: Future) -> Any:
+        """The result of a joined call (a private copy), or its exception raised"""
+        return copy.deepcopy(future.result())
+
+    def do(self, key: Optional[str], fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Call fn(*args, **kwargs), or wait for the identical call already running
+
+        Args:
+            key: Content key of the call (None: never coalesce)
+            fn: The function to run
+
+        Returns:
+            Any: fn's result (waiters get a copy); its exception is raised to every waiter
+        """
+        future, leader = self.join(key)
+        if not leader:
+            return self.wait(future)
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result)
+        return result
+
+    async def do_async(self, key: Optional[str], fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Await fn(*args, **kwargs), or the identical call already running on this event loop
+
+        The shared call keeps running while any caller waits for it; it is
+        cancelled once every caller has been cancelled.
+
+        Args:
+            key: Content key of the call (None: never coalesce)
+            fn: The coroutine function to run
+
+        Returns:
+            Any: A copy of fn's result
+        """
+        if key is None or not SINGLE_FLIGHT_CONFIG['ENABLED']:
+            return await fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._calls += 1
+            entry = self._async_in_flight.get(key)
+            leader = entry is None or entry["loop"] is not loop
+            if leader:
+                entry = {"loop": loop, "task": loop.create_task(fn(*args, **kwargs)), "waiters": 0}
+                self._async_in_flight[key] = entry
+                self._executions += 1
+                entry["task"].add_done_callback(lambda task: self._forget(key, task))
+            else:
+                self._join(key)
+            entry["waiters"] += 1
+        try:
+            result = await asyncio.shield(entry["task"])
+        except asyncio.CancelledError:
+            entry["waiters"] -= 1
+            if entry["waiters"] == 0:
+                entry["task"].cancel()
+            raise
+        entry["waiters"] -= 1
+        # Every caller, leader included, gets its own copy: they resume one after another on the loop
+        return copy.deepcopy(result)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        with self._lock:
+            entry = self._async_in_flight.get(key)
+            if entry is not None and entry["task"] is task:
+                del self._async_in_flight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self._calls,
+                "executions": self._executions,
+                "coalesced": self._coalesced,
+                "in_flight": len(self._in_flight) + len(self._async_in_flight),
+                "coalesce_rate": round(self._coalesced / self._calls, 4) if self._calls else 0.0
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._calls = self._executions = self._coalesced = 0
+
+# Shared instances for the model calls
+vision_flight = SingleFlight("vision_analysis")
+analysis_flight = SingleFlight("parsed_analysis")
+recipe_flight = SingleFlight("recipe_generation")
+
+def single_flight_stats() -> Dict[str, Dict[str, Any]]:
+    """Coalescing counters of every shared instance"""
+    return {flight.name: flight.stats() for flight in (vision_flight, analysis_flight, recipe_flight)}
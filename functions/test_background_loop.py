@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test script for the background event loop and the async recipe entry point
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+import utils
+from background_loop import get_background_loop, run_coroutine, shutdown_background_loop
+from http_client import get_async_client
+
+RECIPES = {"recipes": [{"name": "Egg Salad", "ingredients": [{"name": "egg"}], "instructions": ["Mix"],
+                        "nutritional_info": {"calories": 300, "protein": 18}}]}
+
+async def _current_loop_and_client():
+    return asyncio.get_running_loop(), get_async_client()
+
+def test_loop_reused():
+    """Every call runs on one loop, so the AsyncClient and its connections are shared"""
+    print("🧪 Testing loop reuse...")
+    first_loop, first_client = run_coroutine(_current_loop_and_client())
+    second_loop, second_client = run_coroutine(_current_loop_and_client())
+    assert first_loop is second_loop is get_background_loop()
+    assert first_client is second_client and not first_client.is_closed
+
+def test_concurrent_callers():
+    """Handler threads wait on their own coroutine while the loop interleaves them"""
+    print("🧪 Testing concurrent callers...")
+    results = {}
+
+    def call(index):
+        results[index] = run_coroutine(asyncio.sleep(0.2, result=index))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    assert results == {index: index for index in range(10)}
+    assert elapsed < 1.0, elapsed
+    print(f"   ✅ 10 x 0.2s coroutines finished in {elapsed:.2f}s")
+
+def test_errors_and_misuse():
+    """Exceptions propagate; blocking the loop from itself is refused; timeouts cancel"""
+    print("🧪 Testing errors...")
+    async def fail():
+        raise ValueError("boom")
+    try:
+        run_coroutine(fail())
+        assert False, "expected ValueError"
+    except ValueError as e:
+        assert str(e) == "boom"
+
+    async def nested():
+        try:
+            run_coroutine(asyncio.sleep(0))
+        except RuntimeError:
+            return "refused"
+    assert run_coroutine(nested()) == "refused"
+
+    try:
+        run_coroutine(asyncio.sleep(5), timeout=0.05)
+        assert False, "expected TimeoutError"
+    except TimeoutError:
+        pass
+
+def test_shutdown_restarts():
+    """After shutdown the next call starts a fresh loop"""
+    print("🧪 Testing shutdown...")
+    loop, client = run_coroutine(_current_loop_and_client())
+    shutdown_background_loop()
+    assert loop.is_closed() and client.is_closed
+    assert run_coroutine(asyncio.sleep(0, result="ok")) == "ok"
+    assert get_background_loop() is not loop
+
+def test_get_recipe_logic():
+    """The sync entry point runs on the background loop; the async one runs inside the caller's loop"""
+    print("🧪 Testing get_recipe_logic variants...")
+    loops = []
+
+    async def fake_generate(prompt, image_urls, usage=None):
+        loops.append(asyncio.get_running_loop())
+        return json.dumps(RECIPES)
+
+    originals = (utils.RecipeGenerator.generate_recipe_with_ai, utils.FileManager.cleanup_old_files,
+                 utils.FileManager.save_response_to_mock)
+    utils.RecipeGenerator.generate_recipe_with_ai = staticmethod(fake_generate)
+    utils.FileManager.cleanup_old_files = staticmethod(lambda folder_path, max_files=1000: None)
+    utils.FileManager.save_response_to_mock = staticmethod(lambda response, filename=None: None)
+    # Different calorie targets, so the recipe cache does not answer instead of the generator
+    params = [{"ingredients": "egg, mayonnaise", "max_calories": str(calories)} for calories in (400, 600, 800)]
+    try:
+        first = utils.get_recipe_logic(params[0])
+        second = utils.get_recipe_logic(params[1])
+
+        async def from_running_loop():
+            return await utils.get_recipe_logic_async(params[2])
+        third = asyncio.run(from_running_loop())
+    finally:
+        (utils.RecipeGenerator.generate_recipe_with_ai, utils.FileManager.cleanup_old_files,
+         utils.FileManager.save_response_to_mock) = (staticmethod(originals[0]), staticmethod(originals[1]),
+                                                     staticmethod(originals[2]))
+    assert first["recipes"][0]["name"] == second["recipes"][0]["name"] == third["recipes"][0]["name"] == "Egg Salad"
+    assert loops[0] is loops[1] is get_background_loop()
+    assert loops[2] is not loops[0]
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting background loop tests...")
+    test_loop_reused()
+    test_concurrent_callers()
+    test_errors_and_misuse()
+    test_shutdown_restarts()
+    test_get_recipe_logic()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
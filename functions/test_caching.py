@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test script for the analysis result cache
+"""
+
+import time
+from caching import TTLCache, AnalysisResultCache, make_analysis_cache_key
+
+class FakeCollection:
+    """Minimal stand-in for a pymongo collection used as the second cache tier"""
+
+    def __init__(self):
+        self.documents = {}
+
+    def find_one(self, query, projection=None):
+        document = self.documents.get(query["_id"])
+        if document and document["expires_at"] > query["expires_at"]["$gt"]:
+            return document
+        return None
+
+    def replace_one(self, query, document, upsert=False):
+        self.documents[query["_id"]] = document
+
+    def create_index(self, *args, **kwargs):
+        return "expires_at_1"
+
+def test_cache_key():
+    """Keys change with the image bytes, the prompt and the model"""
+    print("🧪 Testing cache keys...")
+    base = make_analysis_cache_key(b"image", "prompt", "model-a")
+    assert base == make_analysis_cache_key(b"image", "prompt", "model-a")
+    assert base != make_analysis_cache_key(b"image2", "prompt", "model-a")
+    assert base != make_analysis_cache_key(b"image", "prompt2", "model-a")
+    assert base != make_analysis_cache_key(b"image", "prompt", "model-b")
+    print("   ✅ Keys are content addressed")
+
+def test_ttl_and_lru():
+    """Entries expire after the TTL and the least recently used entry is evicted"""
+    print("🧪 Testing TTL and LRU eviction...")
+    cache = TTLCache(max_entries=2, ttl_seconds=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["expirations"] == 1
+    print(f"   ✅ Stats: {stats}")
+
+def test_two_tier_cache():
+    """A Mongo tier hit is promoted into memory and counted separately"""
+    print("🧪 Testing two-tier analysis cache...")
+    collection = FakeCollection()
+    writer = AnalysisResultCache(max_entries=4, ttl_seconds=60, mongo_collection=collection)
+    writer.set("key", {"mealName": "Salad"})
+
+    reader = AnalysisResultCache(max_entries=4, ttl_seconds=60, mongo_collection=collection)
+    assert reader.get("missing") is None
+    assert reader.get("key") == {"mealName": "Salad"}
+    result = reader.get("key")
+    result["mealName"] = "mutated"
+    assert reader.get("key") == {"mealName": "Salad"}
+
+    stats = reader.stats()
+    assert stats["mongo_hits"] == 1
+    assert stats["memory_hits"] == 2
+    assert stats["misses"] == 1
+    print(f"   ✅ Stats: {stats}")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting cache tests...")
+    test_cache_key()
+    test_ttl_and_lru()
+    test_two_tier_cache()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
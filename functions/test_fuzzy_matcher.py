@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Test script for typo-tolerant ingredient matching
+"""
+
+import mongodb_config
+from fuzzy_matcher import FuzzyIngredientMatcher, edit_distance, fuzzy_key, transliterate
+from mongodb_config import _documents_for_matches, find_similar_ingredients
+
+DOCUMENTS = [
+    {
+        "_id": 1,
+        "name": "chicken",
+        "names": {
+            "english": {"name": {"singular": "chicken", "plural": "chickens"}},
+            "hebrew": {"name": {"singular": "עוף", "plural": "עופות"}},
+            "russian": {"name": {"singular": "курица", "plural": "курицы"}},
+            "spanish": {"name": {"singular": "pollo", "plural": "pollos"}}
+        }
+    },
+    {"_id": 2, "name": "Chicken Breast", "names": {"es": {"name": {"singular": "Pechuga de Pollo"}}}},
+    {"_id": 3, "name": "Tomato", "names": {"he": {"name": "עגבנייה"}, "ru": {"name": "помидор"}}},
+    {"_id": 4, "name": "Potato", "names": {"en": {"name": {"singular": "potato", "plural": "potatoes"}, "synonyms": ["spud"]}}},
+    {"_id": 5, "name": "Chips", "names": {"he": {"name": "צ'יפס"}}}
+]
+
+def build_matcher() -> FuzzyIngredientMatcher:
+    matcher = FuzzyIngredientMatcher()
+    assert matcher.build(DOCUMENTS) == 5
+    return matcher
+
+def top(matcher, query, **kwargs):
+    results = matcher.search(query, **kwargs)
+    return results[0]["name"] if results else None
+
+def test_edit_distance():
+    """Optimal string alignment counts a transposition as one edit and stops early"""
+    print("🧪 Testing edit distance...")
+    assert edit_distance("chicken", "chicken", 2) == 0
+    assert edit_distance("chiken", "chicken", 2) == 1
+    assert edit_distance("tomaot", "tomato", 2) == 1
+    assert edit_distance("kitten", "sitting", 3) == 3
+    assert edit_distance("kitten", "sitting", 1) == 2
+    assert edit_distance("a", "abcdef", 2) == 3
+
+def test_normalization():
+    """Per-script folding: Hebrew finals and geresh, Russian ё, transliteration"""
+    print("🧪 Testing fuzzy keys...")
+    assert fuzzy_key("עוף") == "עופ"
+    assert fuzzy_key("צ'יפס") == "ציפס"
+    assert fuzzy_key("Ёжик") == "ежик"
+    assert transliterate(fuzzy_key("Курица")) == "kuritsa"
+    assert transliterate("tomato") == "tomato"
+
+def test_typos_and_transliteration():
+    """Misspelled, transliterated and native names resolve to the canonical ingredient"""
+    print("🧪 Testing fuzzy matches...")
+    matcher = build_matcher()
+    assert top(matcher, "tomatos") == "Tomato"
+    assert top(matcher, "chiken") == "chicken"
+    assert top(matcher, "chiken brest") == "Chicken Breast"
+    assert top(matcher, "kuritsa") == "chicken"
+    assert top(matcher, "kurica") == "chicken"
+    assert top(matcher, "помидоры") == "Tomato"
+    assert top(matcher, "עגבניה") == "Tomato"
+    assert top(matcher, "ציפס") == "Chips"
+    assert top(matcher, "potatos") == "Potato"
+    assert top(matcher, "xyzzy") is None
+    # Short queries must match exactly
+    assert top(matcher, "po") is None
+
+    results = matcher.search("chiken")
+    assert [result["name"] for result in results] == ["chicken", "Chicken Breast"]
+    assert results[0]["score"] > results[1]["score"]
+    assert results[0]["distance"] == 1 and results[0]["match"] == "chicken"
+    assert top(matcher, "pollo", language="ru") is None
+    assert top(matcher, "pollo", language="spanish") == "chicken"
+
+def test_incremental_updates():
+    """Upserts replace a document's terms and removals drop them"""
+    print("🧪 Testing incremental updates...")
+    matcher = build_matcher()
+    terms = matcher.key_count
+    matcher.upsert_document({"_id": 4, "name": "Potato", "names": {"ru": {"name": "картофель"}}})
+    assert top(matcher, "spud") is None
+    assert top(matcher, "kartofel") == "Potato"
+    assert matcher.remove_document(4)
+    assert top(matcher, "potatos") is None
+    assert not matcher.remove_document(4)
+    assert matcher.key_count < terms
+
+class FakeCollection:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, query, projection):
+        ids = set(query["_id"]["$in"])
+        return [dict(document) for document in self.documents if document["_id"] in ids]
+
+def test_documents_keep_ranking():
+    """find_ingredient's fuzzy results come back in match order with scores"""
+    print("🧪 Testing ranked documents...")
+    matches = build_matcher().search("chiken")
+    assert [match["id"] for match in matches] == [1, 2]
+    results = _documents_for_matches(FakeCollection(DOCUMENTS), matches)
+    assert [result["name"] for result in results] == ["chicken", "Chicken Breast"]
+    assert results[0]["score"] == matches[0]["score"] and results[0]["distance"] == 1
+    assert "_id" not in results[0]
+    assert _documents_for_matches(FakeCollection(DOCUMENTS), []) == []
+
+def test_documents_without_plain_name():
+    """Names taken from names.en or stored with surrounding whitespace still find their documents"""
+    print("🧪 Testing documents by _id...")
+    documents = DOCUMENTS + [
+        {"_id": 6, "names": {"en": {"name": {"singular": "Zucchini"}}}},
+        {"_id": 7, "name": " Basil ", "names": {}}
+    ]
+    matcher = FuzzyIngredientMatcher()
+    matcher.build(documents)
+    for query, document_id in (("zuchini", 6), ("basill", 7)):
+        matches = matcher.search(query, limit=1)
+        results = _documents_for_matches(FakeCollection(documents), matches)
+        assert len(results) == 1 and results[0]["names"] == documents[document_id - 1]["names"]
+
+class FakeNormalized:
+    def __init__(self, documents):
+        self.documents = documents
+        self.queries = []
+
+    def find_one(self, query, projection):
+        self.queries.append(query)
+        field, value = next(iter(query.items()))
+        return next((dict(d) for d in self.documents if d.get(field) == value), None)
+
+    def find(self, query, projection):
+        found = [dict(d) for d in self.documents
+                 if d["category"] == query["category"] and d["base_ingredient_name"] != query["base_ingredient_name"]["$ne"]]
+        return type("Cursor", (list,), {"limit": lambda self, n: self[:n]})(found)
+
+def test_similar_ingredients_by_search_key():
+    """find_similar_ingredients looks fuzzy candidates up by normalized key and excludes the stored name"""
+    print("🧪 Testing similar ingredients for a fuzzy match...")
+    collection = FakeNormalized([
+        {"base_ingredient_name": " Basil ", "search_key": "basil", "category": "herbs"},
+        {"base_ingredient_name": "Thyme", "search_key": "thyme", "category": "herbs"}
+    ])
+    original = (mongodb_config.normalized_ingredients_collection, mongodb_config.fuzzy_ingredient_matches)
+    mongodb_config.normalized_ingredients_collection = collection
+    mongodb_config.fuzzy_ingredient_matches = lambda query, limit=None: [{"name": "Basil", "score": 0.9}]
+    try:
+        results = find_similar_ingredients("basill", indexed=True)
+    finally:
+        mongodb_config.normalized_ingredients_collection, mongodb_config.fuzzy_ingredient_matches = original
+    assert [result["base_ingredient_name"] for result in results] == ["Thyme"]
+    assert results[0]["matched_ingredient"] == "Basil" and collection.queries[-1] == {"search_key": "basil"}
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting fuzzy matcher tests...")
+    test_edit_distance()
+    test_normalization()
+    test_typos_and_transliteration()
+    test_incremental_updates()
+    test_documents_keep_ranking()
+    test_documents_without_plain_name()
+    test_similar_ingredients_by_search_key()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Test script for the concurrent per-image analysis used by the refrigerator and invoice services
+"""
+
+import time
+import service
+
+def _slow_analysis(image_url=None, image_base64=None, prompt=None, output_schema=None):
+    """Stand-in for analyze_image_with_openrouter with a fixed model latency"""
+    time.sleep(0.2)
+    if image_base64 == "bad":
+        return {"error": "model refused"}
+    return {"ingredients": [{"name": image_base64}], "total_items": 1}
+
+def test_results_keep_image_order():
+    """Results and errors come back in the order the images were sent"""
+    print("🧪 Testing fan-out ordering...")
+    original = service.analyze_image_with_openrouter
+    service.analyze_image_with_openrouter = _slow_analysis
+    try:
+        images = [{"image_base64": "a"}, {"image_base64": "bad"}, {}, {"image_base64": "d"}]
+        results = service.analyze_images_concurrently(images, "prompt", max_workers=4)
+    finally:
+        service.analyze_image_with_openrouter = original
+
+    assert [r["ingredients"][0]["name"] if r else None for r, _ in results] == ["a", None, None, "d"]
+    assert results[1][1] == "Image 2: model refused"
+    assert results[2][1] == "Image 3: No base64 data provided"
+    print("   ✅ Order and per-image errors preserved")
+
+def test_latency_close_to_slowest_image():
+    """Three images finish in roughly one model round trip"""
+    print("🧪 Testing fan-out latency...")
+    original = service.analyze_image_with_openrouter
+    service.analyze_image_with_openrouter = _slow_analysis
+    try:
+        images = [{"image_base64": str(i)} for i in range(3)]
+        start = time.perf_counter()
+        service.analyze_images_concurrently(images, "prompt", max_workers=3)
+        concurrent_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        service.analyze_images_concurrently(images, "prompt", max_workers=1)
+        sequential_time = time.perf_counter() - start
+    finally:
+        service.analyze_image_with_openrouter = original
+
+    print(f"   concurrent: {concurrent_time:.3f}s, sequential: {sequential_time:.3f}s")
+    assert concurrent_time < 0.35
+    assert sequential_time >= 0.6
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting image fan-out tests...")
+    test_results_keep_image_order()
+    test_latency_close_to_slowest_image()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test script for perceptual hashing and the near-duplicate index
+"""
+
+import io
+import random
+from PIL import Image, ImageDraw
+from image_hash import compute_image_hash, hamming_distance, MultiIndexHashIndex, NearDuplicateIndex
+
+def _sample_photo(seed: int = 1, size=(640, 480)) -> Image.Image:
+    """Draw a random plate-like test image with some structure for the hash to pick up"""
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, (235, 225, 210))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((80, 60, 560, 420), fill=(250, 250, 250))
+    for _ in range(12):
+        x, y = rng.randrange(0, size[0] - 120), rng.randrange(0, size[1] - 120)
+        colour = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        draw.ellipse((x, y, x + rng.randrange(40, 120), y + rng.randrange(40, 120)), fill=colour)
+    return image
+
+def _encode(image: Image.Image, quality: int) -> bytes:
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality)
+    return output.getvalue()
+
+def test_reencoded_copies_are_close():
+    """Re-encoding, resizing and a small crop keep the hash within a few bits"""
+    print("🧪 Testing perceptual hash stability...")
+    photo = _sample_photo()
+    original = compute_image_hash(_encode(photo, 90))
+    reencoded = compute_image_hash(_encode(photo, 40))
+    resized = compute_image_hash(_encode(photo.resize((320, 240)), 80))
+    cropped = compute_image_hash(_encode(photo.crop((8, 6, 632, 474)), 85))
+    different = compute_image_hash(_encode(_sample_photo(seed=2), 90))
+
+    for label, value in (("re-encoded", reencoded), ("resized", resized), ("cropped", cropped)):
+        distance = hamming_distance(original, value)
+        print(f"   {label}: distance {distance}")
+        assert distance <= 6
+    assert hamming_distance(original, different) > 10
+    assert compute_image_hash(b"not an image") is None
+
+def test_multi_index_matches_linear_scan():
+    """The index returns exactly the hashes a brute-force scan would"""
+    print("🧪 Testing multi-index hashing against a linear scan...")
+    rng = random.Random(7)
+    index = MultiIndexHashIndex()
+    hashes = [rng.getrandbits(64) for _ in range(5000)]
+    base = hashes[0]
+    for bits in range(1, 12):
+        value = base
+        for position in rng.sample(range(64), bits):
+            value ^= 1 << position
+        hashes.append(value)
+    for value in hashes:
+        index.add(value)
+
+    for max_distance in (0, 3, 7, 11):
+        expected = sorted((hamming_distance(base, h), i) for i, h in enumerate(hashes) if hamming_distance(base, h) <= max_distance)
+        assert index.search(base, max_distance) == expected
+    print("   ✅ Results identical to linear scan")
+
+def test_near_duplicate_index_scoping_and_eviction():
+    """Matches are scoped by prompt/model and old entries are evicted"""
+    print("🧪 Testing near-duplicate index...")
+    index = NearDuplicateIndex(max_distance=4, max_entries=2)
+    index.add(0b1111, "prompt", "model", "key-1")
+    assert index.find(0b0111, "prompt", "model") == "key-1"
+    assert index.find(0b0111, "other prompt", "model") is None
+    index.add(1 << 40, "prompt", "model", "key-2")
+    index.add(1 << 50, "prompt", "model", "key-3")
+    assert index.find(0b1111, "prompt", "model") is None
+    assert len(index) == 2
+    print(f"   ✅ Stats: {index.stats()}")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting image hash tests...")
+    test_reencoded_copies_are_close()
+    test_multi_index_matches_linear_scan()
+    test_near_duplicate_index_scoping_and_eviction()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
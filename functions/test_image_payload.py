@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Test script for bytes-first image payloads and the streaming request body
+"""
+
+import base64
+import json
+import os
+import requests
+from image_payload import ImagePayload, StreamingJSONBody, IMAGE_URL_PLACEHOLDER, STREAM_CHUNK_SIZE
+
+def _payload(url: str) -> dict:
+    return {
+        "model": "test-model",
+        "messages": [{"role": "user", "content": [
+            {"type": "text", "text": "Describe \"this\" meal ✓"},
+            {"type": "image_url", "image_url": {"url": url}}
+        ]}],
+        "max_tokens": 1000
+    }
+
+def test_streamed_body_matches_json_dumps():
+    """Streaming the image produces exactly the body json= would have sent"""
+    print("🧪 Testing streamed body against json.dumps...")
+    for size in (0, 1, 2, 3, STREAM_CHUNK_SIZE - 1, STREAM_CHUNK_SIZE, 3 * STREAM_CHUNK_SIZE + 5):
+        data = b"\xff\xd8\xff" + os.urandom(size)
+        image = ImagePayload(data)
+        body = StreamingJSONBody(_payload(IMAGE_URL_PLACEHOLDER), image)
+        expected = json.dumps(_payload(f"data:image/jpeg;base64,{base64.b64encode(data).decode('ascii')}")).encode("utf-8")
+        streamed = b"".join(body)
+        assert streamed == expected
+        assert len(body) == len(expected)
+        assert b"".join(body) == expected  # re-iterable for retries
+    print("   ✅ Bodies identical for all sizes")
+
+def test_from_base64_decodes_once():
+    """Plain base64 and data URLs decode to the same bytes; bad input raises ValueError"""
+    print("🧪 Testing base64 decoding...")
+    data = b"\x89PNG\r\n\x1a\n" + os.urandom(100)
+    encoded = base64.b64encode(data).decode("ascii")
+    image = ImagePayload.from_base64(encoded)
+    assert image.data == data and image.mime_type == "image/png"
+    assert ImagePayload.from_base64(f"data:image/png;base64,{encoded}").data == data
+    assert image.view.obj is image.data
+    try:
+        ImagePayload.from_base64("abc")
+        assert False, "Expected ValueError"
+    except ValueError:
+        pass
+
+def test_requests_sends_content_length():
+    """requests prepares the streaming body with Content-Length, not chunked encoding"""
+    print("🧪 Testing prepared request headers...")
+    body = StreamingJSONBody(_payload(IMAGE_URL_PLACEHOLDER), ImagePayload(os.urandom(1000)))
+    prepared = requests.Request("POST", "https://example.com", data=body, headers={"Content-Type": "application/json"}).prepare()
+    assert prepared.headers["Content-Length"] == str(len(body))
+    assert "Transfer-Encoding" not in prepared.headers
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting image payload tests...")
+    test_streamed_body_matches_json_dumps()
+    test_from_base64_decodes_once()
+    test_requests_sends_content_length()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
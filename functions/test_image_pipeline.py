@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test script for the single-pass image preprocessing pipeline
+"""
+
+import io
+from PIL import Image
+from image_pipeline import prepare_image_for_api
+
+def _noisy_jpeg(size, orientation=None, quality=95) -> bytes:
+    image = Image.effect_noise(size, 80).convert("RGB")
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality, exif=exif.tobytes())
+    return output.getvalue()
+
+def test_output_fits_budget():
+    """Large noisy photos are brought under the byte budget"""
+    print("🧪 Testing byte budget...")
+    for max_size_kb in (400, 150, 60):
+        encoded, stats = prepare_image_for_api(_noisy_jpeg((3000, 2000)), max_size_kb=max_size_kb)
+        print(f"   {max_size_kb} KB budget: {stats}")
+        assert len(encoded) <= max_size_kb * 1024
+        assert Image.open(io.BytesIO(encoded)).format == "JPEG"
+
+def test_exif_orientation_applied_once():
+    """A rotated phone photo comes out upright and without double rotation"""
+    print("🧪 Testing EXIF orientation...")
+    encoded, stats = prepare_image_for_api(_noisy_jpeg((1200, 800), orientation=6), max_size_kb=2000)
+    width, height = Image.open(io.BytesIO(encoded)).size
+    assert height > width
+    assert stats["original_size"] == (1200, 800)
+
+def test_small_and_transparent_images():
+    """Small images are not upscaled and RGBA/PNG input is converted to JPEG"""
+    print("🧪 Testing small and transparent images...")
+    small = _noisy_jpeg((320, 240), quality=80)
+    encoded, stats = prepare_image_for_api(small)
+    assert stats["output_size"] == (320, 240)
+    assert stats["encodes"] == 1
+
+    output = io.BytesIO()
+    Image.new("RGBA", (500, 500), (10, 200, 30, 128)).save(output, format="PNG")
+    encoded, _ = prepare_image_for_api(output.getvalue())
+    assert Image.open(io.BytesIO(encoded)).mode == "RGB"
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting image pipeline tests...")
+    test_output_fits_budget()
+    test_exif_orientation_applied_once()
+    test_small_and_transparent_images()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
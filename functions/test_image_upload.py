@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test script for the multipart/binary meal image upload endpoint
+"""
+
+import base64
+import io
+import json
+from flask import Request
+from werkzeug.test import EnvironBuilder
+from PIL import Image
+import service
+from caching import analysis_cache
+
+def _jpeg(seed: int) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (64, 48), (seed, 120, 200)).save(output, format="JPEG")
+    return output.getvalue()
+
+def _request(**kwargs) -> Request:
+    return Request(EnvironBuilder(method="POST", path="/", **kwargs).get_environ())
+
+def _fake_analysis(image_url=None, image_base64=None, prompt=None, image_payload=None, output_schema=None):
+    """Stand-in for analyze_image_with_openrouter that echoes what it received"""
+    return {"mealName": "test meal", "bytes": len(image_payload), "mime_type": image_payload.mime_type}
+
+def _call(handler, req):
+    original = service.analyze_image_with_openrouter
+    service.analyze_image_with_openrouter = _fake_analysis
+    try:
+        return handler(req)
+    finally:
+        service.analyze_image_with_openrouter = original
+
+def test_upload_matches_json_variant():
+    """Multipart and raw uploads produce the same analysis as base64-in-JSON"""
+    print("🧪 Testing upload variants against the JSON endpoint...")
+    analysis_cache.memory.clear()
+    image = _jpeg(1)
+    json_response = _call(service.analyze_meal_image_v2_service, _request(json={"image_base64": base64.b64encode(image).decode("ascii")}))
+    analysis_cache.memory.clear()
+    raw_response = _call(service.analyze_meal_image_upload_service, _request(data=image, content_type="image/jpeg"))
+    analysis_cache.memory.clear()
+    multipart_response = _call(service.analyze_meal_image_upload_service, _request(data={"image": (io.BytesIO(image), "meal.jpg")}))
+
+    expected = json.loads(json_response.get_data())
+    assert expected == {"mealName": "test meal", "bytes": len(image), "mime_type": "image/jpeg"}
+    for response in (raw_response, multipart_response):
+        assert response.status_code == 200
+        assert json.loads(response.get_data()) == expected
+    print("   ✅ Identical results for JSON, raw and multipart uploads")
+
+def test_upload_limits():
+    """Oversized, empty and unsupported uploads are rejected before analysis"""
+    print("🧪 Testing upload limits...")
+    environ = EnvironBuilder(method="POST", path="/", data=b"\xff" * 100, content_type="image/jpeg").get_environ()
+    environ["CONTENT_LENGTH"] = str(service.MAX_FILE_SIZE + 1)
+    oversized = Request(environ)
+    assert _call(service.analyze_meal_image_upload_service, oversized).status_code == 413
+    assert _call(service.analyze_meal_image_upload_service, _request(data=b"", content_type="image/jpeg")).status_code == 400
+    assert _call(service.analyze_meal_image_upload_service, _request(data="hi", content_type="text/plain")).status_code == 415
+    assert _call(service.analyze_meal_image_upload_service, _request(data={"other": "field"}, content_type="multipart/form-data")).status_code == 400
+
+def test_chunked_multipart_too_large():
+    """A multipart body without Content-Length that outgrows the limit is a 413, not a 500"""
+    print("🧪 Testing oversized chunked multipart upload...")
+    import main as endpoints
+    for handler in (service.analyze_meal_image_upload_service, endpoints.analyze_meal_image_upload):
+        environ = EnvironBuilder(method="POST", path="/", data={"image": (io.BytesIO(b"\xff" * (service.MAX_FILE_SIZE + 1)), "meal.jpg")}).get_environ()
+        del environ["CONTENT_LENGTH"]
+        environ["wsgi.input_terminated"] = True
+        response = _call(handler, Request(environ))
+        assert response.status_code == 413
+        assert "maximum size" in json.loads(response.get_data())["error"]
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting image upload tests...")
+    test_upload_matches_json_variant()
+    test_upload_limits()
+    test_chunked_multipart_too_large()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
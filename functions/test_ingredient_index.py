@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test script for the in-memory multilingual ingredient name index
+"""
+
+from ingredient_index import IngredientNameIndex, IngredientIndexRefresher
+
+DOCUMENTS = [
+    {
+        "_id": 1,
+        "name": "chicken",
+        "names": {
+            "english": {"name": {"singular": "chicken", "plural": "chickens"}, "synonyms": ["poultry"]},
+            "hebrew": {"name": {"singular": "עוף", "plural": "עופות"}, "synonyms": ["תרנגולת"]},
+            "russian": {"name": {"singular": "курица", "plural": "курицы"}},
+            "spanish": {"name": {"singular": "pollo", "plural": "pollos"}}
+        }
+    },
+    {
+        "_id": 2,
+        "name": "Chicken Breast",
+        "names": {"he": {"name": {"singular": "חזה עוף"}}, "es": {"name": {"singular": "Pechuga de Pollo"}}}
+    },
+    {"_id": 3, "name": "Cheese", "names": {"ru": {"name": "сыр"}, "he": {"name": "גבינה"}}},
+    {"_id": 4, "name": "Crème Fraîche"}
+]
+
+def build_index() -> IngredientNameIndex:
+    index = IngredientNameIndex()
+    assert index.build(DOCUMENTS) == 4
+    return index
+
+def names(results):
+    return [result["name"] for result in results]
+
+def test_autocomplete_every_language():
+    """Prefixes in any language resolve to the canonical English name"""
+    print("🧪 Testing multilingual autocomplete...")
+    index = build_index()
+    assert names(index.autocomplete("chick")) == ["chicken", "Chicken Breast"]
+    assert names(index.autocomplete("עו")) == ["chicken", "Chicken Breast"]
+    assert names(index.autocomplete("кур")) == ["chicken"]
+    assert names(index.autocomplete("Pol")) == ["chicken", "Chicken Breast"]
+    assert names(index.autocomplete("poultr")) == ["chicken"]
+    assert names(index.autocomplete("תרנ")) == ["chicken"]
+    assert names(index.autocomplete("breast")) == ["Chicken Breast"]
+    assert names(index.autocomplete("creme f")) == ["Crème Fraîche"]
+    assert index.autocomplete("ch", limit=1)[0]["match"] == "cheese"
+    assert index.autocomplete("") == []
+    assert index.autocomplete("zzz") == []
+
+def test_language_filter():
+    """A language restricts matching to that language's names"""
+    print("🧪 Testing language filter...")
+    index = build_index()
+    assert names(index.autocomplete("сы", "russian")) == ["Cheese"]
+    assert index.autocomplete("сы", "he") == []
+    assert index.autocomplete("גב", "he")[0] == {"name": "Cheese", "match": "גבינה", "language": "he"}
+    assert index.canonical_name("Курица") == "chicken"
+    assert index.canonical_name("pollo", "es") == "chicken"
+    assert index.canonical_name("pollo", "ru") is None
+
+def test_incremental_updates():
+    """Upserts replace a document's keys and removals drop them"""
+    print("🧪 Testing incremental updates...")
+    index = build_index()
+    keys_before = index.key_count
+    index.upsert_document({"_id": 3, "name": "Cheese", "names": {"ru": {"name": "сыр"}, "es": {"name": "queso"}}})
+    assert names(index.autocomplete("que")) == ["Cheese"]
+    assert index.autocomplete("גב") == []
+    assert len(index) == 4
+
+    index.upsert_document({"_id": 5, "name": "Salmon", "names": {"he": {"name": "סלמון"}}})
+    assert names(index.autocomplete("סל")) == ["Salmon"]
+    assert index.remove_document(5)
+    assert not index.remove_document(5)
+    assert index.autocomplete("סל") == []
+    assert index.autocomplete("sal") == []
+
+    # Two documents sharing a canonical name keep it until both are gone
+    index.upsert_document({"_id": 6, "name": "chicken", "names": {"ru": {"name": "цыплёнок"}}})
+    index.remove_document(1)
+    assert names(index.autocomplete("цыпл")) == ["chicken"]
+    assert index.autocomplete("кур") == []
+    assert index.key_count < keys_before + 10
+
+class FakeCollection:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, query, projection):
+        return iter(self.documents)
+
+def test_change_events():
+    """Change-stream events are applied without a full rebuild"""
+    print("🧪 Testing change-stream events...")
+    collection = FakeCollection(list(DOCUMENTS))
+    index = IngredientNameIndex()
+    refresher = IngredientIndexRefresher(index, collection)
+    assert refresher.rebuild() == 4
+
+    refresher.apply_change({"operationType": "insert", "documentKey": {"_id": 7}, "fullDocument": {"_id": 7, "name": "Tofu"}})
+    assert names(index.autocomplete("tof")) == ["Tofu"]
+    refresher.apply_change({"operationType": "update", "documentKey": {"_id": 7}, "fullDocument": None})
+    assert index.autocomplete("tof") == []
+    refresher.apply_change({"operationType": "delete", "documentKey": {"_id": 3}})
+    assert index.autocomplete("chee") == []
+
+    collection.documents = DOCUMENTS[:1]
+    refresher.apply_change({"operationType": "drop"})
+    assert len(index) == 1
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting ingredient index tests...")
+    test_autocomplete_every_language()
+    test_language_filter()
+    test_incremental_updates()
+    test_change_events()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
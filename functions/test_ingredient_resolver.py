@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test script for canonical ingredient resolution
+"""
+
+import threading
+import time
+
+import ingredient_resolver
+import persistence_queue
+from ingredient_resolver import IngredientResolver, base_name, singular_forms
+
+CATALOG = [
+    {"_id": "apple-id", "base_ingredient_name": "Apple", "category": "Fruits"},
+    {"_id": "tomato-id", "base_ingredient_name": ["Tomato", "Tomatoes"], "category": "Vegetables"},
+    {"_id": "berry-id", "base_ingredient_name": "Strawberry", "category": "Berry"},
+    {"_id": "chicken-id", "base_ingredient_name": "Chicken Breast", "category": "Poultry"},
+    {"_id": "broken"}
+]
+
+def build_resolver(**kwargs) -> IngredientResolver:
+    resolver = IngredientResolver(**kwargs)
+    assert resolver.load(CATALOG) == 5
+    return resolver
+
+def test_name_cleanup():
+    """Varieties and preparation notes are stripped before lookup"""
+    print("🧪 Testing base names...")
+    assert base_name("Apple (Granny Smith)") == "Apple"
+    assert base_name("Tomatoes, diced") == "Tomatoes"
+    assert base_name("Tomato (On the Vine) [raw]") == "Tomato"
+    assert base_name("(unknown)") == "(unknown)"
+    assert singular_forms("strawberries") == ["strawberries", "strawberry", "strawberrie"]
+    assert singular_forms("potatoes")[:2] == ["potatoes", "potato"]
+    assert singular_forms("hummus") == ["hummus"]
+
+def test_resolution_order():
+    """Exact, then normalized, then fuzzy lookups map to the catalog entry"""
+    print("🧪 Testing resolution...")
+    resolver = build_resolver()
+    apple = resolver.resolve("Apple")
+    assert apple == ("apple-id", "Apple", "Fruits", "exact", 1.0)
+    assert resolver.resolve("Apple (Granny Smith)").method == "normalized"
+    assert resolver.resolve("Apple (Granny Smith)").id == "apple-id"
+    assert resolver.resolve("Tomato (On the Vine)").id == "tomato-id"
+    assert resolver.resolve("Strawberries, sliced").id == "berry-id"
+    assert resolver.resolve("CHICKEN BREAST").method == "normalized"
+    fuzzy = resolver.resolve("Chiken Breast (grilled)")
+    assert fuzzy.id == "chicken-id" and fuzzy.method == "fuzzy" and 0.85 <= fuzzy.score < 1
+    assert resolver.resolve("Dragon Fruit") is None
+    assert resolver.resolve("") is None
+
+def test_partial_word_matches_rejected():
+    """A one-word name never fuzzily resolves to a longer catalog name sharing that word"""
+    print("🧪 Testing partial-word matches...")
+    resolver = IngredientResolver()
+    resolver.load([{"_id": 1, "base_ingredient_name": "apple juice"}, {"_id": 2, "base_ingredient_name": "chicken stock"}])
+    assert resolver.resolve("Apple (Granny Smith)") is None
+    assert resolver.resolve("Chicken") is None
+    assert resolver.resolve("Chiken Stock").id == "2"
+
+def test_memoization():
+    """Repeat names, including misses, are served from the LRU; reloads clear it"""
+    print("🧪 Testing memoization...")
+    resolver = build_resolver()
+    for _ in range(3):
+        resolver.resolve("Apple (Fuji)")
+        resolver.resolve("Dragon Fruit")
+    stats = resolver.stats()["cache"]
+    assert stats["misses"] == 2 and stats["hits"] == 4
+    resolver.load(CATALOG + [{"_id": "dragon-id", "base_ingredient_name": "Dragon Fruit"}])
+    assert resolver.resolve("Dragon Fruit").id == "dragon-id"
+
+def test_catalog_refresh():
+    """The catalog loader runs lazily and again once the interval has passed"""
+    print("🧪 Testing catalog refresh...")
+    loads = []
+
+    def load_catalog():
+        loads.append(1)
+        return CATALOG
+
+    resolver = IngredientResolver(load_catalog, refresh_interval=3600)
+    assert resolver.resolve("apple").id == "apple-id"
+    resolver.resolve("tomato")
+    assert len(loads) == 1
+    resolver._loaded_at -= 3601
+    resolver.resolve("apple")
+    assert len(loads) == 2
+
+def test_concurrent_refresh_loads_once():
+    """Threads hitting a stale catalog together trigger a single reload"""
+    print("🧪 Testing concurrent refresh...")
+    loads = []
+
+    def load_catalog():
+        loads.append(1)
+        time.sleep(0.1)
+        return CATALOG
+
+    resolver = IngredientResolver(load_catalog, refresh_interval=3600)
+    threads = [threading.Thread(target=resolver.resolve, args=("apple",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1 and resolver.resolve("apple").id == "apple-id"
+
+def test_failed_catalog_load():
+    """A failing loader leaves the resolver usable (everything unknown)"""
+    print("🧪 Testing failed catalog load...")
+
+    def load_catalog():
+        raise RuntimeError("MongoDB unavailable")
+
+    assert IngredientResolver(load_catalog).resolve("Apple") is None
+
+def test_known_ingredients_skip_writes():
+    """process_ingredient_nutrition_data only validates and stores unknown ingredients, once"""
+    print("🧪 Testing write skipping...")
+    from utils import process_ingredient_nutrition_data
+
+    batches = []
+    original_persist = persistence_queue.persist_analysis_batch
+    original_resolver = ingredient_resolver._resolver
+    persistence_queue.persist_analysis_batch = batches.append
+    ingredient_resolver._resolver = build_resolver()
+    try:
+        def analysis():
+            return {"macronutrients_by_ingredient": {
+                "Apple (Granny Smith)": {"category": "Fruits", "weight": "100g", "proteins": "0.3g",
+                                         "carbohydrates": "14g", "fats": "0.2g", "calories": "52kcal"},
+                "Dragon Fruit": {"category": "Fruits", "weight": "100g", "proteins": "1.2g",
+                                 "carbohydrates": "13g", "fats": "0.4g", "calories": "60kcal"}
+            }}
+
+        first = analysis()
+        process_ingredient_nutrition_data(first)
+        process_ingredient_nutrition_data(analysis())
+
+        apple = first["macronutrients_by_ingredient"]["Apple (Granny Smith)"]
+        assert apple["canonical_ingredient"] == {"id": "apple-id", "name": "Apple", "match": "normalized"}
+        assert apple["calories_per_100g"] == 52.0
+        stored = [[entry for entry in batch.take_entries() if entry[0] != "meal_analysis"] for batch in batches]
+        assert len(stored) == 2
+        assert [entry[1] for entry in stored[0]] == ["Dragon Fruit"]
+        assert stored[1] == []
+    finally:
+        persistence_queue.persist_analysis_batch = original_persist
+        ingredient_resolver._resolver = original_resolver
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting ingredient resolver tests...")
+    test_name_cleanup()
+    test_resolution_order()
+    test_partial_word_matches_rejected()
+    test_memoization()
+    test_catalog_refresh()
+    test_concurrent_refresh_loads_once()
+    test_failed_catalog_load()
+    test_known_ingredients_skip_writes()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
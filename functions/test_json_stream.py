@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Test script for incremental JSON parsing of streamed model output
+"""
+
+import json
+
+import openai_helper
+from json_stream import IncrementalJSONParser, iter_sse_data, sse_event
+
+ANALYSIS = {
+    "mealName": "Grilled \"Chicken\" Salad",
+    "estimatedCalories": 670,
+    "macros": {"proteins": "30g", "carbohydrates": "50g", "fats": "40g"},
+    "ingredients": ["chicken", "lettuce", "tomato"],
+    "detailedIngredients": [{"name": "Chicken", "grams": 150, "calories": 248.5, "proteins": 46.5}],
+    "healthiness": "healthy",
+    "source": "https://fdc.nal.usda.gov/",
+    "verified": True,
+    "note": None
+}
+
+def _feed_in_chunks(text: str, size: int):
+    parser = IncrementalJSONParser()
+    fields = []
+    for start in range(0, len(text), size):
+        fields.extend(parser.feed(text[start:start + size]))
+    return parser, fields
+
+def test_chunk_boundaries():
+    """Any split of the text gives the same object and the same field events"""
+    print("🧪 Testing chunk boundaries...")
+    text = "```json\n" + json.dumps(ANALYSIS, indent=2) + "\n```"
+    for size in (1, 2, 3, 7, 64, len(text)):
+        parser, fields = _feed_in_chunks(text, size)
+        assert parser.done and parser.result == ANALYSIS, size
+        assert [key for key, _ in fields] == list(ANALYSIS), size
+        assert dict(fields) == ANALYSIS
+
+def test_fields_arrive_early():
+    """mealName is reported before the rest of the object has been generated"""
+    print("🧪 Testing early fields...")
+    parser = IncrementalJSONParser()
+    assert parser.feed("Here is the analysis: {'mealName': 'Past") == []
+    assert parser.feed("a', 'estimatedCal") == [("mealName", "Pasta")]
+    assert not parser.done
+    assert parser.feed("ories': 520, 'macros': {'fats': '12g'") == [("estimatedCalories", 520)]
+    assert parser.feed("}, }") == [("macros", {"fats": "12g"})]
+    assert parser.done and parser.result == {"mealName": "Pasta", "estimatedCalories": 520, "macros": {"fats": "12g"}}
+    # Anything after the closing brace is ignored
+    assert parser.feed("{'more': 1}") == [] and parser.result["mealName"] == "Pasta"
+
+def test_tolerated_output():
+    """Single quotes, Python literals, apostrophes and unquoted unit values parse"""
+    print("🧪 Testing tolerated output...")
+    parser, _ = _feed_in_chunks("{'mealName': 'Chef\\'s \"special\"', 'ok': True, 'weight': 30g, 'x': None}", 5)
+    assert parser.result == {"mealName": "Chef's \"special\"", "ok": True, "weight": "30g", "x": None}
+    parser, _ = _feed_in_chunks('{"a": "back\\\\", "b": "\\u00e9t\\u00e9", "c": -1.5e2}', 4)
+    assert parser.result == {"a": "back\\", "b": "été", "c": -150.0}
+
+def test_truncated_output():
+    """close() returns what was received when the stream stops early"""
+    print("🧪 Testing truncated output...")
+    parser, fields = _feed_in_chunks('{"mealName": "Soup", "ingredients": ["leek", "pot', 6)
+    assert not parser.done and fields == [("mealName", "Soup")]
+    assert parser.close() == {"mealName": "Soup", "ingredients": ["leek"]}
+    assert IncrementalJSONParser().close() is None
+
+def test_sse_helpers():
+    """SSE data lines decode up to [DONE]; events format as event/data pairs"""
+    print("🧪 Testing SSE helpers...")
+    lines = [b": OPENROUTER PROCESSING", b"", b'data: {"a": 1}', "data: {\"b\": 2}", b"data: [DONE]", b'data: {"c": 3}']
+    assert list(iter_sse_data(lines)) == [{"a": 1}, {"b": 2}]
+    assert sse_event("field", {"key": "mealName", "value": "Soup"}) == \
+        'event: field\ndata: {"key": "mealName", "value": "Soup"}\n\n'
+
+class FakeStreamResponse:
+    """A streamed OpenRouter response that records how far it was read"""
+    status_code = 200
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.read = 0
+        self.closed = False
+
+    def iter_lines(self):
+        for piece in self.pieces:
+            self.read += 1
+            yield b": OPENROUTER PROCESSING"
+            yield ("data: " + json.dumps({"choices": [{"delta": {"content": piece}}]})).encode("utf-8")
+
+    def close(self):
+        self.closed = True
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+
+    def post(self, url, **kwargs):
+        self.calls.append(kwargs)
+        return self.response
+
+def _stream(pieces):
+    response = FakeStreamResponse(pieces)
+    session = FakeSession(response)
+    original_session, original_key = openai_helper.get_session, openai_helper.api_key
+    openai_helper.get_session = lambda: session
+    openai_helper.api_key = "sk-or-test-key-0123456789abcdef"
+    try:
+        events = list(openai_helper.stream_image_analysis(image_url="https://example.com/meal.jpg", prompt="Analyze"))
+    finally:
+        openai_helper.get_session, openai_helper.api_key = original_session, original_key
+    return events, response, session
+
+def test_stream_image_analysis():
+    """The streamed request yields fields, then stops reading at the closing brace"""
+    print("🧪 Testing streamed vision request...")
+    pieces = ['```json\n{"mealName": "Ome', 'lette", "estimatedCalories": 3', '20}', "\n```", " trailing tokens"]
+    events, response, session = _stream(pieces)
+    assert events == [
+        ("field", ("mealName", "Omelette")),
+        ("field", ("estimatedCalories", 320)),
+        ("result", {"mealName": "Omelette", "estimatedCalories": 320})
+    ]
+    assert response.read == 3 and response.closed
+    assert session.calls[0]["json"]["stream"] is True and session.calls[0]["stream"] is True
+
+    events, response, _ = _stream(['{"mealName": "Half', ' a meal'])
+    assert events == [("text", '{"mealName": "Half a meal')] and response.closed
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting JSON stream tests...")
+    test_chunk_boundaries()
+    test_fields_arrive_early()
+    test_tolerated_output()
+    test_truncated_output()
+    test_sse_helpers()
+    test_stream_image_analysis()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
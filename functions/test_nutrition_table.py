@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test script for the two-stage nutrition table
+"""
+
+import ingredient_resolver
+from ingredient_resolver import IngredientResolver
+from nutrition_table import NutritionTable, complete_detection_result
+
+DOCUMENTS = [
+    {"name": "Apple", "base_ingredient_name": ["Apple", "Apples"], "category": "Fruits",
+     "proteins_per_100g": 0.3, "carbohydrates_per_100g": 14.0, "fats_per_100g": 0.2, "calories_per_100g": 52.0},
+    {"name": "Chicken Breast", "category": "Poultry", "proteins_per_100g": "31g",
+     "carbohydrates_per_100g": "0g", "fats_per_100g": "3.6g", "calories_per_100g": "165kcal"},
+    {"name": "Tomato", "base_ingredient_name": "Tomato", "category": "Vegetables",
+     "proteins_per_100g": 0.9, "carbohydrates_per_100g": 3.9, "fats_per_100g": 0.2, "calories_per_100g": 18.0},
+    # Missing per-100g values: skipped
+    {"name": "Mystery Sauce", "category": "Sauces", "proteins_per_100g": 1.0}
+]
+
+def build_table() -> NutritionTable:
+    table = NutritionTable()
+    assert table.load(DOCUMENTS) == 3
+    return table
+
+def test_fill():
+    """Known items get per-100g macros scaled by weight; the rest are returned as unknown"""
+    print("🧪 Testing table fill...")
+    table = build_table()
+    items = [
+        {"name": "Apple (Granny Smith)", "weight": "200g"},
+        {"name": "Chicken Breast", "weight": "0.5kg"},
+        {"name": "Tomatoes", "weight": "150 g"},
+        {"name": "Dragon Fruit", "weight": "300g"},
+        {"name": "Apples", "weight": "unknown"},
+        {"weight": "10g"}
+    ]
+    entries, unknown = table.fill(items, resolve=None)
+    assert list(entries) == ["Apple (Granny Smith)", "Chicken Breast", "Tomatoes"]
+    apple = entries["Apple (Granny Smith)"]
+    assert apple["calories"] == "104kcal" and apple["proteins"] == "0.6g" and apple["weight"] == "200g"
+    assert apple["calories_per_100g"] == 52.0 and apple["nutrition_source"] == "ingredients_nutrition_v5"
+    assert entries["Chicken Breast"]["proteins"] == "155g" and entries["Chicken Breast"]["category"] == "Poultry"
+    assert entries["Tomatoes"]["calories"] == "27kcal"
+    assert [item["name"] for item in unknown] == ["Dragon Fruit", "Apples"]
+
+def test_resolver_fallback():
+    """Names the table does not know directly are mapped through the ingredient resolver"""
+    print("🧪 Testing resolver fallback...")
+    resolver = IngredientResolver()
+    resolver.load([{"_id": "chicken-id", "base_ingredient_name": "Chicken Breast"}])
+    entries, unknown = build_table().fill([{"name": "Chiken Breast", "weight": "100g"}], resolve=resolver.resolve)
+    assert entries["Chiken Breast"]["calories"] == "165kcal" and unknown == []
+
+def test_partial_word_match_enriched():
+    """An item sharing only one word with a catalog name is enriched, not filled from that row"""
+    print("🧪 Testing partial-word matches...")
+    table = NutritionTable()
+    table.load([{"name": "Chicken Stock", "category": "Soups", "proteins_per_100g": 0.5,
+                 "carbohydrates_per_100g": 0.9, "fats_per_100g": 0.2, "calories_per_100g": 7.0}])
+    resolver = IngredientResolver()
+    resolver.load([{"_id": "stock-id", "base_ingredient_name": "chicken stock"}])
+    calls = []
+
+    def enrich(items):
+        calls.append([item["name"] for item in items])
+        return {"Chicken": {"category": "Poultry", "weight": "200g", "calories": "478kcal"}}
+
+    original_resolver = ingredient_resolver._resolver
+    ingredient_resolver._resolver = resolver
+    try:
+        result = complete_detection_result({"items": [{"name": "Chicken", "weight": "200g"}]}, enrich=enrich, table=table)
+    finally:
+        ingredient_resolver._resolver = original_resolver
+    assert calls == [["Chicken"]]
+    assert result["macronutrients_by_ingredient"]["Chicken"]["nutrition_source"] == "model"
+
+def test_enrichment():
+    """Only unknown items are sent for enrichment and merged back in"""
+    print("🧪 Testing enrichment...")
+    calls = []
+
+    def enrich(items):
+        calls.append([item["name"] for item in items])
+        return {"Dragon Fruit": {"category": "Fruits", "weight": "300g", "calories": "180kcal"}}
+
+    result = {"items": [
+        {"name": "Apple", "weight": "100g"},
+        {"name": "Dragon Fruit", "weight": "300g"},
+        {"name": "Moon Cheese", "weight": "50g"}
+    ]}
+    complete_detection_result(result, enrich=enrich, table=build_table())
+    assert calls == [["Dragon Fruit", "Moon Cheese"]]
+    nutrition = result["macronutrients_by_ingredient"]
+    assert nutrition["Apple"]["nutrition_source"] == "ingredients_nutrition_v5"
+    assert nutrition["Dragon Fruit"]["nutrition_source"] == "model"
+    assert result["unresolved_items"] == [{"name": "Moon Cheese", "weight": "50g"}]
+    assert result["total_items"] == 3
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting nutrition table tests...")
+    test_fill()
+    test_resolver_fallback()
+    test_partial_word_match_enriched()
+    test_enrichment()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
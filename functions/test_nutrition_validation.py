@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Test script for the columnar nutrition validator
+"""
+
+import numpy as np
+
+import persistence_queue
+from nutrition_validation import (
+    COMPILED_RULES, ERROR_CODES, category_profile, check_nutrition_rules, compile_rules, parse_quantities,
+    queue_validation_errors, validate_and_record, validate_nutrition_batch
+)
+
+ROWS = [
+    # Valid: 4*31 + 9*3.6 = 156.4 kcal
+    {"category": "Poultry", "proteins_per_100g": "31g", "carbohydrates_per_100g": "0g",
+     "fats_per_100g": "3.6g", "calories_per_100g": "165kcal"},
+    # Protein out of range
+    {"category": "Other", "proteins_per_100g": 120, "carbohydrates_per_100g": 0,
+     "fats_per_100g": 0, "calories_per_100g": 480},
+    # Calories do not match the macros
+    {"category": "Fruits", "proteins_per_100g": 0.3, "carbohydrates_per_100g": 14,
+     "fats_per_100g": 0.2, "calories_per_100g": 300},
+    # Macros over 100g
+    {"category": "Nut", "proteins_per_100g": 40, "carbohydrates_per_100g": 40,
+     "fats_per_100g": 40, "calories_per_100g": 680},
+    # Alcoholic: no Atwater check, but tighter ranges
+    {"category": "Alcoholic", "proteins_per_100g": 0, "carbohydrates_per_100g": 0,
+     "fats_per_100g": 0, "calories_per_100g": 231},
+    {"category": "Red Wine", "proteins_per_100g": 0.1, "carbohydrates_per_100g": 45,
+     "fats_per_100g": 0, "calories_per_100g": 85},
+    # Unparseable value
+    {"category": "Other", "proteins_per_100g": "n/a", "carbohydrates_per_100g": "1g",
+     "fats_per_100g": "1g", "calories_per_100g": "17kcal"}
+]
+
+def test_parse_quantities():
+    """Unit strings and numbers become floats in the field's unit, anything else NaN"""
+    print("🧪 Testing quantity parsing...")
+    values = parse_quantities(["5.2g", "500mg", 3, None, "", "n/a", "120 kcal", "5.2g"])
+    assert values[:3].tolist() == [5.2, 0.5, 3.0]
+    assert np.isnan(values[3:7]).all()
+    assert values[7] == 5.2
+    assert parse_quantities(["120 kcal", "418.4 kJ"], "calories_per_100g").round(6).tolist() == [120.0, 100.0]
+
+def test_error_codes():
+    """Each row gets the codes of every rule it breaks"""
+    print("🧪 Testing error codes...")
+    result = validate_nutrition_batch(ROWS)
+    assert result.valid.tolist() == [True, False, False, False, True, False, False]
+    assert result.errors(1) == ["proteins_per_100g_out_of_range", "macro_total_exceeds_100g"]
+    assert result.errors(2) == ["calorie_mismatch"]
+    assert result.errors(3) == ["macro_total_exceeds_100g"]
+    assert result.errors(5) == ["carbohydrates_per_100g_out_of_range"]
+    assert result.errors(6) == ["invalid_proteins_per_100g"]
+    assert result.invalid_rows().tolist() == [1, 2, 3, 5, 6]
+    assert set(ERROR_CODES) >= {code for row in range(len(ROWS)) for code in result.errors(row)}
+    assert result.messages(5) == ["Invalid carbohydrate value for alcoholic beverage: 45g (should be between 0-30g)"]
+    assert result.messages(6) == ["Invalid numeric value for proteins_per_100g"]
+    assert result.messages(2) == ["Calorie calculation mismatch: calculated 59kcal vs provided 300kcal"]
+
+def test_rule_table():
+    """Categories map to profiles and the compiled predicates report in table order"""
+    print("🧪 Testing rule table...")
+    assert category_profile("Liquor") == "alcoholic"
+    assert category_profile("Red Wine") == "alcoholic"
+    assert category_profile("Non-Alcoholic Drinks") == "alcoholic"
+    assert category_profile("Fruits") == "regular"
+    assert category_profile(None) == "regular"
+    assert len(COMPILED_RULES["alcoholic"]) < len(COMPILED_RULES["regular"])
+
+    values = {"proteins_per_100g": 150.0, "carbohydrates_per_100g": 0.0, "fats_per_100g": 0.0, "calories_per_100g": 600.0}
+    assert [code for code, _ in check_nutrition_rules(values, "Meat")] == ["proteins_per_100g_out_of_range", "macro_total_exceeds_100g"]
+    assert check_nutrition_rules(values, "Meat", first_only=True) == [
+        ("proteins_per_100g_out_of_range", "Invalid protein value: 150g (should be between 0-100g)")
+    ]
+    # Rules on missing fields are skipped
+    assert check_nutrition_rules({"calories": 20.0}, "Beer") == [
+        ("calories_out_of_range", "Alcoholic beverage has unusually low calories: 20")
+    ]
+    assert check_nutrition_rules({"calories": 20.0}, "Fruits") == []
+
+    table = {"strict": {"label": "Strict", "ranges": {"fats_per_100g": (0.0, 1.0)}}}
+    rules = compile_rules(table)["strict"]
+    assert [rule.code for rule in rules] == ["fats_per_100g_out_of_range"]
+    assert rules[0].violated({"fats_per_100g": 2.0}) and not rules[0].violated({"fats_per_100g": 0.5})
+
+def test_document_validator():
+    """validate_nutrition_data applies the same table to totals and per-100g values"""
+    print("🧪 Testing validate_nutrition_data...")
+    from mongodb_config import validate_nutrition_data
+
+    chicken = {"category": "Meat", "proteins": "31g", "carbohydrates": "0g", "fats": "3.6g", "calories": "165kcal",
+               "proteins_per_100g": 31.0, "carbohydrates_per_100g": 0.0, "fats_per_100g": 3.6, "calories_per_100g": 165.0}
+    is_valid, details = validate_nutrition_data("chicken", chicken)
+    assert is_valid and details["errors"] == []
+    is_valid, details = validate_nutrition_data("chicken", {**chicken, "proteins": "-5g", "calories_per_100g": 950.0})
+    assert not is_valid
+    assert details["errors"] == [
+        "Negative value for proteins: -5",
+        "Invalid calorie value: 950kcal (should be between 0-900kcal)",
+        "Calorie calculation mismatch: calculated 156.4kcal vs provided 950kcal"
+    ]
+    is_valid, details = validate_nutrition_data("lager", {"category": "Alcoholic", "proteins": "0g", "carbohydrates": "3g",
+                                                          "fats": "0g", "calories": "30kcal"})
+    assert not is_valid and details["errors"] == ["Alcoholic beverage has unusually low calories: 30"]
+
+def test_matches_row_validator():
+    """The batch result agrees with validate_nutritional_values on every row"""
+    print("🧪 Testing agreement with the row validator...")
+    import utils
+
+    original_save = utils.save_validation_error
+    utils.save_validation_error = lambda **kwargs: None
+    try:
+        result = validate_nutrition_batch(ROWS[:6])
+        for row, data in enumerate(ROWS[:6]):
+            is_valid, _ = utils.validate_nutritional_values(data, data["category"], "test")
+            assert is_valid == bool(result.valid[row]), row
+    finally:
+        utils.save_validation_error = original_save
+
+class RecordingBatch:
+    def __init__(self):
+        self.errors = []
+
+    def add_validation_error(self, ingredient_name, error_details, original_data=None):
+        self.errors.append((ingredient_name, error_details, original_data))
+
+def test_bulk_persistence():
+    """Failures are queued on one batch and persisted with a single call"""
+    print("🧪 Testing bulk persistence...")
+    names = [f"ingredient {row}" for row in range(len(ROWS))]
+    result = validate_nutrition_batch(ROWS)
+    batch = queue_validation_errors(result, ROWS, names, RecordingBatch())
+    assert [name for name, _, _ in batch.errors] == ["ingredient 1", "ingredient 2", "ingredient 3", "ingredient 5", "ingredient 6"]
+    assert batch.errors[1][1]["error_codes"] == ["calorie_mismatch"]
+    assert batch.errors[1][2] is ROWS[2]
+
+    persisted = []
+    original_persist = persistence_queue.persist_analysis_batch
+    persistence_queue.persist_analysis_batch = persisted.append
+    try:
+        validate_and_record(ROWS, names)
+        validate_and_record(ROWS[:1], names[:1])
+    finally:
+        persistence_queue.persist_analysis_batch = original_persist
+    assert len(persisted) == 1
+    assert len([entry for entry in persisted[0].take_entries() if entry[0] == "validation_errors"]) == 5
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting nutrition validation tests...")
+    test_parse_quantities()
+    test_error_codes()
+    test_rule_table()
+    test_document_validator()
+    test_matches_row_validator()
+    test_bulk_persistence()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
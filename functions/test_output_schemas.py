@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Test script for the typed output schemas, structured-output requests and per-model parse stats
+"""
+
+import json
+
+import openai_helper
+from config import STRUCTURED_OUTPUT_CONFIG
+from output_schemas import (INGREDIENT_NUTRITION, ITEM_DETECTION, MEAL_ANALYSIS, RECIPE_SET, SIMPLE_MEAL_ANALYSIS,
+                            compile_schema, output_stats, parse_structured_output, response_format_for)
+
+SIMPLE_ANALYSIS = {
+    "mealName": "Omelette",
+    "estimatedCalories": 320,
+    "macros": {"proteins": "20g", "carbohydrates": "2g", "fats": "25g"},
+    "ingredients": ["egg", "butter"],
+    "detailedIngredients": [{"name": "Egg", "grams": 120, "calories": 180, "proteins": 15, "carbs": 1, "fats": 12}],
+    "healthiness": "medium",
+    "health_assessment": "High in protein",
+    "source": "https://fdc.nal.usda.gov/"
+}
+
+RECIPES = {
+    "recipes": [{
+        "name": "Chicken Bowl",
+        "ingredients": [{"name": "chicken", "amount": "150", "unit": "g", "calories": 248, "protein": 46}],
+        "instructions": ["Grill the chicken", "Serve"],
+        "nutritional_info": {"calories": 400, "protein": 46, "carbohydrates": 30, "fat": 10, "fiber": 4},
+        "health_recommendations": {"benefits": ["lean protein"]}
+    }],
+    "total_recipes": 1
+}
+
+def test_validators():
+    """Conforming answers pass; each violation is reported with its path"""
+    print("🧪 Testing compiled validators...")
+    assert SIMPLE_MEAL_ANALYSIS.validate(SIMPLE_ANALYSIS) == []
+    assert RECIPE_SET.validate(RECIPES) == []
+    assert ITEM_DETECTION.validate({"items": [{"name": "Milk", "weight": "1000ml", "quantity": 1}], "total_items": 1}) == []
+    assert INGREDIENT_NUTRITION.validate({"macronutrients_by_ingredient": {
+        "Apple": {"proteins": "0.3g", "carbohydrates": "14g", "fats": "0.2g", "calories": 52, "base_ingredient_name": ["apple", "apples"]}
+    }}) == []
+    assert MEAL_ANALYSIS.validate({"mealName": "Soup", "calories": 200, "ingredients": ["leek"],
+                                   "macronutrients": {"proteins": "5g", "carbohydrates": "30g", "fats": "4g"}}) == []
+
+    broken = dict(SIMPLE_ANALYSIS, estimatedCalories=True, healthiness="great", ingredients=["egg", 3])
+    del broken["macros"]
+    broken["detailedIngredients"] = [{"grams": "120"}]
+    assert sorted(SIMPLE_MEAL_ANALYSIS.validate(broken)) == sorted([
+        "$.macros: missing",
+        "$.estimatedCalories: expected number|string, got bool",
+        "$.ingredients[1]: expected string, got int",
+        "$.detailedIngredients[0].name: missing",
+        "$.healthiness: 'great' is not one of ['N/A', 'healthy', 'medium', 'unhealthy']"
+    ])
+    assert INGREDIENT_NUTRITION.validate({"macronutrients_by_ingredient": {"Apple": {"proteins": "1g"}}}) == [
+        "$.macronutrients_by_ingredient.Apple.carbohydrates: missing",
+        "$.macronutrients_by_ingredient.Apple.fats: missing",
+        "$.macronutrients_by_ingredient.Apple.calories: missing"
+    ]
+    errors = []
+    compile_schema({"type": "integer"})(2.5, "$", errors)
+    compile_schema({"type": "integer"})(3, "$", errors)
+    assert errors == ["$: expected integer, got float"]
+
+def test_response_format():
+    """Only models configured for structured outputs get the json_schema constraint"""
+    print("🧪 Testing response formats...")
+    original = dict(STRUCTURED_OUTPUT_CONFIG)
+    try:
+        STRUCTURED_OUTPUT_CONFIG.update(ENABLED=True, MODELS=("openai/", "google/"))
+        response_format = response_format_for(RECIPE_SET, "google/gemini-2.5-flash-preview")
+        assert response_format["type"] == "json_schema"
+        assert response_format["json_schema"]["name"] == "recipe_set"
+        assert response_format["json_schema"]["schema"] is RECIPE_SET.schema
+        assert response_format_for(RECIPE_SET, "anthropic/claude-3-opus-20240229") is None
+        assert response_format_for(RECIPE_SET, "meta-llama/llama-4", default={"type": "json_object"}) == {"type": "json_object"}
+        assert response_format_for(None, "openai/gpt-4o") is None
+        STRUCTURED_OUTPUT_CONFIG['ENABLED'] = False
+        assert response_format_for(RECIPE_SET, "openai/gpt-4o") is None
+    finally:
+        STRUCTURED_OUTPUT_CONFIG.update(original)
+
+def test_strict_parse_before_repair():
+    """Clean answers never reach the repair parser; broken ones are repaired and counted per model"""
+    print("🧪 Testing parse outcomes and stats...")
+    output_stats.reset()
+    parsed = parse_structured_output(json.dumps(SIMPLE_ANALYSIS), SIMPLE_MEAL_ANALYSIS, "model-a")
+    assert parsed.value == SIMPLE_ANALYSIS and parsed.repairs == () and parsed.errors == []
+    parsed = parse_structured_output("```json\n" + json.dumps(SIMPLE_ANALYSIS) + "\n```", SIMPLE_MEAL_ANALYSIS, "model-a")
+    assert parsed.value == SIMPLE_ANALYSIS and parsed.repairs == ("code_fence",)
+    parsed = parse_structured_output('{"mealName": "Tea"}', SIMPLE_MEAL_ANALYSIS, "model-b")
+    assert parsed.value == {"mealName": "Tea"} and len(parsed.errors) == 3
+    try:
+        parse_structured_output("I cannot analyze this image.", SIMPLE_MEAL_ANALYSIS, "model-b")
+        assert False, "expected JSONDecodeError"
+    except json.JSONDecodeError:
+        pass
+    output_stats.record_request("model-b", structured=True)
+    output_stats.record_request("model-b")
+    output_stats.record_retry("model-b")
+
+    stats = output_stats.stats()
+    assert stats["model-a"]["responses"] == 2 and stats["model-a"]["strict"] == 1 and stats["model-a"]["repaired"] == 1
+    assert stats["model-a"]["repair_rate"] == 0.5 and stats["model-a"]["parse_failure_rate"] == 0.0
+    assert stats["model-b"]["parse_failures"] == 1 and stats["model-b"]["schema_failures"] == 1
+    assert stats["model-b"]["parse_failure_rate"] == 0.5 and stats["model-b"]["schema_failure_rate"] == 0.5
+    assert stats["model-b"]["structured_requests"] == 1 and stats["model-b"]["retry_rate"] == 0.5
+    output_stats.reset()
+
+def test_deeply_nested_output():
+    """Answers nested past the recursion limit take the callers' JSON error paths"""
+    print("🧪 Testing deeply nested answers...")
+    import utils
+
+    output_stats.reset()
+    for text in ("[" * 100000 + "]" * 100000, '{"a": ' * 100000, "Sure: " + "[" * 5000):
+        assert "error" in openai_helper.parse_model_json(text, model="model-c")
+        try:
+            utils.parse_ai_json_response(text, RECIPE_SET, "model-c")
+            assert False, "expected JSONDecodeError"
+        except json.JSONDecodeError:
+            pass
+    assert output_stats.stats()["model-c"]["parse_failures"] == 6
+    output_stats.reset()
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+
+    def json(self):
+        return {"choices": [{"message": {"content": self.content}}]}
+
+class FakeSession:
+    def __init__(self, content):
+        self.content = content
+        self.calls = []
+
+    def post(self, url, **kwargs):
+        self.calls.append(kwargs)
+        return FakeResponse(self.content)
+
+def test_text_completion_request():
+    """complete_text_with_openrouter sends the schema to supporting models and validates the answer"""
+    print("🧪 Testing structured text completion...")
+    answer = {"macronutrients_by_ingredient": {"Kefir": {"proteins": "3g", "carbohydrates": "4g", "fats": "1g", "calories": "40kcal"}}}
+    session = FakeSession(json.dumps(answer))
+    original_session, original_key = openai_helper.get_session, openai_helper.api_key
+    original_config = dict(STRUCTURED_OUTPUT_CONFIG)
+    openai_helper.get_session = lambda: session
+    openai_helper.api_key = "sk-or-test-key-0123456789abcdef"
+    STRUCTURED_OUTPUT_CONFIG.update(ENABLED=True, MODELS=("openai/",))
+    output_stats.reset()
+    try:
+        result = openai_helper.complete_text_with_openrouter("Enrich", model="openai/gpt-4o-mini", output_schema=INGREDIENT_NUTRITION)
+        assert result == answer
+        assert session.calls[0]["json"]["response_format"]["json_schema"]["name"] == "ingredient_nutrition"
+        openai_helper.complete_text_with_openrouter("Enrich", model="anthropic/claude-3-haiku", output_schema=INGREDIENT_NUTRITION)
+        assert "response_format" not in session.calls[1]["json"]
+        stats = output_stats.stats()
+        assert stats["openai/gpt-4o-mini"]["structured_requests"] == 1 and stats["openai/gpt-4o-mini"]["strict"] == 1
+        assert stats["anthropic/claude-3-haiku"]["structured_requests"] == 0
+    finally:
+        openai_helper.get_session, openai_helper.api_key = original_session, original_key
+        STRUCTURED_OUTPUT_CONFIG.update(original_config)
+        output_stats.reset()
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting output schema tests...")
+    test_validators()
+    test_response_format()
+    test_strict_parse_before_repair()
+    test_deeply_nested_output()
+    test_text_completion_request()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
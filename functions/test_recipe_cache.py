@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test script for the recipe result cache keyed on canonical request constraints
+"""
+
+import json
+import time
+
+import utils
+from caching import RecipeResultCache, make_recipe_cache_key, recipe_cache
+
+RECIPES = {"recipes": [{"name": "Tomato Omelette", "ingredients": [{"name": "egg"}, {"name": "tomato"}],
+                        "instructions": ["Whisk", "Fry"], "nutritional_info": {"calories": 420, "protein": 28}}]}
+
+def _key(names, calories=(None, 500), proteins=(30.0, 40.0), diet_type="keto", difficulty="Easy", lang="en"):
+    return make_recipe_cache_key(names, {"calories": calories, "proteins": proteins}, diet_type, difficulty, lang)
+
+def test_canonical_key():
+    """Order, case, duplicates and small macro differences do not change the key"""
+    print("🧪 Testing canonical keys...")
+    base = _key(["Egg", "Tomato"])
+    assert base == _key(["tomato ", "EGG", "egg"])
+    assert base == _key(["Egg", "Tomato"], calories=(None, 510), proteins=(31.0, 39.0))
+    assert base == _key(["Egg", "Tomato"], difficulty="easy", diet_type="Keto")
+    assert base != _key(["Egg", "Tomato", "Cheese"])
+    assert base != _key(["Egg", "Tomato"], calories=(None, 700))
+    assert base != _key(["Egg", "Tomato"], diet_type="vegan")
+    assert base != _key(["Egg", "Tomato"], lang="he")
+    assert _key(["Egg"], lang=None) == _key(["Egg"], lang="EN")
+
+def test_ttl_size_and_tokens():
+    """Entries expire and are evicted; each hit adds its generation's tokens to the savings"""
+    print("🧪 Testing eviction and token accounting...")
+    cache = RecipeResultCache(max_entries=2, ttl_seconds=0.2)
+    cache.set("a", RECIPES, tokens=1500)
+    cache.set("b", RECIPES, tokens=1000)
+    hit = cache.get("a")
+    assert hit == RECIPES
+    hit["recipes"].clear()
+    assert cache.get("a") == RECIPES, "hits must be copies"
+    cache.set("c", RECIPES, tokens=500)
+    assert cache.get("b") is None
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1 and stats["evictions"] == 1
+    assert stats["tokens_saved"] == 3000 and stats["tokens_generated"] == 3000
+    time.sleep(0.25)
+    assert cache.get("a") is None and cache.stats()["expirations"] == 1
+
+def test_get_recipe_logic_served_from_cache():
+    """A repeated request with equivalent constraints skips the model call"""
+    print("🧪 Testing /get_recipe cache hits...")
+    calls = []
+
+    async def fake_generate(prompt, image_urls, usage=None):
+        calls.append(prompt)
+        usage.update({"prompt_tokens": 1200, "completion_tokens": 2300, "total_tokens": 3500})
+        return json.dumps(RECIPES)
+
+    originals = (utils.RecipeGenerator.generate_recipe_with_ai, utils.FileManager.cleanup_old_files,
+                 utils.FileManager.save_response_to_mock)
+    utils.RecipeGenerator.generate_recipe_with_ai = staticmethod(fake_generate)
+    utils.FileManager.cleanup_old_files = staticmethod(lambda folder_path, max_files=1000: None)
+    utils.FileManager.save_response_to_mock = staticmethod(lambda response, filename=None: None)
+    recipe_cache.clear()
+    saved_before = recipe_cache.stats()["tokens_saved"]
+    try:
+        first = utils.get_recipe_logic({"ingredients": "Egg, Tomato", "max_calories": "500", "diet_type": "keto"})
+        second = utils.get_recipe_logic({"ingredients": "tomato,egg,EGG", "max_calories": "490", "diet_type": "Keto"})
+        third = utils.get_recipe_logic({"ingredients": "egg, tomato", "max_calories": "800", "diet_type": "keto"})
+    finally:
+        (utils.RecipeGenerator.generate_recipe_with_ai, utils.FileManager.cleanup_old_files,
+         utils.FileManager.save_response_to_mock) = (staticmethod(originals[0]), staticmethod(originals[1]),
+                                                     staticmethod(originals[2]))
+        stats = recipe_cache.stats()
+        recipe_cache.clear()
+    assert len(calls) == 2
+    assert first["recipes"] == second["recipes"] == third["recipes"] == RECIPES["recipes"]
+    # Metadata describes each request's own ingredients
+    assert [i["name"] for i in second["available_ingredients"]] == ["tomato", "egg", "EGG"]
+    assert stats["tokens_saved"] - saved_before == 3500
+    print(f"   ✅ {stats}")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting recipe cache tests...")
+    test_canonical_key()
+    test_ttl_size_and_tokens()
+    test_get_recipe_logic_served_from_cache()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
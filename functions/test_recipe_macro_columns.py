@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Test script for the numeric macro columns, range indexes and backfill of gpt_recipes
+"""
+
+import mongodb_config
+import utils
+from recipe_macro_columns import (MACRO_COLUMNS_VERSION, MACRO_INDEXES, backfill_macro_columns, build_macro_columns,
+                                  ensure_macro_indexes, macro_range_filter)
+from recipe_retrieval import RecipeIndex, macro_value
+
+class FakeCursor(list):
+    def batch_size(self, size):
+        return self
+
+class FakeBulkResult:
+    def __init__(self, modified_count):
+        self.modified_count = modified_count
+
+class FakeCollection:
+    name = "gpt_recipes"
+
+    def __init__(self, documents):
+        self.documents = {document["_id"]: dict(document) for document in documents}
+        self.bulk_sizes = []
+        self.indexes = []
+        self.inserted = []
+
+    def _pending(self, query):
+        version = query["macro_columns_version"]["$ne"]
+        return [d for d in self.documents.values() if d.get("macro_columns_version") != version]
+
+    def count_documents(self, query):
+        return len(self._pending(query))
+
+    def find(self, query, projection):
+        return FakeCursor({"_id": d["_id"], **{k: d[k] for k in projection if k in d}} for d in self._pending(query))
+
+    def bulk_write(self, operations, ordered=True):
+        self.bulk_sizes.append(len(operations))
+        for operation in operations:
+            self.documents[operation._filter["_id"]].update(operation._doc["$set"])
+        return FakeBulkResult(len(operations))
+
+    def create_index(self, keys, name):
+        self.indexes.append((keys, name))
+        return name
+
+    def insert_one(self, document):
+        self.inserted.append(document)
+        return type("InsertResult", (), {"inserted_id": len(self.inserted)})()
+
+def test_build_columns():
+    """Unit strings become kcal/gram floats; unparseable values become null"""
+    print("🧪 Testing numeric macro columns...")
+    columns = build_macro_columns({"total_calories": "2092kJ", "total_proteins": "25g", "total_fats": "0.5 oz",
+                                   "total_carbohydrates": "n/a", "proteins": "8.3g"})
+    assert sorted(columns) == sorted(["total_calories_value", "total_proteins_value", "total_fats_value",
+                                      "total_carbohydrates_value", "proteins_value", "macro_columns_version"])
+    assert round(columns["total_calories_value"], 3) == 500.0 and columns["total_proteins_value"] == 25.0
+    assert round(columns["total_fats_value"], 3) == 14.175 and columns["proteins_value"] == 8.3
+    assert columns["total_carbohydrates_value"] is None and columns["macro_columns_version"] == MACRO_COLUMNS_VERSION
+
+def test_range_filter():
+    """/get_recipe ranges map to index-friendly filters on the numeric columns"""
+    print("🧪 Testing range filters...")
+    assert macro_range_filter({"calories": (400, 600), "proteins": (None, 30.0), "fats": (0, None),
+                               "carbohydrates": (None, None)}) == {
+        "total_calories_value": {"$gte": 400.0, "$lte": 600.0},
+        "total_proteins_value": {"$lte": 30.0}
+    }
+    # Every range column leads one index
+    assert {keys[0][0] for keys, name in MACRO_INDEXES} >= {"total_calories_value", "total_proteins_value",
+                                                            "total_carbohydrates_value", "total_fats_value"}
+
+def test_backfill_in_batches():
+    """The backfill converts pending recipes in bulk batches, reports progress and is idempotent"""
+    print("🧪 Testing batched backfill...")
+    documents = [{"_id": i, "total_calories": f"{300 + i}kcal", "total_proteins": f"{i}g"} for i in range(25)]
+    documents[0]["macro_columns_version"] = MACRO_COLUMNS_VERSION
+    collection = FakeCollection(documents)
+    progress = []
+    assert backfill_macro_columns(collection, batch_size=10, progress=lambda done, total: progress.append((done, total))) == 24
+    assert collection.bulk_sizes == [10, 10, 4]
+    assert progress == [(10, 24), (20, 24), (24, 24)]
+    assert collection.documents[7]["total_calories_value"] == 307.0 and collection.documents[7]["total_proteins_value"] == 7.0
+    assert "total_calories_value" not in collection.documents[0]
+    assert backfill_macro_columns(collection, batch_size=10) == 0
+    assert ensure_macro_indexes(collection) == [name for keys, name in MACRO_INDEXES]
+
+def test_write_path_and_index_use_columns():
+    """New recipes are saved with the columns, and the retrieval index prefers them over the strings"""
+    print("🧪 Testing write path...")
+    collection = FakeCollection([])
+    original_collection, original_process = mongodb_config.gpt_recipes_collection, utils.process_ingredient_nutrition_data
+    mongodb_config.gpt_recipes_collection = collection
+    utils.process_ingredient_nutrition_data = lambda recipe: None
+    try:
+        recipe = {"name": "Lentil Soup", "base_ingredient_name": ["lentils"],
+                  "macronutrients": {"proteins": "18g", "carbohydrates": "40g", "fats": "3g", "calories": "260kcal"}}
+        assert utils.save_recipe_to_mongodb(recipe, {"name": "Soup"}) == 1
+    finally:
+        mongodb_config.gpt_recipes_collection, utils.process_ingredient_nutrition_data = original_collection, original_process
+    saved = collection.inserted[0]
+    assert saved["total_calories"] == "260kcal" and saved["total_calories_value"] == 260.0
+    assert saved["total_proteins_value"] == 18.0 and saved["macro_columns_version"] == MACRO_COLUMNS_VERSION
+
+    assert macro_value(dict(saved, total_calories="bad"), "calories") == 260.0
+    assert macro_value({"total_calories": "1 kcal"}, "calories") == 1.0
+    index = RecipeIndex()
+    index.build([dict(saved, _id=1, total_calories="unparsed")])
+    assert len(index.search(["lentil"], {"calories": (250, 270)})) == 1
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting recipe macro column tests...")
+    test_build_columns()
+    test_range_filter()
+    test_backfill_in_batches()
+    test_write_path_and_index_use_columns()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
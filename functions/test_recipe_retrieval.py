@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Test script for retrieval-first recipe search over the stored gpt_recipes corpus
+"""
+
+import json
+import time
+
+import mongodb_config
+import recipe_retrieval
+import utils
+from caching import recipe_cache
+from recipe_macro_columns import build_macro_columns
+from recipe_retrieval import RecipeIndex, merge_recipes, recipe_response, search_stored_recipes
+
+def _recipe(name, ingredients, calories, proteins, health_rank=5, difficulty="Easy", **extra):
+    document = {
+        "_id": name.lower().replace(" ", "-"),
+        "name": name,
+        "ingredients": [{"name": ingredient} for ingredient in ingredients],
+        "base_ingredient_name": ingredients,
+        "instructions": ["Cook"],
+        "total_calories": f"{calories}kcal",
+        "total_proteins": f"{proteins}g",
+        "total_carbohydrates": "20g",
+        "total_fats": "10g",
+        "health_rank": health_rank,
+        "difficulty": difficulty,
+        "suitable_diets": []
+    }
+    document.update(extra)
+    return document
+
+DOCUMENTS = [
+    _recipe("Tomato Omelette", ["eggs", "egg", "tomato"], 350, 22, health_rank=7),
+    _recipe("Shakshuka", ["eggs", "tomatoes", "onion", "pepper"], 420, 20, health_rank=8, suitable_diets=["Vegetarian"]),
+    _recipe("Egg Salad", ["egg", "mayonnaise"], 300, 15, gluten_free=True, difficulty="Medium"),
+    _recipe("Chicken Rice", ["chicken breast", "rice"], 600, 45),
+    _recipe("Tomato Omelette", ["egg", "tomatoes"], 360, 21, health_rank=2, _id="tomato-omelette-2"),
+    {"name": "Empty", "ingredients": []}
+]
+
+def _index():
+    index = RecipeIndex()
+    assert index.build(DOCUMENTS) == 5
+    return index
+
+NAMES_BY_ID = {document["_id"]: document["name"] for document in DOCUMENTS if "_id" in document}
+
+def _names(matches):
+    return [NAMES_BY_ID[match["id"]] for match in matches]
+
+def test_coverage_ranking():
+    """Singular and plural forms match; recipes rank by coverage, then matches, then health"""
+    print("🧪 Testing ingredient coverage...")
+    index = _index()
+    matches = index.search(["Eggs", "Tomato (cherry)", "Onion"], min_coverage=0.6)
+    assert _names(matches) == ["Tomato Omelette", "Shakshuka"]
+    assert matches[0]["coverage"] == 1.0 and matches[0]["matched"] == 2 and matches[0]["missing"] == 0
+    assert matches[1]["coverage"] == 0.75 and matches[1]["missing"] == 1
+    # The higher-ranked duplicate name is the one kept
+    assert matches[0]["id"] == "tomato-omelette"
+    assert _names(index.search(["eggs", "tomato", "onion"], min_coverage=0.9)) == ["Tomato Omelette"]
+    assert index.search(["salmon"]) == [] and RecipeIndex().search(["egg"]) == []
+
+def test_filters():
+    """Macro ranges use the numeric columns with tolerance; diet and difficulty are exact"""
+    print("🧪 Testing macro, diet and difficulty filters...")
+    index = _index()
+    assert _names(index.search(["egg", "tomato", "mayonnaise"], {"calories": (None, 340)}, min_coverage=0.5)) == ["Egg Salad"]
+    assert _names(index.search(["egg", "tomato", "mayonnaise"], {"calories": (None, 340)}, min_coverage=0.5,
+                               tolerance=0.1)) == ["Tomato Omelette", "Egg Salad"]
+    assert _names(index.search(["egg", "tomato"], {"proteins": (21.5, None)}, min_coverage=0.5)) == ["Tomato Omelette"]
+    assert _names(index.search(["egg", "mayonnaise"], diet_type="Gluten Free")) == ["Egg Salad"]
+    assert _names(index.search(["eggs", "tomatoes", "onion", "pepper"], diet_type="vegetarian")) == ["Shakshuka"]
+    assert index.search(["egg", "mayonnaise"], diet_type="vegan") == []
+    assert _names(index.search(["egg", "mayonnaise", "tomato"], difficulty="medium", min_coverage=0.5)) == ["Egg Salad"]
+
+def test_recipe_shape_and_merge():
+    """Stored documents come back in the generated recipe shape; merging drops generated duplicates"""
+    print("🧪 Testing recipe shape and merge...")
+    recipe = recipe_response(DOCUMENTS[0])
+    assert recipe["nutritional_info"] == {"calories": 350.0, "protein": 22.0, "carbohydrates": 20.0, "fat": 10.0}
+    assert recipe["source"] == "gpt_recipes" and recipe["recipe_id"] == "tomato-omelette"
+    merged = merge_recipes([recipe], [{"name": "tomato omelette"}, {"name": "Frittata"}])
+    assert [r["name"] for r in merged] == ["Tomato Omelette", "Frittata"]
+
+class FakeRecipes:
+    """gpt_recipes stand-in: _id lookups, and $gte/$lte filters on the numeric columns"""
+
+    def __init__(self, documents, fail=False):
+        self.documents = [dict(document, **build_macro_columns(document)) for document in documents if "_id" in document]
+        self.queries = []
+        self.projections = []
+        self.fail = fail
+
+    @staticmethod
+    def _project(document, projection):
+        projected = {field: value for field, value in document.items() if field in projection}
+        if "ingredients.name" in projection:
+            projected["ingredients"] = [{"name": item["name"]} for item in document.get("ingredients", [])]
+        return projected
+
+    def find(self, query, projection):
+        if "_id" in query:
+            return [document for document in self.documents if document["_id"] in query["_id"]["$in"]]
+        self.queries.append(query)
+        self.projections.append(projection)
+        if self.fail:
+            raise RuntimeError("connection reset")
+        if not query:
+            return [self._project(document, projection) for document in self.documents]
+        return [{"_id": document["_id"]} for document in self.documents
+                if all(document.get(field) is not None
+                       and document[field] >= bounds.get("$gte", float("-inf"))
+                       and document[field] <= bounds.get("$lte", float("inf"))
+                       for field, bounds in query.items())]
+
+def _search_with_collection(collection, *args):
+    original_index = (recipe_retrieval._index, recipe_retrieval._index_loaded_at)
+    original_collection = mongodb_config.gpt_recipes_collection
+    recipe_retrieval._index, recipe_retrieval._index_loaded_at = _index(), time.monotonic()
+    mongodb_config.gpt_recipes_collection = collection
+    try:
+        return [recipe["name"] for recipe in search_stored_recipes(*args)]
+    finally:
+        recipe_retrieval._index, recipe_retrieval._index_loaded_at = original_index
+        mongodb_config.gpt_recipes_collection = original_collection
+
+def test_ranges_use_macro_indexes():
+    """Macro ranges become a gpt_recipes query on the indexed numeric columns, with an in-memory fallback"""
+    print("🧪 Testing indexed macro range queries...")
+    collection = FakeRecipes(DOCUMENTS)
+    # Stored since the index was loaded: the query sees the new value
+    collection.documents[2]["total_calories_value"] = 900.0
+    names = _search_with_collection(collection, ["egg", "tomato", "mayonnaise"], {"calories": (None, 340), "fats": (0, None)})
+    assert names == ["Tomato Omelette"]
+    assert list(collection.queries[0]) == ["total_calories_value"]
+    assert round(collection.queries[0]["total_calories_value"]["$lte"], 6) == 374.0
+
+    collection = FakeRecipes(DOCUMENTS)
+    assert _search_with_collection(collection, ["egg", "tomato", "mayonnaise"], {"calories": (None, None)}) == ["Tomato Omelette", "Egg Salad"]
+    assert collection.queries == []
+
+    failing = FakeRecipes(DOCUMENTS, fail=True)
+    assert _search_with_collection(failing, ["egg", "tomato", "mayonnaise"], {"calories": (None, 340)}) == ["Tomato Omelette", "Egg Salad"]
+    assert len(failing.queries) == 1
+
+def test_index_keeps_only_columns():
+    """The shared index loads the search columns only; returned recipes are fetched in full by _id"""
+    print("🧪 Testing resident index columns...")
+    collection = FakeRecipes(DOCUMENTS)
+    collection.documents = collection.documents[:4]
+    original_index = (recipe_retrieval._index, recipe_retrieval._index_loaded_at)
+    original_collection = mongodb_config.gpt_recipes_collection
+    recipe_retrieval._index, recipe_retrieval._index_loaded_at = None, None
+    mongodb_config.gpt_recipes_collection = collection
+    try:
+        recipes = search_stored_recipes(["eggs", "tomatoes", "onion", "pepper"])
+        index = recipe_retrieval._index
+    finally:
+        recipe_retrieval._index, recipe_retrieval._index_loaded_at = original_index
+        mongodb_config.gpt_recipes_collection = original_collection
+    assert len(index) == 4 and not hasattr(index, "documents")
+    assert "instructions" not in collection.projections[0] and "ingredients" not in collection.projections[0]
+    assert [recipe["name"] for recipe in recipes] == ["Shakshuka", "Tomato Omelette"]
+    assert recipes[0]["instructions"] == ["Cook"] and recipes[0]["ingredient_coverage"] == 1.0
+
+def _run_get_recipe(params, generated):
+    calls = []
+
+    async def fake_generate(prompt, image_urls, usage=None):
+        calls.append(prompt)
+        return json.dumps({"recipes": generated, "total_recipes": len(generated)})
+
+    originals = (utils.RecipeGenerator.generate_recipe_with_ai, utils.FileManager.cleanup_old_files,
+                 utils.FileManager.save_response_to_mock)
+    utils.RecipeGenerator.generate_recipe_with_ai = staticmethod(fake_generate)
+    utils.FileManager.cleanup_old_files = staticmethod(lambda folder_path, max_files=1000: None)
+    utils.FileManager.save_response_to_mock = staticmethod(lambda response, filename=None: None)
+    original_index = (recipe_retrieval._index, recipe_retrieval._index_loaded_at)
+    original_collection = mongodb_config.gpt_recipes_collection
+    recipe_retrieval._index, recipe_retrieval._index_loaded_at = _index(), time.monotonic()
+    mongodb_config.gpt_recipes_collection = FakeRecipes(DOCUMENTS)
+    recipe_cache.clear()
+    try:
+        return utils.get_recipe_logic(params), calls
+    finally:
+        mongodb_config.gpt_recipes_collection = original_collection
+        (utils.RecipeGenerator.generate_recipe_with_ai, utils.FileManager.cleanup_old_files,
+         utils.FileManager.save_response_to_mock) = (staticmethod(originals[0]), staticmethod(originals[1]),
+                                                     staticmethod(originals[2]))
+        recipe_retrieval._index, recipe_retrieval._index_loaded_at = original_index
+        recipe_cache.clear()
+
+def test_get_recipe_generates_shortfall():
+    """/get_recipe answers from the corpus and asks the model only for the missing recipes"""
+    print("🧪 Testing /get_recipe retrieval...")
+    params = {"ingredients": "egg, tomato, onion, pepper, mayonnaise", "retrieval": "true"}
+    generated = [{"name": "Shakshuka"}, {"name": "Frittata"}, {"name": "Egg Muffins"}]
+    result, calls = _run_get_recipe(params, generated)
+    assert len(calls) == 1 and "Generate 2 nutritious" in calls[0] and "Generate 2 recipe(s)" in calls[0]
+    names = [recipe["name"] for recipe in result["recipes"]]
+    assert names == ["Shakshuka", "Tomato Omelette", "Egg Salad", "Frittata", "Egg Muffins"]
+    assert result["total_recipes"] == 5 and result["total_ingredients_found"] == 5
+
+    original_target = recipe_retrieval.RECIPE_RETRIEVAL_CONFIG['TARGET_RECIPES']
+    recipe_retrieval.RECIPE_RETRIEVAL_CONFIG['TARGET_RECIPES'] = 2
+    try:
+        result, calls = _run_get_recipe(params, generated)
+    finally:
+        recipe_retrieval.RECIPE_RETRIEVAL_CONFIG['TARGET_RECIPES'] = original_target
+    assert calls == [] and [recipe["name"] for recipe in result["recipes"]] == ["Shakshuka", "Tomato Omelette"]
+
+    result, calls = _run_get_recipe(dict(params, retrieval="false"), generated)
+    assert len(calls) == 1 and "Generate 5 nutritious" in calls[0]
+    assert [recipe["name"] for recipe in result["recipes"]] == ["Shakshuka", "Frittata", "Egg Muffins"]
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting recipe retrieval tests...")
+    test_coverage_ranking()
+    test_filters()
+    test_recipe_shape_and_merge()
+    test_ranges_use_macro_indexes()
+    test_index_keeps_only_columns()
+    test_get_recipe_generates_shortfall()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test script for ingredient search normalization and index-backed queries
+"""
+
+from text_normalization import normalize_text, search_tokens, query_tokens
+import mongodb_config
+from search_index import build_search_fields
+from mongodb_config import _indexed_name_query, find_ingredient
+
+def test_normalization():
+    """Case, diacritics, punctuation and Hebrew niqqud are folded consistently"""
+    print("🧪 Testing text normalization...")
+    assert normalize_text("Crème  Brûlée") == "creme brulee"
+    assert normalize_text("creme-brulee") == "creme brulee"
+    assert normalize_text("JALAPEÑO") == "jalapeno"
+    assert normalize_text("שָׁלוֹם") == "שלום"
+    assert normalize_text("Курица") == "курица"
+    assert normalize_text("") == ""
+
+def test_tokens_cover_every_language():
+    """Stored documents get prefix tokens for the name and each names.<lang> entry"""
+    print("🧪 Testing search fields...")
+    document = {
+        "name": "Chicken Breast",
+        "names": {
+            "en": {"name": {"singular": "Chicken Breast", "plural": "Chicken Breasts"}},
+            "es": {"name": {"singular": "Pechuga de Pollo"}},
+            "he": {"name": {"singular": "חזה עוף"}}
+        }
+    }
+    fields = build_search_fields(document, "name")
+    tokens = set(fields["search_tokens"])
+    assert fields["search_key"] == "chicken breast"
+    assert {"*:ch", "*:chicken", "*:br", "en:breasts", "es:poll", "he:עו"} <= tokens
+    for language, query in (("*", "chick bre"), ("es", "Pollo"), ("he", "עוף")):
+        assert set(query_tokens(query, language)) <= tokens
+    assert not set(query_tokens("salmon", "*")) <= tokens
+    assert search_tokens(["a"]) == []
+
+def test_indexed_queries():
+    """Queries use the token index, with an anchored search_key fallback for short input"""
+    print("🧪 Testing indexed query filters...")
+    assert _indexed_name_query("Chick") == {"search_tokens": {"$all": ["*:chick"]}}
+    assert _indexed_name_query("pollo", "es") == {"$or": [
+        {"search_tokens": {"$all": ["*:pollo"]}},
+        {"search_tokens": {"$all": ["es:pollo"]}}
+    ]}
+    assert _indexed_name_query("c") == {"search_key": {"$regex": "^c"}}
+    assert _indexed_name_query("extraordinarily")["search_tokens"]["$all"] == ["*:extraordin"]
+
+class FakeCursor(list):
+    def limit(self, count):
+        return FakeCursor(self[:count])
+
+class FakeNames:
+    """ingredient_names stand-in that answers {"search_tokens": {"$all": ...}} (and $or of them)"""
+
+    def __init__(self, documents):
+        self.documents = [dict(document, **build_search_fields(document, "name")) for document in documents]
+
+    def find(self, query, projection):
+        clauses = query.get("$or", [query])
+        return FakeCursor({k: v for k, v in document.items() if projection.get(k, 1)} for document in self.documents
+                          if any(set(clause["search_tokens"]["$all"]) <= set(document["search_tokens"]) for clause in clauses))
+
+def test_long_words_rechecked():
+    """Query words longer than the indexed prefixes must start a stored word in full"""
+    print("🧪 Testing long query words...")
+    collection = FakeNames([
+        {"name": "Watermelon Juice"},
+        {"name": "Watermelons, raw"},
+        {"name": "Melon", "names": {"es": {"name": {"singular": "sandía", "plural": "watermelonsito"}}}},
+        {"name": "Watermelon seeds"}
+    ])
+    original = mongodb_config.ingredient_names_collection
+    mongodb_config.ingredient_names_collection = collection
+    try:
+        assert [r["name"] for r in find_ingredient("watermelons", "indexed")] == ["Watermelons, raw"]
+        assert [r["name"] for r in find_ingredient("watermelons", "indexed", language="es")] == ["Watermelons, raw", "Melon"]
+        assert [r["name"] for r in find_ingredient("watermelon", "indexed", limit=2)] == ["Watermelon Juice", "Watermelons, raw"]
+        assert [r["name"] for r in find_ingredient("watermelon se", "indexed")] == ["Watermelon seeds"]
+    finally:
+        mongodb_config.ingredient_names_collection = original
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting search index tests...")
+    test_normalization()
+    test_tokens_cover_every_language()
+    test_indexed_queries()
+    test_long_words_rechecked()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
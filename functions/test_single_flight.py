@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Test script for request coalescing of identical concurrent model calls
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+import openai_helper
+import utils
+from caching import recipe_cache
+from config import SINGLE_FLIGHT_CONFIG
+from image_payload import ImagePayload
+from single_flight import SingleFlight, content_key, single_flight_stats, vision_flight
+
+def _run_threads(count, target):
+    results = {}
+    errors = {}
+
+    def call(index):
+        try:
+            results[index] = target()
+        except Exception as e:
+            errors[index] = e
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+def test_content_key():
+    """Keys depend on content only; bytes and ImagePayload hash alike; part boundaries matter"""
+    print("🧪 Testing content keys...")
+    assert content_key("prompt", b"\x89PNG") == content_key("prompt", ImagePayload(b"\x89PNG"))
+    assert content_key("ab", "c") != content_key("a", "bc")
+    assert content_key({"b": 1, "a": [2]}) == content_key({"a": [2], "b": 1})
+    assert content_key("prompt", None) != content_key("prompt", "")
+
+def test_threads_share_one_call():
+    """Concurrent identical calls run once; every caller gets the result, waiters a copy"""
+    print("🧪 Testing thread coalescing...")
+    flight = SingleFlight("test")
+    calls = []
+
+    def analyze():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"mealName": "Omelette"}
+    results, errors = _run_threads(8, lambda: flight.do("same-image", analyze))
+    assert len(calls) == 1 and not errors
+    assert all(result == {"mealName": "Omelette"} for result in results.values())
+    assert len({id(result) for result in results.values()}) == 8
+    stats = flight.stats()
+    assert stats["calls"] == 8 and stats["executions"] == 1 and stats["coalesced"] == 7
+    assert stats["in_flight"] == 0 and stats["coalesce_rate"] == 0.875
+
+    # Once the call has finished the next identical request runs again
+    flight.do("same-image", analyze)
+    assert len(calls) == 2
+
+    def fail():
+        time.sleep(0.1)
+        raise ValueError("upstream down")
+    results, errors = _run_threads(4, lambda: flight.do("failing", fail))
+    assert not results and len(errors) == 4 and all(str(e) == "upstream down" for e in errors.values())
+
+    SINGLE_FLIGHT_CONFIG['ENABLED'] = False
+    try:
+        _run_threads(3, lambda: flight.do("same-image", analyze))
+    finally:
+        SINGLE_FLIGHT_CONFIG['ENABLED'] = True
+    assert len(calls) == 5
+
+def test_async_coalescing_and_cancellation():
+    """Coroutines on one loop share a task; it survives a cancelled caller and stops when all cancel"""
+    print("🧪 Testing async coalescing...")
+    flight = SingleFlight("test-async")
+    calls = []
+
+    async def generate(prompt):
+        calls.append(prompt)
+        await asyncio.sleep(0.1)
+        return {"recipes": [prompt]}
+
+    async def scenario():
+        results = await asyncio.gather(*(flight.do_async("recipe", generate, "omelette") for _ in range(5)))
+        assert results == [{"recipes": ["omelette"]}] * 5 and len(calls) == 1
+
+        leader = asyncio.ensure_future(flight.do_async("recipe-2", generate, "salad"))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.do_async("recipe-2", generate, "salad"))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await waiter == {"recipes": ["salad"]}
+
+        only = asyncio.ensure_future(flight.do_async("recipe-3", generate, "soup"))
+        await asyncio.sleep(0.01)
+        only.cancel()
+        await asyncio.sleep(0.15)
+        return only
+    only = asyncio.run(scenario())
+    assert only.cancelled() and calls == ["omelette", "salad", "soup"]
+    assert flight.stats()["coalesced"] == 5 and flight.stats()["in_flight"] == 0
+
+class FakeResponse:
+    status_code = 200
+
+    def json(self):
+        return {"choices": [{"message": {"content": json.dumps({"mealName": "Pasta", "estimatedCalories": 600})}}]}
+
+class SlowSession:
+    def __init__(self):
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        self.calls += 1
+        time.sleep(0.2)
+        return FakeResponse()
+
+def test_vision_helpers():
+    """Retried uploads of the same image reach OpenRouter once"""
+    print("🧪 Testing vision call coalescing...")
+    session = SlowSession()
+    original_session, original_key = openai_helper.get_session, openai_helper.api_key
+    openai_helper.get_session = lambda: session
+    openai_helper.api_key = "sk-or-test-key-0123456789abcdef"
+    vision_flight.reset()
+    try:
+        results, errors = _run_threads(4, lambda: openai_helper.analyze_image_with_openrouter(
+            image_url="https://example.com/meal.jpg", prompt="Analyze"))
+        assert not errors and session.calls == 1
+        assert all(result["mealName"] == "Pasta" for result in results.values())
+        _run_threads(2, lambda: openai_helper.analyze_image_with_vision(image_url="https://example.com/other.jpg", prompt="Analyze"))
+        assert session.calls == 2
+    finally:
+        openai_helper.get_session, openai_helper.api_key = original_session, original_key
+    stats = single_flight_stats()
+    assert stats["parsed_analysis"]["coalesced"] >= 3 and stats["vision_analysis"]["coalesced"] >= 1
+    print(f"   ✅ {stats}")
+
+def _slow_stream(calls):
+    def stream_image_analysis(image_url=None, prompt=None, image_base64=None, image_payload=None, output_schema=None):
+        calls.append(image_url)
+        yield ("field", ("mealName", "Pasta"))
+        time.sleep(0.3)
+        yield ("result", {"mealName": "Pasta", "estimatedCalories": 600})
+    return stream_image_analysis
+
+def test_meal_endpoint_coalescing():
+    """Two identical concurrent requests to the meal endpoint make one upstream call, streamed or not"""
+    print("🧪 Testing meal endpoint coalescing...")
+    import main
+
+    calls = []
+    original_stream = main.stream_image_analysis
+    main.stream_image_analysis = _slow_stream(calls)
+    try:
+        results, errors = _run_threads(2, lambda: main._analyze_meal_image(
+            "https://example.com/pasta.jpg", None, None, "pasta.jpg").get_data(as_text=True))
+        assert not errors and calls == ["https://example.com/pasta.jpg"]
+        assert all(json.loads(body)["mealName"] == "Pasta" for body in results.values())
+
+        results, errors = _run_threads(2, lambda: main._analyze_meal_image(
+            "https://example.com/soup.jpg", None, None, "soup.jpg", stream_events=True).get_data(as_text=True))
+        assert not errors and calls[1:] == ["https://example.com/soup.jpg"]
+        bodies = sorted(results.values(), key=len)
+        # The leader streams its fields; the duplicate only receives the final result
+        assert bodies[0].startswith("event: result") and "event: field" in bodies[1]
+        assert all('"estimatedCalories": 600' in body for body in bodies)
+    finally:
+        main.stream_image_analysis = original_stream
+    assert vision_flight.stats()["in_flight"] == 0
+
+def test_recipe_generation():
+    """Identical concurrent recipe generations make one request; joined callers get the usage marked coalesced"""
+    print("🧪 Testing recipe generation coalescing...")
+    calls = []
+
+    async def fake_generate(prompt, image_urls):
+        calls.append(prompt)
+        await asyncio.sleep(0.1)
+        return json.dumps({"recipes": []}), {"total_tokens": 900}
+
+    original = utils.RecipeGenerator._generate_recipe
+    utils.RecipeGenerator._generate_recipe = staticmethod(fake_generate)
+    try:
+        async def scenario():
+            usages = [{} for _ in range(3)]
+            results = await asyncio.gather(*(utils.RecipeGenerator.generate_recipe_with_ai("Generate 5", [], usage=usage)
+                                             for usage in usages))
+            other = await utils.RecipeGenerator.generate_recipe_with_ai("Generate 2", [])
+            return results, usages, other
+        results, usages, other = asyncio.run(scenario())
+    finally:
+        utils.RecipeGenerator._generate_recipe = staticmethod(original)
+    assert calls == ["Generate 5", "Generate 2"]
+    assert results == [json.dumps({"recipes": []})] * 3 and other == results[0]
+    assert usages == [{"total_tokens": 900}] + [{"total_tokens": 900, "coalesced": True}] * 2
+
+def test_recipe_tokens_counted_once():
+    """Coalesced /get_recipe requests cache the shared set but count its generation tokens once"""
+    print("🧪 Testing token accounting of coalesced recipe requests...")
+    calls = []
+
+    async def fake_generate(prompt, image_urls):
+        calls.append(prompt)
+        await asyncio.sleep(0.1)
+        return json.dumps({"recipes": [{"name": "Frittata"}], "total_recipes": 1}), {"total_tokens": 900}
+
+    originals = (utils.RecipeGenerator._generate_recipe, utils.FileManager.cleanup_old_files,
+                 utils.FileManager.save_response_to_mock)
+    utils.RecipeGenerator._generate_recipe = staticmethod(fake_generate)
+    utils.FileManager.cleanup_old_files = staticmethod(lambda folder_path, max_files=1000: None)
+    utils.FileManager.save_response_to_mock = staticmethod(lambda response, filename=None: None)
+    recipe_cache.clear()
+    generated_before = recipe_cache.tokens_generated
+    try:
+        async def scenario():
+            params = {"ingredients": "egg, tomato", "retrieval": "false"}
+            return await asyncio.gather(*(utils.get_recipe_logic_async(dict(params)) for _ in range(3)))
+        results = asyncio.run(scenario())
+    finally:
+        (utils.RecipeGenerator._generate_recipe, utils.FileManager.cleanup_old_files,
+         utils.FileManager.save_response_to_mock) = (staticmethod(originals[0]), staticmethod(originals[1]),
+                                                     staticmethod(originals[2]))
+        recipe_cache.clear()
+    assert len(calls) == 1 and all(result["recipes"][0]["name"] == "Frittata" for result in results)
+    assert recipe_cache.tokens_generated - generated_before == 900
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting single-flight tests...")
+    test_content_key()
+    test_threads_share_one_call()
+    test_async_coalescing_and_cancellation()
+    test_vision_helpers()
+    test_meal_endpoint_coalescing()
+    test_recipe_generation()
+    test_recipe_tokens_counted_once()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
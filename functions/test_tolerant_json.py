@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Test script for the tolerant JSON parser, including a fuzz test against the old repair cascade
+"""
+
+import json
+import random
+
+from benchmark_tolerant_json import VARIANTS, build_corpus, cascade_parse
+from tolerant_json import parse_tolerant_json
+
+ALPHABET = ["a", "b", "Z", " ", "'", '"', "\\", ":", ",", "{", "]", "\n", "\t", "é", "日", "🍎", "30g", "True"]
+
+def random_text(rng: random.Random) -> str:
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 8)))
+
+def random_value(rng: random.Random, depth: int = 0):
+    kind = rng.randint(0, 7 if depth < 3 else 4)
+    if kind == 0:
+        return random_text(rng)
+    if kind == 1:
+        return rng.randint(-10**6, 10**6)
+    if kind == 2:
+        return round(rng.uniform(-1000, 1000), rng.randint(0, 4))
+    if kind == 3:
+        return rng.choice([True, False, None])
+    if kind == 4:
+        return random_text(rng) or "x"
+    if kind == 5:
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return random_object(rng, depth + 1)
+
+def random_object(rng: random.Random, depth: int = 0) -> dict:
+    return {random_text(rng): random_value(rng, depth) for _ in range(rng.randint(0, 5))}
+
+def dump(value, quote: str = '"', trailing_commas: bool = False, ensure_ascii: bool = True) -> str:
+    """Serialize like json.dumps, optionally with single quotes and trailing commas"""
+    if isinstance(value, dict):
+        members = [f"{dump(key, quote, trailing_commas, ensure_ascii)}: {dump(item, quote, trailing_commas, ensure_ascii)}"
+                   for key, item in value.items()]
+        return "{" + ", ".join(members) + ("," if trailing_commas and members else "") + "}"
+    if isinstance(value, list):
+        items = [dump(item, quote, trailing_commas, ensure_ascii) for item in value]
+        return "[" + ", ".join(items) + ("," if trailing_commas and items else "") + "]"
+    text = json.dumps(value, ensure_ascii=ensure_ascii)
+    if quote == "'" and isinstance(value, str):
+        # Unescape double quotes, escape single ones
+        return "'" + text[1:-1].replace('\\"', '"').replace("'", "\\'") + "'"
+    return text
+
+def test_valid_json():
+    """Well-formed JSON parses exactly like json.loads with no repairs"""
+    print("🧪 Testing valid JSON...")
+    rng = random.Random(1)
+    for _ in range(500):
+        document = random_object(rng)
+        for text in (json.dumps(document), json.dumps(document, indent=2, ensure_ascii=False)):
+            parsed = parse_tolerant_json(text)
+            assert parsed.value == json.loads(text) and parsed.repairs == (), text
+
+def test_fuzz_against_cascade():
+    """Every content-preserving mutation parses back to the original, a superset of what the cascade recovers"""
+    print("🧪 Fuzzing against the repair cascade...")
+    rng = random.Random(2)
+    cascade_recovered = tolerant_recovered = total = 0
+    for _ in range(500):
+        document = random_object(rng)
+        ensure_ascii = rng.random() < 0.5
+        texts = [
+            f"```json\n{dump(document, ensure_ascii=ensure_ascii)}\n```",
+            f"Here is the result:\n{dump(document, ensure_ascii=ensure_ascii)}\nHope this helps!",
+            dump(document, quote="'", ensure_ascii=ensure_ascii),
+            dump(document, trailing_commas=True, ensure_ascii=ensure_ascii),
+            "```\n" + dump(document, quote="'", trailing_commas=True, ensure_ascii=ensure_ascii) + "\n```"
+        ]
+        for text in texts:
+            total += 1
+            try:
+                cascade_ok = cascade_parse(text) == document
+            except (ValueError, TypeError):
+                cascade_ok = False
+            tolerant_ok = parse_tolerant_json(text).value == document
+            assert tolerant_ok or not cascade_ok, text
+            assert tolerant_ok, text
+            cascade_recovered += cascade_ok
+            tolerant_recovered += tolerant_ok
+    print(f"   recovered {tolerant_recovered}/{total} (cascade: {cascade_recovered}/{total})")
+    assert tolerant_recovered > cascade_recovered
+
+def test_fuzz_truncation():
+    """Outputs cut anywhere still parse into the members that were complete"""
+    print("🧪 Fuzzing truncated output...")
+    rng = random.Random(3)
+    for _ in range(300):
+        document = random_object(rng)
+        text = dump(document, quote=rng.choice(['"', "'"]))
+        for cut in sorted(rng.sample(range(1, len(text) + 1), min(10, len(text)))):
+            parsed = parse_tolerant_json(text[:cut])
+            assert isinstance(parsed.value, dict) and set(parsed.value) <= set(document), text[:cut]
+            if cut < len(text):
+                assert "unterminated_structure" in parsed.repairs
+            else:
+                assert parsed.value == document
+
+def test_corpus():
+    """The benchmark corpus of model outputs is fully recovered"""
+    print("🧪 Testing the model output corpus...")
+    for variant, analysis, text in build_corpus(len(VARIANTS) * 20):
+        value = parse_tolerant_json(text).value
+        if variant == "truncated":
+            assert value["mealName"] == analysis["mealName"]
+        else:
+            assert value == analysis, variant
+
+def test_repairs_reported():
+    """Each defect is named in the result"""
+    print("🧪 Testing repair reports...")
+    cases = {
+        "```json\n{'mealName': 'Chef's special', 'kcal': 30g, 'ok': True,}\n```": (
+            {"mealName": "Chef's special", "kcal": "30g", "ok": True},
+            ("code_fence", "single_quotes", "unescaped_quote", "unquoted_value", "python_literal", "trailing_comma")
+        ),
+        'Sure! {"a": [1, 2, {"b": "x"': ({"a": [1, 2, {"b": "x"}]}, ("surrounding_text", "unterminated_structure")),
+        '{"a": "He said "hi" ok", "b": 2}': ({"a": 'He said "hi" ok', "b": 2}, ("unescaped_quote",)),
+        '{a: 1, b: "x"\n "c": 3}': ({"a": 1, "b": "x", "c": 3}, ("unquoted_key", "missing_comma")),
+        '{"a": 1, "b":': ({"a": 1}, ("dropped_incomplete_member", "unterminated_structure")),
+        '{"a": 1,, "b": [1,,2,]}': ({"a": 1, "b": [1, 2]}, ("extra_comma", "trailing_comma")),
+        '{"a": "cut\\': ({"a": "cut"}, ("unterminated_string", "unterminated_structure")),
+        '[1, 2]  and more': ([1, 2], ("surrounding_text",))
+    }
+    for text, (value, repairs) in cases.items():
+        parsed = parse_tolerant_json(text)
+        assert parsed.value == value and parsed.repairs == repairs, (text, parsed)
+    assert parse_tolerant_json('{"a": 1}').repaired is False
+    try:
+        parse_tolerant_json("no json here")
+        assert False, "expected JSONDecodeError"
+    except json.JSONDecodeError:
+        pass
+
+def test_deep_nesting():
+    """Input nested deeper than the recursion limit fails as a JSONDecodeError"""
+    print("🧪 Testing deeply nested input...")
+    for text in ("[" * 5000, "[" * 5000 + "]" * 5000, '{"a":' * 5000):
+        try:
+            parse_tolerant_json(text)
+        except json.JSONDecodeError:
+            pass
+        else:
+            raise AssertionError("deeply nested input parsed")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting tolerant JSON tests...")
+    test_valid_json()
+    test_fuzz_against_cascade()
+    test_fuzz_truncation()
+    test_corpus()
+    test_repairs_reported()
+    test_deep_nesting()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test script for nutrient and weight string parsing
+"""
+
+from unit_parser import _parse_text, parse_nutrient, parse_number, parse_quantity, to_grams, to_kcal
+
+def test_quantities():
+    """Numbers and normalized units are split out of model strings"""
+    print("🧪 Testing quantities...")
+    assert parse_quantity("18.1g") == (18.1, "g")
+    assert parse_quantity("90.4kcal") == (90.4, "kcal")
+    assert parse_quantity("500ml") == (500.0, "ml")
+    assert parse_quantity("1 cup") == (1.0, "cup")
+    assert parse_quantity("2 Cups") == (2.0, "cup")
+    assert parse_quantity("1.2 KG") == (1.2, "kg")
+    assert parse_quantity("250 Grams") == (250.0, "g")
+    assert parse_quantity("1 Litre") == (1.0, "l")
+    assert parse_quantity("335 KJ") == (335.0, "kJ")
+    assert parse_quantity("-5g") == (-5.0, "g")
+    assert parse_quantity("about 30 g") == (30.0, "g")
+    assert parse_quantity(12) == (12.0, None)
+    assert parse_quantity("12") == (12.0, None)
+    assert parse_quantity("n/a") == (None, None)
+    assert parse_quantity(None) == (None, None)
+    assert parse_quantity(True) == (None, None)
+
+def test_decimal_separators():
+    """Comma decimals and thousands separators are told apart"""
+    print("🧪 Testing decimal separators...")
+    assert parse_number("2,5g") == 2.5
+    assert parse_number("0,125 kg") == 0.125
+    assert parse_number("1,500 kcal") == 1500.0
+    assert parse_number("1,234,567") == 1234567.0
+    assert parse_number("1.234,5g") == 1234.5
+    assert parse_number("1,234.5g") == 1234.5
+    assert parse_number("5.") == 5.0
+
+def test_conversions():
+    """kg/mg/l are converted to grams and kJ to kcal; other units are not guessed"""
+    print("🧪 Testing conversions...")
+    assert to_grams("1.2kg") == 1200.0
+    assert to_grams("500mg") == 0.5
+    assert to_grams("250ml") == 250.0
+    assert to_grams("1 L") == 1000.0
+    assert to_grams("450") == 450.0
+    assert to_grams("1 cup") is None
+    assert to_grams(None) is None
+    assert round(to_kcal("418.4 kJ"), 6) == 100.0
+    assert to_kcal("90kcal") == 90.0
+    assert to_kcal("12g") is None
+    assert parse_nutrient("calories_per_100g", "52 kcal") == 52.0
+    assert parse_nutrient("fats", "300mg") == 0.3
+
+def test_literal_cache():
+    """Repeated literal strings are parsed once"""
+    print("🧪 Testing literal cache...")
+    _parse_text.cache_clear()
+    for _ in range(5):
+        parse_quantity("0g")
+    info = _parse_text.cache_info()
+    assert info.misses == 1 and info.hits == 4
+
+def test_per_100g_from_weights():
+    """process_ingredient_nutrition_data understands kg weights and mg nutrients"""
+    print("🧪 Testing per-100g values...")
+    import persistence_queue
+    from utils import process_ingredient_nutrition_data
+
+    original_persist = persistence_queue.persist_analysis_batch
+    persistence_queue.persist_analysis_batch = lambda batch: None
+    try:
+        result = {"macronutrients_by_ingredient": {
+            "Rice (Basmati)": {"category": "Grains", "weight": "1,5 kg", "proteins": "105g",
+                               "carbohydrates": "1.2kg", "fats": "9000mg", "calories": "5400kcal"},
+            "Milk": {"category": "Dairy", "weight": "1 cup", "proteins": "8g",
+                     "carbohydrates": "12g", "fats": "8g", "calories": "150kcal"}
+        }}
+        process_ingredient_nutrition_data(result)
+    finally:
+        persistence_queue.persist_analysis_batch = original_persist
+    rice = result["macronutrients_by_ingredient"]["Rice (Basmati)"]
+    assert (rice["proteins_per_100g"], rice["carbohydrates_per_100g"], rice["fats_per_100g"], rice["calories_per_100g"]) == (7.0, 80.0, 0.6, 360.0)
+    assert result["macronutrients_by_ingredient"]["Milk"]["calories_per_100g"] == 0.0
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting unit parser tests...")
+    test_quantities()
+    test_decimal_separators()
+    test_conversions()
+    test_literal_cache()
+    test_per_100g_from_weights()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Test script for batched MongoDB persistence of analysis results
+"""
+
+from pymongo.errors import BulkWriteError
+from mongodb_config import AnalysisWriteBatch
+
+class FakeCollection:
+    """Stand-in for a pymongo collection that rejects documents named 'bad'"""
+
+    def __init__(self):
+        self.documents = []
+        self.calls = 0
+
+    def insert_many(self, documents, ordered=True):
+        self.calls += 1
+        assert ordered is False
+        errors = []
+        for index, document in enumerate(documents):
+            if document.get("name") == "bad" or document.get("ingredient_name") == "bad":
+                errors.append({"index": index, "code": 121, "errmsg": "Document failed validation"})
+            else:
+                self.documents.append(document)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(documents) - len(errors)})
+
+        class Result:
+            inserted_ids = list(range(len(documents)))
+        return Result()
+
+def test_one_round_trip_per_collection():
+    """Thirty ingredients are written with a single insert_many"""
+    print("🧪 Testing batched writes...")
+    ingredients, errors, meals = FakeCollection(), FakeCollection(), FakeCollection()
+    with AnalysisWriteBatch(ingredients, errors, meals) as batch:
+        for i in range(30):
+            batch.add_ingredient({"name": f"ingredient {i}", "nutrition_data": {}})
+        batch.add_validation_error("tomato", {"errors": ["Negative value"]}, {})
+        batch.add_meal_analysis({"analysis_type": "meal_image_analysis", "result_data": {}})
+        assert len(batch) == 32
+    assert (ingredients.calls, errors.calls, meals.calls) == (1, 1, 1)
+    assert len(ingredients.documents) == 30
+    assert "created_at" in ingredients.documents[0] and "timestamp" in errors.documents[0]
+    print("   ✅ 32 documents in 3 round trips")
+
+def test_per_document_failures():
+    """Rejected documents are reported individually while the rest are saved"""
+    print("🧪 Testing per-document failure reporting...")
+    ingredients = FakeCollection()
+    batch = AnalysisWriteBatch(ingredients, FakeCollection(), FakeCollection())
+    for name in ("apple", "bad", "pear"):
+        batch.add_ingredient({"name": name})
+    result = batch.flush()
+    assert result["inserted"] == {"ingredients": 2}
+    assert result["failed"] == [{"collection": "ingredients", "index": 1, "label": "bad", "error": "Document failed validation"}]
+    assert len(batch) == 0
+    assert batch.flush() == {"inserted": {}, "failed": []}
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting write batch tests...")
+    test_one_round_trip_per_collection()
+    test_per_document_failures()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test script for the write-behind analysis persistence queue
+"""
+
+import os
+import tempfile
+import time
+from datetime import datetime
+from mongodb_config import AnalysisWriteBatch
+from persistence_queue import WriteBehindQueue
+
+class FakeCollection:
+    """Stand-in for a pymongo collection with configurable latency and outages"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.available = True
+        self.documents = []
+        self.calls = 0
+
+    def insert_many(self, documents, ordered=True):
+        time.sleep(self.delay)
+        if not self.available:
+            raise ConnectionError("MongoDB unreachable")
+        self.calls += 1
+        self.documents.extend(documents)
+
+        class Result:
+            inserted_ids = list(range(len(documents)))
+        return Result()
+
+def _setup(delay=0.0, **kwargs):
+    collections = (FakeCollection(delay), FakeCollection(delay), FakeCollection(delay))
+    spill_path = os.path.join(tempfile.mkdtemp(), "spill.jsonl")
+    write_queue = WriteBehindQueue(lambda: AnalysisWriteBatch(*collections), spill_path=spill_path, flush_interval=0.05, **kwargs)
+    return write_queue, collections
+
+def _batch(collections, count: int):
+    batch = AnalysisWriteBatch(*collections)
+    for i in range(count):
+        batch.add_ingredient({"name": f"ingredient {i}"})
+    batch.add_meal_analysis({"analysis_type": "meal_image_analysis", "result_data": {}})
+    return batch
+
+def test_submit_does_not_wait_for_mongo():
+    """Requests return immediately; queued batches are merged and written in the background"""
+    print("🧪 Testing background writes...")
+    write_queue, collections = _setup(delay=0.2)
+    start = time.perf_counter()
+    for _ in range(5):
+        assert write_queue.submit(_batch(collections, 30))
+    elapsed = time.perf_counter() - start
+    print(f"   5 submits took {elapsed * 1000:.1f} ms")
+    assert elapsed < 0.1
+    write_queue.shutdown()
+    ingredients = collections[0]
+    assert len(ingredients.documents) == 150
+    assert ingredients.calls < 5
+    print(f"   ✅ {write_queue.stats()}")
+
+def test_spill_and_replay_when_mongo_is_down():
+    """Unreachable MongoDB spills documents to disk and they are replayed later"""
+    print("🧪 Testing disk spill and replay...")
+    write_queue, collections = _setup()
+    for collection in collections:
+        collection.available = False
+    write_queue.submit(_batch(collections, 3))
+    time.sleep(0.3)
+    assert os.path.exists(write_queue.spill_path)
+    assert write_queue.stats()["documents_spilled"] >= 4
+
+    for collection in collections:
+        collection.available = True
+    assert write_queue.replay_spill() == 4
+    assert not os.path.exists(write_queue.spill_path)
+    assert isinstance(collections[0].documents[0]["created_at"], datetime)
+    write_queue.shutdown()
+
+def test_backpressure_spills_instead_of_blocking():
+    """A full queue spills new batches after a short wait instead of blocking the request"""
+    print("🧪 Testing backpressure...")
+    write_queue, collections = _setup(delay=0.3, max_queue_size=1, enqueue_timeout=0.01, max_batch_documents=1)
+    results = [write_queue.submit(_batch(collections, 1)) for _ in range(5)]
+    assert False in results
+    assert write_queue.stats()["backpressure_spills"] >= 1
+    write_queue.shutdown()
+    write_queue.replay_spill()
+    assert len(collections[0].documents) == 5
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting write-behind tests...")
+    test_submit_does_not_wait_for_mongo()
+    test_spill_and_replay_when_mongo_is_down()
+    test_backpressure_spills_instead_of_blocking()
+    print("✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
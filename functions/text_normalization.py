@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Text normalization and search tokens for indexed ingredient lookups
+
+Stored names and user queries go through the same normalization, so an
+equality or prefix match on the normalized keys can be answered from a
+B-tree index instead of a case-insensitive $regex scan.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Iterable, List
+
+# Word prefixes shorter than this are not indexed (too many matches to be useful)
+MIN_PREFIX_LENGTH = 2
+# Longer query words are looked up by their first MAX_PREFIX_LENGTH characters and re-checked in full
+MAX_PREFIX_LENGTH = 10
+# Language tag used for tokens built from the language-neutral top-level fields
+ANY_LANGUAGE = "*"
+
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+
+@lru_cache(maxsize=65536)
+def normalize_text(text: str) -> str:
+    """
+    Lowercase, fold diacritics and collapse punctuation/whitespace
+
+    "Crème Brûlée" and "creme-brulee" both become "creme brulee".
+    """
+    if not text:
+        return ""
+    text = str(text)
+    if text.isascii():
+        # NFKD is the identity on ASCII and there are no combining marks to strip
+        folded = text
+    else:
+        decomposed = unicodedata.normalize("NFKD", text)
+        folded = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_WORD.sub(" ", folded.casefold()).replace("_", " ").strip()
+
+def text_words(text: str) -> List[str]:
+    normalized = normalize_text(text)
+    return normalized.split() if normalized else []
+
+def search_tokens(texts: Iterable[str], language: str = ANY_LANGUAGE) -> List[str]:
+    """
+    Build language-tagged word-prefix tokens ("en:ch", "en:chi", ...) for stored names
+    """
+    tokens = set()
+    for text in texts:
+        for word in text_words(text):
+            for length in range(MIN_PREFIX_LENGTH, min(len(word), MAX_PREFIX_LENGTH) + 1):
+                tokens.add(f"{language}:{word[:length]}")
+    return sorted(tokens)
+
+def long_query_words(query: str) -> List[str]:
+    """Query words longer than MAX_PREFIX_LENGTH, which query_tokens only matches by their prefix"""
+    return [word for word in text_words(query) if len(word) > MAX_PREFIX_LENGTH]
+
+def words_have_prefixes(words: Iterable[str], texts: Iterable[str]) -> bool:
+    """True if each of words is a prefix of some normalized word of texts"""
+    stored = [word for text in texts for word in text_words(text)]
+    return all(any(candidate.startswith(word) for candidate in stored) for word in words)
+
+def query_tokens(query: str, language: str = ANY_LANGUAGE) -> List[str]:
+    """
+    Tokens a document must all contain to match every query word as a word prefix
+
+    Words shorter than MIN_PREFIX_LENGTH are skipped; words longer than
+    MAX_PREFIX_LENGTH are matched on their first MAX_PREFIX_LENGTH characters;
+    re-check those (long_query_words) with words_have_prefixes.
+    """
+    return sorted({
+        f"{language}:{word[:MAX_PREFIX_LENGTH]}"
+        for word in text_words(query)
+        if len(word) >= MIN_PREFIX_LENGTH
+    })
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Tolerant parsing of model-written JSON in one pass
+
+Model output is close to JSON but often wrapped in a ```json fence or prose,
+single-quoted, padded with trailing commas, or cut off by the token limit.
+parse_tolerant_json reads it with one recursive-descent pass instead of a
+cascade of string rewrites and re-parses, and reports the repairs it made.
+
+Well-formed input is parsed entirely by the json module's C scanner. Otherwise
+one regex tokenizes the text and only tokens are handled in Python: a key
+and its colon are one token, as are a comma and the member after it.
+Complete containers before the first defect still go to the C scanner.
+"""
+
+import json
+import re
+from json.decoder import scanstring
+from json.scanner import make_scanner
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+# The stdlib scanner: parses one complete value at an index (C accelerated)
+_scan_once = make_scanner(json.JSONDecoder(strict=False))
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# A quote closes its string only when a delimiter, a line break or the end follows,
+# so apostrophes ('Chef's') and unescaped inner quotes stay inside the string
+_CLOSE = r"(?:\s*+(?:[,:}\]]|\Z)|[ \t]*+\r?\n)"
+_TOKEN = re.compile(r"""
+    [ \t\n\r]*+ (,)? [ \t\n\r]*+                                      # 1: a comma before the token
+    (?:
+        ([}\]])                                                       # 2: closing bracket
+      | ([{\[])                                                       # 3: opening bracket
+      | "((?:[^"\\]++|\\.|"(?!CLOSE))*+)" (?:\s*+(:)|(?=CLOSE))       # 4: string, 5: its colon (a key)
+      | '((?:[^'\\]++|\\.|'(?!CLOSE))*+)' (?:\s*+(:)|(?=CLOSE))       # 6: single-quoted, 7: colon
+      | (["'][\s\S]*)                                                 # 8: string cut off by the end
+      | ([^\s,:{}\[\]"']++(?:[ \t]++[^\s,:{}\[\]"']++)*+) (?:\s*+(:))? # 9: bare word, 10: colon
+      | ([,:])                                                        # 11: stray comma or colon
+    )
+""".replace("CLOSE", _CLOSE), re.VERBOSE)
+(_CLOSING, _OPENING, _STRING, _STRING_KEY, _SINGLE_QUOTED, _SINGLE_QUOTED_KEY,
+ _UNTERMINATED, _BARE, _BARE_KEY, _STRAY) = range(2, 12)
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?")
+_ESCAPE = re.compile(r"\\(u[dD][89abAB][0-9a-fA-F]{2}\\u[dD][c-fC-F][0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|.)", re.DOTALL)
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+_JSON_LITERALS = {"true": True, "false": False, "null": None}
+_PYTHON_LITERALS = {"True": True, "False": False, "None": None}
+
+# Repair codes reported in RepairedJSON.repairs
+CODE_FENCE = "code_fence"
+SURROUNDING_TEXT = "surrounding_text"
+SINGLE_QUOTES = "single_quotes"
+UNESCAPED_QUOTE = "unescaped_quote"
+UNQUOTED_KEY = "unquoted_key"
+UNQUOTED_VALUE = "unquoted_value"
+PYTHON_LITERAL = "python_literal"
+TRAILING_COMMA = "trailing_comma"
+EXTRA_COMMA = "extra_comma"
+MISSING_COMMA = "missing_comma"
+MISSING_COLON = "missing_colon"
+STRAY_COLON = "stray_colon"
+MISMATCHED_BRACKET = "mismatched_bracket"
+UNTERMINATED_STRING = "unterminated_string"
+UNTERMINATED_STRUCTURE = "unterminated_structure"
+DROPPED_INCOMPLETE_MEMBER = "dropped_incomplete_member"
+
+class RepairedJSON(NamedTuple):
+    """A parsed value and the repairs (in order of first occurrence) it needed"""
+    value: Any
+    repairs: Tuple[str, ...]
+
+    @property
+    def repaired(self) -> bool:
+        return bool(self.repairs)
+
+def _unescape(match: "re.Match") -> str:
+    escape = match.group(1)
+    if len(escape) == 5:
+        return chr(int(escape[1:], 16))
+    if len(escape) == 11:
+        # A surrogate pair (\ud83c\udf4e) is one character
+        high, low = int(escape[1:5], 16), int(escape[7:], 16)
+        return chr(0x10000 + ((high - 0xD800) << 10) + (low - 0xDC00))
+    return _ESCAPES.get(escape, escape)
+
+def _decode_body(body: str, quote: str) -> str:
+    """The value of a string literal's body (between its quotes)"""
+    if "\\" not in body:
+        return body
+    if quote == '"':
+        try:
+            value, end = scanstring(body + '"', 0, False)
+            if end == len(body) + 1:
+                return value
+        except ValueError:
+            pass
+    return _ESCAPE.sub(_unescape, body)
+
+class _Parser:
+    def __init__(self, text: str, start: int, error_position: int):
+        self.text = text
+        # Containers that start before the first defect may be complete: try the C scanner on them
+        self.error_position = error_position
+        self.tokens = _TOKEN.finditer(text, start)
+        self.pending: Optional["re.Match"] = None
+        # Where the last closed container ended
+        self.end = start
+        self.repairs: List[str] = []
+
+    def repair(self, code: str) -> None:
+        if code not in self.repairs:
+            self.repairs.append(code)
+
+    def next(self) -> Optional["re.Match"]:
+        """The next token, or None at the end of the text"""
+        token = self.pending
+        if token is None:
+            return next(self.tokens, None)
+        self.pending = None
+        return token
+
+    def string(self, token: "re.Match", kind: int) -> str:
+        """Decode a string token (a key or a value)"""
+        if kind <= _STRING_KEY:
+            body = token.group(_STRING)
+            if body.count('"') > body.count('\\"'):
+                self.repair(UNESCAPED_QUOTE)
+            return _decode_body(body, '"')
+        if kind <= _SINGLE_QUOTED_KEY:
+            self.repair(SINGLE_QUOTES)
+            body = token.group(_SINGLE_QUOTED)
+            if body.count("'") > body.count("\\'"):
+                self.repair(UNESCAPED_QUOTE)
+            return _decode_body(body, "'")
+        literal = token.group(_UNTERMINATED)
+        if literal[0] == "'":
+            self.repair(SINGLE_QUOTES)
+        self.repair(UNTERMINATED_STRING)
+        # Drop a trailing lone backslash left by the cut
+        body = literal[1:-1] if literal.endswith("\\") and not literal.endswith("\\\\") else literal[1:]
+        return _decode_body(body, literal[0])
+
+    def value(self, token: "re.Match", kind: int) -> Any:
+        if kind == _STRING:
+            body = token.group(_STRING)
+            if "\\" not in body and '"' not in body:
+                return body
+            return self.string(token, kind)
+        if kind == _OPENING:
+            start = token.start(_OPENING)
+            if start < self.error_position:
+                try:
+                    value, end = _scan_once(self.text, start)
+                except (StopIteration, ValueError):
+                    pass
+                else:
+                    self.tokens = _TOKEN.finditer(self.text, end)
+                    self.end = end
+                    return value
+            return self.object() if token.group(_OPENING) == "{" else self.array()
+        if kind == _BARE:
+            return self.bare(token.group(_BARE))
+        if kind in (_STRING_KEY, _SINGLE_QUOTED_KEY, _BARE_KEY):
+            # "a": "b": 1 - a key where a value belongs
+            self.repair(STRAY_COLON)
+            return token.group(_BARE) if kind == _BARE_KEY else self.string(token, kind)
+        return self.string(token, kind)
+
+    def bare(self, word: str) -> Any:
+        if word in _JSON_LITERALS:
+            return _JSON_LITERALS[word]
+        if _NUMBER.fullmatch(word):
+            return float(word) if any(char in word for char in ".eE") else int(word)
+        if word in _PYTHON_LITERALS:
+            self.repair(PYTHON_LITERAL)
+            return _PYTHON_LITERALS[word]
+        self.repair(UNQUOTED_VALUE)
+        try:
+            return float(word)
+        except ValueError:
+            return word
+
+    def close(self, token: Optional["re.Match"], bracket: str) -> None:
+        """Record how a container ended"""
+        if token is None:
+            self.repair(UNTERMINATED_STRUCTURE)
+            self.end = len(self.text)
+            return
+        if token.group(1):
+            self.repair(TRAILING_COMMA)
+        if token.group(_CLOSING) != bracket:
+            self.repair(MISMATCHED_BRACKET)
+        self.end = token.end()
+
+    def object(self) -> dict:
+        result = {}
+        first = True
+        while True:
+            token = self.next()
+            kind = token.lastindex if token is not None else _CLOSING
+            if kind == _CLOSING:
+                self.close(token, "}")
+                return result
+            if token.group(1) is None:
+                if not first:
+                    self.repair(MISSING_COMMA)
+            elif first:
+                self.repair(EXTRA_COMMA)
+            first = False
+
+            if kind == _STRING_KEY:
+                body = token.group(_STRING)
+                key = body if "\\" not in body and '"' not in body else self.string(token, kind)
+            elif kind == _SINGLE_QUOTED_KEY:
+                key = self.string(token, kind)
+            elif kind == _BARE_KEY:
+                self.repair(UNQUOTED_KEY)
+                key = token.group(_BARE)
+            elif kind == _STRAY:
+                if token.group(_STRAY) == ",":
+                    self.repair(EXTRA_COMMA)
+                    first = True
+                    continue
+                # A value without a key: read it and drop it
+                self.repair(STRAY_COLON)
+                token = self.next()
+                if token is not None and token.group(1) is None and token.lastindex not in (_CLOSING, _STRAY):
+                    self.value(token, token.lastindex)
+                else:
+                    self.pending = token
+                continue
+            else:
+                # A string, word or container with no colon after it
+                key = self.value(token, kind)
+                if kind == _BARE:
+                    self.repair(UNQUOTED_KEY)
+                if not isinstance(key, str):
+                    key = json.dumps(key)
+                token = self.next()
+                if token is not None and token.group(1) is None and token.lastindex not in (_CLOSING, _STRAY):
+                    self.repair(MISSING_COLON)
+                else:
+                    self.repair(DROPPED_INCOMPLETE_MEMBER)
+                    self.pending = token
+                    continue
+                result[key] = self.value(token, token.lastindex)
+                continue
+
+            token = self.next()
+            if token is None or token.group(1) is not None or token.lastindex in (_CLOSING, _STRAY):
+                # A key without a value (cut off, or "key": ,)
+                self.repair(DROPPED_INCOMPLETE_MEMBER)
+                self.pending = token
+                continue
+            result[key] = self.value(token, token.lastindex)
+
+    def array(self) -> list:
+        result = []
+        first = True
+        while True:
+            token = self.next()
+            kind = token.lastindex if token is not None else _CLOSING
+            if kind == _CLOSING:
+                self.close(token, "]")
+                return result
+            if token.group(1) is None:
+                if not first:
+                    self.repair(MISSING_COMMA)
+            elif first:
+                self.repair(EXTRA_COMMA)
+            if kind == _STRAY:
+                self.repair(EXTRA_COMMA if token.group(_STRAY) == "," else STRAY_COLON)
+                first = True
+                continue
+            first = False
+            result.append(self.value(token, kind))
+
+    def outside(self, surrounding: str) -> None:
+        """Record what the text around the JSON value was"""
+        if "```" in surrounding:
+            self.repair(CODE_FENCE)
+            surrounding = surrounding.replace("```json", "").replace("```", "")
+        if surrounding.strip():
+            self.repair(SURROUNDING_TEXT)
+
+def parse_tolerant_json(text: str) -> RepairedJSON:
+    """
+    Parse the first JSON object or array in model output, repairing common defects
+
+    Args:
+        text: Model output, possibly fenced, prefixed with prose, single-quoted or truncated
+
+    Returns:
+        RepairedJSON: The parsed value and the repair codes that were applied
+
+    Raises:
+        json.JSONDecodeError: If the text contains no object or array, or nests too deeply
+    """
+    try:
+        return _parse(text)
+    except RecursionError:
+        raise json.JSONDecodeError("JSON nested too deeply", text, 0) from None
+
+def _parse(text: str) -> RepairedJSON:
+    start = _WHITESPACE.match(text).end()
+    prefix = None
+    if start == len(text) or text[start] not in "{[":
+        start = text.find("{")
+        if start == -1:
+            start = text.find("[")
+        if start == -1:
+            raise json.JSONDecodeError("No JSON object found", text, 0)
+        prefix = text[:start]
+
+    try:
+        value, end = _scan_once(text, start)
+    except (StopIteration, json.JSONDecodeError) as e:
+        # The scanner reports where the first defect is (StopIteration: a missing value)
+        parser = _Parser(text, start, e.value if isinstance(e, StopIteration) else e.pos)
+        if prefix is not None:
+            parser.outside(prefix)
+        value = parser.value(parser.next(), _OPENING)
+        end = parser.end
+    else:
+        if prefix is None and _WHITESPACE.match(text, end).end() == len(text):
+            return RepairedJSON(value, ())
+        parser = _Parser(text, end, end)
+        if prefix is not None:
+            parser.outside(prefix)
+    if end < len(text):
+        parser.outside(text[end:])
+    return RepairedJSON(value, tuple(parser.repairs))
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Parse nutrient and weight strings such as "18.1g", "90.4kcal", "500ml" or "1 cup"
+
+Model output and stored documents carry quantities as strings. parse_quantity
+splits them into (value, unit) with one compiled regex, normalizing unit
+spellings (grams -> g, Kcal -> kcal, KJ -> kJ, litres -> l, ...) and comma
+decimals ("2,5g"). Plain "<number><unit>" strings skip the regex, and
+repeated literals ("0g", "100g") are served from LRUs.
+to_grams / to_kcal convert to the base units used for nutrition math.
+"""
+
+import re
+import string
+from functools import lru_cache
+from typing import Any, Optional, Tuple
+
+_UNIT_LETTERS = string.ascii_letters + " "
+# Number (with "." or "," separators) followed by an optional unit word
+_QUANTITY = re.compile(r"([-+]?(?:\d[\d.,]*|[.,]\d+))\s*([^\W\d_]+)?")
+
+UNIT_ALIASES = {
+    "g": "g", "gr": "g", "grs": "g", "gram": "g", "grams": "g", "gramme": "g", "grammes": "g",
+    "kg": "kg", "kgs": "kg", "kilo": "kg", "kilos": "kg", "kilogram": "kg", "kilograms": "kg",
+    "mg": "mg", "milligram": "mg", "milligrams": "mg",
+    "ml": "ml", "millilitre": "ml", "millilitres": "ml", "milliliter": "ml", "milliliters": "ml",
+    "l": "l", "lt": "l", "ltr": "l", "litre": "l", "litres": "l", "liter": "l", "liters": "l",
+    "kcal": "kcal", "kcals": "kcal", "cal": "kcal", "cals": "kcal", "calorie": "kcal", "calories": "kcal",
+    "kj": "kJ", "kilojoule": "kJ", "kilojoules": "kJ",
+    "cup": "cup", "cups": "cup",
+    "tbsp": "tbsp", "tablespoon": "tbsp", "tablespoons": "tbsp",
+    "tsp": "tsp", "teaspoon": "tsp", "teaspoons": "tsp",
+    "oz": "oz", "ounce": "oz", "ounces": "oz",
+    "lb": "lb", "lbs": "lb", "pound": "lb", "pounds": "lb"
+}
+# Grams per unit; ml and l are counted as water (1 g/ml), as the analyses always have
+MASS_FACTORS = {"g": 1.0, "kg": 1000.0, "mg": 0.001, "ml": 1.0, "l": 1000.0, "oz": 28.3495, "lb": 453.592}
+KCAL_FACTORS = {"kcal": 1.0, "kJ": 1 / 4.184}
+
+def _to_float(number: str) -> float:
+    """float() that understands "2,5", "1,500", "1.234,5" and "1,234.5" """
+    if "," in number:
+        if "." in number:
+            # The separator that comes last is the decimal point
+            if number.rindex(",") > number.rindex("."):
+                number = number.replace(".", "").replace(",", ".")
+            else:
+                number = number.replace(",", "")
+        else:
+            head, _, tail = number.rpartition(",")
+            if "," in head or (len(tail) == 3 and head.lstrip("+-") not in ("", "0")):
+                # "1,500" / "1,234,567": thousands separators
+                number = number.replace(",", "")
+            else:
+                number = f"{head}.{tail}"
+    elif number.count(".") > 1:
+        number = number.replace(".", "")
+    return float(number)
+
+def _normalize_unit(unit: str) -> Optional[str]:
+    if not unit:
+        return None
+    lowered = unit.lower()
+    return UNIT_ALIASES.get(lowered, lowered)
+
+def _scan(text: str) -> Tuple[Optional[float], Optional[str]]:
+    match = _QUANTITY.search(text)
+    if not match:
+        return None, None
+    try:
+        value = _to_float(match.group(1).rstrip(".,"))
+    except ValueError:
+        return None, None
+    return value, _normalize_unit(match.group(2))
+
+@lru_cache(maxsize=65536)
+def _parse_text(text: str) -> Tuple[Optional[float], Optional[str]]:
+    # Fast path for the common "<number><unit>" shape: split off the trailing
+    # letters and let float() read the rest; anything else goes to the regex
+    number = text.rstrip(_UNIT_LETTERS)
+    try:
+        value = float(number)
+    except ValueError:
+        return _scan(text)
+    return value, _normalize_unit(text[len(number):].strip())
+
+def parse_quantity(value: Any) -> Tuple[Optional[float], Optional[str]]:
+    """
+    Split a quantity into its number and normalized unit
+
+    Args:
+        value: "18.1g", "90.4 kcal", "1,5 L", "2 cups", 12.5 ...
+
+    Returns:
+        tuple: (value, unit); unit is None for bare numbers, value is None when there is no number
+    """
+    if isinstance(value, str):
+        return _parse_text(value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value), None
+    return None, None
+
+def parse_number(value: Any) -> Optional[float]:
+    """The number of a quantity, ignoring its unit"""
+    return parse_quantity(value)[0]
+
+def _convert(quantity: Tuple[Optional[float], Optional[str]], factors: dict) -> Optional[float]:
+    number, unit = quantity
+    if number is None or unit is None:
+        return number
+    factor = factors.get(unit)
+    return number * factor if factor is not None else None
+
+@lru_cache(maxsize=65536)
+def _text_to_grams(text: str) -> Optional[float]:
+    return _convert(_parse_text(text), MASS_FACTORS)
+
+@lru_cache(maxsize=65536)
+def _text_to_kcal(text: str) -> Optional[float]:
+    return _convert(_parse_text(text), KCAL_FACTORS)
+
+def to_grams(value: Any) -> Optional[float]:
+    """Quantity in grams (bare numbers are grams, ml counted 1:1); None for non-mass units like "cup" """
+    if isinstance(value, str):
+        return _text_to_grams(value)
+    return _convert(parse_quantity(value), MASS_FACTORS)
+
+def to_kcal(value: Any) -> Optional[float]:
+    """Energy in kcal (bare numbers are kcal, kJ converted); None for other units"""
+    if isinstance(value, str):
+        return _text_to_kcal(value)
+    return _convert(parse_quantity(value), KCAL_FACTORS)
+
+def parse_nutrient(field: str, value: Any) -> Optional[float]:
+    """A nutrient amount in its base unit: kcal for calories fields, grams otherwise"""
+    if isinstance(value, str):
+        return _text_to_kcal(value) if field.startswith("calories") else _text_to_grams(value)
+    return _convert(parse_quantity(value), KCAL_FACTORS if field.startswith("calories") else MASS_FACTORS)
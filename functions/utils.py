@@ -9,8 +9,21 @@ from dotenv import load_dotenv
 from urllib.parse import quote_plus
 from datetime import datetime
 import asyncio
+import httpx
 import requests
 from fastapi import HTTPException, UploadFile
+from background_loop import run_coroutine
+from caching import make_recipe_cache_key, recipe_cache
+from config import MAX_FILE_SIZE, RECIPE_CACHE_CONFIG, RECIPE_RETRIEVAL_CONFIG
+from http_client import get_async_client
+from image_pipeline import prepare_image_for_api
+from nutrition_validation import FIELDS as NUTRITION_FIELDS, PER_100G_FIELDS, check_nutrition_rules
+from output_schemas import RECIPE_SET, output_stats, parse_structured_output, response_format_for
+from recipe_macro_columns import build_macro_columns
+from recipe_retrieval import merge_recipes, search_stored_recipes
+from single_flight import content_key, recipe_flight
+from tolerant_json import parse_tolerant_json
+from unit_parser import parse_nutrient, to_grams
 
 # Import your backend and model utilities as needed
 # from backend.app_recipe.utils.base.mongo_client import recipes_collection, ingredient_names_collection, \
@@ -31,8 +44,10 @@ FINAL_MODEL = 'openai/gpt-4o'
 
 # Constants for the functions
 MAX_IMAGES = 3
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+# Upper bound on images analyzed in parallel per request (1 = sequential)
+MAX_CONCURRENT_IMAGE_ANALYSES = int(os.getenv("MAX_CONCURRENT_IMAGE_ANALYSES", str(MAX_IMAGES)))
 INGREDIENT_ANALYSIS_TIMEOUT = 60
+RECIPE_GENERATION_TIMEOUT = 60
 
 # --- Common utility functions moved from main.py ---
 
@@ -48,60 +63,17 @@ def encode_image(file_path: str) -> str:
 def robust_json_parse(json_str: str) -> dict:
     """Robustly parse JSON string, handling common formatting issues"""
     try:
-        # Try direct parsing first
-        return json.loads(json_str)
-    except json.JSONDecodeError:
-        try:
-            # Try to clean up common issues
-            cleaned = json_str.strip()
-            if cleaned.startswith("```json"):
-                cleaned = cleaned[7:]
-            if cleaned.endswith("```"):
-                cleaned = cleaned[:-3]
-            cleaned = cleaned.strip()
-            return json.loads(cleaned)
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON after cleaning: {e}")
-            return None
+        return parse_tolerant_json(json_str).value
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse JSON after cleaning: {e}")
+        return None
 
 def compress_image_for_api(image_bytes, max_size_kb=400, quality=85):
     """Compress image for API submission"""
     try:
-        # Open image from bytes
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Convert to RGB if necessary
-        if image.mode in ('RGBA', 'LA', 'P'):
-            image = image.convert('RGB')
-        
-        # Calculate initial compression
-        output = io.BytesIO()
-        image.save(output, format='JPEG', quality=quality, optimize=True)
-        compressed_bytes = output.getvalue()
-        
-        # If still too large, reduce dimensions
-        while len(compressed_bytes) > max_size_kb * 1024 and quality > 10:
-            output = io.BytesIO()
-            # Reduce quality
-            quality -= 10
-            image.save(output, format='JPEG', quality=quality, optimize=True)
-            compressed_bytes = output.getvalue()
-        
-        # If still too large, resize image
-        if len(compressed_bytes) > max_size_kb * 1024:
-            width, height = image.size
-            scale_factor = 0.8
-            while len(compressed_bytes) > max_size_kb * 1024 and scale_factor > 0.3:
-                new_width = int(width * scale_factor)
-                new_height = int(height * scale_factor)
-                resized_image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                
-                output = io.BytesIO()
-                resized_image.save(output, format='JPEG', quality=quality, optimize=True)
-                compressed_bytes = output.getvalue()
-                scale_factor -= 0.1
-        
-        print(f"📏 Image compressed from {len(image_bytes)} to {len(compressed_bytes)} bytes")
+        compressed_bytes, stats = prepare_image_for_api(image_bytes, max_size_kb=max_size_kb, quality=quality)
+        print(f"📏 Image compressed from {len(image_bytes)} to {len(compressed_bytes)} bytes "
+              f"({stats['output_size'][0]}x{stats['output_size'][1]}, q{stats['quality']}, {stats['encodes']} encodes)")
         return compressed_bytes
         
     except Exception as e:
@@ -111,6 +83,13 @@ def compress_image_for_api(image_bytes, max_size_kb=400, quality=85):
 def process_ingredient_nutrition_data(result: dict) -> None:
     """Process and validate ingredient nutrition data"""
     try:
+        from mongodb_config import AnalysisWriteBatch, validate_nutrition_data
+        from persistence_queue import persist_analysis_batch
+        from ingredient_resolver import get_ingredient_resolver
+
+        # All documents for this analysis are queued together at the end
+        batch = AnalysisWriteBatch()
+        resolver = get_ingredient_resolver()
         if "macronutrients_by_ingredient" in result:
             for ingredient_name, data in result["macronutrients_by_ingredient"].items():
                 # Ensure all required fields exist
@@ -121,44 +100,43 @@ def process_ingredient_nutrition_data(result: dict) -> None:
                 
                 # Calculate per 100g values if weight is available
                 if "weight" in data and data["weight"]:
-                    try:
-                        weight_str = data["weight"].lower().replace("g", "").replace("ml", "")
-                        weight = float(weight_str)
-                        if weight > 0:
-                            # Extract numeric values
-                            proteins = float(data["proteins"].replace("g", ""))
-                            carbs = float(data["carbohydrates"].replace("g", ""))
-                            fats = float(data["fats"].replace("g", ""))
-                            calories = float(data["calories"].replace("kcal", ""))
-                            
-                            # Calculate per 100g
-                            data["proteins_per_100g"] = round((proteins / weight) * 100, 2)
-                            data["carbohydrates_per_100g"] = round((carbs / weight) * 100, 2)
-                            data["fats_per_100g"] = round((fats / weight) * 100, 2)
-                            data["calories_per_100g"] = round((calories / weight) * 100, 2)
-                    except (ValueError, AttributeError):
-                        data["proteins_per_100g"] = 0.0
-                        data["carbohydrates_per_100g"] = 0.0
-                        data["fats_per_100g"] = 0.0
-                        data["calories_per_100g"] = 0.0
+                    weight = to_grams(data["weight"])
+                    totals = {field: parse_nutrient(field, data[field]) for field in NUTRITION_FIELDS}
+                    if weight is None or any(value is None for value in totals.values()):
+                        for field in NUTRITION_FIELDS:
+                            data[f"{field}_per_100g"] = 0.0
+                    elif weight > 0:
+                        for field, value in totals.items():
+                            data[f"{field}_per_100g"] = round((value / weight) * 100, 2)
+                
+                if data.get("nutrition_source") == "ingredients_nutrition_v5":
+                    # Filled from the curated nutrition table in two-stage mode; nothing new to store
+                    continue
+                resolved = resolver.resolve(ingredient_name) if resolver is not None else None
+                if resolved is not None:
+                    # Already in the catalog: link it instead of validating and storing it again
+                    data["canonical_ingredient"] = {"id": resolved.id, "name": resolved.name, "match": resolved.method}
+                    continue
+                if resolver is not None and not resolver.should_persist(ingredient_name):
+                    # Same new ingredient was validated and queued by an earlier analysis
+                    continue
                 
                 # Validate nutrition data
                 is_valid, error_details = validate_nutrition_data(ingredient_name, data)
                 
                 if not is_valid:
-                    # Save validation error to MongoDB
-                    save_validation_error(ingredient_name, error_details, data)
+                    # Queue validation error for MongoDB
+                    batch.add_validation_error(ingredient_name, error_details, data)
                     logger.warning(f"⚠️ Validation failed for {ingredient_name}: {error_details['errors']}")
                 else:
-                    # Save valid ingredient data to MongoDB
+                    # Queue valid ingredient data for MongoDB
                     ingredient_data = {
                         "name": ingredient_name,
                         "nutrition_data": data,
                         "source": "meal_analysis",
                         "analysis_timestamp": datetime.utcnow()
                     }
-                    save_ingredient_to_mongo(ingredient_data)
-                    logger.info(f"✅ Validated and saved {ingredient_name} to MongoDB")
+                    batch.add_ingredient(ingredient_data)
         
         # Save complete meal analysis to MongoDB
         if result:
@@ -167,8 +145,10 @@ def process_ingredient_nutrition_data(result: dict) -> None:
                 "result_data": result,
                 "analysis_timestamp": datetime.utcnow()
             }
-            save_meal_analysis_to_mongo(meal_analysis_data)
-            logger.info("✅ Meal analysis saved to MongoDB")
+            batch.add_meal_analysis(meal_analysis_data)
+        
+        # Written by the background worker; the response does not wait for MongoDB
+        persist_analysis_batch(batch)
             
     except Exception as e:
         logger.error(f"Error processing ingredient nutrition data: {str(e)}")
@@ -292,7 +272,97 @@ def get_invoice_prompt():
     """
 
 
+_DETECTION_ITEM_FORMAT = """
+    {
+      "items": [
+        {
+          "name": "Base Ingredient Name (Type)",
+          "weight": "estimated total weight in grams or ml (e.g., '450g', '1000ml')",
+          "quantity": 1
+        }
+      ],
+      "total_items": 1
+    }
+"""
+
+def get_refrigerator_detection_prompt():
+    """Get the detection-only prompt for two-stage refrigerator analysis (nutrition is filled by the backend)"""
+    return """
+    You are a food analysis agent.
+
+    Your task is to:
+    1. Analyze the image and list every detected food item.
+    2. Normalize each item into its base product name with the type in parentheses (e.g., "Tomatoes on the Vine" → "Tomato (On the Vine)", "Greek Style Yogurt" → "Yogurt (Greek Style)").
+    3. Merge duplicates of the same base product and estimate the total weight of each.
+    4. Do NOT return nutrition values, translations or measurements.
+
+    Return only this JSON:
+    """ + _DETECTION_ITEM_FORMAT
+
+def get_invoice_detection_prompt():
+    """Get the detection-only prompt for two-stage invoice analysis (nutrition is filled by the backend)"""
+    return """
+    You are a food analysis agent.
+
+    Your task is to:
+    1. Extract all visible or OCR-detected food products from the receipt.
+    2. Normalize each product name to a clean base ingredient name with the type in parentheses (e.g., "Magnum Almond Ice Cream" → "Ice Cream (Almond)").
+    3. Merge duplicates and use the package weight printed on the receipt when available.
+    4. Do NOT return nutrition values, translations or measurements.
+
+    Return only this JSON:
+    """ + _DETECTION_ITEM_FORMAT.replace('"total_items": 1', '"total_items": 1,\n      "receipt_summary": {"store": "", "date": "", "total": ""}')
+
+def get_ingredient_enrichment_prompt(items: list) -> str:
+    """Get the text-only prompt that fills nutrition for detected items missing from ingredients_nutrition_v5"""
+    listed = "\n".join(f'    - "{item.get("name")}": {item.get("weight") or "unknown weight"}' for item in items)
+    return f"""
+    You are a nutrition data agent.
+
+    For each ingredient below (name: total weight), return a structured nutrition object inside a dictionary called "macronutrients_by_ingredient", keyed by the ingredient name exactly as given.
+{listed}
+
+    Use this format for every ingredient:
+    {{
+      "macronutrients_by_ingredient": {{
+        "Ingredient Name": {{
+          "category": "one of [Fruits, Other, Eggs, Grains, Legumes, Dairy, Vegetables, Fish, Fat And Oils, Meat, Herb, Leafy Green, Fruit Juice, Nut, Mushroom, Soy, Alcoholic, Seed, Dried Fruit, Spice, Citrus, Dairy Alternatives, Sweeteners, Condiment, Root Vegetable, Shellfish, Seafood, Poultry, Berry, Sauces, Beverages]",
+          "possible_measurement": {{"cup": "", "tbsp": "", "tsp": "", "g": 1, "ml": 1, "avg_raw": "", "small_raw": "", "medium_raw": "", "large_raw": ""}},
+          "base_ingredient_name": ["singular form", "plural form"],
+          "names": {{
+            "english": {{"name": {{"singular": "", "plural": ""}}, "synonyms": []}},
+            "russian": {{"name": {{"singular": "", "plural": ""}}, "synonyms": []}},
+            "spanish": {{"name": {{"singular": "", "plural": ""}}, "synonyms": []}},
+            "hebrew": {{"name": {{"singular": "", "plural": ""}}, "synonyms": []}}
+          }},
+          "data_source": "USDA, Tesco, or other trusted source",
+          "weight": "the given weight (e.g., '450g')",
+          "proteins": "total for the weight (e.g., '7.5g')",
+          "carbohydrates": "total for the weight (e.g., '22.1g')",
+          "fats": "total for the weight (e.g., '3.2g')",
+          "calories": "total for the weight (e.g., '145.5kcal')",
+          "proteins_per_100g": float,
+          "carbohydrates_per_100g": float,
+          "fats_per_100g": float,
+          "calories_per_100g": float
+        }}
+      }}
+    }}
+    """
+
 def get_recipe_logic(params: dict) -> dict:
+    """
+    Generate recipes for /get_recipe from a synchronous handler
+
+    The work runs on the process-lifetime background event loop, so the loop
+    and its pooled AsyncClient are reused across requests instead of being
+    rebuilt by asyncio.run() each time. Async callers should await
+    get_recipe_logic_async() directly.
+    """
+    return run_coroutine(get_recipe_logic_async(params))
+
+async def get_recipe_logic_async(params: dict) -> dict:
+    """Generate recipes for /get_recipe; blocking file housekeeping runs in worker threads"""
     # Extract and robustly convert parameters
     def to_int(val, default=None):
         try:
@@ -364,11 +434,51 @@ def get_recipe_logic(params: dict) -> dict:
             overall_time = time.time() - overall_start_time
             logger.info(f"=== AI recipe generation completed in {overall_time:.3f} seconds (no ingredients found) ===")
             return empty_response
+        # Requests with the same canonical constraints share one generated recipe set
+        cache_key = None
+        if RECIPE_CACHE_CONFIG['ENABLED']:
+            cache_key = make_recipe_cache_key(
+                [ingredient["name"] for ingredient in IngredientParser.deduplicate_ingredients(available_ingredients)],
+                {
+                    "calories": (min_calories, max_calories), "proteins": (min_proteins, max_proteins),
+                    "carbohydrates": (min_carbs, max_carbs), "fats": (min_fats, max_fats)
+                },
+                diet_type, difficulty, lang
+            )
+            cached_result = recipe_cache.get(cache_key)
+            if cached_result is not None:
+                overall_time = time.time() - overall_start_time
+                logger.info(f"Step 3: Recipe cache hit, served in {overall_time:.3f} seconds: {recipe_cache.stats()}")
+                return ResponseBuilder.add_metadata_to_response(cached_result, available_ingredients)
+        # Answer from the stored gpt_recipes corpus first; the model only generates the shortfall
+        retrieved_recipes = []
+        generate_count = 5
+        retrieval = params.get('retrieval')
+        if RECIPE_RETRIEVAL_CONFIG['ENABLED'] if retrieval is None else str(retrieval).lower() == 'true':
+            retrieval_start_time = time.time()
+            target = RECIPE_RETRIEVAL_CONFIG['TARGET_RECIPES']
+            retrieved_recipes = await asyncio.to_thread(
+                search_stored_recipes,
+                [ingredient["name"] for ingredient in available_ingredients],
+                {
+                    "calories": (min_calories, max_calories), "proteins": (min_proteins, max_proteins),
+                    "carbohydrates": (min_carbs, max_carbs), "fats": (min_fats, max_fats)
+                },
+                diet_type, difficulty, target
+            )
+            generate_count = target - len(retrieved_recipes)
+            logger.info(f"Step 3: Retrieved {len(retrieved_recipes)} stored recipes in {time.time() - retrieval_start_time:.3f} seconds")
+            if generate_count <= 0:
+                result_json = {"recipes": retrieved_recipes, "total_recipes": len(retrieved_recipes)}
+                result_json = ResponseBuilder.add_metadata_to_response(result_json, available_ingredients)
+                overall_time = time.time() - overall_start_time
+                logger.info(f"=== Recipes served from gpt_recipes in {overall_time:.3f} seconds ===")
+                return result_json
         # Step 4: Clean up old files
         cleanup_start_time = time.time()
         logger.info(f"Step 4: Starting file cleanup...")
         # TODO: Make this path configurable
-        FileManager.cleanup_old_files("/home/data/kaila/uploads/recipe")
+        await asyncio.to_thread(FileManager.cleanup_old_files, "/home/data/kaila/uploads/recipe")
         cleanup_time = time.time() - cleanup_start_time
         logger.info(f"Step 4: File cleanup completed in {cleanup_time:.3f} seconds")
         # Step 5: Build prompt
@@ -377,7 +487,7 @@ def get_recipe_logic(params: dict) -> dict:
         prompt = PromptBuilder.build_recipe_prompt(
             available_ingredients, min_calories, max_calories,
             min_proteins, max_proteins, min_carbs, max_carbs,
-            min_fats, max_fats, diet_type, None, difficulty
+            min_fats, max_fats, diet_type, None, difficulty, generate_count
         )
         logger.info(f" Prompt = {prompt}")
         prompt_build_time = time.time() - prompt_build_start_time
@@ -385,14 +495,19 @@ def get_recipe_logic(params: dict) -> dict:
         # Step 6: Generate recipe with AI
         api_call_start_time = time.time()
         logger.info(f"Step 6: Starting OpenRouter API call for recipe generation...")
+        usage = {}
         try:
-            # NOTE: If called from an async context, replace asyncio.run with await
-            result = asyncio.run(RecipeGenerator.generate_recipe_with_ai(prompt, []))
+            result = await RecipeGenerator.generate_recipe_with_ai(prompt, [], usage=usage)
             api_call_time = time.time() - api_call_start_time
             logger.info(f"Step 6: OpenRouter API call completed in {api_call_time:.3f} seconds")
         except Exception as e:
             api_call_time = time.time() - api_call_start_time
             logger.error(f"Step 6: API call failed after {api_call_time:.3f} seconds: {str(e)}")
+            if retrieved_recipes:
+                # The stored matches are still a valid, if shorter, answer
+                return ResponseBuilder.add_metadata_to_response(
+                    {"recipes": retrieved_recipes, "total_recipes": len(retrieved_recipes)}, available_ingredients
+                )
             if "Network error" in str(e) or "Timeout" in str(e):
                 fallback_response = ResponseBuilder.build_error_response(
                     "network_error", f"Network error: {str(e)}", available_ingredients
@@ -408,14 +523,21 @@ def get_recipe_logic(params: dict) -> dict:
         parsing_start_time = time.time()
         logger.info(f"Step 7: Starting response parsing...")
         try:
-            result_json = parse_ai_json_response(result)
+            result_json = parse_ai_json_response(result, RECIPE_SET, BASE_MODEL_NAME)
             parsing_time = time.time() - parsing_start_time
             logger.info(f"Step 7: Response parsing completed in {parsing_time:.3f} seconds")
+            if retrieved_recipes and isinstance(result_json, dict):
+                result_json["recipes"] = merge_recipes(retrieved_recipes, result_json.get("recipes") or [])
+                result_json["total_recipes"] = len(result_json["recipes"])
+            if cache_key and isinstance(result_json, dict) and result_json.get("recipes"):
+                # Fall back to a ~4 characters per token estimate when the usage block is missing
+                tokens = usage.get("total_tokens") or (len(prompt) + len(result)) // 4
+                recipe_cache.set(cache_key, result_json, tokens, generated=not usage.get("coalesced"))
             # Step 8: Add metadata and save response
             metadata_start_time = time.time()
             logger.info(f"Step 8: Starting metadata addition...")
             result_json = ResponseBuilder.add_metadata_to_response(result_json, available_ingredients)
-            FileManager.save_response_to_mock(result_json)
+            await asyncio.to_thread(FileManager.save_response_to_mock, result_json)
             metadata_time = time.time() - metadata_start_time
             logger.info(f"Step 8: Metadata addition completed in {metadata_time:.3f} seconds")
             overall_time = time.time() - overall_start_time
@@ -427,6 +549,7 @@ def get_recipe_logic(params: dict) -> dict:
         except json.JSONDecodeError as e:
             parsing_time = time.time() - parsing_start_time
             logger.error(f"Step 7: Response parsing failed after {parsing_time:.3f} seconds: {str(e)}")
+            logger.error(f"Step 7: Output stats for {BASE_MODEL_NAME}: {output_stats.stats().get(BASE_MODEL_NAME)}")
             fallback_response = ResponseBuilder.build_error_response(
                 "parsing_error", "JSON parsing failed", available_ingredients
             )
@@ -506,8 +629,11 @@ def save_recipe_to_mongodb(recipe, recipe_info):
                 'suitable_diets': health.get('suitable_for', []),
                 'unsuitable_diets': health.get('not_suitable_for', [])
             })
+        # Float copies of the macro strings, so range filters can use the macro indexes
+        flattened_recipe.update(build_macro_columns(flattened_recipe))
         try:
             # Save the flattened recipe
+            from mongodb_config import gpt_recipes_collection
             recipe_id = gpt_recipes_collection.insert_one(flattened_recipe).inserted_id
         except Exception as exp:
             print(exp)
@@ -1020,105 +1146,23 @@ def validate_nutritional_values(nutrition_data: Dict, category: str = None, ingr
         Tuple[bool, str]: (is_valid, error_message)
     """
     try:
-        # Extract values and convert to float
-        def extract_float(value: str) -> float:
-            if isinstance(value, (int, float)):
-                return float(value)
-            # Remove units and convert to float
-            return float(str(value).replace('g', '').replace('kcal', '').strip())
-
-        # Get values
-        proteins = extract_float(nutrition_data.get('proteins_per_100g', '0'))
-        carbs = extract_float(nutrition_data.get('carbohydrates_per_100g', '0'))
-        fats = extract_float(nutrition_data.get('fats_per_100g', '0'))
-        calories = extract_float(nutrition_data.get('calories_per_100g', '0'))
-
-        # Check if this is an alcoholic beverage
-        is_alcoholic = category in ['Alcoholic', 'Alcohol', 'Liquor', 'Fortified Wine', 'Liqueur'] or \
-                       any(alcohol_term in str(category).lower() for alcohol_term in
-                           ['wine', 'beer', 'spirit', 'liquor'])
-
-        if is_alcoholic:
-            # Special validation for alcoholic beverages
-            if not (0 <= proteins <= 5):
-                error_msg = f"Invalid protein value for alcoholic beverage: {proteins}g (should be between 0-5g)"
-                save_validation_error(ingredient_name=ingredient_name if ingredient_name else "Unknown",
-                                      error_message=error_msg,
-                                      nutrition_data=nutrition_data,
-                                      category=category)
-                return False, error_msg
-            if not (0 <= carbs <= 30):
-                error_msg = f"Invalid carbohydrate value for alcoholic beverage: {carbs}g (should be between 0-30g)"
-                save_validation_error(ingredient_name=ingredient_name if ingredient_name else "Unknown",
-                                      error_message=error_msg,
-                                      nutrition_data=nutrition_data,
-                                      category=category)
-                return False, error_msg
-            if not (0 <= fats <= 5):
-                error_msg = f"Invalid fat value for alcoholic beverage: {fats}g (should be between 0-5g)"
-                save_validation_error(ingredient_name=ingredient_name if ingredient_name else "Unknown",
-                                      error_message=error_msg,
-                                      nutrition_data=nutrition_data,
-                                      category=category)
-                return False, error_msg
-            if not (0 <= calories <= 350):
-                error_msg = f"Invalid calorie value for alcoholic beverage: {calories}kcal (should be between 0-350kcal)"
-                save_validation_error(ingredient_name=ingredient_name if ingredient_name else "Unknown",
-                                      error_message=error_msg,
-                                      nutrition_data=nutrition_data,
-                                      category=category)
-                return False, error_msg
-
-        else:
-            # Regular food validation
-            if not (0 <= proteins <= 100):
-                error_msg = f"Invalid protein value: {proteins}g (should be between 0-100g)"
-                save_validation_error(ingredient_name=ingredient_name if ingredient_name else "Unknown",
-                                      error_message=error_msg,
-                                      nutrition_data=nutrition_data,
-                                      category=category)
-                return False, error_msg
-            if not (0 <= carbs <= 100):
-                error_msg = f"Invalid carbohydrate value: {carbs}g (should be between 0-100g)"
-                save_validation_error(ingredient_name=ingredient_name if ingredient_name else "Unknown",
-                                      error_message=error_msg,
-                                      nutrition_data=nutrition_data,
-                                      category=category)
-                return False, error_msg
-            if not (0 <= fats <= 100):
-                error_msg = f"Invalid fat value: {fats}g (should be between 0-100g)"
-                save_validation_error(ingredient_name=ingredient_name if ingredient_name else "Unknown",
-                                      error_message=error_msg,
-                                      nutrition_data=nutrition_data,
-                                      category=category)
-                return False, error_msg
-            if not (0 <= calories <= 900):
-                error_msg = f"Invalid calorie value: {calories}kcal (should be between 0-900kcal)"
-                save_validation_error(ingredient_name=ingredient_name if ingredient_name else "Unknown",
-                                      error_message=error_msg,
-                                      nutrition_data=nutrition_data,
-                                      category=category)
-                return False, error_msg
-
-            # Validate total macronutrients don't exceed 100g
-            total_macros = proteins + carbs + fats
-            if total_macros > 100:
-                error_msg = f"Total macronutrients ({total_macros}g) exceed 100g"
-                save_validation_error(ingredient_name=ingredient_name if ingredient_name else "Unknown",
-                                      error_message=error_msg,
-                                      nutrition_data=nutrition_data,
-                                      category=category)
-                return False, error_msg
-
-            # Validate calories match macronutrients (roughly)
-            calculated_calories = (proteins * 4) + (carbs * 4) + (fats * 9)
-            if abs(calculated_calories - calories) > 50:
-                error_msg = f"Calorie calculation mismatch: calculated {calculated_calories}kcal vs provided {calories}kcal"
-                save_validation_error(ingredient_name=ingredient_name if ingredient_name else "Unknown",
-                                      error_message=error_msg,
-                                      nutrition_data=nutrition_data,
-                                      category=category)
-                return False, error_msg
+        # Get values in g / kcal
+        values = {}
+        for key in PER_100G_FIELDS:
+            value = parse_nutrient(key, nutrition_data.get(key, '0'))
+            if value is None:
+                raise ValueError(f"could not convert {key}: {nutrition_data.get(key)!r}")
+            values[key] = value
+
+        # Range, alcoholic-beverage, macro total and calorie (Atwater) rules from the shared rule table
+        violations = check_nutrition_rules(values, category, first_only=True)
+        if violations:
+            error_msg = violations[0][1]
+            save_validation_error(ingredient_name=ingredient_name if ingredient_name else "Unknown",
+                                  error_message=error_msg,
+                                  nutrition_data=nutrition_data,
+                                  category=category)
+            return False, error_msg
 
         return True, "Valid nutritional values"
 
@@ -1369,7 +1413,7 @@ class PromptBuilder:
         requirements_text = "\n".join(prompt_parts) if prompt_parts else "No specific requirements"
 
         final_prompt =  f"""
-        Generate 5 nutritious and delicious recipes using only the provided list of ingredients.  
+        Generate {limit} nutritious and delicious recipes using only the provided list of ingredients.  
         If no ingredients are provided — generate a free-form recipe.
         
         ✅ Water and spices may be used optionally even if not listed.  
@@ -1493,8 +1537,28 @@ class RecipeGenerator:
     """Utility class for generating recipes using AI"""
     
     @staticmethod
-    async def generate_recipe_with_ai(prompt: str, image_urls: List[str]) -> Dict[str, Any]:
-        """Generate recipe using OpenRouter API"""
+    async def generate_recipe_with_ai(prompt: str, image_urls: List[str], usage: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Generate recipe using OpenRouter API; usage, when given, receives the completion's token usage
+
+        Identical generations requested while one is in flight share its answer instead of calling the model again;
+        the usage of such a joined call is marked "coalesced", since the caller that ran it accounts for the tokens.
+        """
+        key = content_key(BASE_MODEL_NAME, prompt, image_urls)
+        led = []
+
+        async def generate():
+            led.append(True)
+            return await RecipeGenerator._generate_recipe(prompt, image_urls)
+        result, call_usage = await recipe_flight.do_async(key, generate)
+        if usage is not None:
+            usage.update(call_usage)
+            if not led:
+                usage["coalesced"] = True
+        return result
+
+    @staticmethod
+    async def _generate_recipe(prompt: str, image_urls: List[str]) -> Tuple[str, Dict[str, Any]]:
         content = [{"type": "text", "text": prompt}]
         
         # Add images if provided
@@ -1511,45 +1575,50 @@ class RecipeGenerator:
                 }
             })
 
+        body = {
+            "model": BASE_MODEL_NAME,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": content
+                }
+            ],
+            "temperature": 0.7,
+            "response_format": response_format_for(RECIPE_SET, BASE_MODEL_NAME, default={"type": "json_object"})
+        }
+        output_stats.record_request(BASE_MODEL_NAME, structured=body["response_format"]["type"] == "json_schema")
+
+        # Shared keep-alive client: retries reuse the pooled connection
+        client = get_async_client()
         max_retries = 2
         for retry_attempt in range(max_retries + 1):
             try:
-                async with httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=10.0)) as client:
-                    body = {
-                        "model": BASE_MODEL_NAME,
-                        "messages": [
-                            {
-                                "role": "user",
-                                "content": content
-                            }
-                        ],
-                        "temperature": 0.7,
-                        "response_format": {"type": "json_object"}
-                    }
-                    
-                    response = await client.post(
-                        "https://openrouter.ai/api/v1/chat/completions",
-                        headers={"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"},
-                        json=body,
-                        timeout=RECIPE_GENERATION_TIMEOUT
-                    )
+                response = await client.post(
+                    "https://openrouter.ai/api/v1/chat/completions",
+                    headers={"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"},
+                    json=body,
+                    timeout=RECIPE_GENERATION_TIMEOUT
+                )
+                
+                if response.status_code == 200:
+                    response_data = response.json()
+                    return response_data["choices"][0]["message"]["content"], response_data.get("usage") or {}
+                elif response.status_code == 429 and retry_attempt < max_retries:
+                    output_stats.record_retry(BASE_MODEL_NAME)
+                    wait_time = 2 ** retry_attempt
+                    await asyncio.sleep(wait_time)
+                    continue
+                elif response.status_code >= 500 and retry_attempt < max_retries:
+                    output_stats.record_retry(BASE_MODEL_NAME)
+                    wait_time = 1 * (retry_attempt + 1)
+                    await asyncio.sleep(wait_time)
+                    continue
+                else:
+                    break
                     
-                    if response.status_code == 200:
-                        response_data = response.json()
-                        return response_data["choices"][0]["message"]["content"]
-                    elif response.status_code == 429 and retry_attempt < max_retries:
-                        wait_time = 2 ** retry_attempt
-                        await asyncio.sleep(wait_time)
-                        continue
-                    elif response.status_code >= 500 and retry_attempt < max_retries:
-                        wait_time = 1 * (retry_attempt + 1)
-                        await asyncio.sleep(wait_time)
-                        continue
-                    else:
-                        break
-                        
             except (httpx.TimeoutException, httpx.ConnectError) as e:
                 if retry_attempt < max_retries:
+                    output_stats.record_retry(BASE_MODEL_NAME)
                     wait_time = 1 * (retry_attempt + 1)
                     await asyncio.sleep(wait_time)
                     continue
@@ -1732,42 +1801,17 @@ class FileManager:
 
 
 
-def parse_ai_json_response(result: str) -> Dict[str, Any]:
-    """Parse AI JSON response with error handling and JSON repair"""
+def parse_ai_json_response(result: str, output_schema=None, model: Optional[str] = None) -> Dict[str, Any]:
+    """Parse AI JSON response strictly, repairing fences, quotes, commas and truncation only when that fails"""
     try:
-        return json.loads(result)
+        parsed = parse_structured_output(result, output_schema, model)
     except json.JSONDecodeError as e:
         logger.error(f"Failed to parse AI response: {str(e)}")
         logger.error(f"Raw response: {result[:500]}...")
-        
-        # Try smart repair first (uses error position for targeted fixes)
-        try:
-            smart_repaired = smart_json_repair(result, e.pos)
-            return json.loads(smart_repaired)
-        except Exception as smart_error:
-            logger.error(f"Smart JSON repair failed: {str(smart_error)}")
-            
-            # Try comprehensive repair
-            try:
-                comprehensive_repaired = comprehensive_json_repair(result, e.pos)
-                return json.loads(comprehensive_repaired)
-            except Exception as comprehensive_error:
-                logger.error(f"Comprehensive JSON repair failed: {str(comprehensive_error)}")
-                
-                # Try the original repair functions as fallback
-                try:
-                    repaired_json = repair_json_response(result, e.pos)
-                    return json.loads(repaired_json)
-                except Exception as repair_error:
-                    logger.error(f"Basic JSON repair failed: {str(repair_error)}")
-                    
-                    # Try aggressive repair as last resort
-                    try:
-                        aggressive_repaired = aggressive_json_repair(result)
-                        return json.loads(aggressive_repaired)
-                    except Exception as aggressive_error:
-                        logger.error(f"Aggressive JSON repair also failed: {str(aggressive_error)}")
-                        raise e
+        raise
+    if parsed.repairs:
+        logger.warning(f"Repaired AI JSON response: {', '.join(parsed.repairs)}")
+    return parsed.value
 
 def get_analysis_prompt():
     """Get the enhanced analysis prompt for meal image analysis"""